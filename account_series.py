@@ -0,0 +1,170 @@
+"""
+Agrupamento persistido de contas (séries de parcelas e recorrências)
+Substitui o reagrupamento por expressão regular das descrições
+"""
+
+import re
+from datetime import date
+from sqlalchemy import func, case, literal
+from sqlalchemy.orm import joinedload
+from app import db
+from models import AccountSeries, Receivable, Payable
+
+# Sufixo usado nas descrições geradas ("- Parcela 1/3", "- Mês 2")
+SERIES_SUFFIX_RE = re.compile(r' - (Parcela|Mês) \d+.*')
+
+def base_description(description):
+    """Descrição da conta sem o sufixo de parcela/mês"""
+    return SERIES_SUFFIX_RE.sub('', description or '')
+
+def start_series(user_id, kind, description, series_type='simple', client_id=None,
+                 supplier_id=None, installment_sale_id=None):
+    """Cria a série de uma nova conta e retorna o registro já com id (flush)"""
+    series = AccountSeries(
+        user_id=user_id,
+        kind=kind,
+        series_type=series_type,
+        description=base_description(description),
+        client_id=client_id,
+        supplier_id=supplier_id,
+        installment_sale_id=installment_sale_id
+    )
+    db.session.add(series)
+    db.session.flush()
+    return series
+
+def recent_series(user_id, kind, limit=5, today=None):
+    """
+    Retorna as contas mais recentes do usuário, já agrupadas por série.
+
+    Uma consulta com LIMIT sobre account_series (com cliente/fornecedor) e
+    uma agregação restrita aos ids retornados.
+    """
+    today = today or date.today()
+    model = Receivable if kind == 'receivable' else Payable
+
+    series_list = AccountSeries.query.options(
+        joinedload(AccountSeries.client if kind == 'receivable' else AccountSeries.supplier)
+    ).filter(
+        AccountSeries.user_id == user_id,
+        AccountSeries.kind == kind,
+        db.session.query(model.id).filter(model.series_id == AccountSeries.id).exists()
+    ).order_by(
+        AccountSeries.created_at.desc(), AccountSeries.id.desc()
+    ).limit(limit).all()
+
+    if not series_list:
+        return []
+
+    is_overdue = case(
+        (model.status == 'overdue', literal(1)),
+        ((model.status == 'pending') & (model.due_date < today), literal(1)),
+        else_=literal(0)
+    )
+    is_paid = case((model.status == 'paid', literal(1)), else_=literal(0))
+
+    totals = {
+        series_id: (amount, first_due_date, count, overdue, paid)
+        for series_id, amount, first_due_date, count, overdue, paid in db.session.query(
+            model.series_id,
+            func.sum(model.amount),
+            func.min(model.due_date),
+            func.count(model.id),
+            func.sum(is_overdue),
+            func.sum(is_paid)
+        ).filter(
+            model.series_id.in_([s.id for s in series_list])
+        ).group_by(model.series_id).all()
+    }
+
+    groups = []
+    for series in series_list:
+        amount, first_due_date, count, overdue, paid = totals.get(series.id, (0, None, 0, 0, 0))
+
+        if overdue:
+            status = 'overdue'
+        elif count and paid == count:
+            status = 'paid'
+        else:
+            status = 'pending'
+
+        groups.append({
+            'id': series.id,
+            'description': series.description,
+            'series_type': series.series_type,
+            'amount': amount or 0,
+            'due_date': first_due_date,
+            'status': status,
+            'client': series.client if kind == 'receivable' else None,
+            'supplier': series.supplier if kind == 'payable' else None
+        })
+
+    return groups
+
+def backfill_series(batch_size=1000):
+    """
+    Cria séries para contas antigas (series_id nulo).
+
+    Linhas com sufixo "- Parcela X"/"- Mês X" são agrupadas por usuário,
+    descrição base e cliente/fornecedor (mesmo critério da tela antiga);
+    parcelas de vendas parceladas são agrupadas pela venda.
+    """
+    created = 0
+
+    for kind, model, party_column in (
+        ('receivable', Receivable, Receivable.client_id),
+        ('payable', Payable, Payable.supplier_id),
+    ):
+        columns = [model.id, model.user_id, party_column, model.description, model.created_at]
+        if model is Receivable:
+            columns.append(Receivable.parent_id)
+
+        rows = db.session.query(*columns).filter(
+            model.series_id.is_(None)
+        ).order_by(model.user_id, model.created_at, model.id).all()
+
+        groups = {}
+        for row in rows:
+            parent_id = row[5] if model is Receivable else None
+            match = SERIES_SUFFIX_RE.search(row.description or '')
+
+            if parent_id:
+                key = ('sale', parent_id)
+                series_type = 'installment'
+            elif match:
+                key = ('suffix', row.user_id, base_description(row.description), row[2])
+                series_type = 'installment' if match.group(1) == 'Parcela' else 'recurring'
+            else:
+                key = ('row', row.id)
+                series_type = 'simple'
+
+            if key not in groups:
+                groups[key] = {
+                    'series': AccountSeries(
+                        user_id=row.user_id,
+                        kind=kind,
+                        series_type=series_type,
+                        description=base_description(row.description),
+                        client_id=row[2] if kind == 'receivable' else None,
+                        supplier_id=row[2] if kind == 'payable' else None,
+                        installment_sale_id=parent_id,
+                        created_at=row.created_at
+                    ),
+                    'ids': []
+                }
+            groups[key]['ids'].append(row.id)
+
+        pending = list(groups.values())
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            db.session.add_all([group['series'] for group in chunk])
+            db.session.flush()
+
+            for group in chunk:
+                model.query.filter(model.id.in_(group['ids'])).update(
+                    {model.series_id: group['series'].id}, synchronize_session=False
+                )
+            db.session.commit()
+            created += len(chunk)
+
+    return created
@@ -0,0 +1,125 @@
+"""
+Cache persistente das análises da IA (ai_analysis_cache)
+Cada resultado é guardado por usuário, tipo de análise e parâmetros, junto
+com uma impressão digital barata dos dados usados: o resumo mensal das
+contas (monthly_summary), o total e o último cadastro de clientes e as
+regras das contas recorrentes. Enquanto a impressão digital não mudar e o
+resultado não vencer (AI_CACHE_TTL_HOURS), a análise sai do banco, sem
+nova chamada à API.
+
+refresh=True ignora o cache e grava o resultado novo. Acima de
+AI_CACHE_MAX_ENTRIES resultados, os usados há mais tempo são removidos
+(LRU). Respostas com erro não são guardadas.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import AIAnalysisCache, AccountSeries, Client, MonthlySummary
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def data_fingerprint(user_id):
+    """Hash dos totais que alimentam as análises (algumas linhas por mês, via índices)"""
+    summary = db.session.query(
+        MonthlySummary.kind, MonthlySummary.month, MonthlySummary.status, MonthlySummary.count, MonthlySummary.amount
+    ).filter(
+        MonthlySummary.user_id == user_id,
+        MonthlySummary.count != 0
+    ).order_by(MonthlySummary.kind, MonthlySummary.month, MonthlySummary.status).all()
+
+    clients = db.session.query(func.count(Client.id), func.max(Client.created_at)).filter(
+        Client.user_id == user_id
+    ).one()
+
+    recurring = db.session.query(
+        func.count(AccountSeries.id),
+        func.max(AccountSeries.id),
+        func.sum(AccountSeries.amount),
+        func.sum(AccountSeries.interval_months),
+        func.count(AccountSeries.next_due_date)
+    ).filter(
+        AccountSeries.user_id == user_id,
+        AccountSeries.series_type == 'recurring'
+    ).one()
+
+    return _digest([[list(row) for row in summary], list(clients), list(recurring)])
+
+def _evict(now):
+    """Remove os vencidos e, acima do limite, os usados há mais tempo"""
+    AIAnalysisCache.query.filter(AIAnalysisCache.expires_at <= now).delete(synchronize_session=False)
+
+    excess = AIAnalysisCache.query.count() - current_app.config.get('AI_CACHE_MAX_ENTRIES', 5000)
+    if excess > 0:
+        oldest = [entry_id for entry_id, in db.session.query(AIAnalysisCache.id)
+                  .order_by(AIAnalysisCache.last_used_at, AIAnalysisCache.id).limit(excess)]
+        AIAnalysisCache.query.filter(AIAnalysisCache.id.in_(oldest)).delete(synchronize_session=False)
+
+def cache_lookup(user_id, analysis, params, fingerprint):
+    """Resultado guardado e ainda válido para os mesmos dados, ou None"""
+    now = datetime.utcnow()
+    entry = AIAnalysisCache.query.filter_by(user_id=user_id, analysis=analysis, params_key=_digest(params)).first()
+    if not entry or entry.fingerprint != fingerprint or entry.expires_at <= now:
+        return None
+
+    entry.last_used_at = now
+    db.session.commit()
+    result = json.loads(entry.result)
+    result.update(gerado_em=entry.created_at.isoformat(), em_cache=True)
+    return result
+
+def cache_store(user_id, analysis, params, fingerprint, result):
+    """
+    Guarda o resultado novo (respostas com erro não são guardadas).
+
+    Retorna o resultado com 'gerado_em' e 'em_cache' para a tela mostrar
+    de quando é.
+    """
+    if not isinstance(result, dict) or 'error' in result:
+        return result
+
+    now = datetime.utcnow()
+    ttl = timedelta(hours=current_app.config.get('AI_CACHE_TTL_HOURS', 24))
+    params_key = _digest(params)
+    entry = AIAnalysisCache.query.filter_by(user_id=user_id, analysis=analysis, params_key=params_key).first()
+    if entry is None:
+        entry = AIAnalysisCache(user_id=user_id, analysis=analysis, params_key=params_key)
+        db.session.add(entry)
+
+    entry.fingerprint = fingerprint
+    entry.result = json.dumps(result, ensure_ascii=False)
+    entry.created_at = now
+    entry.last_used_at = now
+    entry.expires_at = now + ttl
+
+    try:
+        _evict(now)
+        db.session.commit()
+    except IntegrityError:
+        # Outro worker gravou a mesma análise ao mesmo tempo
+        db.session.rollback()
+    return dict(result, gerado_em=now.isoformat(), em_cache=False)
+
+def cached_analysis(user_id, analysis, params, compute, refresh=False):
+    """Resultado da análise, do cache quando os dados não mudaram; compute() só roda na falta"""
+    fingerprint = data_fingerprint(user_id)
+    if not refresh:
+        result = cache_lookup(user_id, analysis, params, fingerprint)
+        if result is not None:
+            return result
+    return cache_store(user_id, analysis, params, fingerprint, compute())
+
+def clear_analysis_cache(user_id=None):
+    """Apaga os resultados guardados (de um usuário ou de todos; sem commit)"""
+    query = AIAnalysisCache.query
+    if user_id is not None:
+        query = query.filter(AIAnalysisCache.user_id == user_id)
+    return query.delete(synchronize_session=False)
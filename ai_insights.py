@@ -5,41 +5,197 @@ Analisa dados financeiros e fornece previsões inteligentes
 
 import os
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, date, timedelta
+from flask import current_app
 from openai import OpenAI
+from sqlalchemy import func, case, and_, or_
+from sqlalchemy.orm import aliased
 from app import db
 from models import Receivable, Payable, Client, User
+from recurrence import virtual_occurrences
+from monthly_summary import OPEN_STATUSES, paid_by_month, status_totals
+from ai_cache import cached_analysis, cache_lookup, cache_store, data_fingerprint
+from background_jobs import register_job
+from cash_flow_forecast import forecast_available, forecast_cash_flow
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Contas mais recentes de cada cliente enviadas na análise de risco
+HISTORY_SIZE = 10
+
+# Textos da predição de fluxo de caixa que a IA pode reescrever (os números são do modelo local)
+NARRATIVE_KEYS = ('tendencias', 'recomendacoes', 'alertas', 'resumo')
+
+# Análise -> (prompt de sistema, temperatura, mensagem do log, mensagem de erro)
+ANALYSES = {
+    'cash_flow': ("Você é um analista financeiro especialista em predições de fluxo de caixa para pequenas e médias empresas brasileiras.",
+                  0.3, "Erro na predição de fluxo de caixa", "Erro ao gerar predição"),
+    'client_risk': ("Você é um especialista em análise de risco de crédito e cobrança.",
+                    0.2, "Erro na análise de risco", "Erro ao gerar análise"),
+    'business_insights': ("Você é um consultor financeiro especializado em análise estratégica de negócios.",
+                          0.3, "Erro nos insights", "Erro ao gerar insights"),
+}
+
+def _supports_window_functions():
+    """ROW_NUMBER() OVER: SQLite 3.25+, MySQL 8+, MariaDB 10.2+"""
+    dialect = db.engine.dialect
+    version = dialect.server_version_info or ()
+    if dialect.name == 'sqlite':
+        return version >= (3, 25)
+    if dialect.name in ('mysql', 'mariadb'):
+        return version >= ((10, 2) if getattr(dialect, 'is_mariadb', False) else (8, 0))
+    return True
+
+def _history_rows_window(user_id, history_size):
+    """
+    Uma consulta: cada cliente com suas últimas contas e os totais.
+
+    Clientes LEFT JOIN contas (pelo índice client_id, due_date); os totais vêm
+    de agregações OVER (PARTITION BY cliente) e o recorte das últimas contas
+    de ROW_NUMBER(). Clientes sem contas vêm com uma linha vazia.
+    """
+    by_client = {'partition_by': Client.id}
+    ranked = db.session.query(
+        Client.id.label('client_id'), Client.name, Client.document, Client.whatsapp,
+        Receivable.amount, Receivable.due_date, Receivable.status,
+        func.row_number().over(
+            order_by=(Receivable.due_date.desc(), Receivable.id.desc()), **by_client
+        ).label('recency'),
+        func.sum(Receivable.amount).over(**by_client).label('total'),
+        func.sum(case((Receivable.status == 'paid', Receivable.amount), else_=0)).over(**by_client).label('paid'),
+        func.sum(case((Receivable.status == 'overdue', 1), else_=0)).over(**by_client).label('overdue')
+    ).outerjoin(
+        Receivable, and_(Receivable.client_id == Client.id, Receivable.user_id == user_id)
+    ).filter(Client.user_id == user_id).subquery()
+
+    columns = [column for column in ranked.c if column.name != 'recency']
+    return db.session.query(*columns).filter(
+        ranked.c.recency <= history_size
+    ).order_by(ranked.c.client_id, ranked.c.recency).all()
+
+def _history_rows_fallback(user_id, history_size):
+    """
+    Mesmo resultado sem funções de janela (SQLite antigo, MySQL 5.7).
+
+    Duas consultas: os totais por GROUP BY e as últimas contas de cada
+    cliente, escolhidas contando quantas contas dele são mais recentes.
+    """
+    totals = dict((client_id, (total, paid, overdue)) for client_id, total, paid, overdue in db.session.query(
+        Receivable.client_id,
+        func.sum(Receivable.amount),
+        func.sum(case((Receivable.status == 'paid', Receivable.amount), else_=0)),
+        func.sum(case((Receivable.status == 'overdue', 1), else_=0))
+    ).filter(Receivable.user_id == user_id).group_by(Receivable.client_id))
+
+    # Só por client_id, para usar o índice (client_id, due_date)
+    newer = aliased(Receivable)
+    newer_count = db.session.query(func.count(newer.id)).filter(
+        newer.client_id == Receivable.client_id,
+        newer.due_date >= Receivable.due_date,
+        or_(newer.due_date > Receivable.due_date, newer.id > Receivable.id)
+    ).scalar_subquery()
+
+    rows = db.session.query(
+        Client.id, Client.name, Client.document, Client.whatsapp,
+        Receivable.amount, Receivable.due_date, Receivable.status
+    ).outerjoin(
+        Receivable, and_(Receivable.client_id == Client.id, Receivable.user_id == user_id,
+                         newer_count < history_size)
+    ).filter(
+        Client.user_id == user_id
+    ).order_by(Client.id, Receivable.due_date.desc(), Receivable.id.desc()).all()
+
+    return [tuple(row) + totals.get(row[0], (None, None, None)) for row in rows]
+
+def client_payment_history(user_id, history_size=HISTORY_SIZE, today=None, use_window=None):
+    """
+    Histórico de pagamentos de cada cliente para a análise de risco.
+
+    Totais sobre todas as contas do cliente e as history_size contas de
+    vencimento mais recente, sem uma consulta por cliente.
+    """
+    today = today or date.today()
+    if use_window is None:
+        use_window = _supports_window_functions()
+    rows = (_history_rows_window if use_window else _history_rows_fallback)(user_id, history_size)
+
+    clients_data = []
+    by_client = {}
+    for client_id, name, document, whatsapp, amount, due_date, status, total, paid, overdue in rows:
+        data = by_client.get(client_id)
+        if data is None:
+            total_amount = float(total or 0)
+            paid_amount = float(paid or 0)
+            data = by_client[client_id] = {
+                "nome": name,
+                "documento": document,
+                "whatsapp": whatsapp,
+                "historico_pagamentos": [],
+                "total_negociado": total_amount,
+                "total_pago": paid_amount,
+                "contas_em_atraso": int(overdue or 0),
+                "score_pagamento": (paid_amount / total_amount * 100) if total_amount > 0 else 0
+            }
+            clients_data.append(data)
+        
+        if due_date is not None:
+            data["historico_pagamentos"].append({
+                "valor": float(amount),
+                "vencimento": due_date.isoformat(),
+                "status": status,
+                "dias_atraso": max(0, (today - due_date).days) if status != 'paid' else 0
+            })
+    
+    return clients_data
+
+def _with_narrative(forecast, narrative):
+    """Previsão local com os textos da IA; se a IA falhar, ficam os textos gerados por regras"""
+    result = dict(forecast)
+    if 'error' in narrative:
+        result['aviso'] = narrative['error']
+        return result
+    
+    for key in NARRATIVE_KEYS:
+        if narrative.get(key):
+            result[key] = narrative[key]
+    for key in ('gerado_em', 'em_cache'):
+        if key in narrative:
+            result[key] = narrative[key]
+    return result
+
 class FinancialAI:
     def __init__(self):
         self.client = None
         self.enabled = False
+        self.settings = None  # Snapshot usado para criar o cliente atual
     
     def _initialize_client(self):
-        """Inicializa o cliente OpenAI com a API key do banco de dados"""
+        """Inicializa o cliente OpenAI com a API key das configurações (cache)"""
         try:
-            from models import SystemSettings
+            from settings_cache import get_settings
             from app import app
             
             with app.app_context():
-                settings = SystemSettings.query.first()
-                if settings and settings.ai_enabled and settings.ai_api_key:
-                    try:
-                        self.client = OpenAI(api_key=settings.ai_api_key.strip())
-                        self.enabled = True
-                        return True
-                    except Exception as e:
-                        logging.error(f"Erro ao inicializar OpenAI client: {str(e)}")
-                        self.client = None
-                        self.enabled = False
-                        return False
-                else:
+                settings = get_settings()
+            self.settings = settings
+            
+            if settings and settings.ai_enabled and settings.ai_api_key:
+                try:
+                    self.client = OpenAI(api_key=settings.ai_api_key.strip())
+                    self.enabled = True
+                    return True
+                except Exception as e:
+                    logging.error(f"Erro ao inicializar OpenAI client: {str(e)}")
                     self.client = None
                     self.enabled = False
                     return False
+            else:
+                self.client = None
+                self.enabled = False
+                return False
         except Exception as e:
             logging.error(f"Erro ao acessar configurações da IA: {str(e)}")
             self.client = None
@@ -51,25 +207,178 @@ class FinancialAI:
         return self._initialize_client()
             
     def is_enabled(self):
-        """Verifica se a IA está habilitada"""
-        if not self.enabled or self.client is None:
+        """Verifica se a IA está habilitada (recria o cliente se as configurações mudaram)"""
+        from settings_cache import get_settings
+        from app import app
+        
+        with app.app_context():
+            settings = get_settings()
+        if settings != self.settings or self.client is None:
             self._initialize_client()
         return self.enabled and self.client is not None
     
-    def get_cash_flow_prediction(self, user_id, months_ahead=3):
-        """Predição de fluxo de caixa"""
+    def _analyses(self, user_id, months_ahead=3, forecast=None):
+        """
+        {análise: (parâmetros do cache, função que coleta os dados e monta o prompt)}
+
+        Os dados só são lidos do banco quando a função é chamada, ou seja,
+        quando a análise não está no cache. Com a previsão local (forecast),
+        a IA só escreve os textos do fluxo de caixa.
+        """
+        # A janela dos dados futuros começa hoje: o resultado vale para o dia
+        cash_flow_params = {'months_ahead': months_ahead, 'today': date.today().isoformat()}
+        if forecast is not None:
+            cash_flow = (dict(cash_flow_params, motor='estatistico'),
+                         lambda: self._cash_flow_narrative_prompt(user_id, forecast))
+        else:
+            cash_flow = (cash_flow_params, lambda: self._cash_flow_prompt(user_id, months_ahead))
+        
+        return {
+            'cash_flow': cash_flow,
+            'client_risk': ({}, lambda: self._client_risk_prompt(user_id)),
+            'business_insights': ({}, lambda: self._business_prompt(user_id)),
+        }
+    
+    def _single_analysis(self, user_id, analysis, refresh, months_ahead=3, forecast=None):
+        params, build_prompt = self._analyses(user_id, months_ahead, forecast)[analysis]
+        timeout = current_app.config.get('AI_REQUEST_TIMEOUT', 45)
+        return cached_analysis(user_id, analysis, params, lambda: self._run(analysis, build_prompt, timeout), refresh)
+    
+    def get_cash_flow_prediction(self, user_id, months_ahead=3, refresh=False):
+        """
+        Predição de fluxo de caixa.
+
+        Os números vêm do modelo estatístico local (cash_flow_forecast.py), em
+        milissegundos e sem depender da IA; com a IA configurada, ela escreve
+        tendências, recomendações, alertas e resumo (do cache enquanto os
+        dados não mudarem). Sem NumPy, a predição inteira é feita pela IA.
+        """
+        forecast = self._local_forecast(user_id, months_ahead)
         if not self.is_enabled():
+            if forecast is not None:
+                return forecast
             return {"error": "IA não configurada. Configure a API key no painel admin."}
+
+        result = self._single_analysis(user_id, 'cash_flow', refresh, months_ahead, forecast)
+        return _with_narrative(forecast, result) if forecast is not None else result
+    
+    def _local_forecast(self, user_id, months_ahead):
+        """Previsão do modelo local, ou None (sem NumPy ou em caso de erro)"""
+        if not forecast_available():
+            return None
+        try:
+            return forecast_cash_flow(user_id, months_ahead)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro na previsão estatística de fluxo de caixa: {str(e)}")
+            return None
+    
+    def get_client_risk_analysis(self, user_id, refresh=False):
+        """Análise de risco de clientes (do cache enquanto os dados não mudarem)"""
+        if not self.is_enabled():
+            return {"error": "IA não configurada"}
         
+        return self._single_analysis(user_id, 'client_risk', refresh)
+    
+    def get_business_insights(self, user_id, refresh=False):
+        """Insights gerais do negócio (do cache enquanto os dados não mudarem)"""
+        if not self.is_enabled():
+            return {"error": "IA não configurada"}
+        
+        return self._single_analysis(user_id, 'business_insights', refresh)
+    
+    def generate_report(self, user_id, months_ahead=3, refresh=False):
+        """
+        As três análises do relatório completo: {análise: resultado}.
+
+        O cache e os dados são lidos uma vez, nesta thread (a sessão do banco
+        não é compartilhada); só as chamadas à API das análises que faltam
+        rodam em paralelo, cada uma limitada a AI_REQUEST_TIMEOUT segundos.
+        O relatório demora o que a chamada mais lenta demorar, e uma análise
+        que falhe ou estoure o tempo volta com 'error' sem derrubar as outras.
+        """
+        forecast = self._local_forecast(user_id, months_ahead)
+        analyses = self._analyses(user_id, months_ahead, forecast)
+        fingerprint = data_fingerprint(user_id)
+        results, prompts = {}, {}
+        
+        for analysis, (params, build_prompt) in analyses.items():
+            cached = None if refresh else cache_lookup(user_id, analysis, params, fingerprint)
+            if cached is not None:
+                results[analysis] = cached
+                continue
+            try:
+                prompts[analysis] = build_prompt()
+            except Exception as e:
+                results[analysis] = self._failure(analysis, e)
+        
+        if prompts:
+            timeout = current_app.config.get('AI_REQUEST_TIMEOUT', 45)
+            deadline = time.monotonic() + timeout
+            pool = ThreadPoolExecutor(max_workers=len(prompts), thread_name_prefix='ai-report')
+            futures = {analysis: pool.submit(self._ask, analysis, prompt, timeout)
+                       for analysis, prompt in prompts.items()}
+            
+            for analysis, future in futures.items():
+                try:
+                    result = future.result(timeout=max(0, deadline - time.monotonic()))
+                except FutureTimeoutError:
+                    logger.warning(f"Análise {analysis} excedeu {timeout:g}s")
+                    result = {"error": "Tempo esgotado ao consultar a IA. Tente novamente."}
+                results[analysis] = cache_store(user_id, analysis, analyses[analysis][0], fingerprint, result)
+            
+            # Não espera chamadas que estouraram o tempo: o resultado delas é descartado
+            pool.shutdown(wait=False, cancel_futures=True)
+        
+        if forecast is not None:
+            results['cash_flow'] = _with_narrative(forecast, results['cash_flow'])
+        return {analysis: results[analysis] for analysis in analyses}
+    
+    def _run(self, analysis, build_prompt, timeout):
+        """Coleta os dados, monta o prompt e consulta a IA"""
         try:
-            # Coletar dados históricos
-            historical_data = self._collect_historical_data(user_id, months=12)
+            prompt = build_prompt()
+        except Exception as e:
+            return self._failure(analysis, e)
+        return self._ask(analysis, prompt, timeout)
+    
+    def _ask(self, analysis, prompt, timeout):
+        """
+        Uma chamada à API, sem acesso ao banco (roda nas threads do relatório).
+
+        Erros voltam como {"error": ...}.
+        """
+        system_prompt, temperature, _log_message, _error_message = ANALYSES[analysis]
+        try:
+            response = self.client.chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt}
+                ],
+                response_format={"type": "json_object"},
+                temperature=temperature,
+                timeout=timeout
+            )
             
-            # Coletar dados futuros (contas agendadas)
-            future_data = self._collect_future_data(user_id, months_ahead)
+            return json.loads(response.choices[0].message.content)
             
-            # Preparar prompt para IA
-            prompt = f"""
+        except Exception as e:
+            return self._failure(analysis, e)
+    
+    def _failure(self, analysis, error):
+        _system_prompt, _temperature, log_message, error_message = ANALYSES[analysis]
+        logger.error(f"{log_message}: {str(error)}")
+        return {"error": f"{error_message}: {str(error)}"}
+    
+    def _cash_flow_prompt(self, user_id, months_ahead):
+        # Coletar dados históricos
+        historical_data = self._collect_historical_data(user_id, months=12)
+        
+        # Coletar dados futuros (contas agendadas)
+        future_data = self._collect_future_data(user_id, months_ahead)
+        
+        return f"""
             Analise os dados financeiros abaixo e forneça uma predição de fluxo de caixa para os próximos {months_ahead} meses.
 
             DADOS HISTÓRICOS (últimos 12 meses):
@@ -94,33 +403,36 @@ class FinancialAI:
 
             Considere sazonalidade, padrões de pagamento e tendências históricas.
             """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "Você é um analista financeiro especialista em predições de fluxo de caixa para pequenas e médias empresas brasileiras."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.3
-            )
-            
-            return json.loads(response.choices[0].message.content)
-            
-        except Exception as e:
-            logger.error(f"Erro na predição de fluxo de caixa: {str(e)}")
-            return {"error": f"Erro ao gerar predição: {str(e)}"}
     
-    def get_client_risk_analysis(self, user_id):
-        """Análise de risco de clientes"""
-        if not self.is_enabled():
-            return {"error": "IA não configurada"}
+    def _cash_flow_narrative_prompt(self, user_id, forecast):
+        historical_data = self._collect_historical_data(user_id, months=12)
+        numbers = {key: value for key, value in forecast.items() if key not in NARRATIVE_KEYS}
         
-        try:
-            # Coletar dados de clientes e histórico de pagamentos
-            clients_data = self._collect_client_payment_history(user_id)
-            
-            prompt = f"""
+        return f"""
+            A previsão de fluxo de caixa abaixo foi calculada pelo sistema com modelos estatísticos sobre o histórico e as contas agendadas. Não altere os números: interprete-os.
+
+            PREVISÃO:
+            {json.dumps(numbers, indent=2, ensure_ascii=False)}
+
+            DADOS HISTÓRICOS (últimos 12 meses):
+            {json.dumps(historical_data, indent=2, ensure_ascii=False)}
+
+            Forneça a análise em JSON com o seguinte formato:
+            {{
+                "tendencias": ["tendência 1", "tendência 2"],
+                "recomendacoes": ["recomendação 1", "recomendação 2"],
+                "alertas": ["alerta 1", "alerta 2"],
+                "resumo": "Resumo executivo da análise"
+            }}
+
+            Considere sazonalidade, padrões de pagamento e tendências históricas.
+            """
+    
+    def _client_risk_prompt(self, user_id):
+        # Coletar dados de clientes e histórico de pagamentos
+        clients_data = self._collect_client_payment_history(user_id)
+        
+        return f"""
             Analise o histórico de pagamentos dos clientes abaixo e classifique o risco de inadimplência de cada um.
 
             DADOS DOS CLIENTES:
@@ -140,33 +452,12 @@ class FinancialAI:
                 "resumo_geral": "Análise geral da carteira"
             }}
             """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "Você é um especialista em análise de risco de crédito e cobrança."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.2
-            )
-            
-            return json.loads(response.choices[0].message.content)
-            
-        except Exception as e:
-            logger.error(f"Erro na análise de risco: {str(e)}")
-            return {"error": f"Erro ao gerar análise: {str(e)}"}
     
-    def get_business_insights(self, user_id):
-        """Insights gerais do negócio"""
-        if not self.is_enabled():
-            return {"error": "IA não configurada"}
+    def _business_prompt(self, user_id):
+        # Coletar dados abrangentes
+        financial_summary = self._get_financial_summary(user_id)
         
-        try:
-            # Coletar dados abrangentes
-            financial_summary = self._get_financial_summary(user_id)
-            
-            prompt = f"""
+        return f"""
             Com base nos dados financeiros da empresa, forneça insights estratégicos para otimização do negócio.
 
             DADOS FINANCEIROS:
@@ -199,58 +490,10 @@ class FinancialAI:
                 "score_saude_financeira": 85
             }}
             """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "Você é um consultor financeiro especializado em análise estratégica de negócios."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.3
-            )
-            
-            return json.loads(response.choices[0].message.content)
-            
-        except Exception as e:
-            logger.error(f"Erro nos insights: {str(e)}")
-            return {"error": f"Erro ao gerar insights: {str(e)}"}
     
     def _collect_historical_data(self, user_id, months=12):
-        """Coleta dados históricos dos últimos X meses"""
-        end_date = date.today()
-        start_date = end_date - timedelta(days=months * 30)
-        
-        receivables = Receivable.query.filter(
-            Receivable.user_id == user_id,
-            Receivable.due_date >= start_date,
-            Receivable.due_date <= end_date
-        ).all()
-        
-        payables = Payable.query.filter(
-            Payable.user_id == user_id,
-            Payable.due_date >= start_date,
-            Payable.due_date <= end_date
-        ).all()
-        
-        # Agrupar por mês
-        monthly_data = {}
-        
-        for r in receivables:
-            month_key = r.due_date.strftime('%Y-%m')
-            if month_key not in monthly_data:
-                monthly_data[month_key] = {"receitas": 0, "gastos": 0}
-            if r.status == 'paid':
-                monthly_data[month_key]["receitas"] += float(r.amount)
-        
-        for p in payables:
-            month_key = p.due_date.strftime('%Y-%m')
-            if month_key not in monthly_data:
-                monthly_data[month_key] = {"receitas": 0, "gastos": 0}
-            if p.status == 'paid':
-                monthly_data[month_key]["gastos"] += float(p.amount)
-        
-        return monthly_data
+        """Recebido e pago por mês nos últimos X meses (do resumo mensal)"""
+        return paid_by_month(user_id, months)
     
     def _collect_future_data(self, user_id, months_ahead=3):
         """Coleta dados futuros (contas agendadas)"""
@@ -271,6 +514,10 @@ class FinancialAI:
             Payable.status.in_(['pending', 'overdue'])
         ).all()
         
+        # Recorrências além da janela já gerada entram como previstas
+        projected_receivables = virtual_occurrences(user_id, 'receivable', start_date, end_date)
+        projected_payables = virtual_occurrences(user_id, 'payable', start_date, end_date)
+        
         return {
             "contas_receber": [
                 {
@@ -279,6 +526,13 @@ class FinancialAI:
                     "cliente": r.client.name if r.client else "N/A",
                     "status": r.status
                 } for r in future_receivables
+            ] + [
+                {
+                    "valor": float(item['amount']),
+                    "vencimento": item['due_date'].isoformat(),
+                    "cliente": item['client'].name if item['client'] else "N/A",
+                    "status": "previsto"
+                } for item in projected_receivables
             ],
             "contas_pagar": [
                 {
@@ -287,51 +541,19 @@ class FinancialAI:
                     "fornecedor": p.supplier.name if p.supplier else "N/A",
                     "status": p.status
                 } for p in future_payables
+            ] + [
+                {
+                    "valor": float(item['amount']),
+                    "vencimento": item['due_date'].isoformat(),
+                    "fornecedor": item['supplier'].name if item['supplier'] else "N/A",
+                    "status": "previsto"
+                } for item in projected_payables
             ]
         }
     
-    def _collect_client_payment_history(self, user_id):
-        """Coleta histórico de pagamentos por cliente"""
-        clients = Client.query.filter_by(user_id=user_id).all()
-        clients_data = []
-        
-        for client in clients:
-            receivables = Receivable.query.filter_by(
-                user_id=user_id, 
-                client_id=client.id
-            ).order_by(Receivable.due_date.desc()).all()
-            
-            payment_history = []
-            total_amount = 0
-            paid_amount = 0
-            overdue_count = 0
-            
-            for r in receivables:
-                payment_history.append({
-                    "valor": float(r.amount),
-                    "vencimento": r.due_date.isoformat(),
-                    "status": r.status,
-                    "dias_atraso": max(0, (date.today() - r.due_date).days) if r.status != 'paid' else 0
-                })
-                
-                total_amount += float(r.amount)
-                if r.status == 'paid':
-                    paid_amount += float(r.amount)
-                elif r.status == 'overdue':
-                    overdue_count += 1
-            
-            clients_data.append({
-                "nome": client.name,
-                "documento": client.document,
-                "whatsapp": client.whatsapp,
-                "historico_pagamentos": payment_history[-10:],  # Últimos 10
-                "total_negociado": total_amount,
-                "total_pago": paid_amount,
-                "contas_em_atraso": overdue_count,
-                "score_pagamento": (paid_amount / total_amount * 100) if total_amount > 0 else 0
-            })
-        
-        return clients_data
+    def _collect_client_payment_history(self, user_id, history_size=HISTORY_SIZE):
+        """Totais de cada cliente e as últimas contas (client_payment_history)"""
+        return client_payment_history(user_id, history_size)
     
     def _get_financial_summary(self, user_id):
         """Resumo financeiro geral"""
@@ -339,21 +561,12 @@ class FinancialAI:
         last_month = today - timedelta(days=30)
         last_3_months = today - timedelta(days=90)
         
-        # Métricas gerais
-        total_receivables = Receivable.query.filter_by(user_id=user_id).count()
-        paid_receivables = Receivable.query.filter_by(user_id=user_id, status='paid').count()
-        overdue_receivables = Receivable.query.filter_by(user_id=user_id, status='overdue').count()
-        
-        # Valores
-        total_to_receive = db.session.query(db.func.sum(Receivable.amount)).filter(
-            Receivable.user_id == user_id,
-            Receivable.status.in_(['pending', 'overdue'])
-        ).scalar() or 0
-        
-        total_received = db.session.query(db.func.sum(Receivable.amount)).filter(
-            Receivable.user_id == user_id,
-            Receivable.status == 'paid'
-        ).scalar() or 0
+        # Métricas gerais (do resumo mensal)
+        totals = status_totals(user_id, 'receivable')
+        total_receivables = sum(count for count, _amount in totals.values())
+        paid_receivables, total_received = totals.get('paid', (0, 0))
+        overdue_receivables = totals.get('overdue', (0, 0))[0]
+        total_to_receive = sum(totals.get(status, (0, 0))[1] for status in OPEN_STATUSES)
         
         return {
             "resumo_geral": {
@@ -370,4 +583,32 @@ class FinancialAI:
         }
 
 # Instância global
-financial_ai = FinancialAI()
\ No newline at end of file
+financial_ai = FinancialAI()
+
+# Tarefas em segundo plano (ver background_jobs.py); params['refresh'] ignora o cache
+@register_job('ai_cash_flow')
+def _cash_flow_job(user_id, params, progress):
+    return financial_ai.get_cash_flow_prediction(user_id, params.get('months_ahead', 3), refresh=params.get('refresh', False))
+
+@register_job('ai_client_risk')
+def _client_risk_job(user_id, params, progress):
+    return financial_ai.get_client_risk_analysis(user_id, refresh=params.get('refresh', False))
+
+@register_job('ai_business_insights')
+def _business_insights_job(user_id, params, progress):
+    return financial_ai.get_business_insights(user_id, refresh=params.get('refresh', False))
+
+@register_job('ai_report')
+def _report_job(user_id, params, progress):
+    """Relatório completo: as três análises em paralelo"""
+    if not financial_ai.is_enabled():
+        return {'error': 'IA não configurada'}
+    
+    analyses = financial_ai.generate_report(user_id, params.get('months_ahead', 3), refresh=params.get('refresh', False))
+    return {
+        'data_geracao': datetime.now().strftime('%d/%m/%Y %H:%M'),
+        'fluxo_caixa': analyses['cash_flow'],
+        'analise_risco': analyses['client_risk'],
+        'insights_negocio': analyses['business_insights'],
+        'resumo_executivo': 'Relatório gerado com sucesso usando IA'
+    }
@@ -1,8 +1,13 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from app import db
-from models import Receivable, Payable, Client, Supplier, UserPlan, InstallmentSale, WhatsAppMessage
-from utils import login_required, get_current_user, send_whatsapp_message, generate_system_url
-from datetime import datetime, timedelta
+from models import Receivable, Payable, Client, InstallmentSale, AccountSeries
+from utils import login_required, get_current_user, get_user_plan, generate_system_url
+from account_series import start_series, recent_series
+from reminder_planner import plan_receivables
+from recurrence import create_recurring_series, stop_series
+from installments import InstallmentPlan, insert_installments
+from whatsapp_outbox import queue_whatsapp_message
+from datetime import datetime
 import uuid
 
 accounts_bp = Blueprint('accounts', __name__)
@@ -12,92 +17,19 @@ accounts_bp = Blueprint('accounts', __name__)
 def index():
     """Página principal de cadastro de contas"""
     user = get_current_user()
-    clients = Client.query.filter_by(user_id=user.id).all()
-    suppliers = Supplier.query.filter_by(user_id=user.id).all()
     
-    # Buscar contas recentes agrupadas (sem mostrar parcelas individuais)
-    import re
-    
-    # Buscar todas as receivables e agrupar manualmente
-    all_receivables = Receivable.query.filter_by(user_id=user.id).order_by(Receivable.created_at.desc()).all()
-    receivables_grouped = {}
-    
-    for receivable in all_receivables:
-        # Remove "- Parcela X" e "- Mês X" da descrição para agrupar
-        base_description = re.sub(r' - (Parcela|Mês) \d+.*', '', receivable.description)
-        key = (base_description, receivable.client_id)
-        
-        if key not in receivables_grouped:
-            receivables_grouped[key] = {
-                'description': base_description,
-                'client_id': receivable.client_id,
-                'total_amount': 0,
-                'first_due_date': receivable.due_date,
-                'created_at': receivable.created_at
-            }
-        
-        receivables_grouped[key]['total_amount'] += receivable.amount
-        if receivable.due_date < receivables_grouped[key]['first_due_date']:
-            receivables_grouped[key]['first_due_date'] = receivable.due_date
-    
-    # Ordenar por data de criação e pegar os 5 mais recentes
-    recent_receivables_data = sorted(receivables_grouped.values(), key=lambda x: x['created_at'], reverse=True)[:5]
-    
-    # Buscar todas as payables e agrupar manualmente
-    all_payables = Payable.query.filter_by(user_id=user.id).order_by(Payable.created_at.desc()).all()
-    payables_grouped = {}
-    
-    for payable in all_payables:
-        # Remove "- Parcela X" e "- Mês X" da descrição para agrupar
-        base_description = re.sub(r' - (Parcela|Mês) \d+.*', '', payable.description)
-        key = (base_description, payable.supplier_id)
-        
-        if key not in payables_grouped:
-            payables_grouped[key] = {
-                'description': base_description,
-                'supplier_id': payable.supplier_id,
-                'total_amount': 0,
-                'first_due_date': payable.due_date,
-                'created_at': payable.created_at
-            }
-        
-        payables_grouped[key]['total_amount'] += payable.amount
-        if payable.due_date < payables_grouped[key]['first_due_date']:
-            payables_grouped[key]['first_due_date'] = payable.due_date
-    
-    # Ordenar por data de criação e pegar os 5 mais recentes
-    recent_payables_data = sorted(payables_grouped.values(), key=lambda x: x['created_at'], reverse=True)[:5]
+    # Contas recentes agrupadas por série (sem mostrar parcelas individuais)
+    recent_receivables = recent_series(user.id, 'receivable', limit=5)
+    recent_payables = recent_series(user.id, 'payable', limit=5)
     
     recent_installment_sales = InstallmentSale.query.filter_by(user_id=user.id).order_by(InstallmentSale.created_at.desc()).limit(5).all()
     
     # Calcular totais
-    receivables_total = sum(r['total_amount'] for r in recent_receivables_data)
-    payables_total = sum(p['total_amount'] for p in recent_payables_data)
-    
-    # Preparar dados estruturados para o template
-    recent_receivables = []
-    for r in recent_receivables_data:
-        client = Client.query.get(r['client_id'])
-        recent_receivables.append({
-            'description': r['description'],
-            'amount': r['total_amount'],
-            'due_date': r['first_due_date'],
-            'client': client
-        })
-    
-    recent_payables = []
-    for p in recent_payables_data:
-        supplier = Supplier.query.get(p['supplier_id']) if p['supplier_id'] else None
-        recent_payables.append({
-            'description': p['description'],
-            'amount': p['total_amount'],
-            'due_date': p['first_due_date'],
-            'supplier': supplier
-        })
+    receivables_total = sum(r['amount'] for r in recent_receivables)
+    payables_total = sum(p['amount'] for p in recent_payables)
     
+    # Clientes e fornecedores são buscados sob demanda pelo formulário (/api/search)
     return render_template('accounts.html', 
-                         clients=clients, 
-                         suppliers=suppliers,
                          recent_receivables=recent_receivables,
                          recent_payables=recent_payables,
                          recent_installment_sales=recent_installment_sales,
@@ -111,7 +43,7 @@ def add_receivable():
     user = get_current_user()
     
     # Check plan limits
-    user_plan = UserPlan.query.filter_by(user_id=user.id).first()
+    user_plan = get_user_plan(user.id)
     current_receivables = Receivable.query.filter_by(user_id=user.id).count()
     
     if current_receivables >= user_plan.max_receivables:
@@ -126,15 +58,18 @@ def add_receivable():
     
     if account_type == 'simple':
         # Conta simples
+        series = start_series(user.id, 'receivable', description, 'simple', client_id=client_id)
         receivable = Receivable(
             user_id=user.id,
             client_id=client_id,
             description=description,
             amount=amount,
             due_date=due_date,
-            type='simple'
+            type='simple',
+            series_id=series.id
         )
         db.session.add(receivable)
+        plan_receivables([receivable])
         db.session.commit()
         flash('Conta a receber simples criada com sucesso!', 'success')
         
@@ -157,62 +92,43 @@ def add_receivable():
             db.session.commit()
             
             # Enviar link de confirmação via WhatsApp
+            link_queued = False
             client = Client.query.get(client_id)
             if client and client.whatsapp:
                 confirmation_url = generate_system_url('installment_sales.confirm_public', token=sale.confirmation_token)
                 message = f"Olá {client.name}! Você tem uma venda parcelada para confirmar. Acesse: {confirmation_url}"
                 
-                success = send_whatsapp_message(user.id, client.whatsapp, message)
-                
-                # Log message
-                whatsapp_msg = WhatsAppMessage(
-                    user_id=user.id,
-                    client_id=client_id,
-                    message_type='confirmation',
-                    content=message,
-                    status='sent' if success else 'failed'
-                )
-                db.session.add(whatsapp_msg)
-                db.session.commit()
+                whatsapp_msg = queue_whatsapp_message(user.id, message, 'confirmation', client_id=client.id)
+                link_queued = whatsapp_msg.status == 'pending'
             
-            flash('Venda parcelada criada e link de confirmação enviado!', 'success')
+            if link_queued:
+                flash('Venda parcelada criada! O link de confirmação está na fila de envio.', 'success')
+            else:
+                flash('Venda parcelada criada e link de confirmação enviado!', 'success')
         else:
             # Criar parcelas diretamente sem confirmação
-            installment_amount = amount / installments
-            for i in range(installments):
-                installment_due_date = due_date + timedelta(days=30 * i)
-                receivable = Receivable(
-                    user_id=user.id,
-                    client_id=client_id,
-                    description=f"{description} - Parcela {i+1}/{installments}",
-                    amount=installment_amount,
-                    due_date=installment_due_date,
-                    type='installment',
-                    installment_number=i+1,
-                    total_installments=installments
-                )
-                db.session.add(receivable)
-            
+            insert_installments([InstallmentPlan(
+                kind='receivable',
+                user_id=user.id,
+                description=description,
+                total_amount=amount,
+                installments=installments,
+                first_due_date=due_date,
+                client_id=client_id
+            )])
             db.session.commit()
             flash(f'Conta parcelada criada com {installments} parcelas!', 'success')
     
     elif account_type == 'recurring':
-        # Conta recorrente
-        recurrence_months = int(request.form.get('recurrence_months'))
-        for i in range(recurrence_months):
-            recurring_due_date = due_date + timedelta(days=30 * i)
-            receivable = Receivable(
-                user_id=user.id,
-                client_id=client_id,
-                description=f"{description} - Mês {i+1}",
-                amount=amount,
-                due_date=recurring_due_date,
-                type='recurring'
-            )
-            db.session.add(receivable)
-        
+        # Conta recorrente: regra na série, ocorrências geradas pela janela móvel
+        recurrence_months = request.form.get('recurrence_months', type=int)
+        create_recurring_series(user.id, 'receivable', description, amount, due_date,
+                                occurrences=recurrence_months, client_id=client_id)
         db.session.commit()
-        flash(f'Conta recorrente criada para {recurrence_months} meses!', 'success')
+        if recurrence_months:
+            flash(f'Conta recorrente criada para {recurrence_months} meses!', 'success')
+        else:
+            flash('Conta recorrente criada sem prazo de término!', 'success')
     
     return redirect(url_for('accounts.index'))
 
@@ -223,7 +139,7 @@ def add_payable():
     user = get_current_user()
     
     # Check plan limits
-    user_plan = UserPlan.query.filter_by(user_id=user.id).first()
+    user_plan = get_user_plan(user.id)
     current_payables = Payable.query.filter_by(user_id=user.id).count()
     
     if current_payables >= user_plan.max_payables:
@@ -239,13 +155,15 @@ def add_payable():
     
     if account_type == 'simple':
         # Conta simples
+        series = start_series(user.id, 'payable', description, 'simple', supplier_id=supplier_id)
         payable = Payable(
             user_id=user.id,
             supplier_id=supplier_id,
             description=description,
             amount=amount,
             due_date=due_date,
-            category=category
+            category=category,
+            series_id=series.id
         )
         db.session.add(payable)
         db.session.commit()
@@ -254,39 +172,44 @@ def add_payable():
     elif account_type == 'installment':
         # Conta parcelada
         installments = int(request.form.get('installments'))
-        installment_amount = amount / installments
-        
-        for i in range(installments):
-            installment_due_date = due_date + timedelta(days=30 * i)
-            payable = Payable(
-                user_id=user.id,
-                supplier_id=supplier_id,
-                description=f"{description} - Parcela {i+1}/{installments}",
-                amount=installment_amount,
-                due_date=installment_due_date,
-                category=category
-            )
-            db.session.add(payable)
+        insert_installments([InstallmentPlan(
+            kind='payable',
+            user_id=user.id,
+            description=description,
+            total_amount=amount,
+            installments=installments,
+            first_due_date=due_date,
+            supplier_id=supplier_id,
+            category=category
+        )])
         
         db.session.commit()
         flash(f'Conta parcelada criada com {installments} parcelas!', 'success')
     
     elif account_type == 'recurring':
-        # Conta recorrente
-        recurrence_months = int(request.form.get('recurrence_months'))
-        for i in range(recurrence_months):
-            recurring_due_date = due_date + timedelta(days=30 * i)
-            payable = Payable(
-                user_id=user.id,
-                supplier_id=supplier_id,
-                description=f"{description} - Mês {i+1}",
-                amount=amount,
-                due_date=recurring_due_date,
-                category=category
-            )
-            db.session.add(payable)
-        
+        # Conta recorrente: regra na série, ocorrências geradas pela janela móvel
+        recurrence_months = request.form.get('recurrence_months', type=int)
+        create_recurring_series(user.id, 'payable', description, amount, due_date,
+                                occurrences=recurrence_months, supplier_id=supplier_id, category=category)
         db.session.commit()
-        flash(f'Conta recorrente criada para {recurrence_months} meses!', 'success')
+        if recurrence_months:
+            flash(f'Conta recorrente criada para {recurrence_months} meses!', 'success')
+        else:
+            flash('Conta recorrente criada sem prazo de término!', 'success')
+    
+    return redirect(url_for('accounts.index'))
+
+@accounts_bp.route('/stop_recurrence/<int:series_id>', methods=['POST'])
+@login_required
+def stop_recurrence(series_id):
+    """Encerrar uma conta recorrente (as ocorrências já geradas são mantidas)"""
+    user = get_current_user()
+    series = AccountSeries.query.filter_by(id=series_id, user_id=user.id, series_type='recurring').first_or_404()
+    
+    stop_series(series)
+    db.session.commit()
     
-    return redirect(url_for('accounts.index'))
\ No newline at end of file
+    flash('Recorrência encerrada! Nenhuma nova ocorrência será gerada.', 'success')
+    if series.kind == 'payable':
+        return redirect(url_for('payables.index'))
+    return redirect(url_for('receivables.index'))
@@ -1,7 +1,9 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from app import db
 from models import User, UserPlan, SystemSettings
 from utils import admin_required, get_current_user
+from evolution_client import client_for_settings, latency_snapshot
+from settings_cache import get_settings, invalidate_settings
 from datetime import datetime, timedelta
 import requests
 import logging
@@ -146,6 +148,7 @@ def update_system_settings():
     
     try:
         db.session.commit()
+        invalidate_settings()
         flash('Configurações do sistema atualizadas!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -252,6 +255,7 @@ def update_evolution_api():
     settings.evolution_enabled = 'evolution_enabled' in request.form
     
     db.session.commit()
+    invalidate_settings()
     
     flash('Configurações da Evolution API atualizadas!', 'success')
     return redirect(url_for('admin.index'))
@@ -262,7 +266,7 @@ def test_evolution_api():
     import requests
     import json
     
-    settings = SystemSettings.query.first()
+    settings = get_settings()
     
     if not settings or not settings.evolution_api_url or not settings.evolution_api_key:
         flash('Configure primeiro a URL e chave da Evolution API!', 'error')
@@ -275,18 +279,8 @@ def test_evolution_api():
         logging.debug(f"Admin Test - API Key: '{settings.evolution_api_key}'")
         logging.debug(f"Admin Test - API Key length: {len(settings.evolution_api_key) if settings.evolution_api_key else 'None'}")
         
-        # Clean the API key and URL from any potential issues
-        clean_api_key = settings.evolution_api_key.strip() if settings.evolution_api_key else ''
-        clean_api_url = settings.evolution_api_url.rstrip('/') if settings.evolution_api_url else ''
-        
         # Test connection to Evolution API using the correct structure
-        response = requests.get(
-            f"{clean_api_url}/instance/fetchInstances",
-            headers={
-                'apikey': clean_api_key
-            },
-            timeout=10
-        )
+        response = client_for_settings(settings).fetch_instances()
         
         if response.status_code == 200:
             instances = response.json()
@@ -313,6 +307,12 @@ def test_evolution_api():
     
     return redirect(url_for('admin.index'))
 
+@admin_bp.route('/evolution_api/metrics')
+@admin_required
+def evolution_api_metrics():
+    """Histograma de latência por endpoint da Evolution API (processo atual)"""
+    return jsonify(latency_snapshot())
+
 @admin_bp.route('/users/<int:user_id>/change_plan', methods=['POST'])
 @admin_required
 def change_user_plan(user_id):
@@ -1,36 +1,40 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from app import db
 from models import User, SystemSettings
-from utils import login_required, get_current_user, admin_required
+from settings_cache import invalidate_settings
+from utils import login_required, get_current_user, admin_required, current_identity
 from ai_insights import financial_ai
-from datetime import datetime
+from cash_flow_forecast import forecast_available
+from background_jobs import enqueue_job
+from api.jobs import job_response
 import logging
 
 ai_insights_bp = Blueprint('ai_insights', __name__)
 
 def check_premium_plan():
     """Verificar se o usuário tem plano Premium"""
-    from models import UserPlan
-    from datetime import datetime
-    
-    user = get_current_user()
-    if not user:
+    identity = current_identity()
+    if not identity:
         flash('Usuário não autenticado!', 'error')
         return redirect(url_for('auth.login'))
     
-    user_plan = UserPlan.query.filter_by(user_id=user.id).first()
+    user_plan = identity.plan
     
     if not user_plan or user_plan.plan_name != 'Premium':
         flash('IA Insights disponível apenas no plano Premium! Faça upgrade para acessar.', 'warning')
         return redirect(url_for('plans.index'))
     
     # Verificar se o plano Premium não expirou
-    if user_plan.expires_at and user_plan.expires_at < datetime.utcnow():
+    if identity.plan_expired:
         flash('Seu plano Premium expirou! Renove para continuar acessando.', 'warning')
         return redirect(url_for('plans.index'))
     
     return None
 
+def wants_refresh():
+    """?refresh=1 gera a análise de novo em vez de usar o resultado guardado"""
+    return request.args.get('refresh') == '1'
+
 @ai_insights_bp.route('/')
 @login_required
 def index():
@@ -44,9 +48,9 @@ def index():
     
     if not financial_ai.is_enabled():
         flash('IA não configurada. Solicite ao administrador para configurar a API key da OpenAI.', 'warning')
-        return render_template('ai_insights.html', ai_enabled=False)
+        return render_template('ai_insights.html', ai_enabled=False, forecast_enabled=forecast_available())
     
-    return render_template('ai_insights.html', ai_enabled=True)
+    return render_template('ai_insights.html', ai_enabled=True, forecast_enabled=forecast_available())
 
 @ai_insights_bp.route('/cash_flow_prediction')
 @login_required
@@ -60,8 +64,8 @@ def cash_flow_prediction():
     user = get_current_user()
     months_ahead = request.args.get('months', 3, type=int)
     
-    prediction = financial_ai.get_cash_flow_prediction(user.id, months_ahead)
-    return jsonify(prediction)
+    job = enqueue_job(user.id, 'ai_cash_flow', {'months_ahead': months_ahead, 'refresh': wants_refresh()})
+    return job_response(job)
 
 @ai_insights_bp.route('/client_risk_analysis')
 @login_required
@@ -74,8 +78,8 @@ def client_risk_analysis():
         
     user = get_current_user()
     
-    analysis = financial_ai.get_client_risk_analysis(user.id)
-    return jsonify(analysis)
+    job = enqueue_job(user.id, 'ai_client_risk', {'refresh': wants_refresh()})
+    return job_response(job)
 
 @ai_insights_bp.route('/business_insights')
 @login_required
@@ -88,8 +92,8 @@ def business_insights():
         
     user = get_current_user()
     
-    insights = financial_ai.get_business_insights(user.id)
-    return jsonify(insights)
+    job = enqueue_job(user.id, 'ai_business_insights', {'refresh': wants_refresh()})
+    return job_response(job)
 
 @ai_insights_bp.route('/admin/config')
 @admin_required
@@ -126,6 +130,7 @@ def update_config():
     settings.prediction_months = int(request.form.get('prediction_months', 3))
     
     db.session.commit()
+    invalidate_settings()
     
     # Atualizar cliente OpenAI com nova configuração
     financial_ai.update_client()
@@ -174,21 +179,6 @@ def generate_report():
     if not financial_ai.is_enabled():
         return jsonify({'error': 'IA não configurada'})
     
-    try:
-        # Gerar todos os insights
-        cash_flow = financial_ai.get_cash_flow_prediction(user.id, 3)
-        risk_analysis = financial_ai.get_client_risk_analysis(user.id)
-        business_insights = financial_ai.get_business_insights(user.id)
-        
-        report = {
-            'data_geracao': datetime.now().strftime('%d/%m/%Y %H:%M'),
-            'fluxo_caixa': cash_flow,
-            'analise_risco': risk_analysis,
-            'insights_negocio': business_insights,
-            'resumo_executivo': 'Relatório gerado com sucesso usando IA'
-        }
-        
-        return jsonify(report)
-        
-    except Exception as e:
-        return jsonify({'error': f'Erro ao gerar relatório: {str(e)}'})
\ No newline at end of file
+    # As três análises rodam em paralelo no worker; a tela acompanha a tarefa
+    job = enqueue_job(user.id, 'ai_report', {'months_ahead': 3, 'refresh': wants_refresh()})
+    return job_response(job)
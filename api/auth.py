@@ -4,7 +4,8 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
 from models import User, UserPlan, PhoneConfirmationToken
-from utils import login_required, get_current_user, send_admin_whatsapp_message, get_system_domain
+from utils import login_required, get_current_user, get_system_domain
+from whatsapp_outbox import queue_whatsapp_message
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -122,9 +123,13 @@ _Este código expira em 24 horas._
 ---
 *FinanceiroMax - Sistema Financeiro Inteligente*"""
                 
-                whatsapp_sent = send_admin_whatsapp_message(phone, message)
+                whatsapp_msg = queue_whatsapp_message(
+                    user.id, message, 'phone_confirmation', phone=phone, sender='admin'
+                )
                 
-                if whatsapp_sent:
+                if whatsapp_msg.status == 'pending':
+                    flash('Usuário criado com sucesso! O código de confirmação será enviado no seu WhatsApp em instantes. Confirme seu número para ativar a conta.', 'success')
+                elif whatsapp_msg.status == 'sent':
                     flash('Usuário criado com sucesso! Código de confirmação enviado no seu WhatsApp. Confirme seu número para ativar a conta.', 'success')
                 else:
                     flash('Usuário criado com sucesso! Porém não foi possível enviar o código de confirmação via WhatsApp. Faça o login normalmente.', 'warning')
@@ -1,17 +1,90 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from app import db
-from models import Client, UserPlan
-from utils import login_required, get_current_user, validate_cpf, validate_cnpj, format_phone
+from models import Client
+from utils import login_required, get_current_user, get_user_plan, validate_cpf, validate_cnpj, format_phone
+from list_api import (DEFAULT_PAGE_SIZE, list_endpoint, selected_fields, date_arg, page_size, keyset_page,
+                      encode_cursor, list_response, parse_datetime_value)
+from exports import export_endpoint, export_format_arg, export_response, stream_rows
+from datetime import date, timedelta
 import re
 
 clients_bp = Blueprint('clients', __name__)
 
+# Campos disponíveis na listagem JSON (?fields=)
+LIST_FIELDS = ('id', 'name', 'whatsapp', 'document', 'email', 'address', 'zip_code', 'city', 'state', 'created_at')
+
+def filter_clients(query, date_from=None, date_to=None):
+    """Período de cadastro (datas inclusivas)"""
+    if date_from:
+        query = query.filter(Client.created_at >= date_from)
+    if date_to:
+        query = query.filter(Client.created_at < date_to + timedelta(days=1))
+    return query
+
+def client_page(user_id, cursor=None, limit=DEFAULT_PAGE_SIZE, date_from=None, date_to=None):
+    """Uma página de clientes (mais recentes primeiro) e o cursor da próxima"""
+    query = filter_clients(Client.query.filter(Client.user_id == user_id), date_from, date_to)
+    
+    clients, has_more = keyset_page(query, Client.created_at, Client.id, cursor, limit,
+                                    descending=True, parse_value=parse_datetime_value)
+    next_cursor = encode_cursor(clients[-1].created_at, clients[-1].id) if has_more else None
+    return clients, next_cursor
+
 @clients_bp.route('/')
 @login_required
 def index():
     user = get_current_user()
-    clients = Client.query.filter_by(user_id=user.id).order_by(Client.created_at.desc()).all()
-    return render_template('clients.html', clients=clients)
+    # Primeira página; as demais são carregadas pela listagem JSON ao rolar
+    clients, next_cursor = client_page(user.id)
+    return render_template('clients.html', clients=clients, next_cursor=next_cursor)
+
+@clients_bp.route('/api/list')
+@login_required
+@list_endpoint
+def api_list():
+    """
+    Listagem JSON paginada por (cadastro, id), mais recentes primeiro.
+    
+    Filtros: date_from, date_to (cadastro); fields, limit, cursor.
+    """
+    user = get_current_user()
+    fields = selected_fields(LIST_FIELDS)
+    
+    clients, next_cursor = client_page(user.id, request.args.get('cursor'), page_size(),
+                                       date_arg('date_from'), date_arg('date_to'))
+    return list_response(clients, fields, lambda client: {name: getattr(client, name) for name in LIST_FIELDS},
+                         next_cursor)
+
+@clients_bp.route('/export')
+@login_required
+@export_endpoint('clients.index')
+def export():
+    """Exportação em CSV/XLSX (?format=), com os filtros da listagem (date_from, date_to)"""
+    user = get_current_user()
+    export_format = export_format_arg()
+    
+    query = filter_clients(
+        db.session.query(
+            Client.id, Client.name, Client.document, Client.whatsapp, Client.email, Client.address,
+            Client.zip_code, Client.city, Client.state, Client.created_at
+        ).filter(Client.user_id == user.id),
+        date_arg('date_from'), date_arg('date_to')
+    ).order_by(Client.created_at.desc(), Client.id.desc())
+    
+    columns = [
+        ('ID', lambda r: r.id),
+        ('Nome', lambda r: r.name),
+        ('CPF/CNPJ', lambda r: r.document),
+        ('WhatsApp', lambda r: r.whatsapp),
+        ('Email', lambda r: r.email),
+        ('Endereço', lambda r: r.address),
+        ('CEP', lambda r: r.zip_code),
+        ('Cidade', lambda r: r.city),
+        ('UF', lambda r: r.state),
+        ('Cadastro', lambda r: r.created_at),
+    ]
+    return export_response(export_format, f'clientes_{date.today():%Y%m%d}', 'Clientes',
+                           columns, stream_rows(query))
 
 @clients_bp.route('/add', methods=['GET', 'POST'])
 @login_required
@@ -21,7 +94,7 @@ def add():
     # Check plan limits
     from api.plans import check_plan_limit
     if not check_plan_limit(user, 'clients'):
-        user_plan = UserPlan.query.filter_by(user_id=user.id).first()
+        user_plan = get_user_plan(user.id)
         limit = user_plan.max_clients if user_plan else 5
         flash(f'Limite de {limit} clientes atingido! Considere fazer upgrade para o plano Premium.', 'error')
         return redirect(url_for('clients.index'))
@@ -0,0 +1,60 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from app import db
+from utils import login_required, get_current_user
+from bulk_import import ImportFormatError, import_csv
+import logging
+
+imports_bp = Blueprint('imports', __name__)
+
+# Tipo -> (tela de origem, título)
+IMPORT_KINDS = {
+    'clients': ('clients.index', 'Clientes'),
+    'receivables': ('receivables.index', 'Contas a Receber'),
+    'payables': ('payables.index', 'Contas a Pagar'),
+}
+
+@imports_bp.route('/<kind>', methods=['POST'])
+@login_required
+def upload(kind):
+    """
+    Importa o CSV enviado no campo 'file'.
+
+    Mostra o relatório (importados, duplicados e erros por linha); com
+    ?format=json devolve o mesmo relatório em JSON.
+    """
+    user = get_current_user()
+    wants_json = request.args.get('format') == 'json'
+
+    if kind not in IMPORT_KINDS:
+        if wants_json:
+            return jsonify({'error': 'Tipo de importação inválido'}), 400
+        flash('Tipo de importação inválido', 'error')
+        return redirect(url_for('dashboard.index'))
+
+    fallback_endpoint, title = IMPORT_KINDS[kind]
+    upload_file = request.files.get('file')
+    if not upload_file or not upload_file.filename:
+        if wants_json:
+            return jsonify({'error': 'Selecione um arquivo CSV'}), 400
+        flash('Selecione um arquivo CSV', 'error')
+        return redirect(url_for(fallback_endpoint))
+
+    try:
+        result = import_csv(user, kind, upload_file.stream)
+    except ImportFormatError as e:
+        if wants_json:
+            return jsonify({'error': str(e)}), 400
+        flash(str(e), 'error')
+        return redirect(url_for(fallback_endpoint))
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Erro na importação de {kind}: {str(e)}")
+        if wants_json:
+            return jsonify({'error': 'Erro ao importar arquivo'}), 500
+        flash('Erro ao importar arquivo', 'error')
+        return redirect(url_for(fallback_endpoint))
+
+    if wants_json:
+        return jsonify(result.to_dict())
+
+    return render_template('import_result.html', result=result, title=title, back_endpoint=fallback_endpoint)
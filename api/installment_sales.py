@@ -1,13 +1,25 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
 from app import db
-from models import InstallmentSale, Client, Receivable, WhatsAppMessage
-from utils import login_required, get_current_user, send_whatsapp_message, generate_system_url
-from datetime import datetime, timedelta
+from models import InstallmentSale, Client, Receivable
+from utils import login_required, get_current_user, generate_system_url
+from installments import InstallmentPlan, insert_installments
+from recurrence import add_months
+from reminder_planner import unplan_receivables
+from monthly_summary import remove_from_summary
+from whatsapp_outbox import queue_whatsapp_message
+from usage_counters import adjust_usage
+from list_api import (list_endpoint, selected_fields, list_arg, date_arg, page_size, keyset_page,
+                      encode_cursor, list_response, parse_datetime_value)
+from datetime import datetime, date, timedelta
 import uuid
 import os
 
 installment_sales_bp = Blueprint('installment_sales', __name__)
 
+# Campos disponíveis na listagem JSON (?fields=)
+LIST_FIELDS = ('id', 'description', 'total_amount', 'installments', 'status', 'client_id', 'client_name',
+               'created_at', 'confirmed_at', 'approved_at')
+
 @installment_sales_bp.route('/')
 @login_required
 def index():
@@ -16,8 +28,55 @@ def index():
         InstallmentSale.user_id == user.id
     ).order_by(InstallmentSale.created_at.desc()).all()
     
-    clients = Client.query.filter_by(user_id=user.id).all()
-    return render_template('installment_sales.html', sales=sales, clients=clients)
+    # Clientes são buscados sob demanda pelo formulário (/api/search)
+    return render_template('installment_sales.html', sales=sales)
+
+@installment_sales_bp.route('/api/list')
+@login_required
+@list_endpoint
+def api_list():
+    """
+    Listagem JSON paginada por (cadastro, id), mais recentes primeiro.
+    
+    Filtros: status (lista), client_id, date_from, date_to (cadastro); fields, limit, cursor.
+    """
+    user = get_current_user()
+    fields = selected_fields(LIST_FIELDS)
+    
+    query = db.session.query(InstallmentSale, Client).join(Client).filter(InstallmentSale.user_id == user.id)
+    
+    statuses = list_arg('status')
+    if statuses:
+        query = query.filter(InstallmentSale.status.in_(statuses))
+    client_id = request.args.get('client_id', type=int)
+    if client_id:
+        query = query.filter(InstallmentSale.client_id == client_id)
+    date_from, date_to = date_arg('date_from'), date_arg('date_to')
+    if date_from:
+        query = query.filter(InstallmentSale.created_at >= date_from)
+    if date_to:
+        query = query.filter(InstallmentSale.created_at < date_to + timedelta(days=1))
+    
+    rows, has_more = keyset_page(query, InstallmentSale.created_at, InstallmentSale.id, request.args.get('cursor'),
+                                 page_size(), descending=True, parse_value=parse_datetime_value)
+    next_cursor = encode_cursor(rows[-1][0].created_at, rows[-1][0].id) if has_more else None
+    
+    def serialize(row):
+        sale, client = row
+        return {
+            'id': sale.id,
+            'description': sale.description,
+            'total_amount': sale.total_amount,
+            'installments': sale.installments,
+            'status': sale.status,
+            'client_id': sale.client_id,
+            'client_name': client.name,
+            'created_at': sale.created_at,
+            'confirmed_at': sale.confirmed_at,
+            'approved_at': sale.approved_at
+        }
+    
+    return list_response(rows, fields, serialize, next_cursor)
 
 @installment_sales_bp.route('/add', methods=['POST'])
 @login_required
@@ -42,26 +101,20 @@ def add():
     db.session.commit()
     
     # Send WhatsApp confirmation link
+    link_queued = False
     client = Client.query.get(client_id)
     if client and client.whatsapp:
         confirmation_url = generate_system_url('installment_sales.confirm_public', token=sale.confirmation_token)
         message = f"Olá {client.name}! Você tem uma venda parcelada para confirmar. Acesse: {confirmation_url}"
         
-        # Actually send the message via WhatsApp
-        success = send_whatsapp_message(user.id, client.whatsapp, message)
-        
-        # Log message
-        whatsapp_msg = WhatsAppMessage(
-            user_id=user.id,
-            client_id=client_id,
-            message_type='confirmation',
-            content=message,
-            status='sent' if success else 'failed'
-        )
-        db.session.add(whatsapp_msg)
-        db.session.commit()
+        # Envio pela fila (ou imediato, fora do modo outbox)
+        whatsapp_msg = queue_whatsapp_message(user.id, message, 'confirmation', client_id=client.id)
+        link_queued = whatsapp_msg.status == 'pending'
     
-    flash('Venda parcelada criada e link de confirmação enviado!', 'success')
+    if link_queued:
+        flash('Venda parcelada criada! O link de confirmação está na fila de envio.', 'success')
+    else:
+        flash('Venda parcelada criada e link de confirmação enviado!', 'success')
     return redirect(url_for('installment_sales.index'))
 
 @installment_sales_bp.route('/confirm/<token>')
@@ -121,24 +174,17 @@ def approve(sale_id):
     sale.approved_at = datetime.utcnow()
     sale.approval_notes = request.form.get('approval_notes')
     
-    # Generate installment receivables
-    installment_amount = sale.total_amount / sale.installments
-    for i in range(sale.installments):
-        due_date = datetime.now().date() + timedelta(days=30 * (i + 1))
-        
-        receivable = Receivable(
-            user_id=user.id,
-            client_id=sale.client_id,
-            description=f"{sale.description} - Parcela {i+1}/{sale.installments}",
-            amount=installment_amount,
-            due_date=due_date,
-            type='installment',
-            installment_number=i+1,
-            total_installments=sale.installments,
-            parent_id=sale.id
-        )
-        db.session.add(receivable)
-    
+    # Gerar parcelas (uma por mês a partir do mês seguinte, um único INSERT)
+    insert_installments([InstallmentPlan(
+        kind='receivable',
+        user_id=user.id,
+        description=sale.description,
+        total_amount=sale.total_amount,
+        installments=sale.installments,
+        first_due_date=add_months(date.today(), 1),
+        client_id=sale.client_id,
+        sale_id=sale.id
+    )])
     db.session.commit()
     
     # Send WhatsApp approval notification
@@ -146,18 +192,7 @@ def approve(sale_id):
     if client and client.whatsapp:
         message = f"Olá {client.name}! Sua venda parcelada foi APROVADA. As parcelas foram geradas no sistema."
         
-        # Actually send the message via WhatsApp
-        success = send_whatsapp_message(user.id, client.whatsapp, message)
-        
-        whatsapp_msg = WhatsAppMessage(
-            user_id=user.id,
-            client_id=sale.client_id,
-            message_type='approval',
-            content=message,
-            status='sent' if success else 'failed'
-        )
-        db.session.add(whatsapp_msg)
-        db.session.commit()
+        queue_whatsapp_message(user.id, message, 'approval', client_id=client.id)
     
     flash('Venda aprovada e parcelas geradas com sucesso!', 'success')
     return redirect(url_for('installment_sales.index'))
@@ -193,18 +228,11 @@ def reject(sale_id):
         else:
             message = f"Olá {client.name}! Infelizmente sua venda parcelada foi REJEITADA. Motivo: {rejection_notes}"
         
-        # Actually send the message via WhatsApp
-        success = send_whatsapp_message(user.id, client.whatsapp, message)
-        
-        whatsapp_msg = WhatsAppMessage(
-            user_id=user.id,
-            client_id=sale.client_id,
-            message_type='rejection_with_resubmit' if send_new_link else 'rejection',
-            content=message,
-            status='sent' if success else 'failed'
+        queue_whatsapp_message(
+            user.id, message,
+            'rejection_with_resubmit' if send_new_link else 'rejection',
+            client_id=client.id
         )
-        db.session.add(whatsapp_msg)
-        db.session.commit()
     
     if send_new_link:
         flash('Venda rejeitada e novo link enviado ao cliente!', 'success')
@@ -236,7 +264,10 @@ def delete(sale_id):
     sale = InstallmentSale.query.filter_by(id=sale_id, user_id=user.id).first_or_404()
     
     # Delete related receivables if any
-    Receivable.query.filter_by(parent_id=sale_id).delete()
+    unplan_receivables([r.id for r in Receivable.query.with_entities(Receivable.id).filter_by(parent_id=sale_id)])
+    remove_from_summary(Receivable, [Receivable.parent_id == sale_id])
+    deleted = Receivable.query.filter_by(parent_id=sale_id).delete()
+    adjust_usage(user.id, 'receivables', -deleted)
     
     db.session.delete(sale)
     db.session.commit()
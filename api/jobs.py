@@ -0,0 +1,23 @@
+from flask import Blueprint, jsonify, url_for
+from utils import login_required, get_current_user
+from models import BackgroundJob
+from background_jobs import job_status
+
+jobs_bp = Blueprint('jobs', __name__)
+
+def job_response(job):
+    """Resposta das telas que criam tarefas: 202 enquanto a tarefa não terminar"""
+    data = job_status(job)
+    data['status_url'] = url_for('jobs.status', job_id=job.id)
+    return jsonify(data), 200 if job.status in ('done', 'failed') else 202
+
+@jobs_bp.route('/<int:job_id>')
+@login_required
+def status(job_id):
+    """Status, progresso e resultado de uma tarefa em segundo plano do usuário"""
+    user = get_current_user()
+    job = BackgroundJob.query.filter_by(id=job_id, user_id=user.id).first()
+    if not job:
+        return jsonify({'error': 'Tarefa não encontrada'}), 404
+
+    return jsonify(job_status(job))
@@ -1,34 +1,60 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from app import db
-from models import Payable, Supplier, UserPlan
-from utils import login_required, get_current_user
-from datetime import datetime, date
-from sqlalchemy import extract
-from tasks import update_overdue_status
+from models import Payable, Supplier
+from utils import login_required, get_current_user, get_user_plan, month_range, month_filter_args
+from account_series import start_series
+from recurrence import virtual_occurrences
+from list_api import (list_endpoint, selected_fields, list_arg, date_range_args, page_size, keyset_page,
+                      encode_cursor, list_response, parse_date_value)
+from exports import export_endpoint, export_format_arg, export_response, status_label, stream_rows
+from datetime import datetime, date, timedelta
 
 payables_bp = Blueprint('payables', __name__)
 
+# Campos disponíveis na listagem JSON (?fields=)
+LIST_FIELDS = ('id', 'description', 'amount', 'due_date', 'status', 'effective_status', 'category',
+               'supplier_id', 'supplier_name', 'series_id', 'created_at')
+
+def filter_payables(query):
+    """Filtros da listagem e da exportação: status, supplier_id, category e período (date_from/date_to ou month/year)"""
+    statuses = list_arg('status')
+    if statuses:
+        query = query.filter(Payable.status.in_(statuses))
+    supplier_id = request.args.get('supplier_id', type=int)
+    if supplier_id:
+        query = query.filter(Payable.supplier_id == supplier_id)
+    category = request.args.get('category')
+    if category:
+        query = query.filter(Payable.category == category)
+    date_from, date_to = date_range_args()
+    if date_from:
+        query = query.filter(Payable.due_date >= date_from)
+    if date_to:
+        query = query.filter(Payable.due_date <= date_to)
+    return query
+
 @payables_bp.route('/')
 @login_required
 def index():
     user = get_current_user()
     
-    # Atualizar status de contas em atraso automaticamente
-    update_overdue_status()
-    
     # Get month and year filter from request
-    filter_month = request.args.get('month', str(date.today().month), type=int)
-    filter_year = request.args.get('year', str(date.today().year), type=int)
+    filter_month, filter_year = month_filter_args()
     
-    # Filter payables by month and year
+    # Filter payables by month and year (intervalo de datas, usa o índice user_id + due_date)
+    month_start, next_month_start = month_range(filter_year, filter_month)
     payables = db.session.query(Payable, Supplier).outerjoin(Supplier).filter(
         Payable.user_id == user.id,
-        extract('month', Payable.due_date) == filter_month,
-        extract('year', Payable.due_date) == filter_year
+        Payable.due_date >= month_start,
+        Payable.due_date < next_month_start
     ).order_by(Payable.due_date.asc()).all()
     
     suppliers = Supplier.query.filter_by(user_id=user.id).all()
     
+    # Ocorrências previstas de contas recorrentes (ainda não geradas)
+    projected_payables = virtual_occurrences(user.id, 'payable', month_start,
+                                             next_month_start - timedelta(days=1))
+    
     # Generate month options for the filter
     months = [
         {'value': 1, 'name': 'Janeiro'},
@@ -51,12 +77,79 @@ def index():
     
     return render_template('payables.html', 
                          payables=payables, 
+                         projected_payables=projected_payables,
                          suppliers=suppliers,
                          months=months,
                          years=years,
                          current_month=filter_month,
                          current_year=filter_year)
 
+@payables_bp.route('/api/list')
+@login_required
+@list_endpoint
+def api_list():
+    """
+    Listagem JSON paginada por (vencimento, id).
+    
+    Filtros: status (lista), supplier_id, category, date_from, date_to (ou month/year); fields, limit, cursor.
+    """
+    user = get_current_user()
+    fields = selected_fields(LIST_FIELDS)
+    
+    query = filter_payables(db.session.query(Payable, Supplier).outerjoin(Supplier).filter(Payable.user_id == user.id))
+    
+    rows, has_more = keyset_page(query, Payable.due_date, Payable.id, request.args.get('cursor'),
+                                 page_size(), parse_value=parse_date_value)
+    next_cursor = encode_cursor(rows[-1][0].due_date, rows[-1][0].id) if has_more else None
+    
+    def serialize(row):
+        payable, supplier = row
+        return {
+            'id': payable.id,
+            'description': payable.description,
+            'amount': payable.amount,
+            'due_date': payable.due_date,
+            'status': payable.status,
+            'effective_status': payable.effective_status,
+            'category': payable.category,
+            'supplier_id': payable.supplier_id,
+            'supplier_name': supplier.name if supplier else None,
+            'series_id': payable.series_id,
+            'created_at': payable.created_at
+        }
+    
+    return list_response(rows, fields, serialize, next_cursor)
+
+@payables_bp.route('/export')
+@login_required
+@export_endpoint('payables.index')
+def export():
+    """Exportação em CSV/XLSX (?format=), com os mesmos filtros da listagem"""
+    user = get_current_user()
+    export_format = export_format_arg()
+    
+    query = filter_payables(
+        db.session.query(
+            Payable.id, Supplier.name, Supplier.document, Payable.description, Payable.category,
+            Payable.amount, Payable.due_date, Payable.status, Payable.created_at
+        ).select_from(Payable).outerjoin(Supplier).filter(Payable.user_id == user.id)
+    ).order_by(Payable.due_date, Payable.id)
+    
+    today = date.today()
+    columns = [
+        ('ID', lambda r: r.id),
+        ('Fornecedor', lambda r: r.name),
+        ('CPF/CNPJ', lambda r: r.document),
+        ('Descrição', lambda r: r.description),
+        ('Categoria', lambda r: r.category),
+        ('Valor', lambda r: r.amount),
+        ('Vencimento', lambda r: r.due_date),
+        ('Status', lambda r: status_label(r.status, r.due_date, today)),
+        ('Cadastro', lambda r: r.created_at),
+    ]
+    return export_response(export_format, f'contas_a_pagar_{today:%Y%m%d}', 'Contas a pagar',
+                           columns, stream_rows(query))
+
 @payables_bp.route('/add', methods=['POST'])
 @login_required
 def add():
@@ -65,7 +158,7 @@ def add():
     # Check plan limits
     from api.plans import check_plan_limit
     if not check_plan_limit(user, 'payables'):
-        user_plan = UserPlan.query.filter_by(user_id=user.id).first()
+        user_plan = get_user_plan(user.id)
         limit = user_plan.max_payables if user_plan else 20
         flash(f'Limite de {limit} contas a pagar atingido! Considere fazer upgrade para o plano Premium.', 'error')
         return redirect(url_for('payables.index'))
@@ -76,13 +169,15 @@ def add():
     due_date = request.form.get('due_date')
     category = request.form.get('category')
     
+    series = start_series(user.id, 'payable', description, 'simple', supplier_id=supplier_id)
     payable = Payable(
         user_id=user.id,
         supplier_id=supplier_id,
         description=description,
         amount=float(amount),
         due_date=datetime.strptime(due_date, '%Y-%m-%d').date(),
-        category=category
+        category=category,
+        series_id=series.id
     )
     
     db.session.add(payable)
@@ -1,7 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from app import db
 from models import User, UserPlan
-from utils import login_required, get_current_user
+from utils import login_required, get_current_user, get_user_plan
+from usage_counters import get_usage
+from plan_lifecycle import effective_plan, is_expired
 from datetime import datetime, timedelta
 
 plans_bp = Blueprint('plans', __name__)
@@ -51,15 +53,16 @@ def index():
     if not user:
         return redirect(url_for('auth.login'))
     
-    # Buscar plano atual do usuário
-    user_plan = UserPlan.query.filter_by(user_id=user.id).first()
-    current_plan = user_plan.plan_name if user_plan else 'Free'
+    # Buscar plano atual do usuário (vencido vale como Gratuito)
+    user_plan = get_user_plan(user.id)
+    current_plan = effective_plan(user_plan)['plan_name']
     
-    # Calcular estatísticas de uso
+    # Estatísticas de uso (contadores mantidos em users)
+    usage = get_usage(user)
     usage_stats = {
-        'clients_count': len(user.clients),
-        'receivables_count': len(user.receivables),
-        'payables_count': len(user.payables)
+        'clients_count': usage['clients'],
+        'receivables_count': usage['receivables'],
+        'payables_count': usage['payables']
     }
     
     return render_template('plans.html', 
@@ -103,7 +106,7 @@ def request_upgrade(plan_name):
     
     # Mensagem personalizada para o admin
     plan_info = PLANS[plan_name]
-    current_plan = UserPlan.query.filter_by(user_id=user.id).first()
+    current_plan = get_user_plan(user.id)
     current_plan_name = current_plan.plan_name if current_plan else 'Free'
     
     message = f"""🔄 *Solicitação de Mudança de Plano*
@@ -148,7 +151,7 @@ def upgrade(plan_name):
         return redirect(url_for('plans.request_upgrade', plan_name=plan_name))
     
     # Buscar ou criar plano do usuário
-    user_plan = UserPlan.query.filter_by(user_id=user.id).first()
+    user_plan = get_user_plan(user.id)
     if not user_plan:
         user_plan = UserPlan(user_id=user.id)
         db.session.add(user_plan)
@@ -176,119 +179,57 @@ def upgrade(plan_name):
 @plans_bp.route('/check_limits')
 @login_required
 def check_limits():
-    """API para verificar limites do plano atual"""
+    """API para verificar limites do plano atual (somente leitura)"""
     user = get_current_user()
     if not user:
         return jsonify({'error': 'Usuário não autenticado'}), 401
     
-    user_plan = UserPlan.query.filter_by(user_id=user.id).first()
-    if not user_plan:
-        # Criar plano gratuito padrão se não existir
-        user_plan = UserPlan(
-            user_id=user.id,
-            plan_name='Free',
-            max_clients=PLANS['Free']['max_clients'],
-            max_receivables=PLANS['Free']['max_receivables'],
-            max_payables=PLANS['Free']['max_payables']
-        )
-        db.session.add(user_plan)
-        db.session.commit()
-    
-    # Verificar se o plano expirou
-    plan_expired = False
-    if user_plan.expires_at and user_plan.expires_at < datetime.utcnow():
-        plan_expired = True
-        # Reverter para plano gratuito se expirou
-        user_plan.plan_name = 'Free'
-        user_plan.max_clients = PLANS['Free']['max_clients']
-        user_plan.max_receivables = PLANS['Free']['max_receivables']
-        user_plan.max_payables = PLANS['Free']['max_payables']
-        user_plan.expires_at = None
-        db.session.commit()
+    # Plano vencido vale como Gratuito até a rotina de expiração rebaixá-lo
+    user_plan = get_user_plan(user.id)
+    plan_expired = is_expired(user_plan)
+    plan = effective_plan(user_plan)
     
-    # Calcular uso atual
-    current_usage = {
-        'clients': len(user.clients),
-        'receivables': len(user.receivables),
-        'payables': len(user.payables)
-    }
+    # Uso atual (contadores mantidos em users)
+    current_usage = get_usage(user)
     
     # Verificar limites
     limits_exceeded = {
-        'clients': current_usage['clients'] >= user_plan.max_clients,
-        'receivables': current_usage['receivables'] >= user_plan.max_receivables,
-        'payables': current_usage['payables'] >= user_plan.max_payables
+        'clients': current_usage['clients'] >= plan['max_clients'],
+        'receivables': current_usage['receivables'] >= plan['max_receivables'],
+        'payables': current_usage['payables'] >= plan['max_payables']
     }
     
     return jsonify({
-        'plan_name': user_plan.plan_name,
+        'plan_name': plan['plan_name'],
         'plan_expired': plan_expired,
         'limits': {
-            'max_clients': user_plan.max_clients,
-            'max_receivables': user_plan.max_receivables,
-            'max_payables': user_plan.max_payables
+            'max_clients': plan['max_clients'],
+            'max_receivables': plan['max_receivables'],
+            'max_payables': plan['max_payables']
         },
         'usage': current_usage,
         'limits_exceeded': limits_exceeded,
-        'expires_at': user_plan.expires_at.isoformat() if user_plan.expires_at else None
+        'expires_at': plan['expires_at'].isoformat() if plan['expires_at'] else None
     })
 
 def check_plan_limit(user, limit_type):
     """Função auxiliar para verificar se o usuário pode adicionar mais itens"""
-    user_plan = UserPlan.query.filter_by(user_id=user.id).first()
-    
-    if not user_plan:
-        # Criar plano gratuito padrão
-        user_plan = UserPlan(
-            user_id=user.id,
-            plan_name='Free',
-            max_clients=PLANS['Free']['max_clients'],
-            max_receivables=PLANS['Free']['max_receivables'],
-            max_payables=PLANS['Free']['max_payables']
-        )
-        db.session.add(user_plan)
-        db.session.commit()
-    
-    # Verificar se o plano expirou
-    if user_plan.expires_at and user_plan.expires_at < datetime.utcnow():
-        # Reverter para plano gratuito
-        user_plan.plan_name = 'Free'
-        user_plan.max_clients = PLANS['Free']['max_clients']
-        user_plan.max_receivables = PLANS['Free']['max_receivables']
-        user_plan.max_payables = PLANS['Free']['max_payables']
-        user_plan.expires_at = None
-        db.session.commit()
-    
-    # Verificar limite específico
-    if limit_type == 'clients':
-        return len(user.clients) < user_plan.max_clients
-    elif limit_type == 'receivables':
-        return len(user.receivables) < user_plan.max_receivables
-    elif limit_type == 'payables':
-        return len(user.payables) < user_plan.max_payables
-    
-    return True
+    if limit_type not in ('clients', 'receivables', 'payables'):
+        return True
+    return remaining_quota(user, limit_type) > 0
+
+def remaining_quota(user, limit_type):
+    """Quantos itens do tipo (clients, receivables, payables) ainda cabem no plano"""
+    plan = effective_plan(get_user_plan(user.id))
+    return max(0, plan[f'max_{limit_type}'] - get_usage(user)[limit_type])
 
 def get_plan_info(user):
     """Função auxiliar para obter informações do plano do usuário"""
-    user_plan = UserPlan.query.filter_by(user_id=user.id).first()
-    
-    if not user_plan:
-        return {
-            'plan_name': 'Free',
-            'plan_display_name': 'Gratuito',
-            'is_premium': False,
-            'expires_at': None
-        }
-    
-    # Verificar se expirou
-    if user_plan.expires_at and user_plan.expires_at < datetime.utcnow():
-        user_plan.plan_name = 'Free'
-        db.session.commit()
+    plan = effective_plan(get_user_plan(user.id))
     
     return {
-        'plan_name': user_plan.plan_name,
-        'plan_display_name': PLANS.get(user_plan.plan_name, {}).get('name', user_plan.plan_name),
-        'is_premium': user_plan.plan_name == 'Premium',
-        'expires_at': user_plan.expires_at
-    }
\ No newline at end of file
+        'plan_name': plan['plan_name'],
+        'plan_display_name': PLANS.get(plan['plan_name'], {}).get('name', plan['plan_name']),
+        'is_premium': plan['plan_name'] == 'Premium',
+        'expires_at': plan['expires_at']
+    }
@@ -1,54 +1,83 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from app import db
-from models import Receivable, Client, UserPlan, InstallmentSale
-from utils import login_required, get_current_user, send_whatsapp_message
-from datetime import datetime, date
-from sqlalchemy import and_, extract, or_
-from tasks import update_overdue_status
+from models import Receivable, Client, InstallmentSale
+from utils import login_required, get_current_user, get_user_plan, month_range, month_filter_args
+from whatsapp_outbox import queue_whatsapp_message
+from account_series import start_series
+from reminder_planner import plan_receivables, unplan_receivables
+from recurrence import virtual_occurrences
+from party_search import find_by_name
+from list_api import (list_endpoint, selected_fields, list_arg, date_range_args, page_size, keyset_page,
+                      encode_cursor, list_response, parse_date_value)
+from exports import export_endpoint, export_format_arg, export_response, status_label, stream_rows
+from datetime import datetime, date, timedelta
+from sqlalchemy import and_, or_
 
 receivables_bp = Blueprint('receivables', __name__)
 
+# Campos disponíveis na listagem JSON (?fields=)
+LIST_FIELDS = ('id', 'description', 'amount', 'due_date', 'status', 'effective_status', 'type',
+               'installment_number', 'total_installments', 'client_id', 'client_name', 'series_id', 'created_at')
+
+def visible_receivables(query):
+    """Contas normais ou parcelas de vendas já aprovadas"""
+    return query.filter(
+        or_(
+            Receivable.type != 'installment',  # Regular receivables
+            and_(
+                Receivable.type == 'installment',
+                Receivable.parent_id.in_(
+                    db.session.query(InstallmentSale.id).filter(
+                        InstallmentSale.status == 'approved'
+                    )
+                )
+            )
+        )
+    )
+
+def filter_receivables(query):
+    """Filtros da listagem e da exportação: status, client_id e período (date_from/date_to ou month/year)"""
+    statuses = list_arg('status')
+    if statuses:
+        query = query.filter(Receivable.status.in_(statuses))
+    client_id = request.args.get('client_id', type=int)
+    if client_id:
+        query = query.filter(Receivable.client_id == client_id)
+    date_from, date_to = date_range_args()
+    if date_from:
+        query = query.filter(Receivable.due_date >= date_from)
+    if date_to:
+        query = query.filter(Receivable.due_date <= date_to)
+    return query
+
 @receivables_bp.route('/')
 @login_required
 def index():
     user = get_current_user()
     
-    # Atualizar status de contas em atraso automaticamente
-    update_overdue_status()
-    
     # Get month and year filter from request
-    filter_month = request.args.get('month', str(date.today().month), type=int)
-    filter_year = request.args.get('year', str(date.today().year), type=int)
+    filter_month, filter_year = month_filter_args()
     
     # Base query with client join
     base_query = db.session.query(Receivable, Client).join(Client).filter(
         Receivable.user_id == user.id
     )
     
-    # Filter by month and year
+    # Filter by month and year (intervalo de datas, usa o índice user_id + due_date)
+    month_start, next_month_start = month_range(filter_year, filter_month)
     base_query = base_query.filter(
-        extract('month', Receivable.due_date) == filter_month,
-        extract('year', Receivable.due_date) == filter_year
+        Receivable.due_date >= month_start,
+        Receivable.due_date < next_month_start
     )
     
     # Filter out installment receivables from unapproved sales
-    # Show regular receivables OR installment receivables from approved sales only
-    receivables_query = base_query.filter(
-        or_(
-            Receivable.type != 'installment',  # Regular receivables
-            and_(
-                Receivable.type == 'installment',
-                Receivable.parent_id.in_(
-                    db.session.query(InstallmentSale.id).filter(
-                        InstallmentSale.status == 'approved'
-                    )
-                )
-            )
-        )
-    ).order_by(Receivable.due_date.asc())
+    receivables_query = visible_receivables(base_query).order_by(Receivable.due_date.asc())
     
     receivables = receivables_query.all()
-    clients = Client.query.filter_by(user_id=user.id).all()
+    
+    # Ocorrências previstas de contas recorrentes (ainda não geradas)
+    projected_receivables = virtual_occurrences(user.id, 'receivable', month_start,
+                                                next_month_start - timedelta(days=1))
     
     # Generate month options for the filter
     months = [
@@ -72,14 +101,84 @@ def index():
     
     return render_template('receivables.html', 
                          receivables=receivables, 
-                         clients=clients,
+                         projected_receivables=projected_receivables,
                          months=months,
                          years=years,
                          current_month=filter_month,
                          current_year=filter_year,
                          today=date.today())
 
+@receivables_bp.route('/api/list')
+@login_required
+@list_endpoint
+def api_list():
+    """
+    Listagem JSON paginada por (vencimento, id).
+    
+    Filtros: status (lista), client_id, date_from, date_to (ou month/year); fields, limit, cursor.
+    """
+    user = get_current_user()
+    fields = selected_fields(LIST_FIELDS)
+    
+    query = filter_receivables(visible_receivables(db.session.query(Receivable, Client).join(Client).filter(
+        Receivable.user_id == user.id
+    )))
+    
+    rows, has_more = keyset_page(query, Receivable.due_date, Receivable.id, request.args.get('cursor'),
+                                 page_size(), parse_value=parse_date_value)
+    next_cursor = encode_cursor(rows[-1][0].due_date, rows[-1][0].id) if has_more else None
+    
+    def serialize(row):
+        receivable, client = row
+        return {
+            'id': receivable.id,
+            'description': receivable.description,
+            'amount': receivable.amount,
+            'due_date': receivable.due_date,
+            'status': receivable.status,
+            'effective_status': receivable.effective_status,
+            'type': receivable.type,
+            'installment_number': receivable.installment_number,
+            'total_installments': receivable.total_installments,
+            'client_id': receivable.client_id,
+            'client_name': client.name,
+            'series_id': receivable.series_id,
+            'created_at': receivable.created_at
+        }
+    
+    return list_response(rows, fields, serialize, next_cursor)
 
+@receivables_bp.route('/export')
+@login_required
+@export_endpoint('receivables.index')
+def export():
+    """Exportação em CSV/XLSX (?format=), com os mesmos filtros da listagem"""
+    user = get_current_user()
+    export_format = export_format_arg()
+    
+    query = filter_receivables(visible_receivables(
+        db.session.query(
+            Receivable.id, Client.name, Client.document, Receivable.description, Receivable.amount,
+            Receivable.due_date, Receivable.status, Receivable.type, Receivable.installment_number,
+            Receivable.total_installments, Receivable.created_at
+        ).select_from(Receivable).join(Client).filter(Receivable.user_id == user.id)
+    )).order_by(Receivable.due_date, Receivable.id)
+    
+    today = date.today()
+    columns = [
+        ('ID', lambda r: r.id),
+        ('Cliente', lambda r: r.name),
+        ('CPF/CNPJ', lambda r: r.document),
+        ('Descrição', lambda r: r.description),
+        ('Valor', lambda r: r.amount),
+        ('Vencimento', lambda r: r.due_date),
+        ('Status', lambda r: status_label(r.status, r.due_date, today)),
+        ('Tipo', lambda r: 'Parcelado' if r.type == 'installment' else 'Simples'),
+        ('Parcela', lambda r: f'{r.installment_number}/{r.total_installments}' if r.installment_number else None),
+        ('Cadastro', lambda r: r.created_at),
+    ]
+    return export_response(export_format, f'contas_a_receber_{today:%Y%m%d}', 'Contas a receber',
+                           columns, stream_rows(query))
 
 @receivables_bp.route('/send_reminder/<int:receivable_id>', methods=['POST'])
 @login_required
@@ -136,10 +235,12 @@ Lembramos que você possui uma conta a vencer:
 
 Obrigado!"""
     
-    # Enviar mensagem via WhatsApp
-    success = send_whatsapp_message(user.id, client.whatsapp, message)
+    # Enviar mensagem via WhatsApp (fila de envio no modo outbox)
+    whatsapp_msg = queue_whatsapp_message(user.id, message, 'reminder', client_id=client.id)
     
-    if success:
+    if whatsapp_msg.status == 'pending':
+        flash(f'Cobrança para {client.name} ({client.whatsapp}) adicionada à fila de envio do WhatsApp!', 'success')
+    elif whatsapp_msg.status == 'sent':
         flash(f'Cobrança enviada via WhatsApp para {client.name} ({client.whatsapp})!', 'success')
     else:
         flash(f'Erro ao enviar cobrança: O número {client.whatsapp} não existe no WhatsApp ou não está válido. Verifique o número do cliente.', 'error')
@@ -154,7 +255,7 @@ def add():
     # Check plan limits
     from api.plans import check_plan_limit
     if not check_plan_limit(user, 'receivables'):
-        user_plan = UserPlan.query.filter_by(user_id=user.id).first()
+        user_plan = get_user_plan(user.id)
         limit = user_plan.max_receivables if user_plan else 20
         flash(f'Limite de {limit} contas a receber atingido! Considere fazer upgrade para o plano Premium.', 'error')
         return redirect(url_for('receivables.index'))
@@ -163,9 +264,9 @@ def add():
     client_id = request.form.get('client_id')
     client_name = request.form.get('client_name', '').strip()
     
-    # If no client_id provided, try to find by name
+    # Nome digitado sem escolher da lista: procura ignorando acentos e caixa
     if not client_id and client_name:
-        client = Client.query.filter_by(user_id=user.id, name=client_name).first()
+        client = find_by_name(user.id, 'clients', client_name)
         if client:
             client_id = client.id
         else:
@@ -180,15 +281,18 @@ def add():
     amount = request.form.get('amount')
     due_date = request.form.get('due_date')
     
+    series = start_series(user.id, 'receivable', description, 'simple', client_id=client_id)
     receivable = Receivable(
         user_id=user.id,
         client_id=client_id,
         description=description,
         amount=float(amount),
-        due_date=datetime.strptime(due_date, '%Y-%m-%d').date()
+        due_date=datetime.strptime(due_date, '%Y-%m-%d').date(),
+        series_id=series.id
     )
     
     db.session.add(receivable)
+    plan_receivables([receivable])
     db.session.commit()
     
     flash('Conta a receber adicionada com sucesso!', 'success')
@@ -206,6 +310,7 @@ def edit(receivable_id):
     receivable.due_date = datetime.strptime(request.form.get('due_date'), '%Y-%m-%d').date()
     receivable.status = request.form.get('status')
     
+    plan_receivables([receivable])
     db.session.commit()
     flash('Conta a receber atualizada com sucesso!', 'success')
     return redirect(url_for('receivables.index'))
@@ -216,6 +321,7 @@ def delete(receivable_id):
     user = get_current_user()
     receivable = Receivable.query.filter_by(id=receivable_id, user_id=user.id).first_or_404()
     
+    unplan_receivables([receivable.id])
     db.session.delete(receivable)
     db.session.commit()
     
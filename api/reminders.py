@@ -1,7 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from app import db
-from models import User, AutoReminderConfig
+from models import User, AutoReminderConfig, ReminderSchedule
 from utils import login_required, get_current_user
+from reminder_planner import replan_user
+from sqlalchemy import func
 import logging
 
 reminders_bp = Blueprint('reminders', __name__)
@@ -58,6 +60,9 @@ def update():
     # Horário preferido
     config.preferred_time = request.form.get('preferred_time', '09:00')
     
+    # Refaz a agenda de lembretes com as novas regras
+    db.session.flush()
+    replan_user(user.id)
     db.session.commit()
     
     flash('Configurações de lembretes atualizadas com sucesso!', 'success')
@@ -86,10 +91,11 @@ def test_reminder():
             return redirect(url_for('reminders.index'))
         
         # Verificar se existe instância WhatsApp configurada
-        from models import UserWhatsAppInstance, SystemSettings
+        from models import UserWhatsAppInstance
+        from settings_cache import get_settings
         
         # Verificar configurações do sistema
-        system_settings = SystemSettings.query.first()
+        system_settings = get_settings()
         if not system_settings or not system_settings.evolution_api_url or not system_settings.evolution_api_key:
             flash('WhatsApp não configurado no sistema. Configure a Evolution API no painel administrativo.', 'warning')
             return redirect(url_for('reminders.index'))
@@ -158,9 +164,16 @@ def status():
     
     config = AutoReminderConfig.query.filter_by(user_id=user.id).first()
     
+    # Próximos lembretes já agendados
+    scheduled, next_fire_at = db.session.query(
+        func.count(ReminderSchedule.id), func.min(ReminderSchedule.fire_at)
+    ).filter(ReminderSchedule.user_id == user.id).one()
+    
     return jsonify({
         'active': config.is_active if config else False,
         'due_reminders': config.enable_due_reminders if config else False,
         'overdue_reminders': config.enable_overdue_reminders if config else False,
-        'preferred_time': config.preferred_time if config else '09:00'
+        'preferred_time': config.preferred_time if config else '09:00',
+        'scheduled_reminders': scheduled,
+        'next_reminder_at': next_fire_at.strftime('%d/%m/%Y %H:%M') if next_fire_at else None
     })
\ No newline at end of file
@@ -0,0 +1,26 @@
+from flask import Blueprint, request, jsonify
+from utils import login_required, get_current_user
+from party_search import SEARCH_TYPES, DEFAULT_LIMIT, MAX_LIMIT, search_parties, party_result
+
+search_bp = Blueprint('search', __name__)
+
+@search_bp.route('/search')
+@login_required
+def search():
+    """
+    Typeahead de clientes/fornecedores dos formulários.
+
+    Parâmetros: type (clients, suppliers), q, limit e with_phone=1 (só
+    cadastros com WhatsApp/telefone).
+    """
+    user = get_current_user()
+
+    search_type = request.args.get('type', 'clients')
+    if search_type not in SEARCH_TYPES:
+        return jsonify({'error': 'Tipo de busca inválido'}), 400
+
+    limit = max(1, min(request.args.get('limit', DEFAULT_LIMIT, type=int), MAX_LIMIT))
+    parties = search_parties(user.id, search_type, request.args.get('q', ''), limit,
+                             with_phone=request.args.get('with_phone') == '1')
+
+    return jsonify({'results': [party_result(party) for party in parties]})
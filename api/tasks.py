@@ -1,6 +1,6 @@
 from flask import Blueprint, jsonify, flash, redirect, url_for
 from utils import login_required, admin_required, get_current_user
-from tasks import update_overdue_status, check_due_soon
+from tasks import update_overdue_status, run_daily_overdue_sweep, check_due_soon
 
 tasks_bp = Blueprint('tasks', __name__)
 
@@ -25,7 +25,7 @@ def manual_update_overdue():
 @login_required
 def overdue_status():
     """API endpoint para verificar status de contas em atraso"""
-    result = update_overdue_status()
+    result = run_daily_overdue_sweep()
     due_soon = check_due_soon()
     
     return jsonify({
@@ -1,7 +1,13 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from app import db
-from models import UserWhatsAppInstance, WhatsAppMessage, PaymentReminder, Client, SystemSettings
-from utils import login_required, get_current_user, send_whatsapp_message
+from models import UserWhatsAppInstance, WhatsAppMessage, PaymentReminder, Client
+from settings_cache import get_settings
+from utils import login_required, get_current_user, current_identity
+from whatsapp_outbox import queue_whatsapp_message
+from evolution_client import client_for_settings
+from list_api import list_arg, date_range_args
+from exports import export_endpoint, export_format_arg, export_response, status_label, stream_rows
+from datetime import date, timedelta
 import requests
 import os
 import logging
@@ -14,22 +20,19 @@ whatsapp_bp = Blueprint('whatsapp', __name__)
 
 def check_premium_plan():
     """Verificar se o usuário tem plano Premium"""
-    from models import UserPlan
-    from datetime import datetime
-    
-    user = get_current_user()
-    if not user:
+    identity = current_identity()
+    if not identity:
         flash('Usuário não autenticado!', 'error')
         return redirect(url_for('auth.login'))
     
-    user_plan = UserPlan.query.filter_by(user_id=user.id).first()
+    user_plan = identity.plan
     
     if not user_plan or user_plan.plan_name != 'Premium':
         flash('Funcionalidade disponível apenas no plano Premium! Faça upgrade para acessar.', 'warning')
         return redirect(url_for('plans.index'))
     
     # Verificar se o plano Premium não expirou
-    if user_plan.expires_at and user_plan.expires_at < datetime.utcnow():
+    if identity.plan_expired:
         flash('Seu plano Premium expirou! Renove para continuar acessando.', 'warning')
         return redirect(url_for('plans.index'))
     
@@ -49,9 +52,63 @@ def index():
         WhatsAppMessage.user_id == user.id
     ).order_by(WhatsAppMessage.created_at.desc()).limit(50).all()
     reminders = PaymentReminder.query.filter_by(user_id=user.id).all()
-    clients = Client.query.filter_by(user_id=user.id).filter(Client.whatsapp.isnot(None)).all()
     
-    return render_template('whatsapp.html', instances=instances, messages=messages, reminders=reminders, clients=clients)
+    # Clientes são buscados sob demanda pelo formulário (/api/search)
+    return render_template('whatsapp.html', instances=instances, messages=messages, reminders=reminders)
+
+@whatsapp_bp.route('/messages/export')
+@login_required
+@export_endpoint('whatsapp.index')
+def export_messages():
+    """
+    Histórico de mensagens em CSV/XLSX (?format=), mais recentes primeiro.
+    
+    Filtros: status (lista), message_type (lista), client_id e período de
+    criação (date_from/date_to ou month/year).
+    """
+    premium_check = check_premium_plan()
+    if premium_check:
+        return premium_check
+    
+    user = get_current_user()
+    export_format = export_format_arg()
+    
+    query = db.session.query(
+        WhatsAppMessage.id, WhatsAppMessage.created_at, WhatsAppMessage.sent_at, Client.name,
+        WhatsAppMessage.phone, Client.whatsapp, WhatsAppMessage.message_type, WhatsAppMessage.status,
+        WhatsAppMessage.attempts, WhatsAppMessage.last_error, WhatsAppMessage.content
+    ).select_from(WhatsAppMessage).outerjoin(Client).filter(WhatsAppMessage.user_id == user.id)
+    
+    statuses = list_arg('status')
+    if statuses:
+        query = query.filter(WhatsAppMessage.status.in_(statuses))
+    message_types = list_arg('message_type')
+    if message_types:
+        query = query.filter(WhatsAppMessage.message_type.in_(message_types))
+    client_id = request.args.get('client_id', type=int)
+    if client_id:
+        query = query.filter(WhatsAppMessage.client_id == client_id)
+    date_from, date_to = date_range_args()
+    if date_from:
+        query = query.filter(WhatsAppMessage.created_at >= date_from)
+    if date_to:
+        query = query.filter(WhatsAppMessage.created_at < date_to + timedelta(days=1))
+    query = query.order_by(WhatsAppMessage.created_at.desc(), WhatsAppMessage.id.desc())
+    
+    columns = [
+        ('ID', lambda r: r.id),
+        ('Criada em', lambda r: r.created_at),
+        ('Enviada em', lambda r: r.sent_at),
+        ('Cliente', lambda r: r.name),
+        ('Telefone', lambda r: r.phone or r.whatsapp),
+        ('Tipo', lambda r: r.message_type),
+        ('Status', lambda r: status_label(r.status)),
+        ('Tentativas', lambda r: r.attempts),
+        ('Último erro', lambda r: r.last_error),
+        ('Mensagem', lambda r: r.content),
+    ]
+    return export_response(export_format, f'mensagens_whatsapp_{date.today():%Y%m%d}', 'Mensagens',
+                           columns, stream_rows(query))
 
 @whatsapp_bp.route('/instances/add', methods=['POST'])
 @login_required
@@ -66,7 +123,7 @@ def add_instance():
     instance_name = request.form.get('instance_name')
     
     # Get Evolution API settings from admin panel
-    system_settings = SystemSettings.query.first()
+    system_settings = get_settings()
     
     if not system_settings or not system_settings.evolution_enabled:
         flash('Integração Evolution API não está configurada ou ativada! Configure no painel administrativo primeiro.', 'error')
@@ -83,28 +140,11 @@ def add_instance():
         logging.debug(f"API Key length: {len(system_settings.evolution_api_key) if system_settings.evolution_api_key else 'None'}")
         logging.debug(f"Instance Name: '{instance_name}'")
         
-        # Clean the API key and URL from any potential whitespace/encoding issues
-        clean_api_key = system_settings.evolution_api_key.strip() if system_settings.evolution_api_key else ''
-        clean_api_url = system_settings.evolution_api_url.rstrip('/') if system_settings.evolution_api_url else ''
-        
-        logging.debug(f"Clean API Key: '{clean_api_key}'")
-        logging.debug(f"Clean API URL: '{clean_api_url}'")
+        # Cliente com URL/chave já normalizadas (sem espaços/barra final)
+        client = client_for_settings(system_settings)
         
         # Create the instance directly using Baileys (following Evolution API documentation)
-        create_response = requests.post(
-            f"{clean_api_url}/instance/create",
-            headers={
-                'Content-Type': 'application/json',
-                'apikey': clean_api_key
-            },
-            json={
-                'instanceName': instance_name,
-                'token': clean_api_key,
-                'qrcode': True,
-                'integration': 'WHATSAPP-BAILEYS'
-            },
-            timeout=30
-        )
+        create_response = client.create_instance(instance_name)
         
         logging.debug(f"Create instance response: {create_response.status_code} - {create_response.text}")
         
@@ -167,23 +207,13 @@ def get_qrcode(instance_name):
     ).first_or_404()
     
     # Get Evolution API settings
-    system_settings = SystemSettings.query.first()
+    system_settings = get_settings()
     
     if not system_settings or not system_settings.evolution_enabled:
         return jsonify({'error': 'Evolution API não configurada'}), 400
     
     try:
-        # Clean the API key and URL from any potential issues
-        clean_api_key = system_settings.evolution_api_key.strip() if system_settings.evolution_api_key else ''
-        clean_api_url = system_settings.evolution_api_url.rstrip('/') if system_settings.evolution_api_url else ''
-        
-        response = requests.get(
-            f"{clean_api_url}/instance/connect/{instance_name}",
-            headers={
-                'apikey': clean_api_key,
-            },
-            timeout=10
-        )
+        response = client_for_settings(system_settings).connect(instance_name)
         
         logging.debug(f"QR Code response: {response.status_code} - {response.text}")
         
@@ -256,23 +286,13 @@ def check_instance_status(instance_name):
     ).first_or_404()
     
     # Get Evolution API settings
-    system_settings = SystemSettings.query.first()
+    system_settings = get_settings()
     
     if not system_settings or not system_settings.evolution_enabled:
         return jsonify({'error': 'Evolution API não configurada'}), 400
     
     try:
-        # Clean the API key and URL from any potential issues
-        clean_api_key = system_settings.evolution_api_key.strip() if system_settings.evolution_api_key else ''
-        clean_api_url = system_settings.evolution_api_url.rstrip('/') if system_settings.evolution_api_url else ''
-        
-        response = requests.get(
-            f"{clean_api_url}/instance/fetchInstances",
-            headers={
-                'apikey': clean_api_key,
-            },
-            timeout=10
-        )
+        response = client_for_settings(system_settings).fetch_instances()
         
         if response.status_code == 200:
             instances_data = response.json()
@@ -332,24 +352,14 @@ def logout_instance(instance_name):
     ).first_or_404()
     
     # Get Evolution API settings
-    system_settings = SystemSettings.query.first()
+    system_settings = get_settings()
     
     if not system_settings or not system_settings.evolution_enabled:
         flash('Evolution API não configurada!', 'error')
         return redirect(url_for('whatsapp.index'))
     
     try:
-        # Clean the API key and URL from any potential issues
-        clean_api_key = system_settings.evolution_api_key.strip() if system_settings.evolution_api_key else ''
-        clean_api_url = system_settings.evolution_api_url.rstrip('/') if system_settings.evolution_api_url else ''
-        
-        response = requests.delete(
-            f"{clean_api_url}/instance/logout/{instance_name}",
-            headers={
-                'apikey': clean_api_key,
-            },
-            timeout=10
-        )
+        response = client_for_settings(system_settings).logout(instance_name)
         
         logging.debug(f"Logout response: {response.status_code} - {response.text}")
         
@@ -385,17 +395,10 @@ def delete_instance(instance_id):
     instance = UserWhatsAppInstance.query.filter_by(id=instance_id, user_id=user.id).first_or_404()
     
     # Try to delete from Evolution API as well
-    system_settings = SystemSettings.query.first()
+    system_settings = get_settings()
     if system_settings and system_settings.evolution_enabled:
         try:
-            clean_api_key = system_settings.evolution_api_key.strip() if system_settings.evolution_api_key else ''
-            clean_api_url = system_settings.evolution_api_url.rstrip('/') if system_settings.evolution_api_url else ''
-            
-            requests.delete(
-                f"{clean_api_url}/instance/delete/{instance.instance_name}",
-                headers={'apikey': clean_api_key},
-                timeout=10
-            )
+            client_for_settings(system_settings).delete_instance(instance.instance_name)
         except Exception as e:
             logging.warning(f"Failed to delete instance from API: {e}")
     
@@ -420,21 +423,12 @@ def send_message():
         flash('Cliente não possui WhatsApp cadastrado!', 'error')
         return redirect(url_for('whatsapp.index'))
     
-    # Send message via Evolution API
-    success = send_whatsapp_message(user.id, client.whatsapp, message)
-    
-    # Log message
-    whatsapp_msg = WhatsAppMessage(
-        user_id=user.id,
-        client_id=client_id,
-        message_type=message_type,
-        content=message,
-        status='sent' if success else 'failed'
-    )
-    db.session.add(whatsapp_msg)
-    db.session.commit()
+    # Send message via Evolution API (fila de envio no modo outbox)
+    whatsapp_msg = queue_whatsapp_message(user.id, message, message_type, client_id=client.id)
     
-    if success:
+    if whatsapp_msg.status == 'pending':
+        flash('Mensagem adicionada à fila de envio!', 'success')
+    elif whatsapp_msg.status == 'sent':
         flash('Mensagem enviada com sucesso!', 'success')
     else:
         flash('Erro ao enviar mensagem!', 'error')
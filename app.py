@@ -38,8 +38,16 @@ db.init_app(app)
 # Import models and create tables
 with app.app_context():
     import models
+    import usage_counters  # eventos que mantêm os contadores de uso
+    import party_search  # eventos que mantêm os termos de busca de clientes/fornecedores
+    import monthly_summary  # eventos que mantêm o resumo mensal das contas
     db.create_all()
     
+    # Apply pending schema migrations (antes de qualquer consulta aos modelos)
+    from migrations import run_migrations
+    run_migrations()
+    party_search.setup_search_backend()
+    
     # Create sample data if not exists
     from sample_data import create_sample_data
     create_sample_data()
@@ -48,10 +56,10 @@ with app.app_context():
 @app.context_processor
 def inject_user_plan():
     """Inject user plan information into all templates"""
-    from models import SystemSettings
+    from settings_cache import get_settings
     
-    # Get system settings
-    system_settings = SystemSettings.query.first()
+    # Get system settings (cache em memória)
+    system_settings = get_settings()
     
     context = {
         'system_name': system_settings.system_name if system_settings else 'FinanceiroMax',
@@ -61,13 +69,13 @@ def inject_user_plan():
         'secondary_color': system_settings.secondary_color if system_settings else '#6c757d'
     }
     
-    # Add user plan info
-    if 'user_id' in session:
-        from utils import get_user_plan_name, has_premium_access
-        user_id = session['user_id']
+    # Add user plan info (identidade já carregada na requisição)
+    from utils import current_identity
+    identity = current_identity()
+    if identity:
         context.update({
-            'current_user_plan': get_user_plan_name(user_id),
-            'has_premium_access': has_premium_access(user_id)
+            'current_user_plan': identity.plan_name,
+            'has_premium_access': identity.has_premium
         })
     else:
         context.update({
@@ -92,6 +100,9 @@ from api.ai_insights import ai_insights_bp
 from api.dashboard import dashboard_bp
 from api.profile import profile_bp
 from api.plans import plans_bp
+from api.search import search_bp
+from api.imports import imports_bp
+from api.jobs import jobs_bp
 
 app.register_blueprint(auth_bp, url_prefix='/auth')
 app.register_blueprint(clients_bp, url_prefix='/clients')
@@ -106,6 +117,9 @@ app.register_blueprint(reminders_bp, url_prefix='/reminders')
 app.register_blueprint(ai_insights_bp, url_prefix='/ai_insights')
 app.register_blueprint(profile_bp, url_prefix='/profile')
 app.register_blueprint(plans_bp, url_prefix='/plans')
+app.register_blueprint(search_bp, url_prefix='/api')
+app.register_blueprint(imports_bp, url_prefix='/import')
+app.register_blueprint(jobs_bp, url_prefix='/jobs')
 app.register_blueprint(dashboard_bp, url_prefix='/')
 
 if __name__ == '__main__':
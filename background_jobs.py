@@ -0,0 +1,288 @@
+"""
+Tarefas em segundo plano (background_jobs)
+
+Operações demoradas (análises da IA, exportações, operações em lote) não
+rodam dentro da requisição: a tela grava a tarefa com enqueue_job(), devolve
+o id na hora e acompanha status, progresso e resultado em GET /jobs/<id>.
+O worker reserva as tarefas como a fila do WhatsApp (UPDATE condicional com
+reserva locked_until; SKIP LOCKED no MySQL/PostgreSQL), então vários
+processos podem rodar workers ao mesmo tempo.
+
+Cada tipo de tarefa registra sua função com @register_job('tipo'):
+
+    @register_job('ai_report')
+    def _report_job(user_id, params, progress):
+        progress(50)  # grava o progresso e renova a reserva
+        return {...}  # resultado (JSON)
+
+Com BACKGROUND_JOBS_ENABLED=False a tarefa roda na própria requisição
+(comportamento antigo) e já volta concluída. Tarefas concluídas há mais de
+BACKGROUND_JOB_RETENTION_HOURS são apagadas pelo scheduler.
+
+Uso como processo dedicado: python background_jobs.py
+"""
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_
+from app import db
+from models import BackgroundJob
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tempo que uma tarefa fica reservada sem sinal de progresso antes de poder ser retomada
+LEASE_SECONDS = 600
+# Tarefas retomadas mais vezes que isso (worker caiu no meio) são dadas como falhas
+MAX_ATTEMPTS = 3
+
+FINISHED_STATUSES = ('done', 'failed')
+
+# Tipo de tarefa -> função(user_id, params, progress)
+JOB_HANDLERS = {}
+
+def register_job(kind):
+    """Decorator que registra a função executada pelas tarefas do tipo"""
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+def jobs_enabled():
+    return current_app.config.get('BACKGROUND_JOBS_ENABLED', False)
+
+def _params_key(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def enqueue_job(user_id, kind, params=None):
+    """
+    Registra uma tarefa e retorna o BackgroundJob.
+
+    Se já houver uma tarefa igual (usuário, tipo e parâmetros) na fila ou em
+    execução, retorna essa em vez de criar outra. Sem o modo em segundo
+    plano a tarefa é executada na hora.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Tipo de tarefa desconhecido: {kind}")
+
+    params = params or {}
+    params_key = _params_key(params)
+    existing = BackgroundJob.query.filter(
+        BackgroundJob.user_id == user_id,
+        BackgroundJob.kind == kind,
+        BackgroundJob.status.in_(('pending', 'running')),
+        BackgroundJob.params_key == params_key
+    ).order_by(BackgroundJob.id.desc()).first()
+    if existing:
+        return existing
+
+    job = BackgroundJob(
+        user_id=user_id,
+        kind=kind,
+        params=json.dumps(params, default=str),
+        params_key=params_key,
+        status='pending',
+        progress=0,
+        attempts=0
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    if not jobs_enabled():
+        job.status = 'running'
+        job.attempts = 1
+        run_job(job)
+    return job
+
+def job_status(job):
+    """Resposta de GET /jobs/<id>"""
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress or 0,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+def _claimable(now):
+    """Na fila, ou em execução por um worker que parou de dar sinal"""
+    return or_(
+        BackgroundJob.status == 'pending',
+        and_(
+            BackgroundJob.status == 'running',
+            BackgroundJob.locked_until < now
+        )
+    )
+
+def claim_job(now=None):
+    """
+    Reserva a tarefa mais antiga da fila para este worker (ou None).
+
+    Mesmo esquema de claim_batch() da fila do WhatsApp: o UPDATE só pega a
+    tarefa se ela ainda estiver livre, então dois workers nunca executam a
+    mesma tarefa.
+    """
+    now = now or datetime.utcnow()
+    token = uuid.uuid4().hex
+
+    query = db.session.query(BackgroundJob.id).filter(_claimable(now)).order_by(BackgroundJob.id).limit(1)
+    if db.engine.dialect.name in ('mysql', 'mariadb', 'postgresql'):
+        query = query.with_for_update(skip_locked=True)
+
+    row = query.first()
+    if row is None:
+        db.session.commit()
+        return None
+
+    claimed = BackgroundJob.query.filter(
+        BackgroundJob.id == row.id,
+        _claimable(now)
+    ).update({
+        BackgroundJob.status: 'running',
+        BackgroundJob.attempts: BackgroundJob.attempts + 1,
+        BackgroundJob.locked_by: token,
+        BackgroundJob.locked_until: now + timedelta(seconds=LEASE_SECONDS),
+        BackgroundJob.started_at: now
+    }, synchronize_session=False)
+    db.session.commit()
+
+    if not claimed:
+        return None
+    return BackgroundJob.query.filter_by(id=row.id, locked_by=token).first()
+
+def _finish(job_id, status, result=None, error=None):
+    job = db.session.get(BackgroundJob, job_id)
+    job.status = status
+    job.result = json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+    job.error = error
+    job.progress = 100 if status == 'done' else job.progress
+    job.finished_at = datetime.utcnow()
+    job.locked_by = None
+    job.locked_until = None
+    db.session.commit()
+    return job
+
+def run_job(job):
+    """Executa uma tarefa já reservada e grava o resultado (ou o erro)"""
+    job_id = job.id
+    handler = JOB_HANDLERS.get(job.kind)
+    if handler is None:
+        return _finish(job_id, 'failed', error=f"Tipo de tarefa desconhecido: {job.kind}")
+    if job.attempts > MAX_ATTEMPTS:
+        return _finish(job_id, 'failed', error='Tarefa interrompida várias vezes; tente novamente')
+
+    def progress(percent):
+        """Grava o progresso (0 a 100) e renova a reserva da tarefa"""
+        BackgroundJob.query.filter_by(id=job_id).update({
+            BackgroundJob.progress: max(0, min(99, int(percent))),
+            BackgroundJob.locked_until: datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)
+        }, synchronize_session=False)
+        db.session.commit()
+
+    try:
+        result = handler(job.user_id, json.loads(job.params or '{}'), progress)
+    except Exception as e:
+        db.session.rollback()
+        logger.exception(f"Erro na tarefa {job.kind} #{job_id}")
+        return _finish(job_id, 'failed', error=str(e))
+    return _finish(job_id, 'done', result=result)
+
+def process_jobs(limit=None, now=None):
+    """Executa tarefas da fila até esvaziá-la (ou até limit); retorna quantas rodaram"""
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_job(now)
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+def cleanup_jobs(now=None):
+    """Apaga as tarefas concluídas há mais de BACKGROUND_JOB_RETENTION_HOURS (sem commit)"""
+    now = now or datetime.utcnow()
+    retention = timedelta(hours=current_app.config.get('BACKGROUND_JOB_RETENTION_HOURS', 24))
+    return BackgroundJob.query.filter(
+        BackgroundJob.status.in_(FINISHED_STATUSES),
+        BackgroundJob.finished_at < now - retention
+    ).delete(synchronize_session=False)
+
+class JobWorker:
+    """Threads que executam as tarefas da fila (BACKGROUND_JOB_WORKERS por processo)"""
+
+    def __init__(self):
+        self.running = False
+        self.threads = []
+
+    def start(self, workers=1):
+        if not self.running:
+            self.running = True
+            for _ in range(max(1, workers)):
+                thread = threading.Thread(target=self.run, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            logger.info(f"Worker de tarefas em segundo plano iniciado ({len(self.threads)} threads)")
+
+    def stop(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        logger.info("Worker de tarefas em segundo plano parado")
+
+    def run(self):
+        from app import app
+
+        while self.running:
+            try:
+                with app.app_context():
+                    processed = process_jobs(limit=1)
+                    poll_seconds = app.config.get('BACKGROUND_JOB_POLL_SECONDS', 1)
+
+                # Fila vazia: aguarda; tarefa executada: segue para a próxima
+                if not processed:
+                    time.sleep(poll_seconds)
+            except Exception as e:
+                logger.error(f"Erro no worker de tarefas: {str(e)}")
+                time.sleep(30)
+
+# Instância global do worker
+job_worker = JobWorker()
+
+def start_job_worker():
+    """Inicia o worker de tarefas (apenas no modo em segundo plano)"""
+    from app import app
+
+    if app.config.get('BACKGROUND_JOBS_ENABLED'):
+        job_worker.start(app.config.get('BACKGROUND_JOB_WORKERS', 2))
+
+def stop_job_worker():
+    job_worker.stop()
+
+def run_worker():
+    """
+    Processo dedicado: executa as tarefas da fila até ser interrompido.
+
+    Precisa rodar no módulo background_jobs importado (não em __main__),
+    onde os módulos das tarefas registram suas funções.
+    """
+    from app import app
+    import ai_insights  # registra as tarefas da IA
+
+    logging.basicConfig(level=logging.INFO)
+    job_worker.start(app.config.get('BACKGROUND_JOB_WORKERS', 2))
+    for thread in job_worker.threads:
+        thread.join()
+
+if __name__ == '__main__':
+    import background_jobs
+
+    background_jobs.run_worker()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Mede a importação em lote (bulk_import.py) com 10 mil e 100 mil linhas
+1. Validação de CPF/CNPJ e telefone: utils linha a linha x bloco no NumPy.
+2. Importação completa (leitura, validação, deduplicação e gravação) de
+   clientes e de contas a receber desses clientes.
+
+A importação confirma cada bloco, então roda com um usuário temporário que
+é apagado (com tudo o que foi gravado) ao final.
+
+Uso: DATABASE_URL=... python benchmark_bulk_import.py [linhas ...]
+"""
+import io
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from app import app, db
+from models import User, UserPlan
+from bulk_import import CPF_WEIGHTS, valid_documents, normalize_phones, import_csv, np
+from utils import validate_cpf, format_phone
+
+def make_cpf(rng):
+    digits = [rng.randrange(10) for _ in range(9)]
+    for weights in CPF_WEIGHTS:
+        remainder = sum(d * w for d, w in zip(digits, weights)) % 11
+        digits.append(0 if remainder < 2 else 11 - remainder)
+    return ''.join(map(str, digits))
+
+def make_rows(count, seed=42):
+    """Clientes com ~2% de CPF e ~2% de telefone inválidos"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        cpf = make_cpf(rng)
+        if rng.random() < 0.02:
+            cpf = cpf[:-1] + str((int(cpf[-1]) + 1) % 10)
+        phone = f"{rng.randint(1, 9)}{rng.randint(1, 9)}9{rng.randint(10000000, 99999999)}"
+        if rng.random() < 0.02:
+            phone = phone[:5]
+        rows.append((f"Cliente Benchmark {i}", cpf, phone))
+    return rows
+
+def measure(label, rows, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {rows:>7} linhas  {elapsed * 1000:>9.1f} ms  {rows / elapsed:>10.0f} linhas/s")
+    return result
+
+def per_row_validation(documents, phones):
+    return [validate_cpf(d) for d in documents], [format_phone(p) for p in phones]
+
+def clients_csv(rows):
+    lines = ['Nome;CPF/CNPJ;WhatsApp'] + [f"{name};{cpf};{phone}" for name, cpf, phone in rows]
+    return io.BytesIO('\n'.join(lines).encode('utf-8'))
+
+def receivables_csv(rows):
+    due_date = date.today() + timedelta(days=30)
+    lines = ['Cliente;CPF/CNPJ;Descrição;Valor;Vencimento'] + [
+        f"{name};{cpf};Mensalidade;{100 + i % 50},00;{due_date + timedelta(days=i % 60):%d/%m/%Y}"
+        for i, (name, cpf, _phone) in enumerate(rows)
+    ]
+    return io.BytesIO('\n'.join(lines).encode('utf-8'))
+
+def remove_user(user_id):
+    """Apaga o usuário temporário e as linhas dele em todas as tabelas"""
+    for table in reversed(db.metadata.sorted_tables):
+        if 'user_id' in table.c and table.name != 'users':
+            db.session.execute(table.delete().where(table.c.user_id == user_id))
+    db.session.execute(User.__table__.delete().where(User.__table__.c.id == user_id))
+    db.session.commit()
+
+def main(sizes=(10000, 100000)):
+    print(f"NumPy: {'sim' if np is not None else 'não instalado (validação linha a linha)'}")
+    with app.app_context():
+        for count in sizes:
+            rows = make_rows(count)
+            documents = [cpf for _name, cpf, _phone in rows]
+            phones = [phone for _name, _cpf, phone in rows]
+
+            measure("Validação linha a linha (utils)", count, lambda: per_row_validation(documents, phones))
+            measure("Validação em bloco", count, lambda: (valid_documents(documents), normalize_phones(phones)))
+
+            stamp = datetime.utcnow().timestamp()
+            user = User(username=f"bench{stamp}", email=f"bench{stamp}@benchmark.local")
+            user.set_password('x')
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(UserPlan(user_id=user.id, plan_name='Premium', max_clients=999999,
+                                    max_receivables=999999, max_payables=999999))
+            db.session.commit()
+            try:
+                result = measure("Importação de clientes", count, lambda: import_csv(user, 'clients', clients_csv(rows)))
+                print(f"  importados {result.imported}, duplicados {result.duplicates}, erros {result.error_count}")
+                measure("Reimportação (tudo duplicado)", count, lambda: import_csv(user, 'clients', clients_csv(rows)))
+                result = measure("Importação de contas a receber", count,
+                                 lambda: import_csv(user, 'receivables', receivables_csv(rows)))
+                print(f"  importados {result.imported}, duplicados {result.duplicates}, erros {result.error_count}")
+            finally:
+                db.session.rollback()
+                remove_user(user.id)
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or (10000, 100000))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Mede a geração de parcelas: loop do ORM (antigo) x INSERT em lote
+Planos de 12/60/360 parcelas e um lote de 1.000 aprovações de 12 parcelas.
+Tudo é desfeito (rollback) ao final de cada medição.
+
+Uso: DATABASE_URL=... python benchmark_installments.py [repetições]
+"""
+import sys
+import time
+from datetime import date
+from app import app, db
+from models import User, Client, Receivable
+from account_series import start_series
+from installments import InstallmentPlan, insert_installments, installment_schedule
+from reminder_planner import plan_receivables
+
+def legacy_orm(plan):
+    """Caminho anterior: um objeto Receivable por parcela"""
+    series = start_series(plan.user_id, 'receivable', plan.description, 'installment', client_id=plan.client_id)
+    receivables = []
+    for number, due_date, amount in installment_schedule(plan.total_amount, plan.installments, plan.first_due_date):
+        receivables.append(Receivable(
+            user_id=plan.user_id,
+            client_id=plan.client_id,
+            description=f"{plan.description} - Parcela {number}/{plan.installments}",
+            amount=amount,
+            due_date=due_date,
+            type='installment',
+            installment_number=number,
+            total_installments=plan.installments,
+            series_id=series.id
+        ))
+    db.session.add_all(receivables)
+    plan_receivables(receivables)
+
+def measure(label, rows, func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        db.session.rollback()
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<38} {rows:>7} parcelas  {best * 1000:>9.1f} ms  {rows / best:>10.0f} parcelas/s")
+
+def main(repeat=3):
+    with app.app_context():
+        client = Client.query.first()
+        if not client:
+            print("Nenhum cliente cadastrado; rode com os dados de exemplo")
+            return
+        user = db.session.get(User, client.user_id)
+
+        def plan(installments, number=0):
+            return InstallmentPlan(kind='receivable', user_id=user.id, description=f'Benchmark {number}',
+                                   total_amount=1000, installments=installments,
+                                   first_due_date=date.today(), client_id=client.id)
+
+        for installments in (12, 60, 360):
+            measure(f"ORM, 1 plano de {installments}", installments,
+                    lambda: legacy_orm(plan(installments)), repeat)
+            measure(f"Lote, 1 plano de {installments}", installments,
+                    lambda: insert_installments([plan(installments)]), repeat)
+
+        approvals = [plan(12, n) for n in range(1000)]
+        measure("ORM, 1.000 aprovações de 12", 12000,
+                lambda: [legacy_orm(p) for p in approvals], repeat)
+        measure("Lote, 1.000 aprovações de 12", 12000,
+                lambda: insert_installments(approvals), repeat)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
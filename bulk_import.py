@@ -0,0 +1,507 @@
+"""
+Importação em lote de clientes, contas a receber e contas a pagar (CSV)
+O arquivo é lido em blocos de IMPORT_CHUNK_ROWS linhas. Em cada bloco:
+
+- validação vetorizada: dígitos verificadores de CPF/CNPJ e formato dos
+  telefones calculados sobre matrizes de dígitos do NumPy (sem NumPy, cai
+  para utils.validate_cpf/validate_cnpj linha a linha);
+- uma consulta indexada para achar o que já está cadastrado (duplicados);
+- corte pelo limite do plano;
+- um INSERT de várias linhas por tabela.
+
+Cada linha rejeitada entra no relatório com o número da linha no arquivo
+e o motivo. Aceita ';' ou ',' como separador e os arquivos gerados pela
+exportação (exports.py).
+"""
+
+import csv
+import io
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import func, or_, select
+from app import db
+from models import Client, Supplier, Receivable, Payable, AccountSeries, SearchTerm
+from account_series import base_description
+from party_search import build_search_key, normalize_text, only_digits, add_search_terms
+from reminder_planner import plan_receivables
+from usage_counters import adjust_usage
+from monthly_summary import add_to_summary
+from utils import validate_cpf, validate_cnpj
+
+try:
+    import numpy as np
+except ImportError:  # validação linha a linha
+    np = None
+
+IMPORT_CHUNK_ROWS = 2000
+MAX_REPORTED_ERRORS = 10000
+
+# Campo -> cabeçalhos aceitos (já normalizados: sem acento, minúsculas)
+COLUMNS = {
+    'clients': {
+        'name': ('nome', 'name', 'cliente', 'razao social'),
+        'document': ('cpf cnpj', 'cpf', 'cnpj', 'documento', 'document'),
+        'whatsapp': ('whatsapp', 'celular', 'telefone', 'phone'),
+        'email': ('email', 'e mail'),
+        'address': ('endereco', 'address'),
+        'zip_code': ('cep', 'zip code'),
+        'city': ('cidade', 'city'),
+        'state': ('uf', 'estado', 'state'),
+    },
+    'receivables': {
+        'client': ('cliente', 'nome', 'client'),
+        'document': ('cpf cnpj', 'cpf', 'cnpj', 'documento', 'document'),
+        'description': ('descricao', 'description'),
+        'amount': ('valor', 'amount'),
+        'due_date': ('vencimento', 'due date', 'data de vencimento'),
+        'status': ('status', 'situacao'),
+    },
+    'payables': {
+        'supplier': ('fornecedor', 'supplier'),
+        'description': ('descricao', 'description'),
+        'category': ('categoria', 'category'),
+        'amount': ('valor', 'amount'),
+        'due_date': ('vencimento', 'due date', 'data de vencimento'),
+        'status': ('status', 'situacao'),
+    },
+}
+
+REQUIRED_COLUMNS = {
+    'clients': ('name',),
+    'receivables': ('description', 'amount', 'due_date'),
+    'payables': ('description', 'amount', 'due_date'),
+}
+
+STATUS_VALUES = {
+    'pendente': 'pending', 'pending': 'pending',
+    'atrasado': 'overdue', 'atrasada': 'overdue', 'overdue': 'overdue',
+    'pago': 'paid', 'paga': 'paid', 'paid': 'paid',
+    'cancelado': 'cancelled', 'cancelada': 'cancelled', 'cancelled': 'cancelled',
+}
+
+CPF_WEIGHTS = ([10, 9, 8, 7, 6, 5, 4, 3, 2], [11, 10, 9, 8, 7, 6, 5, 4, 3, 2])
+CNPJ_WEIGHTS = ([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+class ImportFormatError(ValueError):
+    """Arquivo que não dá para importar (vazio, sem as colunas obrigatórias...)"""
+
+@dataclass
+class ImportResult:
+    kind: str
+    imported: int = 0
+    duplicates: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'message': message})
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'imported': self.imported,
+            'duplicates': self.duplicates,
+            'error_count': self.error_count,
+            'errors': self.errors
+        }
+
+# Validação vetorizada
+def _digit_matrix(values, width):
+    """['12345678909', ...] (todos com 'width' dígitos) -> matriz (n, width) de inteiros"""
+    raw = np.frombuffer(''.join(values).encode('ascii'), dtype=np.uint8)
+    return raw.reshape(len(values), width).astype(np.int32) - 48
+
+def _check_digit(matrix, weights):
+    remainder = (matrix[:, :len(weights)] * np.array(weights, dtype=np.int32)).sum(axis=1) % 11
+    return np.where(remainder < 2, 0, 11 - remainder)
+
+def _valid_check_digits(values, weights):
+    matrix = _digit_matrix(values, len(weights[1]) + 1)
+    first, second = len(weights[0]), len(weights[1])
+    repeated = (matrix == matrix[:, :1]).all(axis=1)
+    return (
+        (_check_digit(matrix, weights[0]) == matrix[:, first]) &
+        (_check_digit(matrix, weights[1]) == matrix[:, second]) &
+        ~repeated
+    )
+
+def valid_documents(documents):
+    """
+    Máscara de documentos válidos (só dígitos; vazio conta como válido).
+
+    CPFs (11 dígitos) e CNPJs (14) são verificados em bloco; outros
+    tamanhos são inválidos.
+    """
+    if np is None:
+        return [not d or (validate_cpf(d) if len(d) == 11 else validate_cnpj(d) if len(d) == 14 else False)
+                for d in documents]
+
+    lengths = np.fromiter(map(len, documents), dtype=np.int32, count=len(documents))
+    valid = lengths == 0
+    for width, weights in ((11, CPF_WEIGHTS), (14, CNPJ_WEIGHTS)):
+        index = np.flatnonzero(lengths == width)
+        if index.size:
+            valid[index] = _valid_check_digits([documents[i] for i in index], weights)
+    return valid.tolist()
+
+def normalize_phones(phones):
+    """
+    Telefones (só dígitos) no formato do WhatsApp: '55' + DDD + número.
+
+    Retorna o número normalizado, '' quando vazio ou None quando inválido
+    (DDD com zero, tamanho errado, celular sem o 9).
+    """
+    normalized = ['55' + p if len(p) in (10, 11) else p for p in phones]
+    if np is None:
+        return [p if not p or (len(p) in (12, 13) and p.startswith('55') and '0' not in p[2:4]
+                               and (len(p) == 12 or p[4] == '9')) else None
+                for p in normalized]
+
+    lengths = np.fromiter(map(len, normalized), dtype=np.int32, count=len(normalized))
+    prefix = _digit_matrix([(p + '00000')[:5] for p in normalized], 5)
+    valid = (
+        ((lengths == 12) | (lengths == 13)) &
+        (prefix[:, 0] == 5) & (prefix[:, 1] == 5) &
+        (prefix[:, 2] > 0) & (prefix[:, 3] > 0) &
+        ((lengths == 12) | (prefix[:, 4] == 9))
+    )
+    return [p if ok or not p else None for p, ok in zip(normalized, valid.tolist())]
+
+# Leitura do arquivo
+def _clean(value):
+    value = (value or '').strip()
+    # Texto exportado com apóstrofo para não virar fórmula
+    if value[:2] in ("'=", "'+", "'-", "'@"):
+        value = value[1:]
+    return value
+
+def read_chunks(stream, kind, chunk_rows=IMPORT_CHUNK_ROWS):
+    """Blocos de [(linha no arquivo, {campo: valor})] de um CSV enviado"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    header_line = text.readline()
+    if not header_line.strip():
+        raise ImportFormatError('Arquivo vazio')
+
+    delimiter = ';' if header_line.count(';') >= header_line.count(',') else ','
+    header = next(csv.reader([header_line], delimiter=delimiter))
+    aliases = {alias: name for name, names in COLUMNS[kind].items() for alias in names}
+    positions = {}
+    for position, title in enumerate(header):
+        name = aliases.get(normalize_text(title))
+        if name and name not in positions:
+            positions[name] = position
+
+    missing = [name for name in REQUIRED_COLUMNS[kind] if name not in positions]
+    if kind == 'receivables' and 'client' not in positions and 'document' not in positions:
+        missing.append('client')
+    if missing:
+        raise ImportFormatError(f"Colunas obrigatórias ausentes: {', '.join(missing)}")
+
+    chunk = []
+    for line, row in enumerate(csv.reader(text, delimiter=delimiter), start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        chunk.append((line, {name: _clean(row[pos]) if pos < len(row) else '' for name, pos in positions.items()}))
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def parse_amount(value):
+    """'1.234,56', '1234.56' ou 'R$ 10,00' -> Decimal (None se inválido ou não positivo)"""
+    value = re.sub(r'[^\d,.\-]', '', value or '')
+    if ',' in value:
+        value = value.replace('.', '').replace(',', '.')
+    try:
+        amount = Decimal(value).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+    return amount if amount > 0 else None
+
+def parse_date(value):
+    for date_format in ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y'):
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+def _insert_rows(table, rows, user_id):
+    """
+    INSERT de várias linhas do usuário; retorna os ids gerados, na ordem das linhas.
+
+    Com RETURNING (PostgreSQL, SQLite 3.35+, MariaDB 10.5+) os ids vêm do
+    próprio INSERT. Sem ele (MySQL), são os ids do usuário acima do maior id
+    anterior ao INSERT, lidos na mesma transação.
+    """
+    if db.engine.dialect.insert_executemany_returning_sort_by_parameter_order:
+        return db.session.execute(
+            table.insert().returning(table.c.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+
+    last_id = db.session.execute(select(func.max(table.c.id))).scalar() or 0
+    db.session.execute(table.insert(), rows)
+    return db.session.execute(
+        select(table.c.id).where(table.c.user_id == user_id, table.c.id > last_id).order_by(table.c.id)
+    ).scalars().all()
+
+# Clientes
+def _existing_client_keys(user_id, keys):
+    """
+    Chaves de deduplicação já cadastradas, em uma consulta.
+
+    Documento e WhatsApp são achados pelos termos de busca (índice
+    user_id, kind, term); clientes sem documento e WhatsApp, pelo nome.
+    """
+    digit_keys = [value for kind, value in keys if kind != 'name']
+    name_keys = [value for kind, value in keys if kind == 'name']
+    conditions = []
+    if digit_keys:
+        conditions.append(Client.id.in_(db.session.query(SearchTerm.party_id).filter(
+            SearchTerm.user_id == user_id, SearchTerm.kind == 'clients', SearchTerm.term.in_(digit_keys)
+        )))
+    if name_keys:
+        conditions.append(Client.search_key.in_(name_keys))
+    if not conditions:
+        return set()
+
+    found = set()
+    for document, whatsapp, search_key in db.session.query(Client.document, Client.whatsapp, Client.search_key).filter(
+        Client.user_id == user_id, or_(*conditions)
+    ):
+        found.add(('document', only_digits(document)))
+        found.add(('whatsapp', only_digits(whatsapp)))
+        found.add(('name', search_key))
+    return found
+
+def _client_key(record):
+    if record['document']:
+        return ('document', record['document'])
+    if record['whatsapp']:
+        return ('whatsapp', record['whatsapp'])
+    return ('name', record['search_key'])
+
+def _import_clients_chunk(user_id, chunk, result, quota, seen):
+    documents = valid_documents([only_digits(row.get('document')) for _line, row in chunk])
+    phones = normalize_phones([only_digits(row.get('whatsapp')) for _line, row in chunk])
+
+    records = []
+    for (line, row), document_ok, phone in zip(chunk, documents, phones):
+        if not row['name']:
+            result.add_error(line, 'Nome obrigatório')
+            continue
+        if not document_ok:
+            result.add_error(line, f"CPF/CNPJ inválido: {row.get('document')}")
+            continue
+        if phone is None:
+            result.add_error(line, f"WhatsApp inválido: {row.get('whatsapp')}")
+            continue
+
+        document = only_digits(row.get('document')) or None
+        records.append((line, {
+            'user_id': user_id,
+            'name': row['name'][:120],
+            'document': document,
+            'whatsapp': phone or None,
+            'email': row.get('email') or None,
+            'address': row.get('address') or None,
+            'zip_code': (row.get('zip_code') or '')[:10] or None,
+            'city': (row.get('city') or '')[:80] or None,
+            'state': (row.get('state') or '')[:2].upper() or None,
+            'search_key': build_search_key(row['name'], document, phone),
+        }))
+
+    existing = _existing_client_keys(user_id, [
+        _client_key({'document': r['document'], 'whatsapp': r['whatsapp'], 'search_key': r['search_key']})
+        for _line, r in records
+    ])
+
+    rows = []
+    for line, record in records:
+        key = _client_key(record)
+        if key in existing or key in seen:
+            result.duplicates += 1
+            continue
+        if len(rows) >= quota:
+            result.add_error(line, 'Limite de clientes do plano atingido')
+            continue
+        seen.add(key)
+        rows.append(record)
+
+    if rows:
+        created_at = datetime.utcnow()
+        for row in rows:
+            row['created_at'] = created_at
+        client_ids = _insert_rows(Client.__table__, rows, user_id)
+        adjust_usage(user_id, 'clients', len(rows))
+        add_search_terms('clients', [
+            (client_id, user_id, row['search_key']) for client_id, row in zip(client_ids, rows)
+        ])
+    return len(rows)
+
+# Contas a receber / pagar
+def _party_directory(model, user_id):
+    """Nome normalizado e documento -> id, para resolver cliente/fornecedor pelo texto da planilha"""
+    by_name, by_document = {}, {}
+    for party_id, name, document in db.session.query(model.id, model.name, model.document).filter(
+        model.user_id == user_id
+    ).order_by(model.id):
+        by_name.setdefault(normalize_text(name), party_id)
+        if document:
+            by_document.setdefault(only_digits(document), party_id)
+    return by_name, by_document
+
+def _parse_account(line, row, result):
+    amount = parse_amount(row['amount'])
+    due_date = parse_date(row['due_date'])
+    status = STATUS_VALUES.get(normalize_text(row.get('status')) or 'pendente')
+    if not row['description']:
+        result.add_error(line, 'Descrição obrigatória')
+    elif amount is None:
+        result.add_error(line, f"Valor inválido: {row['amount']}")
+    elif due_date is None:
+        result.add_error(line, f"Vencimento inválido: {row['due_date']} (use DD/MM/AAAA)")
+    elif status is None:
+        result.add_error(line, f"Status inválido: {row.get('status')}")
+    else:
+        return {'description': row['description'][:200], 'amount': amount, 'due_date': due_date, 'status': status}
+    return None
+
+def _existing_accounts(model, user_id, party_column, records):
+    """
+    (parte, descrição, valor, vencimento) já cadastrados, em uma consulta.
+
+    Só as partes e o intervalo de vencimentos do bloco (índices
+    client_id/supplier_id + due_date).
+    """
+    party_ids = {r[party_column.key] for _line, r in records}
+    due_dates = [r['due_date'] for _line, r in records]
+    parties = party_column.in_([party_id for party_id in party_ids if party_id])
+    if None in party_ids:
+        parties = or_(parties, party_column.is_(None))
+    return {
+        (party_id, description, amount, due_date)
+        for party_id, description, amount, due_date in db.session.query(
+            party_column, model.description, model.amount, model.due_date
+        ).filter(
+            model.user_id == user_id,
+            parties,
+            model.due_date >= min(due_dates),
+            model.due_date <= max(due_dates)
+        )
+    }
+
+def _import_accounts_chunk(kind, user_id, chunk, result, quota, seen, directory):
+    model, party_field = (Receivable, 'client_id') if kind == 'receivables' else (Payable, 'supplier_id')
+    by_name, by_document = directory
+
+    documents = [only_digits(row.get('document')) for _line, row in chunk] if kind == 'receivables' else None
+    documents_ok = valid_documents(documents) if documents else None
+
+    records = []
+    for index, (line, row) in enumerate(chunk):
+        account = _parse_account(line, row, result)
+        if account is None:
+            continue
+
+        if kind == 'receivables':
+            if documents[index] and not documents_ok[index]:
+                result.add_error(line, f"CPF/CNPJ inválido: {row.get('document')}")
+                continue
+            party_id = by_document.get(documents[index]) or by_name.get(normalize_text(row.get('client')))
+            if not party_id:
+                result.add_error(line, f"Cliente não encontrado: {row.get('client') or row.get('document')}")
+                continue
+        else:
+            party_id = None
+            if row.get('supplier'):
+                party_id = by_name.get(normalize_text(row['supplier']))
+                if not party_id:
+                    result.add_error(line, f"Fornecedor não encontrado: {row['supplier']}")
+                    continue
+            account['category'] = (row.get('category') or '')[:50] or None
+
+        account['user_id'] = user_id
+        account[party_field] = party_id
+        records.append((line, account))
+
+    if not records:
+        return 0
+
+    existing = _existing_accounts(model, user_id, getattr(model, party_field), records)
+    rows = []
+    for line, account in records:
+        key = (account[party_field], account['description'], account['amount'], account['due_date'])
+        if key in existing or key in seen:
+            result.duplicates += 1
+            continue
+        if len(rows) >= quota:
+            result.add_error(line, 'Limite do plano atingido')
+            continue
+        seen.add(key)
+        rows.append(account)
+
+    if not rows:
+        return 0
+
+    # Uma série por conta (como no cadastro avulso); as contas do bloco são
+    # achadas depois pelas séries (índice series_id)
+    created_at = datetime.utcnow()
+    series_kind = kind[:-1]
+    series_ids = _insert_rows(AccountSeries.__table__, [{
+        'user_id': user_id,
+        'kind': series_kind,
+        'series_type': 'simple',
+        'description': base_description(row['description']),
+        'client_id': row.get('client_id'),
+        'supplier_id': row.get('supplier_id'),
+        'created_at': created_at,
+    } for row in rows], user_id)
+    for row, series_id in zip(rows, series_ids):
+        row['series_id'] = series_id
+        row['created_at'] = created_at
+
+    db.session.execute(model.__table__.insert(), rows)
+    add_to_summary(series_kind, rows)
+    adjust_usage(user_id, kind, len(rows))
+
+    if kind == 'receivables':
+        plan_receivables(db.session.query(
+            Receivable.id, Receivable.user_id, Receivable.status, Receivable.due_date
+        ).filter(Receivable.series_id.in_(series_ids)).all(), new=True)
+    return len(rows)
+
+def import_csv(user, kind, stream, chunk_rows=IMPORT_CHUNK_ROWS):
+    """
+    Importa um CSV de clients, receivables ou payables para o usuário.
+
+    Cada bloco é confirmado (commit) ao final; um erro de formato do
+    arquivo levanta ImportFormatError antes de gravar qualquer linha.
+    Retorna o ImportResult com os totais e o relatório de erros.
+    """
+    from api.plans import remaining_quota
+
+    result = ImportResult(kind)
+    quota = remaining_quota(user, kind)
+    seen = set()
+    directory = None
+    if kind == 'receivables':
+        directory = _party_directory(Client, user.id)
+    elif kind == 'payables':
+        directory = _party_directory(Supplier, user.id)
+
+    for chunk in read_chunks(stream, kind, chunk_rows):
+        if kind == 'clients':
+            imported = _import_clients_chunk(user.id, chunk, result, quota, seen)
+        else:
+            imported = _import_accounts_chunk(kind, user.id, chunk, result, quota, seen, directory)
+        db.session.commit()
+        result.imported += imported
+        quota -= imported
+
+    return result
@@ -0,0 +1,245 @@
+"""
+Previsão estatística do fluxo de caixa (local, sem chamada à IA)
+
+As séries mensais de recebido e pago (resumo mensal, últimos 24 meses
+fechados) passam por três modelos: sazonal ingênuo (mesmo mês do ano
+anterior), suavização exponencial simples e tendência linear. O modelo de
+cada série é o de menor erro médio absoluto num backtest de origem móvel
+(previsão de um passo nos últimos meses do histórico).
+
+A previsão estatística é combinada com o que já está agendado: as contas
+em aberto e as recorrências de cada mês futuro, com as contas a receber
+ponderadas pela taxa de recebimento do histórico, são o piso do mês.
+
+Devolve o mesmo formato da predição da IA (predicao_mensal, tendencias,
+recomendacoes, alertas, ...), com textos gerados por regras; a IA, quando
+configurada, só reescreve os textos (ver FinancialAI.get_cash_flow_prediction).
+Sem NumPy instalado a previsão local fica indisponível.
+"""
+
+from datetime import date, timedelta
+from monthly_summary import OPEN_STATUSES, month_of, summary_rows
+from recurrence import add_months, virtual_occurrences
+import logging
+
+try:
+    import numpy as np
+except ImportError:  # a previsão volta a depender só da IA
+    np = None
+
+logger = logging.getLogger(__name__)
+
+SEASON = 12
+HISTORY_MONTHS = 24
+BACKTEST_MONTHS = 12
+# Histórico mínimo para qualquer modelo (abaixo disso, a média)
+MIN_HISTORY = 3
+TREND_MONTHS = 12
+SMOOTHING_ALPHAS = (0.1, 0.2, 0.3, 0.5, 0.7, 0.9)
+
+# Variação mensal (fração da média) abaixo da qual a série é tratada como estável
+STABLE_SLOPE = 0.02
+# Taxa de inadimplência a partir da qual a previsão gera alerta
+DEFAULT_ALERT_RATE = 0.15
+
+MODEL_LABELS = {
+    'sazonal': 'sazonal ingênuo (mesmo mês do ano anterior)',
+    'suavizacao': 'suavização exponencial',
+    'tendencia': 'tendência linear',
+    'media': 'média do histórico',
+}
+
+def forecast_available():
+    return np is not None
+
+# Modelos: (histórico, meses) -> previsão, ou None sem histórico suficiente
+def _seasonal_naive(y, horizon):
+    if len(y) < SEASON:
+        return None
+    last_season = y[-SEASON:]
+    return last_season[np.arange(horizon) % SEASON]
+
+def _smoothing_levels(y, alpha):
+    """Nível após cada mês; levels[t] é a previsão de um passo para y[t + 1]"""
+    levels = np.empty(len(y))
+    level = y[0]
+    for t, value in enumerate(y):
+        level = alpha * value + (1 - alpha) * level
+        levels[t] = level
+    return levels
+
+def _exponential_smoothing(y, horizon):
+    """Suavização simples, com alpha de menor erro quadrático dentro do histórico"""
+    if len(y) < MIN_HISTORY:
+        return None
+    best_level, best_sse = None, None
+    for alpha in SMOOTHING_ALPHAS:
+        levels = _smoothing_levels(y, alpha)
+        sse = float(np.sum((y[1:] - levels[:-1]) ** 2))
+        if best_sse is None or sse < best_sse:
+            best_level, best_sse = levels[-1], sse
+    return np.full(horizon, best_level)
+
+def _linear_trend(y, horizon):
+    """Reta de mínimos quadrados sobre os últimos TREND_MONTHS meses"""
+    if len(y) < MIN_HISTORY:
+        return None
+    recent = y[-TREND_MONTHS:]
+    slope, intercept = np.polyfit(np.arange(len(recent)), recent, 1)
+    return intercept + slope * np.arange(len(recent), len(recent) + horizon)
+
+MODELS = {
+    'sazonal': _seasonal_naive,
+    'suavizacao': _exponential_smoothing,
+    'tendencia': _linear_trend,
+}
+
+def backtest_errors(y, months=BACKTEST_MONTHS):
+    """
+    {modelo: erro médio absoluto} da previsão de um passo nos últimos meses.
+
+    Cada origem usa só o histórico anterior a ela; modelos sem histórico
+    suficiente em alguma origem (o sazonal precisa de um ano) ficam de fora.
+    """
+    y = np.asarray(y, dtype=float)
+    origins = range(max(MIN_HISTORY, len(y) - months), len(y))
+    errors = {}
+    for name, model in MODELS.items():
+        predictions = [model(y[:origin], 1) for origin in origins]
+        if origins and all(prediction is not None for prediction in predictions):
+            actual = y[list(origins)]
+            errors[name] = float(np.mean(np.abs(np.concatenate(predictions) - actual)))
+    return errors
+
+def forecast_series(values, horizon):
+    """
+    Previsão dos próximos horizon meses de uma série mensal.
+
+    Retorna (previsão, modelo escolhido, erro médio do backtest); valores
+    negativos viram zero.
+    """
+    y = np.asarray(values, dtype=float)
+    if len(y) == 0:
+        return np.zeros(horizon), 'media', None
+
+    errors = backtest_errors(y)
+    if not errors:
+        return np.full(horizon, max(0.0, float(y.mean()))), 'media', None
+
+    # Empate: o primeiro de MODELS (o mais simples)
+    name = min(errors, key=errors.get)
+    return np.clip(MODELS[name](y, horizon), 0, None), name, errors[name]
+
+def _monthly_series(user_id, kind, start, end):
+    """(pagos, total) por mês em [start, end), pelo resumo mensal"""
+    months = (end.year - start.year) * 12 + end.month - start.month
+    paid, total = np.zeros(months), np.zeros(months)
+    for month, status, _count, amount in summary_rows(user_id, kind, start, end):
+        index = (month.year - start.year) * 12 + month.month - start.month
+        total[index] += float(amount)
+        if status == 'paid':
+            paid[index] += float(amount)
+    return paid, total
+
+def _scheduled(user_id, kind, start, end):
+    """Em aberto e recorrências previstas por mês em [start, end)"""
+    months = (end.year - start.year) * 12 + end.month - start.month
+    scheduled = np.zeros(months)
+    for month, status, _count, amount in summary_rows(user_id, kind, start, end):
+        if status in OPEN_STATUSES:
+            scheduled[(month.year - start.year) * 12 + month.month - start.month] += float(amount)
+    for item in virtual_occurrences(user_id, kind, start, end - timedelta(days=1)):
+        due_date = item['due_date']
+        scheduled[(due_date.year - start.year) * 12 + due_date.month - start.month] += float(item['amount'])
+    return scheduled
+
+def _trend_text(label, y):
+    recent = y[-TREND_MONTHS:]
+    if len(recent) < 4 or recent.mean() <= 0:
+        return None
+    slope = np.polyfit(np.arange(len(recent)), recent, 1)[0] / recent.mean()
+    if abs(slope) < STABLE_SLOPE:
+        return f"{label} estáveis nos últimos {len(recent)} meses"
+    direction = 'alta' if slope > 0 else 'queda'
+    return f"{label} em {direction} de {abs(slope) * 100:.1f}% ao mês nos últimos {len(recent)} meses"
+
+def _narrative(months, revenue, expenses, history_revenue, history_expenses, default_rate):
+    """Tendências, alertas, recomendações e resumo gerados por regras"""
+    balance = revenue - expenses
+    trends = [text for text in (_trend_text('Receitas', history_revenue),
+                                _trend_text('Gastos', history_expenses)) if text]
+
+    alerts, recommendations = [], []
+    negative = [(month, value) for month, value in zip(months, balance) if value < 0]
+    for month, value in negative:
+        alerts.append(f"Saldo previsto negativo em {month}: R$ {value:.2f}")
+    if negative:
+        recommendations.append(f"Antecipe cobranças e renegocie pagamentos antes de {negative[0][0]}")
+    if default_rate >= DEFAULT_ALERT_RATE:
+        alerts.append(f"{default_rate * 100:.0f}% do valor a receber já vencido não foi pago")
+        recommendations.append("Reforce os lembretes automáticos de cobrança via WhatsApp")
+    if not recommendations:
+        recommendations.append("Mantenha a reserva de caixa e acompanhe os recebimentos do mês")
+
+    summary = (f"Para os próximos {len(months)} meses, receitas previstas de R$ {revenue.sum():.2f}, "
+               f"gastos de R$ {expenses.sum():.2f} e saldo de R$ {balance.sum():.2f}.")
+    return trends, recommendations, alerts, summary
+
+def forecast_cash_flow(user_id, months_ahead=3, today=None):
+    """
+    Previsão de fluxo de caixa do mês corrente e dos seguintes, no formato da IA.
+
+    Algumas consultas ao resumo mensal e às recorrências; o cálculo em si
+    leva milissegundos.
+    """
+    current = month_of(today or date.today())
+    history_start = add_months(current, -HISTORY_MONTHS)
+    future_end = add_months(current, months_ahead)
+
+    revenue_paid, revenue_total = _monthly_series(user_id, 'receivable', history_start, current)
+    expenses_paid, _expenses_total = _monthly_series(user_id, 'payable', history_start, current)
+
+    # Meses antes do primeiro lançamento não entram no histórico
+    active = np.flatnonzero(revenue_total + expenses_paid)
+    first = active[0] if len(active) else len(revenue_paid)
+    revenue_history, expenses_history = revenue_paid[first:], expenses_paid[first:]
+
+    collected = revenue_total[first:].sum()
+    collection_rate = float(revenue_history.sum() / collected) if collected > 0 else 1.0
+    default_rate = 1.0 - collection_rate
+
+    revenue, revenue_model, revenue_error = forecast_series(revenue_history, months_ahead)
+    expenses, expenses_model, expenses_error = forecast_series(expenses_history, months_ahead)
+
+    # O que já está agendado é o piso do mês
+    revenue = np.maximum(revenue, _scheduled(user_id, 'receivable', current, future_end) * collection_rate)
+    expenses = np.maximum(expenses, _scheduled(user_id, 'payable', current, future_end))
+
+    months = [add_months(current, offset).strftime('%Y-%m') for offset in range(months_ahead)]
+    trends, recommendations, alerts, summary = _narrative(
+        months, revenue, expenses, revenue_history, expenses_history, default_rate
+    )
+
+    return {
+        "predicao_mensal": [
+            {
+                "mes": month,
+                "receita_prevista": round(float(revenue[i]), 2),
+                "gastos_previstos": round(float(expenses[i]), 2),
+                "saldo_previsto": round(float(revenue[i] - expenses[i]), 2)
+            } for i, month in enumerate(months)
+        ],
+        "tendencias": trends,
+        "recomendacoes": recommendations,
+        "alertas": alerts,
+        "probabilidade_inadimplencia": round(default_rate, 4),
+        "melhor_mes_cobranca": months[int(np.argmax(revenue))] if months else None,
+        "resumo": summary,
+        "metodo": {
+            "receitas": MODEL_LABELS[revenue_model],
+            "gastos": MODEL_LABELS[expenses_model],
+            "erro_medio_receitas": round(revenue_error, 2) if revenue_error is not None else None,
+            "erro_medio_gastos": round(expenses_error, 2) if expenses_error is not None else None,
+            "meses_historico": int(len(revenue_history))
+        }
+    }
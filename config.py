@@ -45,13 +45,55 @@ class Config:
     SESSION_COOKIE_SAMESITE = 'Lax'
     PERMANENT_SESSION_LIFETIME = 3600 * 24 * 7  # 1 week
     
+    # Cache das configurações do sistema (segundos) e arquivo usado para
+    # avisar os outros workers quando o admin altera as configurações
+    SETTINGS_CACHE_TTL = int(os.environ.get('SETTINGS_CACHE_TTL', 60))
+    SETTINGS_STAMP_FILE = os.environ.get('SETTINGS_STAMP_FILE')
+    
     # External APIs
     EVOLUTION_API_URL = os.environ.get('EVOLUTION_API_URL')
     EVOLUTION_API_KEY = os.environ.get('EVOLUTION_API_KEY')
     EVOLUTION_DEFAULT_INSTANCE = os.environ.get('EVOLUTION_DEFAULT_INSTANCE')
     
+    # Cliente HTTP da Evolution API (pool keep-alive, timeouts e novas tentativas)
+    EVOLUTION_POOL_SIZE = int(os.environ.get('EVOLUTION_POOL_SIZE', 20))
+    EVOLUTION_CONNECT_TIMEOUT = float(os.environ.get('EVOLUTION_CONNECT_TIMEOUT', 3.05))
+    EVOLUTION_READ_TIMEOUT = float(os.environ.get('EVOLUTION_READ_TIMEOUT', 10))
+    EVOLUTION_MAX_RETRIES = int(os.environ.get('EVOLUTION_MAX_RETRIES', 2))
+    EVOLUTION_RETRY_BACKOFF = float(os.environ.get('EVOLUTION_RETRY_BACKOFF', 0.5))
+    
+    # Envio de lembretes em lote (pool de threads + limite por instância)
+    REMINDER_INTERVAL_SECONDS = int(os.environ.get('REMINDER_INTERVAL_SECONDS', 300))
+    REMINDER_DISPATCH_WORKERS = int(os.environ.get('REMINDER_DISPATCH_WORKERS', 8))
+    REMINDER_DISPATCH_QUEUE_SIZE = int(os.environ.get('REMINDER_DISPATCH_QUEUE_SIZE', 200))
+    EVOLUTION_RATE_PER_SECOND = float(os.environ.get('EVOLUTION_RATE_PER_SECOND', 5))
+    
+    # Contas recorrentes: dias à frente cujas ocorrências já viram linhas
+    RECURRENCE_HORIZON_DAYS = int(os.environ.get('RECURRENCE_HORIZON_DAYS', 90))
+    
+    # Busca de clientes/fornecedores: prefix (tabela de termos) ou fulltext (FTS5/FULLTEXT)
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'prefix').lower()
+    
+    # Fila de envio (outbox): as telas só gravam a mensagem; o worker envia
+    WHATSAPP_OUTBOX_ENABLED = os.environ.get('WHATSAPP_OUTBOX_ENABLED', 'True').lower() == 'true'
+    WHATSAPP_OUTBOX_BATCH_SIZE = int(os.environ.get('WHATSAPP_OUTBOX_BATCH_SIZE', 50))
+    WHATSAPP_OUTBOX_POLL_SECONDS = float(os.environ.get('WHATSAPP_OUTBOX_POLL_SECONDS', 5))
+    WHATSAPP_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('WHATSAPP_OUTBOX_MAX_ATTEMPTS', 5))
+    
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     
+    # Cache das análises da IA: validade (horas) e limite de resultados guardados
+    AI_CACHE_TTL_HOURS = float(os.environ.get('AI_CACHE_TTL_HOURS', 24))
+    AI_CACHE_MAX_ENTRIES = int(os.environ.get('AI_CACHE_MAX_ENTRIES', 5000))
+    # Tempo máximo (segundos) de cada chamada à API da IA; abaixo do proxy_read_timeout do nginx
+    AI_REQUEST_TIMEOUT = float(os.environ.get('AI_REQUEST_TIMEOUT', 45))
+    
+    # Tarefas em segundo plano (análises da IA, exportações, operações em lote)
+    BACKGROUND_JOBS_ENABLED = os.environ.get('BACKGROUND_JOBS_ENABLED', 'True').lower() == 'true'
+    BACKGROUND_JOB_WORKERS = int(os.environ.get('BACKGROUND_JOB_WORKERS', 2))
+    BACKGROUND_JOB_POLL_SECONDS = float(os.environ.get('BACKGROUND_JOB_POLL_SECONDS', 1))
+    BACKGROUND_JOB_RETENTION_HOURS = float(os.environ.get('BACKGROUND_JOB_RETENTION_HOURS', 24))
+    
     # Server
     HOST = os.environ.get('HOST', '0.0.0.0')
     PORT = int(os.environ.get('PORT', 5000))
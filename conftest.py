@@ -0,0 +1,58 @@
+"""
+Fixtures compartilhadas dos testes (banco SQLite em memória)
+"""
+import os
+import uuid
+from datetime import datetime
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import pytest
+from app import app, db
+from models import User, UserPlan, Client
+
+PREMIUM_LIMIT = 999999
+
+@pytest.fixture
+def make_user():
+    """
+    Cria um usuário com nome único (já gravado, com commit) e o retorna.
+
+    premium=True dá um plano Premium sem limites; premium_expires_in
+    (timedelta) define quando ele vence.
+    """
+    def factory(premium=False, premium_expires_in=None, **fields):
+        key = uuid.uuid4().hex[:12]
+        user = User(username=f"u{key}", email=f"{key}@t.com", **fields)
+        user.set_password('x')
+        db.session.add(user)
+        db.session.flush()
+        if premium or premium_expires_in is not None:
+            db.session.add(UserPlan(
+                user_id=user.id, plan_name='Premium', max_clients=PREMIUM_LIMIT,
+                max_receivables=PREMIUM_LIMIT, max_payables=PREMIUM_LIMIT,
+                expires_at=datetime.utcnow() + premium_expires_in if premium_expires_in is not None else None
+            ))
+        db.session.commit()
+        return user
+    return factory
+
+@pytest.fixture
+def make_client():
+    """Cria um cliente do usuário (com commit) e o retorna"""
+    def factory(user_id, name='Cliente', **fields):
+        client = Client(user_id=user_id, name=name, **fields)
+        db.session.add(client)
+        db.session.commit()
+        return client
+    return factory
+
+@pytest.fixture
+def logged_client():
+    """Cliente HTTP de teste já logado como o usuário"""
+    def factory(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+        return client
+    return factory
@@ -0,0 +1,147 @@
+"""
+Métricas do dashboard calculadas em passagem única no banco
+Os meses fechados e os futuros vêm do resumo mensal (monthly_summary.py);
+só as contas do mês corrente são agregadas, em um GROUP BY com agregação
+condicional, para separar as que já venceram das que ainda vão vencer.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import func, case, literal
+from app import db
+from models import Client, Receivable, Payable, InstallmentSale
+from monthly_summary import summary_rows
+from utils import month_range
+import logging
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class DashboardMetrics:
+    """Resultado tipado compartilhado pelo dashboard e por calculate_dashboard_stats"""
+    total_clients: int = 0
+
+    total_receivables: int = 0
+    pending_receivables: int = 0
+    overdue_receivables: int = 0
+    paid_receivables: int = 0
+    receivables_pending_amount: Decimal = Decimal('0')
+    receivables_overdue_amount: Decimal = Decimal('0')
+    # Soma de todas as contas com status 'pending', vencidas ou não (total do dashboard)
+    receivables_pending_total: Decimal = Decimal('0')
+    revenue_this_month: Decimal = Decimal('0')
+
+    total_payables: int = 0
+    pending_payables: int = 0
+    overdue_payables: int = 0
+    paid_payables: int = 0
+    payables_pending_amount: Decimal = Decimal('0')
+    payables_overdue_amount: Decimal = Decimal('0')
+    payables_pending_total: Decimal = Decimal('0')
+    expenses_this_month: Decimal = Decimal('0')
+
+    total_installment_sales: int = 0
+    pending_sales: int = 0
+    confirmed_sales: int = 0
+
+def _account_rows(model, user_id, today, month_start, month_end):
+    """
+    Agrega as contas do mês corrente em um GROUP BY status, (due_date < today).
+
+    A receita/despesa do mês (contas pagas com vencimento no mês) vem da
+    mesma consulta via agregação condicional.
+    """
+    past_due = case((model.due_date < today, literal(1)), else_=literal(0))
+    paid_this_month = case((model.status == 'paid', model.amount), else_=literal(0))
+
+    return db.session.query(
+        model.status,
+        past_due.label('past_due'),
+        func.count(model.id),
+        func.coalesce(func.sum(model.amount), 0),
+        func.coalesce(func.sum(paid_this_month), 0)
+    ).filter(
+        model.user_id == user_id,
+        model.due_date >= month_start,
+        model.due_date < month_end
+    ).group_by(model.status, past_due).all()
+
+def _summary_rows(kind, user_id, month_start):
+    """Demais meses, no formato de _account_rows: os anteriores ao corrente já venceram"""
+    return [
+        (status, month < month_start, count, amount, 0)
+        for month, status, count, amount in summary_rows(user_id, kind)
+        if month != month_start
+    ]
+
+def _fold_account_rows(rows):
+    """Converte as linhas agrupadas em contadores por status efetivo"""
+    totals = {
+        'total': 0, 'pending': 0, 'overdue': 0, 'paid': 0,
+        'pending_amount': Decimal('0'), 'overdue_amount': Decimal('0'),
+        'pending_total': Decimal('0'), 'month_amount': Decimal('0')
+    }
+
+    for status, past_due, count, amount, month_amount in rows:
+        amount = Decimal(str(amount or 0))
+        totals['total'] += count
+        totals['month_amount'] += Decimal(str(month_amount or 0))
+        if status == 'pending':
+            totals['pending_total'] += amount
+
+        if status == 'paid':
+            totals['paid'] += count
+        elif status == 'overdue' or (status == 'pending' and past_due):
+            totals['overdue'] += count
+            totals['overdue_amount'] += amount
+        elif status == 'pending':
+            totals['pending'] += count
+            totals['pending_amount'] += amount
+
+    return totals
+
+def get_dashboard_metrics(user_id, today=None):
+    """Calcula todas as métricas do dashboard de um usuário"""
+    today = today or date.today()
+    month_start, month_end = month_range(today.year, today.month)
+    metrics = DashboardMetrics()
+
+    metrics.total_clients = Client.query.filter_by(user_id=user_id).count()
+
+    receivables = _fold_account_rows(_account_rows(Receivable, user_id, today, month_start, month_end) +
+                                     _summary_rows('receivable', user_id, month_start))
+    metrics.total_receivables = receivables['total']
+    metrics.pending_receivables = receivables['pending']
+    metrics.overdue_receivables = receivables['overdue']
+    metrics.paid_receivables = receivables['paid']
+    metrics.receivables_pending_amount = receivables['pending_amount']
+    metrics.receivables_overdue_amount = receivables['overdue_amount']
+    metrics.receivables_pending_total = receivables['pending_total']
+    metrics.revenue_this_month = receivables['month_amount']
+
+    payables = _fold_account_rows(_account_rows(Payable, user_id, today, month_start, month_end) +
+                                  _summary_rows('payable', user_id, month_start))
+    metrics.total_payables = payables['total']
+    metrics.pending_payables = payables['pending']
+    metrics.overdue_payables = payables['overdue']
+    metrics.paid_payables = payables['paid']
+    metrics.payables_pending_amount = payables['pending_amount']
+    metrics.payables_overdue_amount = payables['overdue_amount']
+    metrics.payables_pending_total = payables['pending_total']
+    metrics.expenses_this_month = payables['month_amount']
+
+    sales = db.session.query(
+        InstallmentSale.status, func.count(InstallmentSale.id)
+    ).filter(
+        InstallmentSale.user_id == user_id
+    ).group_by(InstallmentSale.status).all()
+
+    for status, count in sales:
+        metrics.total_installment_sales += count
+        if status == 'pending':
+            metrics.pending_sales = count
+        elif status == 'confirmed':
+            metrics.confirmed_sales = count
+
+    return metrics
@@ -0,0 +1,188 @@
+"""
+Cliente HTTP da Evolution API
+Sessão com pool de conexões (keep-alive), timeouts separados de conexão e
+leitura, novas tentativas com jitter e histograma de latência por endpoint
+"""
+
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Limites superiores (ms) dos buckets do histograma
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class LatencyHistogram:
+    """Histograma de latência acumulado (thread-safe)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Último bucket: acima do maior limite
+        self.total = 0
+        self.sum_ms = 0.0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds, error=False):
+        ms = seconds * 1000
+        index = next((i for i, bound in enumerate(self.buckets) if ms <= bound), len(self.buckets))
+        with self.lock:
+            self.counts[index] += 1
+            self.total += 1
+            self.sum_ms += ms
+            if error:
+                self.errors += 1
+
+    def quantile(self, q):
+        """Limite superior do bucket que contém o quantil q (aproximado)"""
+        with self.lock:
+            if not self.total:
+                return None
+            target = q * self.total
+            seen = 0
+            for i, count in enumerate(self.counts):
+                seen += count
+                if seen >= target:
+                    return self.buckets[i] if i < len(self.buckets) else float('inf')
+
+    def snapshot(self):
+        with self.lock:
+            labels = [f"<={bound}ms" for bound in self.buckets] + [f">{self.buckets[-1]}ms"]
+            data = {
+                'count': self.total,
+                'errors': self.errors,
+                'avg_ms': round(self.sum_ms / self.total, 1) if self.total else None,
+                'buckets': dict(zip(labels, self.counts)),
+            }
+        data['p50_ms'] = self.quantile(0.5)
+        data['p95_ms'] = self.quantile(0.95)
+        return data
+
+# Histogramas por endpoint, compartilhados por todos os clientes do processo
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+def _histogram(endpoint):
+    with _histograms_lock:
+        if endpoint not in _histograms:
+            _histograms[endpoint] = LatencyHistogram()
+        return _histograms[endpoint]
+
+def latency_snapshot():
+    """Latência por endpoint desde o início do processo"""
+    with _histograms_lock:
+        items = list(_histograms.items())
+    return {endpoint: histogram.snapshot() for endpoint, histogram in sorted(items)}
+
+def reset_latency_histograms():
+    with _histograms_lock:
+        _histograms.clear()
+
+class EvolutionClient:
+    """
+    Acesso à Evolution API com uma requests.Session reaproveitada.
+
+    Novas tentativas apenas em erro de conexão (inclui conexão resetada e
+    timeout de conexão) e respostas 5xx; timeout de leitura não é repetido,
+    pois a API pode ter processado o pedido.
+    """
+
+    def __init__(self, api_url, api_key, pool_size=None, connect_timeout=None,
+                 read_timeout=None, max_retries=None, backoff=None):
+        self.api_url = (api_url or '').rstrip('/')
+        self.api_key = (api_key or '').strip()
+        self.connect_timeout = connect_timeout or Config.EVOLUTION_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or Config.EVOLUTION_READ_TIMEOUT
+        self.max_retries = Config.EVOLUTION_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = Config.EVOLUTION_RETRY_BACKOFF if backoff is None else backoff
+
+        pool_size = pool_size or Config.EVOLUTION_POOL_SIZE
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'apikey': self.api_key})
+
+    def _sleep_before_retry(self, attempt):
+        # Backoff exponencial com jitter completo
+        time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def request(self, method, path, endpoint=None, read_timeout=None, **kwargs):
+        """Executa a chamada e retorna a requests.Response"""
+        endpoint = endpoint or path
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        histogram = _histogram(endpoint)
+
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, f"{self.api_url}{path}", timeout=timeout, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                histogram.observe(time.monotonic() - started, error=True)
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(f"Evolution API {endpoint}: erro de conexão ({e}), nova tentativa")
+            except requests.exceptions.RequestException:
+                histogram.observe(time.monotonic() - started, error=True)
+                raise
+            else:
+                histogram.observe(time.monotonic() - started, error=response.status_code >= 500)
+                if response.status_code < 500 or attempt >= self.max_retries:
+                    return response
+                logger.warning(f"Evolution API {endpoint}: HTTP {response.status_code}, nova tentativa")
+
+            self._sleep_before_retry(attempt)
+            attempt += 1
+
+    # Endpoints usados pelo sistema
+
+    def send_text(self, instance_name, number, text):
+        return self.request('POST', f"/message/sendText/{instance_name}", endpoint='message/sendText',
+                            json={'number': number, 'text': text})
+
+    def create_instance(self, instance_name):
+        return self.request('POST', '/instance/create', endpoint='instance/create', read_timeout=30,
+                            json={
+                                'instanceName': instance_name,
+                                'token': self.api_key,
+                                'qrcode': True,
+                                'integration': 'WHATSAPP-BAILEYS'
+                            })
+
+    def connect(self, instance_name):
+        return self.request('GET', f"/instance/connect/{instance_name}", endpoint='instance/connect')
+
+    def fetch_instances(self):
+        return self.request('GET', '/instance/fetchInstances', endpoint='instance/fetchInstances')
+
+    def logout(self, instance_name):
+        return self.request('DELETE', f"/instance/logout/{instance_name}", endpoint='instance/logout')
+
+    def delete_instance(self, instance_name):
+        return self.request('DELETE', f"/instance/delete/{instance_name}", endpoint='instance/delete')
+
+    def close(self):
+        self.session.close()
+
+# Um cliente (e pool de conexões) por URL/chave, compartilhado entre threads
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_evolution_client(api_url, api_key):
+    key = ((api_url or '').rstrip('/'), (api_key or '').strip())
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = EvolutionClient(*key)
+            _clients[key] = client
+        return client
+
+def client_for_settings(system_settings):
+    """Cliente configurado a partir de SystemSettings"""
+    return get_evolution_client(system_settings.evolution_api_url, system_settings.evolution_api_key)
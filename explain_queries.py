@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Mostra o plano de execução (EXPLAIN) das consultas mais usadas do FinanceiroMax
+Funciona com SQLite (EXPLAIN QUERY PLAN) e MySQL (EXPLAIN)
+
+Uso: DATABASE_URL=... python explain_queries.py [user_id]
+"""
+import sys
+from datetime import date
+from app import app, db
+from models import Receivable, Payable, Client, Supplier, InstallmentSale, WhatsAppMessage, AccountSeries
+from utils import month_range
+
+def hot_queries(user_id):
+    """Consultas das telas de listagem e do dashboard"""
+    today = date.today()
+    month_start, next_month_start = month_range(today.year, today.month)
+
+    return {
+        'receivables.index (mês)': db.session.query(Receivable, Client).join(Client).filter(
+            Receivable.user_id == user_id,
+            Receivable.due_date >= month_start,
+            Receivable.due_date < next_month_start
+        ).order_by(Receivable.due_date.asc()),
+
+        'payables.index (mês)': db.session.query(Payable, Supplier).outerjoin(Supplier).filter(
+            Payable.user_id == user_id,
+            Payable.due_date >= month_start,
+            Payable.due_date < next_month_start
+        ).order_by(Payable.due_date.asc()),
+
+        'receivables pendentes vencidas': Receivable.query.filter(
+            Receivable.user_id == user_id,
+            Receivable.status == 'pending',
+            Receivable.due_date < today
+        ),
+
+        'receivables por cliente': Receivable.query.filter(
+            Receivable.client_id == 1
+        ).order_by(Receivable.due_date.desc()),
+
+        'parcelas de venda': Receivable.query.filter(Receivable.parent_id == 1),
+
+        'contas recentes (séries)': AccountSeries.query.filter(
+            AccountSeries.user_id == user_id,
+            AccountSeries.kind == 'receivable'
+        ).order_by(AccountSeries.created_at.desc()).limit(5),
+
+        'installment_sales.index': InstallmentSale.query.filter(
+            InstallmentSale.user_id == user_id
+        ).order_by(InstallmentSale.created_at.desc()),
+
+        'vendas pendentes': InstallmentSale.query.filter_by(user_id=user_id, status='pending'),
+
+        'whatsapp.index (histórico)': WhatsAppMessage.query.filter(
+            WhatsAppMessage.user_id == user_id
+        ).order_by(WhatsAppMessage.created_at.desc()).limit(50),
+    }
+
+def explain(query):
+    """Executa EXPLAIN para uma consulta ORM no dialeto configurado"""
+    dialect = db.engine.dialect
+    compiled = query.statement.compile(dialect=dialect, compile_kwargs={'render_postcompile': True})
+
+    if dialect.name == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif dialect.name in ('mysql', 'mariadb'):
+        prefix = 'EXPLAIN '
+    else:
+        raise RuntimeError(f"Dialeto não suportado: {dialect.name}")
+
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+
+    with db.engine.connect() as conn:
+        result = conn.exec_driver_sql(prefix + compiled.string, params)
+        return list(result.keys()), result.fetchall()
+
+def main():
+    user_id = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+
+    with app.app_context():
+        print(f"=== EXPLAIN ({db.engine.dialect.name}) - usuário {user_id} ===\n")
+
+        for name, query in hot_queries(user_id).items():
+            print(f"--- {name} ---")
+            try:
+                columns, rows = explain(query)
+                print(' | '.join(columns))
+                for row in rows:
+                    print(' | '.join(str(value) for value in row))
+            except Exception as e:
+                print(f"Erro: {e}")
+            print()
+
+if __name__ == '__main__':
+    main()
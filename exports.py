@@ -0,0 +1,260 @@
+"""
+Exportação em CSV/XLSX por streaming
+As linhas vêm do banco em lotes (yield_per, com cursor do lado do servidor
+quando o driver suporta) e o arquivo é gerado e enviado aos pedaços, linha
+a linha; nenhuma etapa guarda o resultado inteiro em memória.
+
+O XLSX é montado direto em XML (strings inline, sem tabela de strings
+compartilhadas) dentro de um zip gravado em fluxo, então a memória usada
+não depende do número de linhas e não há dependência extra.
+"""
+
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from functools import wraps
+from xml.sax.saxutils import escape
+from flask import Response, stream_with_context, request, flash, redirect, url_for
+from list_api import ListArgumentError
+
+EXPORT_BATCH_SIZE = 1000  # linhas por busca no cursor do banco
+FLUSH_ROWS = 500  # linhas por pedaço enviado ao cliente
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+STATUS_LABELS = {
+    'pending': 'Pendente',
+    'overdue': 'Atrasado',
+    'paid': 'Pago',
+    'cancelled': 'Cancelado',
+    'sending': 'Enviando',
+    'sent': 'Enviada',
+    'failed': 'Falhou',
+}
+
+def export_format_arg():
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        raise ListArgumentError('Formato de exportação inválido (use csv ou xlsx)')
+    return export_format
+
+def export_endpoint(fallback_endpoint):
+    """Parâmetro inválido na exportação: avisa e volta para a tela de origem"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                return view(*args, **kwargs)
+            except ListArgumentError as e:
+                flash(str(e), 'error')
+                return redirect(url_for(fallback_endpoint))
+        return wrapper
+    return decorator
+
+def status_label(status, due_date=None, today=None):
+    """Rótulo do status, com 'Atrasado' para pendentes vencidas (como nas telas)"""
+    if status == 'pending' and due_date and due_date < (today or date.today()):
+        status = 'overdue'
+    return STATUS_LABELS.get(status, status or '')
+
+def stream_rows(query):
+    """Itera a consulta em lotes, sem carregar todas as linhas"""
+    return query.yield_per(EXPORT_BATCH_SIZE)
+
+# CSV no padrão do Excel em português: ';' entre campos, vírgula decimal, BOM UTF-8
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%d/%m/%Y %H:%M')
+    if isinstance(value, date):
+        return value.strftime('%d/%m/%Y')
+    if isinstance(value, (Decimal, float)):
+        return f'{value:.2f}'.replace('.', ',')
+    value = str(value)
+    # Evita que planilhas interpretem o texto como fórmula
+    if value[:1] in ('=', '+', '-', '@'):
+        return "'" + value
+    return value
+
+def generate_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    buffer.write('\ufeff')
+    writer.writerow([header for header, _getter in columns])
+
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([_csv_value(getter(row)) for _header, getter in columns])
+        if count % FLUSH_ROWS == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+# XLSX: partes fixas do pacote e a planilha gerada em fluxo
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Estilos: 0 padrão, 1 data, 2 data e hora, 3 valor (0,00), 4 cabeçalho em negrito
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="dd/mm/yyyy"/>'
+    '<numFmt numFmtId="165" formatCode="dd/mm/yyyy hh:mm"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="5">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '</cellXfs></styleSheet>'
+)
+
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+_ILLEGAL_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def _xlsx_cell(ref, value, header=False):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        value = 'Sim' if value else 'Não'
+    if isinstance(value, datetime):
+        serial = (value - _EXCEL_EPOCH).total_seconds() / 86400
+        return f'<c r="{ref}" s="2"><v>{serial:.6f}</v></c>'
+    if isinstance(value, date):
+        return f'<c r="{ref}" s="1"><v>{(value - _EXCEL_EPOCH.date()).days}</v></c>'
+    if isinstance(value, (Decimal, float)):
+        return f'<c r="{ref}" s="3"><v>{value:f}</v></c>'
+    if isinstance(value, int):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+
+    text = escape(_ILLEGAL_XML_CHARS.sub('', str(value)))
+    style = ' s="4"' if header else ''
+    return f'<c r="{ref}" t="inlineStr"{style}><is><t xml:space="preserve">{text}</t></is></c>'
+
+def _xlsx_row(number, letters, values, header=False):
+    cells = ''.join(_xlsx_cell(f'{letter}{number}', value, header) for letter, value in zip(letters, values))
+    return f'<row r="{number}">{cells}</row>'.encode('utf-8')
+
+class _ChunkSink(io.RawIOBase):
+    """Destino não pesquisável do zip: acumula os bytes até o próximo envio"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def generate_xlsx(sheet_name, columns, rows):
+    sink = _ChunkSink()
+    letters = [_column_letter(i) for i in range(len(columns))]
+
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as package:
+        package.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        package.writestr('_rels/.rels', _ROOT_RELS)
+        package.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        package.writestr('xl/styles.xml', _STYLES)
+        package.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        yield sink.drain()
+
+        with package.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b'<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" '
+                b'activePane="bottomLeft" state="frozen"/></sheetView></sheetViews><sheetData>'
+            )
+            sheet.write(_xlsx_row(1, letters, [header for header, _getter in columns], header=True))
+
+            for number, row in enumerate(rows, start=2):
+                sheet.write(_xlsx_row(number, letters, [getter(row) for _header, getter in columns]))
+                if number % FLUSH_ROWS == 0:
+                    yield sink.drain()
+
+            sheet.write(b'</sheetData></worksheet>')
+        yield sink.drain()
+    yield sink.drain()
+
+def export_response(export_format, filename, sheet_name, columns, rows):
+    """
+    Resposta em pedaços (chunked) com o arquivo gerado sob demanda.
+
+    columns: [(cabeçalho, função que extrai o valor da linha)]. O contexto
+    da requisição (e a sessão do banco) fica aberto até o fim do envio.
+    """
+    if export_format == 'xlsx':
+        body = generate_xlsx(sheet_name, columns, rows)
+    else:
+        body = generate_csv(columns, rows)
+
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}.{export_format}'}
+    )
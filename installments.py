@@ -0,0 +1,116 @@
+"""
+Geração de parcelas em lote
+Monta o cronograma inteiro (meses de calendário, centavos exatos) e grava
+todas as parcelas com um único INSERT de várias linhas, em vez de um
+objeto do ORM por parcela.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from app import db
+from models import AccountSeries, Receivable, Payable
+from account_series import base_description
+from recurrence import add_months
+from reminder_planner import plan_receivables
+from usage_counters import adjust_usage
+from monthly_summary import add_to_summary
+
+CENT = Decimal('0.01')
+
+def split_amount(total, count):
+    """
+    Divide o total em 'count' parcelas de centavos exatos.
+
+    Os centavos que sobram vão para as primeiras parcelas, então a soma
+    sempre fecha com o total (100,00 / 3 -> 33,34 + 33,33 + 33,33).
+    """
+    cents = int((Decimal(str(total)) / CENT).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    base, remainder = divmod(cents, count)
+    return [(Decimal(base + 1) if i < remainder else Decimal(base)) * CENT for i in range(count)]
+
+def installment_schedule(total, count, first_due_date):
+    """[(número, vencimento, valor)], uma parcela por mês a partir de first_due_date"""
+    return [
+        (number, add_months(first_due_date, number - 1), amount)
+        for number, amount in enumerate(split_amount(total, count), start=1)
+    ]
+
+@dataclass
+class InstallmentPlan:
+    """Uma conta parcelada a gerar (receivable ou payable)"""
+    kind: str
+    user_id: int
+    description: str
+    total_amount: Decimal
+    installments: int
+    first_due_date: date
+    client_id: int = None
+    supplier_id: int = None
+    category: str = None
+    sale_id: int = None
+
+    def series(self):
+        return AccountSeries(
+            user_id=self.user_id,
+            kind=self.kind,
+            series_type='installment',
+            description=base_description(self.description),
+            client_id=self.client_id,
+            supplier_id=self.supplier_id,
+            installment_sale_id=self.sale_id
+        )
+
+    def rows(self, series_id):
+        rows = []
+        for number, due_date, amount in installment_schedule(self.total_amount, self.installments, self.first_due_date):
+            row = {
+                'user_id': self.user_id,
+                'description': f"{self.description} - Parcela {number}/{self.installments}",
+                'amount': amount,
+                'due_date': due_date,
+                'series_id': series_id
+            }
+            if self.kind == 'receivable':
+                row.update(client_id=self.client_id, type='installment', installment_number=number,
+                           total_installments=self.installments, parent_id=self.sale_id)
+            else:
+                row.update(supplier_id=self.supplier_id, category=self.category)
+            rows.append(row)
+        return rows
+
+def insert_installments(plans):
+    """
+    Cria as séries e grava as parcelas de todos os planos (sem commit).
+
+    Um flush para as séries, um INSERT de várias linhas por tabela, o ajuste
+    dos contadores de uso e o agendamento dos lembretes das contas a receber.
+    Retorna as séries criadas, na ordem dos planos.
+    """
+    series_list = [plan.series() for plan in plans]
+    db.session.add_all(series_list)
+    db.session.flush()
+
+    for kind, model in (('receivable', Receivable), ('payable', Payable)):
+        rows = []
+        usage = {}
+        for plan, series in zip(plans, series_list):
+            if plan.kind != kind:
+                continue
+            rows.extend(plan.rows(series.id))
+            usage[plan.user_id] = usage.get(plan.user_id, 0) + plan.installments
+        if not rows:
+            continue
+
+        db.session.execute(model.__table__.insert(), rows)
+        add_to_summary(kind, rows)
+        for user_id, count in usage.items():
+            adjust_usage(user_id, f'{kind}s', count)
+
+        if kind == 'receivable':
+            series_ids = [series.id for plan, series in zip(plans, series_list) if plan.kind == kind]
+            plan_receivables(db.session.query(
+                Receivable.id, Receivable.user_id, Receivable.status, Receivable.due_date
+            ).filter(Receivable.series_id.in_(series_ids)).all(), new=True)
+
+    return series_list
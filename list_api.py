@@ -0,0 +1,135 @@
+"""
+Listagens JSON paginadas por cursor (keyset)
+As páginas seguintes continuam a partir da última linha vista, com
+WHERE (ordem, id) > (valor, id) sobre os índices por usuário, em vez de
+OFFSET; o cursor é opaco para o cliente.
+"""
+
+import base64
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from functools import wraps
+from flask import request, jsonify
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+class ListArgumentError(ValueError):
+    """Parâmetro inválido na listagem (vira resposta 400)"""
+
+def encode_cursor(sort_value, row_id):
+    if isinstance(sort_value, (date, datetime)):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_value, row_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+def decode_cursor(token, parse_value):
+    """Cursor -> (valor de ordenação, id); parse_value converte o valor"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return parse_value(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        raise ListArgumentError('Cursor inválido')
+
+def page_size():
+    size = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+def date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ListArgumentError(f'Data inválida em {name} (use AAAA-MM-DD)')
+
+def date_range_args():
+    """
+    (date_from, date_to) inclusivos, de ?date_from/date_to ou, como nas
+    telas mensais, de ?month/year.
+    """
+    month, year = request.args.get('month', type=int), request.args.get('year', type=int)
+    if month and year:
+        from utils import month_range, valid_month
+        if not valid_month(year, month):
+            raise ListArgumentError('Mês inválido')
+        start, next_start = month_range(year, month)
+        return start, next_start - timedelta(days=1)
+    return date_arg('date_from'), date_arg('date_to')
+
+def list_arg(name):
+    """'pending,overdue' -> ['pending', 'overdue']"""
+    return [part.strip() for part in request.args.get(name, '').split(',') if part.strip()]
+
+def selected_fields(available):
+    """Campos pedidos em ?fields= (todos quando omitido); 'id' vem sempre"""
+    requested = list_arg('fields')
+    if not requested:
+        return list(available)
+
+    unknown = [name for name in requested if name not in available]
+    if unknown:
+        raise ListArgumentError(f"Campos desconhecidos: {', '.join(unknown)}")
+    return ['id'] + [name for name in requested if name != 'id']
+
+def keyset_page(query, sort_column, id_column, cursor, limit, descending=False, parse_value=None):
+    """
+    Uma página da consulta ordenada por (sort_column, id_column).
+
+    Retorna (linhas, has_more). Busca limit + 1 linhas para saber se há
+    próxima página sem um COUNT.
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor, parse_value or (lambda value: value))
+        if descending:
+            query = query.filter(or_(sort_column < sort_value, and_(sort_column == sort_value, id_column < row_id)))
+        else:
+            query = query.filter(or_(sort_column > sort_value, and_(sort_column == sort_value, id_column > row_id)))
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    rows = query.limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def list_response(rows, fields, serializer, next_cursor=None):
+    """Resposta padrão: itens só com os campos pedidos e o próximo cursor"""
+    items = []
+    for row in rows:
+        data = serializer(row)
+        items.append({name: _json_value(data[name]) for name in fields})
+
+    return jsonify({
+        'items': items,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
+    })
+
+def list_endpoint(view):
+    """Converte ListArgumentError em resposta 400 com JSON"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            return view(*args, **kwargs)
+        except ListArgumentError as e:
+            return jsonify({'error': str(e)}), 400
+    return wrapper
+
+def parse_date_value(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def parse_datetime_value(value):
+    return datetime.fromisoformat(value)
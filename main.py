@@ -1,5 +1,7 @@
 from app import app
 from scheduler import start_reminder_system
+from whatsapp_outbox import start_outbox_worker
+from background_jobs import start_job_worker
 import logging
 
 # Configurar logging
@@ -9,5 +11,11 @@ logging.basicConfig(level=logging.INFO)
 start_reminder_system()
 logging.info("Sistema de lembretes automáticos iniciado")
 
+# Worker da fila de mensagens WhatsApp (modo outbox)
+start_outbox_worker()
+
+# Worker das tarefas em segundo plano (análises da IA)
+start_job_worker()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,210 @@
+"""
+Evolução de esquema do FinanceiroMax
+db.create_all() cria tabelas novas, mas não altera tabelas existentes;
+as migrações abaixo são aplicadas uma única vez, na ordem, e registradas
+em schema_migrations.
+"""
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import SchemaMigration
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _has_column(table, column):
+    return column in {c['name'] for c in inspect(db.engine).get_columns(table)}
+
+def _has_index(table, index_name):
+    return index_name in {i['name'] for i in inspect(db.engine).get_indexes(table)}
+
+def add_column(table, column, ddl):
+    """ALTER TABLE ... ADD COLUMN, apenas se a coluna ainda não existir"""
+    if not _has_column(table, column):
+        with db.engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        logger.info(f"Coluna {table}.{column} adicionada")
+
+def create_index(table, index_name, columns):
+    """CREATE INDEX, apenas se o índice ainda não existir"""
+    if not _has_index(table, index_name):
+        with db.engine.begin() as conn:
+            conn.execute(text(f"CREATE INDEX {index_name} ON {table} ({', '.join(columns)})"))
+        logger.info(f"Índice {index_name} criado em {table}")
+
+def create_fulltext_index(table, index_name, column):
+    """CREATE FULLTEXT INDEX (MySQL), apenas se o índice ainda não existir"""
+    if not _has_index(table, index_name):
+        with db.engine.begin() as conn:
+            conn.execute(text(f"CREATE FULLTEXT INDEX {index_name} ON {table} ({column})"))
+        logger.info(f"Índice FULLTEXT {index_name} criado em {table}")
+
+def drop_not_null(model, column):
+    """Torna uma coluna opcional (SQLite não tem ALTER COLUMN: a tabela é recriada)"""
+    table = model.__tablename__
+    columns = {c['name']: c for c in inspect(db.engine).get_columns(table)}
+    if columns[column]['nullable']:
+        return
+    
+    dialect = db.engine.dialect.name
+    with db.engine.begin() as conn:
+        if dialect in ('mysql', 'mariadb'):
+            conn.execute(text(f"ALTER TABLE {table} MODIFY {column} INTEGER NULL"))
+        elif dialect == 'postgresql':
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} DROP NOT NULL"))
+        else:
+            old_indexes = [i['name'] for i in inspect(conn).get_indexes(table)]
+            conn.execute(text(f"ALTER TABLE {table} RENAME TO {table}_old"))
+            for index_name in old_indexes:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+            model.__table__.create(bind=conn)
+            
+            # Copia apenas as colunas que já existiam; as novas ficam com o padrão
+            copied = ', '.join(name for name in columns if name in model.__table__.columns)
+            conn.execute(text(f"INSERT INTO {table} ({copied}) SELECT {copied} FROM {table}_old"))
+            conn.execute(text(f"DROP TABLE {table}_old"))
+    logger.info(f"Coluna {table}.{column} agora aceita nulo")
+
+def migrate_account_series():
+    """Coluna series_id em contas a receber/pagar e preenchimento das séries"""
+    from account_series import backfill_series
+
+    add_column('receivables', 'series_id', 'INTEGER REFERENCES account_series(id)')
+    add_column('payables', 'series_id', 'INTEGER REFERENCES account_series(id)')
+    create_index('receivables', 'ix_receivables_series_id', ['series_id'])
+    create_index('payables', 'ix_payables_series_id', ['series_id'])
+
+    created = backfill_series()
+    if created:
+        logger.info(f"{created} séries de contas criadas a partir dos dados existentes")
+
+# Lista fixa: índices acrescentados depois aos modelos ficam com a própria migração
+TENANT_INDEXES = [
+    ('receivables', 'ix_receivables_user_due', ['user_id', 'due_date']),
+    ('receivables', 'ix_receivables_user_status_due', ['user_id', 'status', 'due_date']),
+    ('receivables', 'ix_receivables_client_due', ['client_id', 'due_date']),
+    ('receivables', 'ix_receivables_parent_id', ['parent_id']),
+    ('receivables', 'ix_receivables_user_created', ['user_id', 'created_at']),
+    ('payables', 'ix_payables_user_due', ['user_id', 'due_date']),
+    ('payables', 'ix_payables_user_status_due', ['user_id', 'status', 'due_date']),
+    ('payables', 'ix_payables_supplier_due', ['supplier_id', 'due_date']),
+    ('payables', 'ix_payables_user_created', ['user_id', 'created_at']),
+    ('installment_sales', 'ix_installment_sales_user_status', ['user_id', 'status']),
+    ('installment_sales', 'ix_installment_sales_user_created', ['user_id', 'created_at']),
+    ('installment_sales', 'ix_installment_sales_client_created', ['client_id', 'created_at']),
+    ('installment_sales', 'ix_installment_sales_token', ['confirmation_token']),
+    ('whatsapp_messages', 'ix_whatsapp_messages_user_created', ['user_id', 'created_at']),
+    ('whatsapp_messages', 'ix_whatsapp_messages_client_created', ['client_id', 'created_at']),
+]
+
+def migrate_tenant_indexes():
+    """Índices compostos das tabelas filtradas por usuário/status/vencimento"""
+    for table, index_name, columns in TENANT_INDEXES:
+        create_index(table, index_name, columns)
+
+def migrate_whatsapp_outbox():
+    """Colunas da fila de envio em whatsapp_messages"""
+    from models import WhatsAppMessage
+    
+    drop_not_null(WhatsAppMessage, 'client_id')
+    add_column('whatsapp_messages', 'phone', 'VARCHAR(20)')
+    add_column('whatsapp_messages', 'sender', "VARCHAR(20) DEFAULT 'user'")
+    add_column('whatsapp_messages', 'attempts', 'INTEGER DEFAULT 0')
+    add_column('whatsapp_messages', 'last_error', 'TEXT')
+    add_column('whatsapp_messages', 'next_attempt_at', 'DATETIME')
+    add_column('whatsapp_messages', 'locked_by', 'VARCHAR(64)')
+    add_column('whatsapp_messages', 'locked_until', 'DATETIME')
+    create_index('whatsapp_messages', 'ix_whatsapp_messages_status_next_attempt', ['status', 'next_attempt_at'])
+
+def migrate_reminder_schedule():
+    """Agenda de lembretes das contas em aberto já existentes"""
+    from reminder_planner import backfill_schedule
+    
+    planned = backfill_schedule()
+    if planned:
+        logger.info(f"{planned} lembretes agendados a partir das contas existentes")
+
+def migrate_usage_counters():
+    """Contadores de uso dos limites do plano em users"""
+    from usage_counters import repair_usage_counters
+    
+    add_column('users', 'clients_count', 'INTEGER NOT NULL DEFAULT 0')
+    add_column('users', 'receivables_count', 'INTEGER NOT NULL DEFAULT 0')
+    add_column('users', 'payables_count', 'INTEGER NOT NULL DEFAULT 0')
+    repair_usage_counters()
+
+def migrate_plan_lifecycle():
+    """Índice de vencimento dos planos e expiração dos já vencidos"""
+    from plan_lifecycle import expire_plans
+    
+    create_index('user_plans', 'ix_user_plans_expires_at', ['expires_at'])
+    expire_plans()
+
+def migrate_recurrence_rules():
+    """Regra das contas recorrentes em account_series"""
+    add_column('account_series', 'amount', 'NUMERIC(10, 2)')
+    add_column('account_series', 'category', 'VARCHAR(50)')
+    add_column('account_series', 'start_date', 'DATE')
+    add_column('account_series', 'interval_months', 'INTEGER DEFAULT 1')
+    add_column('account_series', 'occurrences', 'INTEGER')
+    add_column('account_series', 'materialized_count', 'INTEGER DEFAULT 0')
+    add_column('account_series', 'next_due_date', 'DATE')
+    create_index('account_series', 'ix_account_series_next_due_date', ['next_due_date'])
+
+def migrate_list_indexes():
+    """Índice da listagem paginada de clientes (user_id, created_at)"""
+    create_index('clients', 'ix_clients_user_created', ['user_id', 'created_at'])
+
+def migrate_search_terms():
+    """Chave de busca normalizada de clientes/fornecedores e seus termos"""
+    from party_search import rebuild_search_index
+    
+    add_column('clients', 'search_key', 'VARCHAR(255)')
+    add_column('suppliers', 'search_key', 'VARCHAR(255)')
+    indexed = rebuild_search_index()
+    if indexed:
+        logger.info(f"{indexed} clientes/fornecedores indexados para busca")
+
+def migrate_monthly_summary():
+    """Resumo mensal das contas (tabela criada por create_all) preenchido a partir das contas"""
+    from monthly_summary import rebuild_monthly_summary
+
+    rows = rebuild_monthly_summary()
+    if rows:
+        logger.info(f"Resumo mensal preenchido com {rows} linhas")
+
+# Ordem de aplicação; nunca renomear ou reordenar migrações já publicadas
+MIGRATIONS = [
+    ('0001_account_series', migrate_account_series),
+    ('0002_tenant_indexes', migrate_tenant_indexes),
+    ('0003_whatsapp_outbox', migrate_whatsapp_outbox),
+    ('0004_reminder_schedule', migrate_reminder_schedule),
+    ('0005_usage_counters', migrate_usage_counters),
+    ('0006_plan_lifecycle', migrate_plan_lifecycle),
+    ('0007_recurrence_rules', migrate_recurrence_rules),
+    ('0008_list_indexes', migrate_list_indexes),
+    ('0009_search_terms', migrate_search_terms),
+    ('0010_monthly_summary', migrate_monthly_summary),
+]
+
+def run_migrations():
+    """Aplica as migrações pendentes"""
+    applied = {m.name for m in SchemaMigration.query.all()}
+
+    for name, migration in MIGRATIONS:
+        if name in applied:
+            continue
+
+        try:
+            migration()
+            db.session.add(SchemaMigration(name=name))
+            db.session.commit()
+            logger.info(f"Migração {name} aplicada")
+        except IntegrityError:
+            # Outro worker registrou a mesma migração ao mesmo tempo
+            db.session.rollback()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao aplicar migração {name}: {str(e)}")
+            raise
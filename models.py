@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, date
 from app import db
 from werkzeug.security import generate_password_hash, check_password_hash
 import uuid
@@ -16,8 +16,14 @@ class User(db.Model):
     profile_photo = db.Column(db.String(200))  # Caminho para foto de perfil
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Contadores de uso dos limites do plano (mantidos por usage_counters)
+    clients_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    receivables_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    payables_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Relationships
     clients = db.relationship('Client', backref='user', lazy=True, cascade='all, delete-orphan')
+    suppliers = db.relationship('Supplier', backref='user', lazy=True, cascade='all, delete-orphan')
     receivables = db.relationship('Receivable', backref='user', lazy=True, cascade='all, delete-orphan')
     payables = db.relationship('Payable', backref='user', lazy=True, cascade='all, delete-orphan')
     installment_sales = db.relationship('InstallmentSale', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -26,6 +32,13 @@ class User(db.Model):
     user_plan = db.relationship('UserPlan', backref='user', uselist=False, cascade='all, delete-orphan')
     whatsapp_instances = db.relationship('UserWhatsAppInstance', backref='user', lazy=True, cascade='all, delete-orphan')
     confirmation_tokens = db.relationship('PhoneConfirmationToken', backref='user', lazy=True, cascade='all, delete-orphan')
+    account_series = db.relationship('AccountSeries', backref='user', lazy=True, cascade='all, delete-orphan')
+    reminder_schedule = db.relationship('ReminderSchedule', lazy=True, cascade='all, delete-orphan')
+    plan_transitions = db.relationship('PlanTransition', lazy=True, cascade='all, delete-orphan')
+    search_terms = db.relationship('SearchTerm', lazy=True, cascade='all, delete-orphan')
+    monthly_summary = db.relationship('MonthlySummary', lazy=True, cascade='all, delete-orphan')
+    ai_analysis_cache = db.relationship('AIAnalysisCache', lazy=True, cascade='all, delete-orphan')
+    background_jobs = db.relationship('BackgroundJob', lazy=True, cascade='all, delete-orphan')
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -47,6 +60,9 @@ class User(db.Model):
 
 class Client(db.Model):
     __tablename__ = 'clients'
+    __table_args__ = (
+        db.Index('ix_clients_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -58,6 +74,7 @@ class Client(db.Model):
     zip_code = db.Column(db.String(10))
     city = db.Column(db.String(80))
     state = db.Column(db.String(2))
+    search_key = db.Column(db.String(255))  # Nome/documento/WhatsApp normalizados (ver party_search.py)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -67,6 +84,13 @@ class Client(db.Model):
 
 class Receivable(db.Model):
     __tablename__ = 'receivables'
+    __table_args__ = (
+        db.Index('ix_receivables_user_due', 'user_id', 'due_date'),
+        db.Index('ix_receivables_user_status_due', 'user_id', 'status', 'due_date'),
+        db.Index('ix_receivables_client_due', 'client_id', 'due_date'),
+        db.Index('ix_receivables_parent_id', 'parent_id'),
+        db.Index('ix_receivables_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -79,10 +103,24 @@ class Receivable(db.Model):
     installment_number = db.Column(db.Integer)
     total_installments = db.Column(db.Integer)
     parent_id = db.Column(db.Integer, db.ForeignKey('installment_sales.id'))
+    series_id = db.Column(db.Integer, db.ForeignKey('account_series.id'), index=True)  # Agrupa parcelas/recorrências
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    @property
+    def effective_status(self):
+        """Status considerando o vencimento, sem depender da rotina de atraso"""
+        if self.status == 'pending' and self.due_date and self.due_date < date.today():
+            return 'overdue'
+        return self.status
+
 class Payable(db.Model):
     __tablename__ = 'payables'
+    __table_args__ = (
+        db.Index('ix_payables_user_due', 'user_id', 'due_date'),
+        db.Index('ix_payables_user_status_due', 'user_id', 'status', 'due_date'),
+        db.Index('ix_payables_supplier_due', 'supplier_id', 'due_date'),
+        db.Index('ix_payables_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -92,7 +130,51 @@ class Payable(db.Model):
     due_date = db.Column(db.Date, nullable=False)
     status = db.Column(db.String(20), default='pending')  # pending, paid, overdue, cancelled
     category = db.Column(db.String(50))
+    series_id = db.Column(db.Integer, db.ForeignKey('account_series.id'), index=True)  # Agrupa parcelas/recorrências
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def effective_status(self):
+        """Status considerando o vencimento, sem depender da rotina de atraso"""
+        if self.status == 'pending' and self.due_date and self.due_date < date.today():
+            return 'overdue'
+        return self.status
+
+class AccountSeries(db.Model):
+    """Conta cadastrada como um todo (simples, parcelada ou recorrente)"""
+    __tablename__ = 'account_series'
+    __table_args__ = (
+        db.Index('ix_account_series_user_kind_created', 'user_id', 'kind', 'created_at'),
+        db.Index('ix_account_series_next_due_date', 'next_due_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # receivable, payable
+    series_type = db.Column(db.String(20), default='simple')  # simple, installment, recurring
+    description = db.Column(db.String(200), nullable=False)  # Descrição base, sem "- Parcela X"
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id', ondelete='SET NULL'))
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id', ondelete='SET NULL'))
+    installment_sale_id = db.Column(db.Integer, db.ForeignKey('installment_sales.id', ondelete='SET NULL'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Regra das recorrências (ver recurrence.py); as ocorrências são geradas
+    # aos poucos, dentro de uma janela móvel
+    amount = db.Column(db.Numeric(10, 2))
+    category = db.Column(db.String(50))  # Apenas contas a pagar
+    start_date = db.Column(db.Date)
+    interval_months = db.Column(db.Integer, default=1)
+    occurrences = db.Column(db.Integer)  # Nulo = sem prazo
+    materialized_count = db.Column(db.Integer, default=0)
+    next_due_date = db.Column(db.Date)  # Próxima ocorrência ainda não gerada; nulo = encerrada
+    
+    # Relationships
+    # Ao remover o cliente/fornecedor/venda a série continua, sem vínculo
+    client = db.relationship('Client', lazy=True, backref=db.backref('account_series', lazy=True))
+    supplier = db.relationship('Supplier', lazy=True, backref=db.backref('account_series', lazy=True))
+    installment_sale = db.relationship('InstallmentSale', lazy=True, backref=db.backref('account_series', lazy=True))
+    receivables = db.relationship('Receivable', backref='series', lazy=True)
+    payables = db.relationship('Payable', backref='series', lazy=True)
 
 class Supplier(db.Model):
     __tablename__ = 'suppliers'
@@ -104,6 +186,7 @@ class Supplier(db.Model):
     email = db.Column(db.String(120))
     phone = db.Column(db.String(20))
     address = db.Column(db.Text)
+    search_key = db.Column(db.String(255))  # Nome/documento/telefone normalizados (ver party_search.py)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -111,6 +194,12 @@ class Supplier(db.Model):
 
 class InstallmentSale(db.Model):
     __tablename__ = 'installment_sales'
+    __table_args__ = (
+        db.Index('ix_installment_sales_user_status', 'user_id', 'status'),
+        db.Index('ix_installment_sales_user_created', 'user_id', 'created_at'),
+        db.Index('ix_installment_sales_client_created', 'client_id', 'created_at'),
+        db.Index('ix_installment_sales_token', 'confirmation_token'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -131,16 +220,30 @@ class InstallmentSale(db.Model):
 
 class WhatsAppMessage(db.Model):
     __tablename__ = 'whatsapp_messages'
+    __table_args__ = (
+        db.Index('ix_whatsapp_messages_user_created', 'user_id', 'created_at'),
+        db.Index('ix_whatsapp_messages_client_created', 'client_id', 'created_at'),
+        db.Index('ix_whatsapp_messages_status_next_attempt', 'status', 'next_attempt_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'))  # Nulo em mensagens do sistema (ex.: cadastro)
     message_type = db.Column(db.String(50), nullable=False)  # confirmation, reminder, approval, rejection
     content = db.Column(db.Text, nullable=False)
-    status = db.Column(db.String(20), default='pending')  # pending, sent, failed
+    status = db.Column(db.String(20), default='pending')  # pending, sending, sent, failed
     template_type = db.Column(db.String(50))
     sent_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Fila de envio (outbox)
+    phone = db.Column(db.String(20))  # Destino; se nulo, usa o WhatsApp do cliente
+    sender = db.Column(db.String(20), default='user')  # user (instância do usuário), admin (instância do sistema)
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text)
+    next_attempt_at = db.Column(db.DateTime)
+    locked_by = db.Column(db.String(64))
+    locked_until = db.Column(db.DateTime)
 
 class PaymentReminder(db.Model):
     __tablename__ = 'payment_reminders'
@@ -157,6 +260,9 @@ class PaymentReminder(db.Model):
 
 class UserPlan(db.Model):
     __tablename__ = 'user_plans'
+    __table_args__ = (
+        db.Index('ix_user_plans_expires_at', 'expires_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -168,6 +274,22 @@ class UserPlan(db.Model):
     expires_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class PlanTransition(db.Model):
+    """Histórico de mudanças de plano feitas pelas rotinas (ex.: expiração)"""
+    __tablename__ = 'plan_transitions'
+    __table_args__ = (
+        # Uma expiração gera uma única transição, mesmo com vários workers
+        db.UniqueConstraint('user_id', 'effective_at', name='uq_plan_transitions_user_effective'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    from_plan = db.Column(db.String(50))
+    to_plan = db.Column(db.String(50), nullable=False)
+    reason = db.Column(db.String(20), nullable=False)  # expired
+    effective_at = db.Column(db.DateTime, nullable=False)  # expires_at do plano anterior
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class AutoReminderConfig(db.Model):
     __tablename__ = 'auto_reminder_configs'
     
@@ -192,7 +314,40 @@ class AutoReminderConfig(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relacionamento
-    user = db.relationship('User', backref='reminder_config')
+    user = db.relationship('User', backref=db.backref('reminder_config', cascade='all, delete-orphan'))
+
+class ReminderLedger(db.Model):
+    """Lembretes automáticos já reservados/enviados; garante um envio por conta, tipo e dia"""
+    __tablename__ = 'reminder_ledger'
+    __table_args__ = (
+        db.UniqueConstraint('receivable_id', 'reminder_kind', 'offset_days',
+                            name='uq_reminder_ledger_receivable_kind_offset'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    receivable_id = db.Column(db.Integer, db.ForeignKey('receivables.id', ondelete='CASCADE'), nullable=False)
+    reminder_kind = db.Column(db.String(20), nullable=False)  # due, overdue
+    offset_days = db.Column(db.Integer, nullable=False)  # dias antes (due) ou após (overdue) o vencimento
+    status = db.Column(db.String(20), default='claimed')  # claimed, sent (falhas saem do ledger e são tentadas de novo)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+class ReminderSchedule(db.Model):
+    """Próximos lembretes automáticos, já calculados a partir da AutoReminderConfig do usuário"""
+    __tablename__ = 'reminder_schedule'
+    __table_args__ = (
+        db.UniqueConstraint('receivable_id', 'reminder_kind', 'offset_days',
+                            name='uq_reminder_schedule_receivable_kind_offset'),
+        db.Index('ix_reminder_schedule_fire_at', 'fire_at'),
+        db.Index('ix_reminder_schedule_user_id', 'user_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    receivable_id = db.Column(db.Integer, db.ForeignKey('receivables.id', ondelete='CASCADE'), nullable=False)
+    reminder_kind = db.Column(db.String(20), nullable=False)  # due, overdue
+    offset_days = db.Column(db.Integer, nullable=False)
+    fire_at = db.Column(db.DateTime, nullable=False)  # Horário local de envio
 
 class UserWhatsAppInstance(db.Model):
     __tablename__ = 'user_whatsapp_instances'
@@ -255,3 +410,92 @@ class PhoneConfirmationToken(db.Model):
     def is_expired(self):
         """Verificar se o token expirou"""
         return datetime.utcnow() > self.expires_at
+
+class SearchTerm(db.Model):
+    """Termos de busca de clientes/fornecedores (uma linha por palavra, sem acento, em minúsculas)"""
+    __tablename__ = 'search_terms'
+    __table_args__ = (
+        db.Index('ix_search_terms_lookup', 'user_id', 'kind', 'term'),
+        db.Index('ix_search_terms_party', 'kind', 'party_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # clients, suppliers
+    party_id = db.Column(db.Integer, nullable=False)  # clients.id ou suppliers.id
+    term = db.Column(db.String(64), nullable=False)
+
+class MonthlySummary(db.Model):
+    """Totais de contas por usuário, mês de vencimento, tipo e status (ver monthly_summary.py)"""
+    __tablename__ = 'monthly_summary'
+    __table_args__ = (
+        db.Index('ux_monthly_summary_key', 'user_id', 'kind', 'month', 'status', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # receivable, payable
+    month = db.Column(db.Date, nullable=False)  # Primeiro dia do mês de vencimento
+    status = db.Column(db.String(20), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class AIAnalysisCache(db.Model):
+    """Resultados das análises da IA por usuário, tipo e parâmetros (ver ai_cache.py)"""
+    __tablename__ = 'ai_analysis_cache'
+    __table_args__ = (
+        db.Index('ux_ai_analysis_cache_key', 'user_id', 'analysis', 'params_key', unique=True),
+        db.Index('ix_ai_analysis_cache_last_used_at', 'last_used_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    analysis = db.Column(db.String(50), nullable=False)  # cash_flow, client_risk, business_insights
+    params_key = db.Column(db.String(64), nullable=False)  # Hash dos parâmetros da análise
+    fingerprint = db.Column(db.String(64), nullable=False)  # Hash dos dados usados (ver data_fingerprint)
+    result = db.Column(db.Text, nullable=False)  # JSON devolvido pela IA
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class BackgroundJob(db.Model):
+    """Tarefas demoradas executadas fora da requisição (ver background_jobs.py)"""
+    __tablename__ = 'background_jobs'
+    __table_args__ = (
+        db.Index('ix_background_jobs_status_id', 'status', 'id'),
+        db.Index('ix_background_jobs_user_kind_status', 'user_id', 'kind', 'status'),
+        db.Index('ix_background_jobs_finished_at', 'finished_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(50), nullable=False)  # ai_report, ai_cash_flow, ...
+    params = db.Column(db.Text)  # JSON com os parâmetros da tarefa
+    params_key = db.Column(db.String(64), nullable=False)  # Hash dos parâmetros (evita tarefas repetidas)
+    status = db.Column(db.String(20), default='pending')  # pending, running, done, failed
+    progress = db.Column(db.Integer, default=0)  # 0 a 100
+    result = db.Column(db.Text)  # JSON devolvido pela tarefa
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, default=0)
+    locked_by = db.Column(db.String(64))
+    locked_until = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+class JobWatermark(db.Model):
+    """Marca d'água das rotinas em lote (última data processada por rotina)"""
+    __tablename__ = 'job_watermarks'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    last_run_on = db.Column(db.Date)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SchemaMigration(db.Model):
+    """Registro das migrações de esquema já aplicadas (ver migrations.py)"""
+    __tablename__ = 'schema_migrations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,215 @@
+"""
+Resumo mensal das contas (monthly_summary)
+Uma linha por usuário, tipo (receivable/payable), mês de vencimento e
+status, com a quantidade e a soma dos valores. Dashboard, IA e relatórios
+leem esses totais (algumas linhas por mês) em vez de agregar as contas.
+
+Inserções, edições (status, valor, vencimento) e exclusões pelo ORM
+atualizam o resumo via eventos do SQLAlchemy, na mesma transação.
+Operações em lote não disparam esses eventos: quem as usa chama
+add_to_summary() depois de um __table__.insert(), ou move_in_summary() /
+remove_from_summary() antes de um query.update() / query.delete().
+rebuild_monthly_summary() recalcula tudo a partir das contas.
+"""
+
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import event, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import get_history
+from app import db
+from models import Receivable, Payable, MonthlySummary
+from recurrence import add_months
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tipo -> modelo das contas
+SUMMARY_KINDS = {
+    'receivable': Receivable,
+    'payable': Payable,
+}
+
+OPEN_STATUSES = ('pending', 'overdue')
+
+# Atributos que mudam a linha do resumo em que a conta é somada
+TRACKED_ATTRS = ('status', 'amount', 'due_date')
+
+def month_of(due_date):
+    return due_date.replace(day=1)
+
+def _to_decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value or 0))
+
+def _new_deltas():
+    return defaultdict(lambda: [0, Decimal('0')])
+
+def _add(deltas, user_id, kind, due_date, status, count, amount):
+    delta = deltas[(user_id, kind, month_of(due_date), status or 'pending')]
+    delta[0] += count
+    delta[1] += _to_decimal(amount)
+
+def _apply(connection, deltas):
+    """Soma as diferenças nas linhas do resumo, criando as que faltarem"""
+    table = MonthlySummary.__table__
+    for (user_id, kind, month, status), (count, amount) in deltas.items():
+        if not count and not amount:
+            continue
+
+        key = (table.c.user_id == user_id, table.c.kind == kind, table.c.month == month, table.c.status == status)
+        increment = table.update().where(*key).values(count=table.c.count + count, amount=table.c.amount + amount)
+        if connection.execute(increment).rowcount or count < 0:
+            # Sem linha para subtrair (ex.: resumo já removido com o usuário): nada a fazer
+            continue
+
+        # Primeira conta do mês/status: outro processo pode criar a linha ao mesmo tempo
+        try:
+            with connection.begin_nested():
+                connection.execute(table.insert().values(user_id=user_id, kind=kind, month=month,
+                                                         status=status, count=count, amount=amount))
+        except IntegrityError:
+            connection.execute(increment)
+
+def _previous(target, attr):
+    history = get_history(target, attr)
+    return history.deleted[0] if history.deleted else getattr(target, attr)
+
+def _keep_previous(target, value, oldvalue, initiator):
+    return value
+
+def _register(kind, model):
+    # Carrega o valor antigo mesmo em objetos expirados (após commit), para
+    # que after_update saiba de qual linha do resumo subtrair
+    for attr in TRACKED_ATTRS:
+        event.listen(getattr(model, attr), 'set', _keep_previous, active_history=True, retval=True)
+
+    @event.listens_for(model, 'after_insert')
+    def _after_insert(mapper, connection, target):
+        deltas = _new_deltas()
+        _add(deltas, target.user_id, kind, target.due_date, target.status, 1, target.amount)
+        _apply(connection, deltas)
+
+    @event.listens_for(model, 'after_update')
+    def _after_update(mapper, connection, target):
+        if not any(get_history(target, attr).has_changes() for attr in TRACKED_ATTRS):
+            return
+        old = (_previous(target, 'due_date'), _previous(target, 'status'), _previous(target, 'amount'))
+        new = (target.due_date, target.status, target.amount)
+        deltas = _new_deltas()
+        _add(deltas, target.user_id, kind, old[0], old[1], -1, -_to_decimal(old[2]))
+        _add(deltas, target.user_id, kind, new[0], new[1], 1, new[2])
+        _apply(connection, deltas)
+
+    @event.listens_for(model, 'after_delete')
+    def _after_delete(mapper, connection, target):
+        deltas = _new_deltas()
+        _add(deltas, target.user_id, kind, target.due_date, target.status, -1, -_to_decimal(target.amount))
+        _apply(connection, deltas)
+
+for _kind, _model in SUMMARY_KINDS.items():
+    _register(_kind, _model)
+
+def _kind_of(model):
+    return 'receivable' if model is Receivable else 'payable'
+
+def _grouped(model, criteria):
+    """Contas que casam com os critérios, agrupadas por usuário, vencimento e status"""
+    return db.session.query(
+        model.user_id, model.due_date, model.status, func.count(model.id), func.coalesce(func.sum(model.amount), 0)
+    ).filter(*criteria).group_by(model.user_id, model.due_date, model.status)
+
+def add_to_summary(kind, rows):
+    """Soma ao resumo contas gravadas em lote (dicts com user_id, due_date, amount e status; sem commit)"""
+    deltas = _new_deltas()
+    for row in rows:
+        _add(deltas, row['user_id'], kind, row['due_date'], row.get('status'), 1, row['amount'])
+    _apply(db.session.connection(), deltas)
+
+def move_in_summary(model, criteria, status):
+    """Antes de um UPDATE em lote do status das contas que casam com os critérios (sem commit)"""
+    kind = _kind_of(model)
+    deltas = _new_deltas()
+    for user_id, due_date, old_status, count, amount in _grouped(model, criteria):
+        if old_status != status:
+            _add(deltas, user_id, kind, due_date, old_status, -count, -_to_decimal(amount))
+            _add(deltas, user_id, kind, due_date, status, count, amount)
+    _apply(db.session.connection(), deltas)
+
+def remove_from_summary(model, criteria):
+    """Antes de um DELETE em lote das contas que casam com os critérios (sem commit)"""
+    kind = _kind_of(model)
+    deltas = _new_deltas()
+    for user_id, due_date, status, count, amount in _grouped(model, criteria):
+        _add(deltas, user_id, kind, due_date, status, -count, -_to_decimal(amount))
+    _apply(db.session.connection(), deltas)
+
+def rebuild_monthly_summary(user_ids=None):
+    """
+    Recalcula o resumo a partir das contas (sem commit).
+
+    Um GROUP BY por tabela (usuário, vencimento, status), somado por mês
+    aqui e gravado com um INSERT de várias linhas. Retorna quantas linhas
+    o resumo passou a ter.
+    """
+    table = MonthlySummary.__table__
+    delete = table.delete()
+    if user_ids is not None:
+        delete = delete.where(table.c.user_id.in_(list(user_ids)))
+    db.session.execute(delete)
+
+    deltas = _new_deltas()
+    for kind, model in SUMMARY_KINDS.items():
+        criteria = [model.user_id.in_(list(user_ids))] if user_ids is not None else []
+        for user_id, due_date, status, count, amount in _grouped(model, criteria):
+            _add(deltas, user_id, kind, due_date, status, count, amount)
+
+    rows = [
+        {'user_id': user_id, 'kind': kind, 'month': month, 'status': status, 'count': count, 'amount': amount}
+        for (user_id, kind, month, status), (count, amount) in deltas.items()
+    ]
+    if rows:
+        db.session.execute(table.insert(), rows)
+    return len(rows)
+
+# Leitura
+def summary_rows(user_id, kind, start_month=None, end_month=None):
+    """[(mês, status, quantidade, soma)] do usuário, meses em [start_month, end_month)"""
+    query = db.session.query(
+        MonthlySummary.month, MonthlySummary.status, MonthlySummary.count, MonthlySummary.amount
+    ).filter(
+        MonthlySummary.user_id == user_id,
+        MonthlySummary.kind == kind,
+        MonthlySummary.count != 0
+    )
+    if start_month:
+        query = query.filter(MonthlySummary.month >= start_month)
+    if end_month:
+        query = query.filter(MonthlySummary.month < end_month)
+    return query.order_by(MonthlySummary.month).all()
+
+def status_totals(user_id, kind):
+    """{status: (quantidade, soma)} somando todos os meses"""
+    totals = {}
+    for _month, status, count, amount in summary_rows(user_id, kind):
+        previous_count, previous_amount = totals.get(status, (0, Decimal('0')))
+        totals[status] = (previous_count + count, previous_amount + _to_decimal(amount))
+    return totals
+
+def paid_by_month(user_id, months=12, today=None):
+    """
+    Recebido e pago por mês de vencimento nos últimos N meses (incluindo o atual).
+
+    {'2025-01': {'receitas': 0.0, 'gastos': 0.0}, ...}, só os meses com contas.
+    """
+    current = month_of(today or date.today())
+    start = add_months(current, -(months - 1))
+    end = add_months(current, 1)
+
+    monthly = {}
+    for kind, label in (('receivable', 'receitas'), ('payable', 'gastos')):
+        for month, status, _count, amount in summary_rows(user_id, kind, start, end):
+            entry = monthly.setdefault(month.strftime('%Y-%m'), {'receitas': 0, 'gastos': 0})
+            if status == 'paid':
+                entry[label] += float(amount)
+    return dict(sorted(monthly.items()))
@@ -0,0 +1,297 @@
+"""
+Busca de clientes e fornecedores (typeahead)
+Cada cadastro guarda em search_key o nome sem acentos e em minúsculas, mais
+os dígitos do documento e do telefone; search_terms tem uma linha por
+palavra desse texto, indexada por (user_id, kind, term). A busca por
+prefixo vira uma faixa nesse índice (term >= 'sil' AND term < 'sim'), sem
+varrer nem carregar a tabela de clientes.
+
+Os termos são mantidos por eventos do SQLAlchemy, na mesma transação da
+gravação do cadastro; rebuild_search_index() recalcula tudo.
+
+Com SEARCH_BACKEND=fulltext a busca usa o índice de texto do banco sobre
+search_key (FTS5 no SQLite, FULLTEXT no MySQL). Em outros bancos, ou se o
+índice não puder ser criado, a busca continua por prefixo.
+"""
+
+import re
+import unicodedata
+from flask import current_app
+from sqlalchemy import event, bindparam, text, Integer
+from sqlalchemy.orm.attributes import get_history
+from app import db
+from models import Client, Supplier, SearchTerm
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MAX_TERM_LENGTH = 64
+MAX_KEY_LENGTH = 255
+
+# Tipo de busca -> (modelo, atributo do telefone)
+SEARCH_TYPES = {
+    'clients': (Client, 'whatsapp'),
+    'suppliers': (Supplier, 'phone'),
+}
+
+# Índice de texto criado por setup_search_backend() (por processo)
+_fulltext_ready = False
+
+def normalize_text(value):
+    """'João da Silva-ME' -> 'joao da silva me'"""
+    folded = unicodedata.normalize('NFKD', value or '')
+    folded = ''.join(ch for ch in folded if not unicodedata.combining(ch))
+    return ' '.join(re.findall(r'[a-z0-9]+', folded.lower()))
+
+def only_digits(value):
+    return re.sub(r'\D', '', value or '')
+
+def phone_variants(phone):
+    """'5511987654321' -> com DDI, sem DDI e sem DDD, para achar como o usuário digitar"""
+    digits = only_digits(phone)
+    if not digits:
+        return []
+    variants = [digits]
+    if digits.startswith('55') and len(digits) >= 12:
+        variants += [digits[2:], digits[4:]]
+    return variants
+
+def search_words(name, document=None, phone=None):
+    """Palavras indexadas de um cadastro, sem repetição e na ordem"""
+    words = normalize_text(name).split()
+    document_digits = only_digits(document)
+    if document_digits:
+        words.append(document_digits)
+    words += phone_variants(phone)
+    return list(dict.fromkeys(word[:MAX_TERM_LENGTH] for word in words))
+
+def build_search_key(name, document=None, phone=None):
+    return ' '.join(search_words(name, document, phone))[:MAX_KEY_LENGTH]
+
+def query_terms(q):
+    """
+    Termos da busca digitada.
+
+    Só números e pontuação ('123.456.789-00', '(11) 98765-4321') viram um
+    único termo de dígitos; o resto é normalizado como os nomes.
+    """
+    q = (q or '').strip()
+    if re.fullmatch(r'[\d\s.\-/()+]+', q):
+        digits = only_digits(q)
+        return [digits[:MAX_TERM_LENGTH]] if digits else []
+    return [word[:MAX_TERM_LENGTH] for word in normalize_text(q).split()]
+
+def _prefix_upper_bound(term):
+    """Menor texto maior que todos os que começam com term ('sil' -> 'sim')"""
+    return term[:-1] + chr(ord(term[-1]) + 1)
+
+def _term_rows(search_type, party_id, user_id, search_key):
+    return [
+        {'user_id': user_id, 'kind': search_type, 'party_id': party_id, 'term': term}
+        for term in dict.fromkeys((search_key or '').split())
+    ]
+
+def _register(search_type, model, phone_attr):
+    terms = SearchTerm.__table__
+
+    def _delete_terms(connection, party_id):
+        connection.execute(terms.delete().where(terms.c.kind == search_type, terms.c.party_id == party_id))
+
+    def _insert_terms(connection, target):
+        rows = _term_rows(search_type, target.id, target.user_id, target.search_key)
+        if rows:
+            connection.execute(terms.insert(), rows)
+
+    @event.listens_for(model, 'before_insert')
+    @event.listens_for(model, 'before_update')
+    def _set_search_key(mapper, connection, target):
+        target.search_key = build_search_key(target.name, target.document, getattr(target, phone_attr))
+
+    @event.listens_for(model, 'after_insert')
+    def _after_insert(mapper, connection, target):
+        _insert_terms(connection, target)
+
+    @event.listens_for(model, 'after_update')
+    def _after_update(mapper, connection, target):
+        if get_history(target, 'search_key').has_changes():
+            _delete_terms(connection, target.id)
+            _insert_terms(connection, target)
+
+    @event.listens_for(model, 'after_delete')
+    def _after_delete(mapper, connection, target):
+        _delete_terms(connection, target.id)
+
+for _search_type, (_model, _phone_attr) in SEARCH_TYPES.items():
+    _register(_search_type, _model, _phone_attr)
+
+def add_search_terms(search_type, parties):
+    """Termos de cadastros gravados em lote, sem eventos do ORM: [(id, user_id, search_key)] (sem commit)"""
+    rows = []
+    for party_id, user_id, search_key in parties:
+        rows += _term_rows(search_type, party_id, user_id, search_key)
+    if rows:
+        db.session.execute(SearchTerm.__table__.insert(), rows)
+
+def rebuild_search_index(user_ids=None):
+    """
+    Recalcula search_key e search_terms a partir dos cadastros (sem commit).
+
+    Um UPDATE em lote por tabela e um INSERT de várias linhas para os termos.
+    Retorna quantos cadastros foram indexados.
+    """
+    terms = SearchTerm.__table__
+    total = 0
+
+    for search_type, (model, phone_attr) in SEARCH_TYPES.items():
+        query = db.session.query(model.id, model.user_id, model.name, model.document, getattr(model, phone_attr))
+        delete = terms.delete().where(terms.c.kind == search_type)
+        if user_ids is not None:
+            query = query.filter(model.user_id.in_(user_ids))
+            delete = delete.where(terms.c.user_id.in_(user_ids))
+
+        keys, parties = [], []
+        for party_id, user_id, name, document, phone in query:
+            search_key = build_search_key(name, document, phone)
+            keys.append({'party_id': party_id, 'search_key': search_key})
+            parties.append((party_id, user_id, search_key))
+
+        db.session.execute(delete)
+        if keys:
+            table = model.__table__
+            db.session.execute(
+                table.update().where(table.c.id == bindparam('party_id')).values(search_key=bindparam('search_key')),
+                keys
+            )
+        add_search_terms(search_type, parties)
+        total += len(keys)
+
+    return total
+
+def _fulltext_enabled():
+    return _fulltext_ready and current_app.config.get('SEARCH_BACKEND') == 'fulltext'
+
+def _fulltext_filter(query, model, search_terms):
+    """Filtro pelo índice de texto do banco (todas as palavras, por prefixo)"""
+    table = model.__tablename__
+    if db.engine.dialect.name == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in search_terms)
+        matching_ids = text(f"SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH :fts_match") \
+            .bindparams(fts_match=match).columns(rowid=Integer)
+        return query.filter(model.id.in_(matching_ids))
+
+    match = ' '.join(f'+{term}*' for term in search_terms)
+    return query.filter(text(f"MATCH ({table}.search_key) AGAINST (:fts_match IN BOOLEAN MODE)")
+                        .bindparams(fts_match=match))
+
+def _prefix_filter(query, model, user_id, search_type, search_terms):
+    """Cada termo precisa casar, por prefixo, com alguma palavra do cadastro"""
+    for term in search_terms:
+        matching_ids = db.session.query(SearchTerm.party_id).filter(
+            SearchTerm.user_id == user_id,
+            SearchTerm.kind == search_type,
+            SearchTerm.term >= term,
+            SearchTerm.term < _prefix_upper_bound(term)
+        )
+        query = query.filter(model.id.in_(matching_ids))
+    return query
+
+def search_parties(user_id, search_type, q, limit=DEFAULT_LIMIT, with_phone=False):
+    """
+    Clientes ou fornecedores do usuário que casam com q, em ordem de nome.
+
+    Busca por nome (qualquer palavra, sem acento), documento ou telefone.
+    with_phone restringe aos cadastros com WhatsApp/telefone.
+    """
+    model, phone_attr = SEARCH_TYPES[search_type]
+    search_terms = query_terms(q)
+    if not search_terms:
+        return []
+
+    query = model.query.filter(model.user_id == user_id)
+    if with_phone:
+        query = query.filter(getattr(model, phone_attr).isnot(None))
+
+    if _fulltext_enabled():
+        query = _fulltext_filter(query, model, search_terms)
+    else:
+        query = _prefix_filter(query, model, user_id, search_type, search_terms)
+
+    return query.order_by(model.name, model.id).limit(limit).all()
+
+def find_by_name(user_id, search_type, name):
+    """Cadastro cujo nome é igual ao informado, ignorando acentos, caixa e pontuação"""
+    wanted = normalize_text(name)
+    if not wanted:
+        return None
+    for party in search_parties(user_id, search_type, name, limit=MAX_LIMIT):
+        if normalize_text(party.name) == wanted:
+            return party
+    return None
+
+def party_result(party):
+    """Item da resposta de /api/search"""
+    _model, phone_attr = SEARCH_TYPES[party.__tablename__]
+    return {
+        'id': party.id,
+        'name': party.name,
+        'document': party.document,
+        'phone': getattr(party, phone_attr)
+    }
+
+def _setup_sqlite_fts(conn, table):
+    fts = f'{table}_fts'
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                          {'name': fts}).first()
+    if exists:
+        return
+
+    conn.execute(text(f"CREATE VIRTUAL TABLE {fts} USING fts5(search_key, content='{table}', content_rowid='id')"))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, search_key) VALUES (new.id, new.search_key);
+        END"""))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, search_key) VALUES ('delete', old.id, old.search_key);
+        END"""))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF search_key ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, search_key) VALUES ('delete', old.id, old.search_key);
+            INSERT INTO {fts}(rowid, search_key) VALUES (new.id, new.search_key);
+        END"""))
+    conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+    logger.info(f"Índice FTS5 {fts} criado")
+
+def setup_search_backend():
+    """
+    Prepara o índice de texto quando SEARCH_BACKEND=fulltext (idempotente).
+
+    Chamado na inicialização, depois das migrações. Se o banco não tiver
+    suporte, registra um aviso e a busca segue por prefixo.
+    """
+    global _fulltext_ready
+    _fulltext_ready = False
+    if current_app.config.get('SEARCH_BACKEND') != 'fulltext':
+        return
+
+    from migrations import create_fulltext_index
+
+    dialect = db.engine.dialect.name
+    try:
+        if dialect == 'sqlite':
+            with db.engine.begin() as conn:
+                for model, _phone_attr in SEARCH_TYPES.values():
+                    _setup_sqlite_fts(conn, model.__tablename__)
+        elif dialect in ('mysql', 'mariadb'):
+            for model, _phone_attr in SEARCH_TYPES.values():
+                create_fulltext_index(model.__tablename__, f'ft_{model.__tablename__}_search_key', 'search_key')
+        else:
+            logger.warning(f"SEARCH_BACKEND=fulltext não suportado em {dialect}; usando busca por prefixo")
+            return
+    except Exception as e:
+        logger.warning(f"Índice de texto indisponível ({str(e)}); usando busca por prefixo")
+        return
+
+    _fulltext_ready = True
@@ -0,0 +1,83 @@
+"""
+Ciclo de vida dos planos
+Planos vencidos voltam para o Gratuito em lote, pelo scheduler, em vez de
+serem alterados pelas rotas de leitura. Cada expiração fica registrada em
+plan_transitions.
+
+Entre o vencimento e a próxima execução da rotina as leituras já tratam
+o plano como Gratuito (ver effective_plan), sem gravar nada.
+"""
+
+from datetime import datetime
+from sqlalchemy import literal, select
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import UserPlan, PlanTransition
+import logging
+
+logger = logging.getLogger(__name__)
+
+def is_expired(user_plan, now=None):
+    return bool(user_plan and user_plan.expires_at and user_plan.expires_at < (now or datetime.utcnow()))
+
+def effective_plan(user_plan, now=None):
+    """Nome e limites em vigor do plano (Gratuito se não existe ou venceu)"""
+    from api.plans import PLANS
+    
+    if user_plan is None or is_expired(user_plan, now):
+        free = PLANS['Free']
+        return {
+            'plan_name': 'Free',
+            'max_clients': free['max_clients'],
+            'max_receivables': free['max_receivables'],
+            'max_payables': free['max_payables'],
+            'expires_at': None
+        }
+    return {
+        'plan_name': user_plan.plan_name,
+        'max_clients': user_plan.max_clients,
+        'max_receivables': user_plan.max_receivables,
+        'max_payables': user_plan.max_payables,
+        'expires_at': user_plan.expires_at
+    }
+
+def expire_plans(now=None):
+    """
+    Rebaixa para o Gratuito todos os planos vencidos até 'now'.
+
+    Um INSERT ... SELECT registra as transições e um único UPDATE altera
+    os planos, na mesma transação. Se outro worker já registrou as mesmas
+    expirações, a restrição única faz esta execução desistir sem alterar nada.
+    Retorna quantos planos foram rebaixados.
+    """
+    from api.plans import PLANS
+    
+    now = now or datetime.utcnow()
+    expired = (UserPlan.expires_at.isnot(None), UserPlan.expires_at < now)
+    free = PLANS['Free']
+    
+    try:
+        db.session.execute(PlanTransition.__table__.insert().from_select(
+            ['user_id', 'from_plan', 'to_plan', 'reason', 'effective_at', 'created_at'],
+            select(
+                UserPlan.user_id, UserPlan.plan_name, literal('Free'), literal('expired'),
+                UserPlan.expires_at, literal(now)
+            ).where(*expired)
+        ))
+
+        downgraded = UserPlan.query.filter(*expired).update({
+            UserPlan.plan_name: 'Free',
+            UserPlan.max_clients: free['max_clients'],
+            UserPlan.max_receivables: free['max_receivables'],
+            UserPlan.max_payables: free['max_payables'],
+            UserPlan.expires_at: None
+        }, synchronize_session=False)
+        db.session.commit()
+    except IntegrityError:
+        # Outro worker processou as mesmas expirações
+        db.session.rollback()
+        return 0
+
+    if downgraded:
+        logger.info(f"{downgraded} planos vencidos voltaram para o Gratuito")
+    return downgraded
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+Recalcula o resumo mensal das contas (monthly_summary) a partir das contas
+Uso: python rebuild_monthly_summary.py [user_id ...]
+Sem argumentos recalcula todos os usuários.
+"""
+import sys
+from app import app, db
+from monthly_summary import rebuild_monthly_summary
+
+def main():
+    user_ids = [int(arg) for arg in sys.argv[1:]] or None
+
+    with app.app_context():
+        rows = rebuild_monthly_summary(user_ids)
+        db.session.commit()
+
+    target = f"usuários {', '.join(map(str, user_ids))}" if user_ids else "todos os usuários"
+    print(f"✅ Resumo mensal recalculado ({target}): {rows} linhas")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Contas recorrentes como regra
+A série (account_series) guarda início, intervalo em meses, quantidade
+(ou nenhuma, sem prazo) e valor. Apenas as ocorrências dentro da janela
+RECURRENCE_HORIZON_DAYS viram linhas em receivables/payables; a rotina
+diária gera as seguintes conforme a janela avança, e as telas mostram as
+ocorrências futuras como previstas, calculadas na hora.
+"""
+
+import calendar
+from datetime import date, timedelta
+from flask import current_app
+from sqlalchemy.orm import joinedload
+from app import db
+from models import AccountSeries, Receivable, Payable
+from account_series import start_series
+from reminder_planner import plan_receivables
+import logging
+
+logger = logging.getLogger(__name__)
+
+RECURRENCE_JOB = 'recurrence_materialize'
+
+def add_months(start, months):
+    """Mesmo dia N meses depois (ou o último dia do mês: 31/01 + 1 -> 28/02)"""
+    month_index = start.month - 1 + months
+    year = start.year + month_index // 12
+    month = month_index % 12 + 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+def horizon(today=None):
+    """Última data cujas ocorrências já devem existir como linhas"""
+    days = current_app.config.get('RECURRENCE_HORIZON_DAYS', 90)
+    return (today or date.today()) + timedelta(days=days)
+
+def occurrence_date(series, index):
+    """Vencimento da ocorrência 'index' (a partir de 0) da série"""
+    return add_months(series.start_date, index * (series.interval_months or 1))
+
+def _occurrences(series, start_index, until):
+    index = start_index
+    while series.occurrences is None or index < series.occurrences:
+        due_date = occurrence_date(series, index)
+        if due_date > until:
+            break
+        yield index, due_date
+        index += 1
+
+def _build(series, index, due_date):
+    fields = {
+        'user_id': series.user_id,
+        'description': f"{series.description} - Mês {index + 1}",
+        'amount': series.amount,
+        'due_date': due_date,
+        'series_id': series.id
+    }
+    if series.kind == 'receivable':
+        return Receivable(client_id=series.client_id, type='recurring', **fields)
+    return Payable(supplier_id=series.supplier_id, category=series.category, **fields)
+
+def materialize_series(series, until):
+    """Gera as ocorrências da série até 'until' e avança next_due_date (sem commit)"""
+    rows = [_build(series, index, due_date)
+            for index, due_date in _occurrences(series, series.materialized_count or 0, until)]
+
+    if rows:
+        db.session.add_all(rows)
+        series.materialized_count = (series.materialized_count or 0) + len(rows)
+
+    if series.occurrences is not None and series.materialized_count >= series.occurrences:
+        series.next_due_date = None
+    else:
+        series.next_due_date = occurrence_date(series, series.materialized_count)
+
+    if rows and series.kind == 'receivable':
+        plan_receivables(rows)
+    return rows
+
+def create_recurring_series(user_id, kind, description, amount, start_date, occurrences=None,
+                            interval_months=1, client_id=None, supplier_id=None, category=None, today=None):
+    """
+    Cadastra uma conta recorrente e gera apenas as ocorrências da janela.
+
+    A primeira ocorrência é sempre gerada, mesmo que comece depois da janela.
+    Faz flush, mas não commit.
+    """
+    series = start_series(user_id, kind, description, 'recurring', client_id=client_id, supplier_id=supplier_id)
+    series.amount = amount
+    series.category = category
+    series.start_date = start_date
+    series.interval_months = interval_months
+    series.occurrences = occurrences
+    series.materialized_count = 0
+
+    materialize_series(series, max(horizon(today), start_date))
+    db.session.flush()
+    return series
+
+def stop_series(series):
+    """Encerra a recorrência: nenhuma ocorrência nova será gerada"""
+    series.occurrences = series.materialized_count or 0
+    series.next_due_date = None
+
+def materialize_due(today=None, batch_size=500):
+    """Gera as ocorrências que entraram na janela (em lotes por id)"""
+    until = horizon(today)
+    created = 0
+    last_id = 0
+
+    while True:
+        batch = AccountSeries.query.filter(
+            AccountSeries.next_due_date.isnot(None),
+            AccountSeries.next_due_date <= until,
+            AccountSeries.id > last_id
+        ).order_by(AccountSeries.id).limit(batch_size).all()
+        if not batch:
+            break
+
+        last_id = batch[-1].id
+        for series in batch:
+            created += len(materialize_series(series, until))
+        db.session.commit()
+
+    if created:
+        logger.info(f"{created} ocorrências de contas recorrentes geradas")
+    return created
+
+def run_daily_materialization(today=None):
+    """Avança a janela das recorrências uma vez por dia (marca d'água)"""
+    from tasks import claim_daily_run
+
+    today = today or date.today()
+    if not claim_daily_run(RECURRENCE_JOB, today):
+        return None
+    return materialize_due(today)
+
+def virtual_occurrences(user_id, kind, start, end):
+    """
+    Ocorrências previstas (ainda não geradas) com vencimento entre start e end.
+
+    Retorna dicionários ordenados por vencimento, para listas e projeções.
+    """
+    series_list = AccountSeries.query.options(
+        joinedload(AccountSeries.client if kind == 'receivable' else AccountSeries.supplier)
+    ).filter(
+        AccountSeries.user_id == user_id,
+        AccountSeries.kind == kind,
+        AccountSeries.next_due_date.isnot(None),
+        AccountSeries.next_due_date <= end
+    ).all()
+
+    projected = []
+    for series in series_list:
+        for index, due_date in _occurrences(series, series.materialized_count or 0, end):
+            if due_date < start:
+                continue
+            projected.append({
+                'series_id': series.id,
+                'description': f"{series.description} - Mês {index + 1}",
+                'amount': series.amount,
+                'due_date': due_date,
+                'category': series.category,
+                'client': series.client if kind == 'receivable' else None,
+                'supplier': series.supplier if kind == 'payable' else None
+            })
+
+    projected.sort(key=lambda item: item['due_date'])
+    return projected
@@ -0,0 +1,157 @@
+"""
+Planejamento dos lembretes automáticos
+Converte a AutoReminderConfig de cada usuário em horários de envio
+(reminder_schedule), recalculados quando uma conta a receber é criada ou
+editada e quando a configuração muda.
+"""
+
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from app import db
+from models import AutoReminderConfig, Receivable, ReminderSchedule
+
+# Valores usados quando o usuário não tem configuração salva
+DEFAULT_DAYS_BEFORE_DUE = [1, 3, 7]
+DEFAULT_DAYS_AFTER_DUE = [1, 3, 7, 15, 30]
+DEFAULT_PREFERRED_TIME = time(9, 0)
+
+UNPAID_STATUSES = ('pending', 'overdue')
+
+def parse_days(value):
+    """'1,3,7' -> [1, 3, 7] (ignora valores inválidos ou não positivos)"""
+    days = set()
+    for part in (value or '').split(','):
+        part = part.strip()
+        if part.isdigit() and int(part) > 0:
+            days.add(int(part))
+    return sorted(days)
+
+def parse_time(value):
+    """'09:30' -> time(9, 30); horário padrão se inválido"""
+    try:
+        hour, minute = (int(part) for part in (value or '').split(':'))
+        return time(hour, minute)
+    except ValueError:
+        return DEFAULT_PREFERRED_TIME
+
+@dataclass
+class ReminderPlan:
+    due_days: list = field(default_factory=lambda: list(DEFAULT_DAYS_BEFORE_DUE))
+    overdue_days: list = field(default_factory=lambda: list(DEFAULT_DAYS_AFTER_DUE))
+    preferred_time: time = DEFAULT_PREFERRED_TIME
+
+    @classmethod
+    def from_config(cls, config):
+        if config is None:
+            return cls()
+        if not config.is_active:
+            return cls(due_days=[], overdue_days=[])
+        return cls(
+            due_days=parse_days(config.days_before_due) if config.enable_due_reminders else [],
+            overdue_days=parse_days(config.days_after_due) if config.enable_overdue_reminders else [],
+            preferred_time=parse_time(config.preferred_time)
+        )
+
+    @property
+    def lookback_days(self):
+        """Quantos dias após o vencimento uma conta ainda pode receber lembrete"""
+        return max(self.overdue_days, default=0)
+
+    def fire_times(self, due_date, today):
+        """Lembretes (tipo, dias, horário) de um vencimento, a partir de hoje"""
+        for days in self.due_days:
+            fire_date = due_date - timedelta(days=days)
+            if fire_date >= today:
+                yield 'due', days, datetime.combine(fire_date, self.preferred_time)
+        for days in self.overdue_days:
+            fire_date = due_date + timedelta(days=days)
+            if fire_date >= today:
+                yield 'overdue', days, datetime.combine(fire_date, self.preferred_time)
+
+def plan_for_user(user_id):
+    return ReminderPlan.from_config(AutoReminderConfig.query.filter_by(user_id=user_id).first())
+
+def _insert_schedule(plans, receivables, today):
+    rows = []
+    for receivable in receivables:
+        if receivable.status not in UNPAID_STATUSES:
+            continue
+        plan = plans[receivable.user_id]
+        for kind, days, fire_at in plan.fire_times(receivable.due_date, today):
+            rows.append({
+                'user_id': receivable.user_id,
+                'receivable_id': receivable.id,
+                'reminder_kind': kind,
+                'offset_days': days,
+                'fire_at': fire_at
+            })
+    if rows:
+        db.session.execute(ReminderSchedule.__table__.insert(), rows)
+    return len(rows)
+
+def plan_receivables(receivables, today=None, new=False):
+    """
+    Recalcula os lembretes das contas informadas (novas ou editadas).
+
+    Faz flush para obter os ids, mas não faz commit: o chamador confirma a
+    transação junto com as contas. Com new=True (contas recém-inseridas)
+    não há agenda antiga a remover.
+    """
+    receivables = [r for r in receivables if r is not None]
+    if not receivables:
+        return 0
+
+    today = today or date.today()
+    db.session.flush()
+    if not new:
+        unplan_receivables([r.id for r in receivables])
+
+    plans = {user_id: plan_for_user(user_id) for user_id in {r.user_id for r in receivables}}
+    return _insert_schedule(plans, receivables, today)
+
+def unplan_receivables(receivable_ids):
+    if receivable_ids:
+        ReminderSchedule.query.filter(
+            ReminderSchedule.receivable_id.in_(list(receivable_ids))
+        ).delete(synchronize_session=False)
+
+def replan_user(user_id, today=None, batch_size=1000):
+    """Recalcula todos os lembretes de um usuário (após mudar a configuração)"""
+    today = today or date.today()
+    plan = plan_for_user(user_id)
+
+    ReminderSchedule.query.filter(
+        ReminderSchedule.user_id == user_id
+    ).delete(synchronize_session=False)
+
+    if not plan.due_days and not plan.overdue_days:
+        return 0
+
+    # Vencimentos antigos demais não geram mais nenhum lembrete
+    query = Receivable.query.filter(
+        Receivable.user_id == user_id,
+        Receivable.status.in_(UNPAID_STATUSES),
+        Receivable.due_date >= today - timedelta(days=plan.lookback_days)
+    ).order_by(Receivable.id)
+
+    planned = 0
+    last_id = 0
+    while True:
+        batch = query.filter(Receivable.id > last_id).limit(batch_size).all()
+        if not batch:
+            break
+        planned += _insert_schedule({user_id: plan}, batch, today)
+        last_id = batch[-1].id
+    return planned
+
+def backfill_schedule(today=None):
+    """Gera a agenda de todos os usuários com contas em aberto"""
+    planned = 0
+    user_ids = [row[0] for row in db.session.query(Receivable.user_id).filter(
+        Receivable.status.in_(UNPAID_STATUSES)
+    ).distinct().all()]
+
+    for user_id in user_ids:
+        planned += replan_user(user_id, today)
+        db.session.commit()
+    return planned
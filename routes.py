@@ -18,10 +18,9 @@ def login_required(f):
     return decorated_function
 
 def get_current_user():
-    """Get current user from session"""
-    if 'user_id' in session:
-        return User.query.get(session['user_id'])
-    return None
+    """Get current user from session (memoizado por requisição em utils)"""
+    from utils import get_current_user as current_user_for_request
+    return current_user_for_request()
 
 def admin_required(f):
     """Decorator to require admin privileges"""
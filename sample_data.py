@@ -1,6 +1,8 @@
 from app import db
 from models import (User, Client, Receivable, Payable, Supplier, InstallmentSale, 
                    PaymentReminder, UserPlan, UserWhatsAppInstance, SystemSettings)
+from account_series import start_series
+from reminder_planner import plan_receivables
 from datetime import datetime, timedelta, date, time
 import uuid
 
@@ -98,7 +100,7 @@ def create_sample_data():
     
     db.session.commit()
     
-    # Create sample receivables
+    # Create sample receivables (como no cadastro: com série e lembretes agendados)
     receivables_data = [
         {'client_idx': 0, 'description': 'Serviço de consultoria', 'amount': 1500.00, 'days_offset': 10, 'status': 'pending'},
         {'client_idx': 1, 'description': 'Venda de produto A', 'amount': 2500.00, 'days_offset': 5, 'status': 'pending'},
@@ -114,16 +116,22 @@ def create_sample_data():
         {'client_idx': 4, 'description': 'Consultoria paga', 'amount': 2200.00, 'days_offset': -15, 'status': 'paid'}
     ]
     
+    receivables = []
     for rec_data in receivables_data:
+        client_id = clients[rec_data['client_idx']].id
+        series = start_series(admin.id, 'receivable', rec_data['description'], client_id=client_id)
         receivable = Receivable(
             user_id=admin.id,
-            client_id=clients[rec_data['client_idx']].id,
+            client_id=client_id,
             description=rec_data['description'],
             amount=rec_data['amount'],
             due_date=date.today() + timedelta(days=rec_data['days_offset']),
-            status=rec_data['status']
+            status=rec_data['status'],
+            series_id=series.id
         )
         db.session.add(receivable)
+        receivables.append(receivable)
+    plan_receivables(receivables, new=True)
     
     # Create sample suppliers
     suppliers_data = [
@@ -158,14 +166,17 @@ def create_sample_data():
     ]
     
     for pay_data in payables_data:
+        supplier_id = suppliers[pay_data['supplier_idx']].id
+        series = start_series(admin.id, 'payable', pay_data['description'], supplier_id=supplier_id)
         payable = Payable(
             user_id=admin.id,
-            supplier_id=suppliers[pay_data['supplier_idx']].id,
+            supplier_id=supplier_id,
             description=pay_data['description'],
             amount=pay_data['amount'],
             due_date=date.today() + timedelta(days=pay_data['days_offset']),
             category=pay_data['category'],
-            status=pay_data['status']
+            status=pay_data['status'],
+            series_id=series.id
         )
         db.session.add(payable)
     
@@ -7,14 +7,21 @@ import threading
 import time
 from datetime import datetime, date, timedelta
 from app import db
-from models import Receivable, Payable, Client, User, UserPlan, AutoReminderConfig
-from utils import send_whatsapp_message
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from models import Receivable, Payable, Client, User, UserPlan, AutoReminderConfig, ReminderLedger, ReminderSchedule
+from reminder_planner import DEFAULT_DAYS_BEFORE_DUE
+from monthly_summary import move_in_summary
+from utils import get_evolution_target, post_whatsapp_text
+from whatsapp_dispatch import WhatsAppDispatcher, DispatchJob
 import logging
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+PAYABLE_REMINDER_JOB = 'payable_reminders'
+
 class ReminderScheduler:
     def __init__(self):
         self.running = False
@@ -39,90 +46,319 @@ class ReminderScheduler:
         """Loop principal do scheduler"""
         while self.running:
             try:
-                # Executa verificações a cada hora
-                self._check_due_reminders()
-                self._check_overdue_reminders()
+                # Varredura diária (marca d'água) e lembretes pendentes;
+                # o ledger evita reenvios, então o intervalo pode ser curto
+                self._run_overdue_sweep()
+                self._run_usage_repair()
+                self._run_plan_expiry()
+                self._run_recurrence()
+                self._run_job_cleanup()
+                self.run_reminders()
                 
-                # Aguarda 1 hora (3600 segundos)
-                time.sleep(3600)
+                time.sleep(self._interval())
                 
             except Exception as e:
                 logger.error(f"Erro no scheduler de lembretes: {str(e)}")
                 time.sleep(300)  # Aguarda 5 minutos antes de tentar novamente
                 
-    def _check_due_reminders(self):
-        """Verifica contas próximas do vencimento e envia lembretes"""
-        from app import app, db
+    def _interval(self):
+        from app import app
+        return app.config.get('REMINDER_INTERVAL_SECONDS', 300)
+    
+    def _run_overdue_sweep(self):
+        """Marca contas vencidas como 'overdue' uma vez por dia (marca d'água)"""
+        from app import app
+        from tasks import run_daily_overdue_sweep
+        
+        with app.app_context():
+            result = run_daily_overdue_sweep()
+            if not result['success']:
+                logger.error(f"Erro na rotina diária de contas em atraso: {result['error']}")
+    
+    def _run_usage_repair(self):
+        """Reconcilia os contadores de uso dos planos uma vez por dia"""
+        from app import app
+        from usage_counters import run_daily_usage_repair
         
         with app.app_context():
             try:
-                today = date.today()
-                
-                # Busca contas que vencem em 1, 3 e 7 dias
-                for days_ahead in [1, 3, 7]:
-                    due_date = today + timedelta(days=days_ahead)
-                    
-                    # Contas a receber
-                    receivables = db.session.query(Receivable, Client, User).join(
-                        Client, Receivable.client_id == Client.id
-                    ).join(
-                        User, Receivable.user_id == User.id
-                    ).filter(
-                        Receivable.due_date == due_date,
-                        Receivable.status == 'pending'
-                    ).all()
-                    
-                    for receivable, client, user in receivables:
-                        self._send_due_reminder(receivable, client, user, days_ahead)
-                        
-                    # Contas a pagar
-                    payables = db.session.query(Payable, User).join(
-                        User, Payable.user_id == User.id
-                    ).filter(
-                        Payable.due_date == due_date,
-                        Payable.status == 'pending'
-                    ).all()
-                    
-                    for payable, user in payables:
-                        self._send_payable_reminder(payable, user, days_ahead)
-                        
+                run_daily_usage_repair()
             except Exception as e:
-                logger.error(f"Erro ao verificar lembretes de vencimento: {str(e)}")
-            
-    def _check_overdue_reminders(self):
-        """Verifica contas em atraso e envia lembretes"""
-        from app import app, db
+                db.session.rollback()
+                logger.error(f"Erro ao reconciliar contadores de uso: {str(e)}")
+    
+    def _run_plan_expiry(self):
+        """Rebaixa os planos vencidos desde a última execução"""
+        from app import app
+        from plan_lifecycle import expire_plans
         
         with app.app_context():
             try:
-                today = date.today()
-                
-                # Contas a receber em atraso
-                overdue_receivables = db.session.query(Receivable, Client, User).join(
-                    Client, Receivable.client_id == Client.id
-                ).join(
-                    User, Receivable.user_id == User.id
-                ).filter(
-                    Receivable.due_date < today,
-                    Receivable.status.in_(['pending', 'overdue'])
-                ).all()
-                
-                for receivable, client, user in overdue_receivables:
-                    days_overdue = (today - receivable.due_date).days
-                    
-                    # Envia lembrete nos dias 1, 3, 7, 15 e 30 após vencimento
-                    if days_overdue in [1, 3, 7, 15, 30]:
-                        self._send_overdue_reminder(receivable, client, user, days_overdue)
-                        
+                expire_plans()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Erro ao expirar planos: {str(e)}")
+    
+    def _run_recurrence(self):
+        """Gera as ocorrências recorrentes que entraram na janela (uma vez por dia)"""
+        from app import app
+        from recurrence import run_daily_materialization
+        
+        with app.app_context():
+            try:
+                run_daily_materialization()
             except Exception as e:
-                logger.error(f"Erro ao verificar lembretes de atraso: {str(e)}")
+                db.session.rollback()
+                logger.error(f"Erro ao gerar contas recorrentes: {str(e)}")
+    
+    def _run_job_cleanup(self):
+        """Apaga as tarefas em segundo plano concluídas há mais tempo que a retenção"""
+        from app import app
+        from background_jobs import cleanup_jobs
+        
+        with app.app_context():
+            try:
+                removed = cleanup_jobs()
+                db.session.commit()
+                if removed:
+                    logger.info(f"{removed} tarefas em segundo plano antigas removidas")
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Erro ao limpar tarefas em segundo plano: {str(e)}")
+    
+    def run_reminders(self, send_func=None, now=None):
+        """
+        Envia os lembretes da agenda cujo horário chegou, pelo pipeline concorrente.
+        
+        Cada lembrete é reservado no reminder_ledger antes do envio (restrição
+        única por conta/tipo/dia), então rodar várias vezes ao dia ou em vários
+        workers não repete mensagens. Envios que falharam ou foram ignorados
+        saem do ledger e continuam na agenda: são tentados de novo nas
+        próximas execuções, até o fim do dia do lembrete. Retorna o
+        DispatchSummary da execução.
+        """
+        from app import app
+        
+        with app.app_context():
+            now = now or datetime.now()
+            dispatcher = WhatsAppDispatcher(
+                send_func or post_whatsapp_text,
+                workers=app.config.get('REMINDER_DISPATCH_WORKERS', 8),
+                queue_size=app.config.get('REMINDER_DISPATCH_QUEUE_SIZE', 200),
+                rate_per_instance=app.config.get('EVOLUTION_RATE_PER_SECOND', 5)
+            )
+            targets = {}
+            
+            candidates, schedule_ids = self._reminder_candidates(now)
+            claimed = self._claim(candidates)
+            skipped_ids = []
+            
+            with dispatcher:
+                for ledger_id, kind, offset_days, receivable, client, user in claimed:
+                    if kind == 'due':
+                        message = self._due_reminder_message(receivable, client, offset_days)
+                    else:
+                        message = self._overdue_reminder_message(receivable, client, offset_days)
+                    
+                    if not self._enqueue(dispatcher, targets, user, client, message,
+                                         (kind, receivable.id, client.name, receivable.description, ledger_id)):
+                        skipped_ids.append(ledger_id)
+            
+            self._check_payable_reminders(now.date())
+            
+            summary = dispatcher.summary
+            retry_ids = self._apply_results(summary, skipped_ids)
             
-    def _send_due_reminder(self, receivable, client, user, days_ahead):
-        """Envia lembrete de conta próxima do vencimento"""
+            # Sai da agenda o que foi enviado e o que não é mais elegível
+            eligible = {(receivable.id, kind, offset_days) for receivable, _c, _u, kind, offset_days in candidates}
+            done = {(receivable.id, kind, offset_days)
+                    for ledger_id, kind, offset_days, receivable, _c, _u in claimed if ledger_id not in retry_ids}
+            self._clear_schedule([schedule_id for key, schedule_id in schedule_ids.items()
+                                  if key in done or key not in eligible], now.date())
+            logger.info(f"Lembretes automáticos: {summary}")
+            return summary
+    
+    def _target_for(self, user_id, targets):
+        """Instância de envio do usuário, resolvida uma única vez por execução"""
+        if user_id not in targets:
+            targets[user_id] = get_evolution_target(user_id)
+        return targets[user_id]
+    
+    def _enqueue(self, dispatcher, targets, user, client, message, context):
+        """Coloca um lembrete na fila; retorna False se ele foi ignorado"""
         if not client.whatsapp:
-            return
+            dispatcher.skip()
+            return False
+        
+        target = self._target_for(user.id, targets)
+        if not target:
+            dispatcher.skip()
+            return False
+        
+        dispatcher.submit(DispatchJob(target, client.whatsapp, message, context))
+        return True
+    
+    def _reminder_candidates(self, now):
+        """
+        Lembretes da agenda com horário já atingido e ainda ausentes do ledger.
+        
+        Lê apenas reminder_schedule (índice em fire_at); as contas já pagas e
+        os lembretes de dias anteriores (sistema parado) são descartados.
+        Retorna os candidatos e os ids lidos da agenda, por (conta, tipo, dias).
+        """
+        today = now.date()
+        rows = db.session.query(ReminderSchedule, Receivable, Client, User).join(
+            Receivable, ReminderSchedule.receivable_id == Receivable.id
+        ).join(
+            Client, Receivable.client_id == Client.id
+        ).join(
+            User, Receivable.user_id == User.id
+        ).outerjoin(
+            ReminderLedger, and_(
+                ReminderLedger.receivable_id == ReminderSchedule.receivable_id,
+                ReminderLedger.reminder_kind == ReminderSchedule.reminder_kind,
+                ReminderLedger.offset_days == ReminderSchedule.offset_days
+            )
+        ).filter(
+            ReminderSchedule.fire_at <= now,
+            ReminderSchedule.fire_at >= datetime.combine(today, datetime.min.time()),
+            ReminderLedger.id.is_(None)
+        ).order_by(ReminderSchedule.fire_at).all()
+        
+        candidates = []
+        schedule_ids = {}
+        for entry, receivable, client, user in rows:
+            schedule_ids[(receivable.id, entry.reminder_kind, entry.offset_days)] = entry.id
+            if entry.reminder_kind == 'due':
+                eligible = receivable.status == 'pending' and receivable.due_date > today
+            else:
+                eligible = receivable.status in ('pending', 'overdue') and receivable.due_date < today
+            if eligible:
+                candidates.append((receivable, client, user, entry.reminder_kind, entry.offset_days))
+        
+        return candidates, schedule_ids
+    
+    def _clear_schedule(self, schedule_ids, today):
+        """Tira da agenda os lembretes concluídos e os de dias anteriores (perdidos ou de contas removidas)"""
+        try:
+            ReminderSchedule.query.filter(or_(
+                ReminderSchedule.id.in_(schedule_ids),
+                ReminderSchedule.fire_at < datetime.combine(today, datetime.min.time())
+            )).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao limpar agenda de lembretes: {str(e)}")
+    
+    def _claim(self, candidates):
+        """
+        Insere as entradas do ledger e devolve apenas os lembretes reservados.
+        
+        Se outro worker reservou algum lembrete ao mesmo tempo, a inserção em
+        lote falha na restrição única e os itens são reservados um a um.
+        """
+        if not candidates:
+            return []
+        
+        entries = [
+            ReminderLedger(receivable_id=receivable.id, reminder_kind=kind, offset_days=offset_days)
+            for receivable, client, user, kind, offset_days in candidates
+        ]
+        
+        try:
+            db.session.add_all(entries)
+            db.session.commit()
+            reserved = list(zip(entries, candidates))
+        except IntegrityError:
+            db.session.rollback()
+            reserved = []
+            for receivable, client, user, kind, offset_days in candidates:
+                entry = ReminderLedger(receivable_id=receivable.id, reminder_kind=kind, offset_days=offset_days)
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(entry)
+                    reserved.append((entry, (receivable, client, user, kind, offset_days)))
+                except IntegrityError:
+                    pass
+            db.session.commit()
+        
+        return [
+            (entry.id, kind, offset_days, receivable, client, user)
+            for entry, (receivable, client, user, kind, offset_days) in reserved
+        ]
+    
+    def _check_payable_reminders(self, today):
+        """Lembretes internos de contas a pagar, uma vez por dia"""
+        from tasks import claim_daily_run
+        
+        try:
+            if not claim_daily_run(PAYABLE_REMINDER_JOB, today):
+                return
+            
+            due_dates = {today + timedelta(days=days): days for days in DEFAULT_DAYS_BEFORE_DUE}
+            payables = db.session.query(Payable, User).join(
+                User, Payable.user_id == User.id
+            ).filter(
+                Payable.due_date.in_(list(due_dates)),
+                Payable.status == 'pending'
+            ).all()
             
-        message = f"""⏰ *LEMBRETE DE VENCIMENTO* ⏰
+            for payable, user in payables:
+                self._send_payable_reminder(payable, user, due_dates[payable.due_date])
+                
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao verificar lembretes de contas a pagar: {str(e)}")
+    
+    def _apply_results(self, summary, skipped_ids=()):
+        """
+        Registra o resultado no ledger e marca como 'overdue' as contas cobradas.
+        
+        As reservas dos envios que falharam ou foram ignorados são apagadas
+        para que o lembrete seja tentado de novo; retorna os ids apagados.
+        """
+        overdue_ids = []
+        sent_ids = []
+        failed_ids = []
+        
+        for result in summary.results:
+            kind, receivable_id, client_name, description, ledger_id = result.job.context
+            
+            if result.success:
+                logger.info(f"Lembrete {'de atraso' if kind == 'overdue' else 'de vencimento'} enviado: {client_name} - {description}")
+                sent_ids.append(ledger_id)
+                if kind == 'overdue':
+                    overdue_ids.append(receivable_id)
+            else:
+                logger.warning(f"Falha ao enviar lembrete: {client_name} - {result.job.phone}")
+                failed_ids.append(ledger_id)
+        
+        retry_ids = set(failed_ids) | set(skipped_ids)
+        try:
+            if sent_ids:
+                ReminderLedger.query.filter(ReminderLedger.id.in_(sent_ids)).update(
+                    {ReminderLedger.status: 'sent', ReminderLedger.sent_at: datetime.utcnow()},
+                    synchronize_session=False
+                )
+            if retry_ids:
+                ReminderLedger.query.filter(ReminderLedger.id.in_(list(retry_ids))).delete(
+                    synchronize_session=False)
+            
+            if overdue_ids:
+                newly_overdue = (Receivable.id.in_(overdue_ids), Receivable.status != 'overdue')
+                move_in_summary(Receivable, newly_overdue, 'overdue')
+                Receivable.query.filter(*newly_overdue).update(
+                    {Receivable.status: 'overdue'}, synchronize_session=False)
+            db.session.commit()
+            return retry_ids
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao registrar resultado dos lembretes: {str(e)}")
+            return set()
+            
+    def _due_reminder_message(self, receivable, client, days_ahead):
+        """Mensagem de lembrete de conta próxima do vencimento"""
+        return f"""⏰ *LEMBRETE DE VENCIMENTO* ⏰
 
 Olá {client.name}!
 
@@ -135,20 +371,10 @@ Sua conta vence em {days_ahead} dia{'s' if days_ahead > 1 else ''}:
 Para evitar juros, efetue o pagamento até a data de vencimento.
 
 Obrigado!"""
-
-        success = send_whatsapp_message(user.id, client.whatsapp, message)
-        
-        if success:
-            logger.info(f"Lembrete de vencimento enviado: {client.name} - {receivable.description}")
-        else:
-            logger.warning(f"Falha ao enviar lembrete: {client.name} - {client.whatsapp}")
-            
-    def _send_overdue_reminder(self, receivable, client, user, days_overdue):
-        """Envia lembrete de conta em atraso"""
-        if not client.whatsapp:
-            return
             
-        message = f"""🔴 *CONTA EM ATRASO* 🔴
+    def _overdue_reminder_message(self, receivable, client, days_overdue):
+        """Mensagem de lembrete de conta em atraso"""
+        return f"""🔴 *CONTA EM ATRASO* 🔴
 
 Olá {client.name}!
 
@@ -162,18 +388,6 @@ Temos uma conta em aberto em seu nome:
 Por favor, entre em contato urgentemente para regularização.
 
 Obrigado!"""
-
-        success = send_whatsapp_message(user.id, client.whatsapp, message)
-        
-        if success:
-            logger.info(f"Lembrete de atraso enviado: {client.name} - {receivable.description}")
-            
-            # Marcar como overdue se ainda não estiver
-            if receivable.status != 'overdue':
-                receivable.status = 'overdue'
-                db.session.commit()
-        else:
-            logger.warning(f"Falha ao enviar lembrete de atraso: {client.name} - {client.whatsapp}")
             
     def _send_payable_reminder(self, payable, user, days_ahead):
         """Envia lembrete interno de conta a pagar"""
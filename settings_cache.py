@@ -0,0 +1,77 @@
+"""
+Cache em memória das configurações do sistema (linha única de system_settings)
+
+Cada processo guarda uma cópia imutável da linha por SETTINGS_CACHE_TTL
+segundos. Quem altera as configurações chama invalidate_settings(), que
+limpa a cópia local e atualiza um arquivo-carimbo; os demais workers do
+gunicorn comparam o carimbo a cada leitura (um stat, sem consulta ao banco)
+e recarregam na hora.
+"""
+
+import os
+import threading
+import time
+from collections import namedtuple
+from flask import current_app
+from models import SystemSettings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Mesmos atributos do modelo, porém somente leitura
+SettingsSnapshot = namedtuple('SettingsSnapshot', [c.name for c in SystemSettings.__table__.columns])
+
+_lock = threading.Lock()
+_snapshot = None
+_loaded_at = 0.0
+_loaded_stamp = None
+_loaded = False
+
+def _stamp_path():
+    path = current_app.config.get('SETTINGS_STAMP_FILE')
+    return path or os.path.join(current_app.instance_path, 'settings.stamp')
+
+def _read_stamp():
+    try:
+        return os.stat(_stamp_path()).st_mtime_ns
+    except OSError:
+        return None
+
+def _load():
+    row = SystemSettings.query.first()
+    if row is None:
+        return None
+    return SettingsSnapshot(**{name: getattr(row, name) for name in SettingsSnapshot._fields})
+
+def get_settings():
+    """Configurações atuais (SettingsSnapshot) ou None se ainda não existem"""
+    global _snapshot, _loaded_at, _loaded_stamp, _loaded
+
+    ttl = current_app.config.get('SETTINGS_CACHE_TTL', 60)
+    stamp = _read_stamp()
+
+    with _lock:
+        if _loaded and stamp == _loaded_stamp and time.monotonic() - _loaded_at < ttl:
+            return _snapshot
+
+        _snapshot = _load()
+        _loaded_at = time.monotonic()
+        _loaded_stamp = stamp
+        _loaded = True
+        return _snapshot
+
+def invalidate_settings():
+    """Descarta o cache deste processo e avisa os demais (chamar após o commit)"""
+    global _loaded
+
+    with _lock:
+        _loaded = False
+
+    path = _stamp_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a'):
+            pass
+        os.utime(path, None)
+    except OSError as e:
+        logger.warning(f"Não foi possível atualizar o carimbo de configurações {path}: {e}")
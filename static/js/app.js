@@ -13,6 +13,7 @@ function initializeApp() {
     initializeToasts();
     initializeDataTables();
     initializeFormValidation();
+    initializePartyPickers();
     initializeTheme();
     initializeCharts();
     console.log('FinanceiroMax initialized successfully');
@@ -445,6 +446,96 @@ function validateCNPJ(cnpj) {
     return true;
 }
 
+// Seleção de cliente/fornecedor por busca (/api/search)
+// <input data-party-picker="clients|suppliers" data-target="id do hidden">
+// data-with-phone: só cadastros com WhatsApp/telefone
+// data-free-text: aceita o nome digitado sem escolher da lista
+function initializePartyPickers() {
+    document.querySelectorAll('[data-party-picker]').forEach(input => {
+        const hidden = document.getElementById(input.dataset.target);
+        const menu = document.createElement('div');
+        menu.className = 'dropdown-menu w-100';
+        menu.style.top = '100%';
+        menu.style.left = '0';
+        input.parentElement.appendChild(menu);
+
+        const requireSelection = () => {
+            const pending = input.required && !('freeText' in input.dataset) && input.value.trim() && !hidden.value;
+            input.setCustomValidity(pending ? 'Selecione um item da lista' : '');
+        };
+
+        const search = debounce(function() {
+            const query = input.value.trim();
+            if (query.length < 2) {
+                menu.classList.remove('show');
+                return;
+            }
+
+            const params = new URLSearchParams({ type: input.dataset.partyPicker, q: query });
+            if (input.dataset.withPhone) params.set('with_phone', '1');
+
+            fetch(`/api/search?${params}`)
+                .then(response => response.json())
+                .then(data => renderPartyResults(menu, data.results || [], (party) => {
+                    setPartyPickerValue(input, party.id, party.name);
+                    menu.classList.remove('show');
+                }))
+                .catch(error => console.error('Search failed:', error));
+        }, 250);
+
+        input.addEventListener('input', function() {
+            hidden.value = '';
+            requireSelection();
+            search();
+        });
+        input.addEventListener('blur', () => setTimeout(() => menu.classList.remove('show'), 200));
+    });
+}
+
+function renderPartyResults(menu, results, onSelect) {
+    menu.innerHTML = '';
+    if (results.length === 0) {
+        menu.innerHTML = '<span class="dropdown-item-text text-muted">Nenhum resultado encontrado</span>';
+    }
+
+    results.forEach(party => {
+        const item = document.createElement('button');
+        item.type = 'button';
+        item.className = 'dropdown-item';
+        item.textContent = party.name;
+
+        const details = [party.document, party.phone].filter(Boolean).join(' · ');
+        if (details) {
+            const small = document.createElement('small');
+            small.className = 'text-muted ms-2';
+            small.textContent = details;
+            item.appendChild(small);
+        }
+
+        item.addEventListener('mousedown', (e) => {
+            e.preventDefault();
+            onSelect(party);
+        });
+        menu.appendChild(item);
+    });
+    menu.classList.add('show');
+}
+
+function setPartyPickerValue(input, id, name) {
+    input.value = name || '';
+    document.getElementById(input.dataset.target).value = id || '';
+    input.setCustomValidity('');
+    input.classList.remove('is-invalid');
+}
+
+function debounce(func, wait) {
+    let timeout;
+    return function(...args) {
+        clearTimeout(timeout);
+        timeout = setTimeout(() => func.apply(this, args), wait);
+    };
+}
+
 // Theme Management
 function initializeTheme() {
     const themeToggle = document.getElementById('theme-toggle');
@@ -574,5 +665,6 @@ window.FinanceiroMax = {
     formatDocument,
     validateCPF,
     validateCNPJ,
+    setPartyPickerValue,
     makeRequest
 };
@@ -1,36 +1,33 @@
-from datetime import date
+from datetime import date, datetime
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 from app import db
-from models import Receivable, Payable
+from models import Receivable, Payable, JobWatermark
+from monthly_summary import move_in_summary
 import logging
 
-def update_overdue_status():
+OVERDUE_SWEEP_JOB = 'overdue_sweep'
+
+def update_overdue_status(today=None):
     """
     Atualiza automaticamente o status de contas vencidas para 'overdue'
+    
+    Executa um único UPDATE em lote por tabela, sem carregar as contas no ORM.
     """
-    today = date.today()
+    today = today or date.today()
     
     try:
         # Atualizar contas a receber em atraso
-        overdue_receivables = Receivable.query.filter(
-            Receivable.status == 'pending',
-            Receivable.due_date < today
-        ).all()
-        
-        receivables_count = 0
-        for receivable in overdue_receivables:
-            receivable.status = 'overdue'
-            receivables_count += 1
+        overdue = (Receivable.status == 'pending', Receivable.due_date < today)
+        move_in_summary(Receivable, overdue, 'overdue')
+        receivables_count = Receivable.query.filter(*overdue).update(
+            {Receivable.status: 'overdue'}, synchronize_session=False)
         
         # Atualizar contas a pagar em atraso
-        overdue_payables = Payable.query.filter(
-            Payable.status == 'pending',
-            Payable.due_date < today
-        ).all()
-        
-        payables_count = 0
-        for payable in overdue_payables:
-            payable.status = 'overdue'
-            payables_count += 1
+        overdue = (Payable.status == 'pending', Payable.due_date < today)
+        move_in_summary(Payable, overdue, 'overdue')
+        payables_count = Payable.query.filter(*overdue).update(
+            {Payable.status: 'overdue'}, synchronize_session=False)
         
         db.session.commit()
         
@@ -51,6 +48,69 @@ def update_overdue_status():
             'error': str(e)
         }
 
+def claim_daily_run(job_name, today=None):
+    """
+    Reserva a execução diária de uma rotina usando a marca d'água.
+    
+    Retorna True apenas para o primeiro processo que reivindicar o dia;
+    execuções seguintes no mesmo dia (ou em outros workers) retornam False.
+    """
+    today = today or date.today()
+    
+    try:
+        if not JobWatermark.query.filter_by(name=job_name).first():
+            db.session.add(JobWatermark(name=job_name))
+            db.session.commit()
+    except IntegrityError:
+        # Outro worker criou a marca d'água ao mesmo tempo
+        db.session.rollback()
+    
+    claimed = JobWatermark.query.filter(
+        JobWatermark.name == job_name,
+        or_(JobWatermark.last_run_on.is_(None), JobWatermark.last_run_on < today)
+    ).update({
+        JobWatermark.last_run_on: today,
+        JobWatermark.updated_at: datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    
+    return claimed == 1
+
+def run_daily_overdue_sweep(today=None):
+    """
+    Executa a virada de status para 'overdue' uma vez por dia.
+    
+    Idempotente: chamadas repetidas no mesmo dia não tocam nas tabelas.
+    """
+    today = today or date.today()
+    
+    try:
+        if not claim_daily_run(OVERDUE_SWEEP_JOB, today):
+            return {
+                'success': True,
+                'skipped': True,
+                'receivables_updated': 0,
+                'payables_updated': 0
+            }
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Erro ao reservar rotina de contas em atraso: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+    
+    result = update_overdue_status(today)
+    if not result['success']:
+        # Liberar o dia para que a próxima execução tente novamente
+        JobWatermark.query.filter_by(name=OVERDUE_SWEEP_JOB).update(
+            {JobWatermark.last_run_on: None}, synchronize_session=False
+        )
+        db.session.commit()
+    
+    result['skipped'] = False
+    return result
+
 def check_due_soon():
     """
     Retorna contas que vencem nos próximos 3 dias
@@ -0,0 +1,170 @@
+"""
+Teste das séries de contas: agrupamento das contas antigas e remoção de usuário, cliente e venda com
+chaves estrangeiras ativas
+"""
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from app import app, db
+from models import (User, Client, Supplier, Receivable, Payable, InstallmentSale, AccountSeries,
+                    AutoReminderConfig, ReminderLedger, ReminderSchedule, PlanTransition, SearchTerm, MonthlySummary,
+                    AIAnalysisCache, BackgroundJob)
+from account_series import backfill_series, start_series
+from ai_cache import cache_store
+from background_jobs import enqueue_job
+from reminder_planner import plan_receivables
+
+@contextmanager
+def foreign_keys():
+    """Ativa PRAGMA foreign_keys no SQLite (como InnoDB/PostgreSQL fazem sempre)"""
+    db.session.commit()
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql('PRAGMA foreign_keys=ON')
+    try:
+        yield
+    finally:
+        db.session.rollback()
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql('PRAGMA foreign_keys=OFF')
+
+def test_admin_deletes_user_with_all_related_rows(make_user, logged_client):
+    with app.app_context():
+        admin_id = make_user(is_admin=True).id
+        user = make_user()
+        user_id = user.id
+        client = Client(user_id=user_id, name='Cliente Removido')
+        supplier = Supplier(user_id=user_id, name='Fornecedor Removido')
+        db.session.add_all([client, supplier])
+        db.session.flush()
+
+        series = start_series(user_id, 'receivable', 'Consultoria', client_id=client.id)
+        receivable = Receivable(user_id=user_id, client_id=client.id, description='Consultoria', amount=100,
+                                due_date=date.today(), series_id=series.id)
+        payable_series = start_series(user_id, 'payable', 'Aluguel', supplier_id=supplier.id)
+        db.session.add_all([receivable, Payable(user_id=user_id, supplier_id=supplier.id, description='Aluguel',
+                                                amount=50, due_date=date.today(), series_id=payable_series.id)])
+        db.session.flush()
+        plan_receivables([receivable], new=True)
+        db.session.add(AutoReminderConfig(user_id=user_id))
+        db.session.add(ReminderLedger(receivable_id=receivable.id, reminder_kind='due', offset_days=1))
+        db.session.add(PlanTransition(user_id=user_id, from_plan='Premium', to_plan='Free', reason='expired',
+                                      effective_at=datetime.utcnow()))
+        cache_store(user_id, 'cash_flow', {'months_ahead': 3}, 'fp', {'resumo': 'ok'})
+        enqueue_job(user_id, 'ai_report', {'months_ahead': 3})
+        db.session.commit()
+
+        assert SearchTerm.query.filter_by(user_id=user_id).count() > 0
+        assert MonthlySummary.query.filter_by(user_id=user_id).count() > 0
+        assert ReminderSchedule.query.filter_by(user_id=user_id).count() > 0
+
+        with foreign_keys():
+            response = logged_client(admin_id).post(f'/admin/users/{user_id}/delete')
+            assert response.status_code == 302
+
+        assert db.session.get(User, user_id) is None
+        for model in (Client, Supplier, Receivable, Payable, AccountSeries, AutoReminderConfig, ReminderSchedule,
+                      PlanTransition, SearchTerm, MonthlySummary, AIAnalysisCache, BackgroundJob):
+            assert model.query.filter_by(user_id=user_id).count() == 0, model.__tablename__
+        assert ReminderLedger.query.filter_by(receivable_id=receivable.id).count() == 0
+
+def test_series_survive_supplier_and_sale_removal(make_user, logged_client):
+    with app.app_context():
+        user = make_user()
+        user_id = user.id
+        client = Client(user_id=user_id, name='Cliente Venda')
+        supplier = Supplier(user_id=user_id, name='Fornecedor Antigo')
+        db.session.add_all([client, supplier])
+        db.session.flush()
+        sale = InstallmentSale(user_id=user_id, client_id=client.id, description='Venda', total_amount=300,
+                               installments=3)
+        db.session.add(sale)
+        db.session.flush()
+        sale_id = sale.id
+        sale_series_id = start_series(user_id, 'receivable', 'Venda', 'installment', client_id=client.id,
+                                      installment_sale_id=sale_id).id
+        supplier_series_id = start_series(user_id, 'payable', 'Compra', supplier_id=supplier.id).id
+        db.session.commit()
+
+        with foreign_keys():
+            db.session.delete(supplier)
+            db.session.commit()
+            response = logged_client(user_id).post(f'/sales/delete/{sale_id}')
+            assert response.status_code == 302
+
+        assert db.session.get(InstallmentSale, sale_id) is None
+        assert db.session.get(AccountSeries, sale_series_id).installment_sale_id is None
+        assert db.session.get(AccountSeries, supplier_series_id).supplier_id is None
+
+def test_sample_data_has_series_and_reminders():
+    with app.app_context():
+        admin = User.query.filter_by(username='joel').one()
+        assert Receivable.query.filter_by(user_id=admin.id, series_id=None).count() == 0
+        assert Payable.query.filter_by(user_id=admin.id, series_id=None).count() == 0
+        assert ReminderSchedule.query.filter_by(user_id=admin.id).count() > 0
+
+def test_backfill_groups_legacy_accounts(make_user, make_client):
+    with app.app_context():
+        user_id = make_user().id
+        other_id = make_user().id
+        client_a = make_client(user_id, 'Cliente A').id
+        client_b = make_client(user_id, 'Cliente B').id
+        other_client = make_client(other_id).id
+        supplier = Supplier(user_id=user_id, name='Fornecedor')
+        db.session.add(supplier)
+        db.session.flush()
+        sale = InstallmentSale(user_id=user_id, client_id=client_a, description='Venda', total_amount=200,
+                               installments=2)
+        db.session.add(sale)
+        db.session.flush()
+
+        def receivable(description, client_id=client_a, owner_id=user_id, parent_id=None):
+            row = Receivable(user_id=owner_id, client_id=client_id, description=description, amount=10,
+                             due_date=date.today(), parent_id=parent_id)
+            db.session.add(row)
+            return row
+
+        carne = [receivable(f'Carnê - Parcela {n}/3') for n in (1, 2, 3)]
+        # Mesma descrição base, mas outro cliente ou outro usuário: séries separadas
+        carne_b = receivable('Carnê - Parcela 1/3', client_id=client_b)
+        carne_other = receivable('Carnê - Parcela 1/3', client_id=other_client, owner_id=other_id)
+        mensal = [receivable(f'Academia - Mês {n}') for n in (1, 2)]
+        # Parcelas da venda agrupadas pela venda, mesmo com descrições diferentes
+        sale_rows = [receivable('Venda - Parcela 1/2', parent_id=sale.id), receivable('Entrada', parent_id=sale.id)]
+        avulsas = [receivable('Consultoria'), receivable('Consultoria')]
+        aluguel = [Payable(user_id=user_id, supplier_id=supplier.id, description=f'Aluguel - Mês {n}', amount=50,
+                           due_date=date.today()) for n in (1, 2)]
+        luz = Payable(user_id=user_id, description='Luz', amount=20, due_date=date.today())
+        db.session.add_all(aluguel + [luz])
+        db.session.commit()
+
+        assert backfill_series(batch_size=2) >= 9
+
+        def series(rows):
+            return {db.session.get(type(row), row.id).series for row in rows}
+
+        (carne_series,) = series(carne)
+        assert (carne_series.series_type, carne_series.description, carne_series.client_id) == \
+            ('installment', 'Carnê', client_a)
+        assert len(series([carne[0], carne_b, carne_other])) == 3
+        assert db.session.get(Receivable, carne_other.id).series.user_id == other_id
+
+        (mensal_series,) = series(mensal)
+        assert (mensal_series.series_type, mensal_series.description) == ('recurring', 'Academia')
+
+        (sale_series,) = series(sale_rows)
+        assert (sale_series.series_type, sale_series.installment_sale_id) == ('installment', sale.id)
+
+        assert len(series(avulsas)) == 2
+        assert {item.series_type for item in series(avulsas)} == {'simple'}
+
+        (aluguel_series,) = series(aluguel)
+        assert (aluguel_series.kind, aluguel_series.series_type, aluguel_series.supplier_id) == \
+            ('payable', 'recurring', supplier.id)
+        assert db.session.get(Payable, luz.id).series.series_type == 'simple'
+
+        # Nada mais sem série; uma segunda execução não cria séries para o usuário
+        assert Receivable.query.filter_by(user_id=user_id, series_id=None).count() == 0
+        before = AccountSeries.query.filter_by(user_id=user_id).count()
+        assert before == 8
+        backfill_series()
+        assert AccountSeries.query.filter_by(user_id=user_id).count() == before
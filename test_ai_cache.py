@@ -0,0 +1,89 @@
+"""
+Teste do cache das análises da IA (impressão digital dos dados, validade e LRU)
+"""
+from datetime import date, datetime, timedelta
+
+from app import app, db
+from models import Receivable, AIAnalysisCache
+from ai_cache import cached_analysis, data_fingerprint
+
+class FakeAnalysis:
+    """Conta as chamadas que iriam para a API"""
+    def __init__(self, result=None):
+        self.calls = 0
+        self.result = result
+
+    def __call__(self):
+        self.calls += 1
+        return dict(self.result or {'resumo': f'análise {self.calls}'})
+
+def test_hit_until_data_changes_or_refresh(make_user, make_client):
+    with app.app_context():
+        user_id = make_user().id
+        client_id = make_client(user_id, 'Cliente IA').id
+        analysis = FakeAnalysis()
+
+        first = cached_analysis(user_id, 'business_insights', {}, analysis)
+        second = cached_analysis(user_id, 'business_insights', {}, analysis)
+        assert analysis.calls == 1
+        assert first['em_cache'] is False and second['em_cache'] is True
+        assert second['resumo'] == 'análise 1' and second['gerado_em'] == first['gerado_em']
+
+        # Outros parâmetros são outra entrada
+        cached_analysis(user_id, 'cash_flow', {'months_ahead': 6}, analysis)
+        assert analysis.calls == 2
+
+        # Nova conta ou pagamento mudam a impressão digital
+        fingerprint = data_fingerprint(user_id)
+        receivable = Receivable(user_id=user_id, client_id=client_id, description='X', amount=10,
+                                due_date=date.today())
+        db.session.add(receivable)
+        db.session.commit()
+        assert data_fingerprint(user_id) != fingerprint
+        assert cached_analysis(user_id, 'business_insights', {}, analysis)['resumo'] == 'análise 3'
+
+        receivable.status = 'paid'
+        db.session.commit()
+        cached_analysis(user_id, 'business_insights', {}, analysis)
+        assert analysis.calls == 4
+
+        assert cached_analysis(user_id, 'business_insights', {}, analysis, refresh=True)['em_cache'] is False
+        assert analysis.calls == 5
+        assert AIAnalysisCache.query.filter_by(user_id=user_id, analysis='business_insights').count() == 1
+
+def test_errors_are_not_cached_and_ttl_expires(make_user):
+    with app.app_context():
+        user_id = make_user().id
+        failing = FakeAnalysis({'error': 'timeout'})
+        cached_analysis(user_id, 'client_risk', {}, failing)
+        cached_analysis(user_id, 'client_risk', {}, failing)
+        assert failing.calls == 2
+        assert AIAnalysisCache.query.filter_by(user_id=user_id).count() == 0
+
+        analysis = FakeAnalysis()
+        cached_analysis(user_id, 'client_risk', {}, analysis)
+        entry = AIAnalysisCache.query.filter_by(user_id=user_id).one()
+        entry.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        assert cached_analysis(user_id, 'client_risk', {}, analysis)['em_cache'] is False
+        assert analysis.calls == 2
+
+def test_least_recently_used_entries_are_evicted(make_user):
+    with app.app_context():
+        user_id = make_user().id
+        analysis = FakeAnalysis()
+        AIAnalysisCache.query.delete()
+        db.session.commit()
+
+        app.config['AI_CACHE_MAX_ENTRIES'] = 2
+        try:
+            cached_analysis(user_id, 'cash_flow', {'months_ahead': 3}, analysis)
+            cached_analysis(user_id, 'cash_flow', {'months_ahead': 6}, analysis)
+            cached_analysis(user_id, 'cash_flow', {'months_ahead': 3}, analysis)  # uso recente
+            cached_analysis(user_id, 'cash_flow', {'months_ahead': 12}, analysis)
+        finally:
+            app.config['AI_CACHE_MAX_ENTRIES'] = 5000
+
+        assert AIAnalysisCache.query.count() == 2
+        assert cached_analysis(user_id, 'cash_flow', {'months_ahead': 3}, analysis)['em_cache'] is True
+        assert cached_analysis(user_id, 'cash_flow', {'months_ahead': 6}, analysis)['em_cache'] is False
@@ -0,0 +1,85 @@
+"""
+Teste do relatório completo da IA (chamadas em paralelo, tempo limite e resultado parcial)
+"""
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from app import app
+from ai_insights import ANALYSES, FinancialAI
+
+SYSTEM_PROMPTS = {system_prompt: analysis for analysis, (system_prompt, *_rest) in ANALYSES.items()}
+
+class FakeCompletions:
+    """Responde cada análise depois de `delays[análise]` segundos; 'falha' levanta erro"""
+    def __init__(self, delays):
+        self.delays = delays
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def create(self, messages, timeout, **kwargs):
+        analysis = SYSTEM_PROMPTS[messages[0]['content']]
+        with self.lock:
+            self.calls.append((analysis, timeout))
+        delay = self.delays.get(analysis, 0)
+        if delay == 'falha':
+            raise RuntimeError('serviço indisponível')
+        time.sleep(delay)
+        message = SimpleNamespace(content=json.dumps({'resumo': analysis}))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+def make_ai(delays):
+    ai = FinancialAI()
+    ai.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(delays)))
+    return ai
+
+def test_report_latency_is_the_slowest_call(make_user, make_client):
+    with app.app_context():
+        user_id = make_user().id
+        make_client(user_id, 'Cliente Relatório')
+        ai = make_ai({'cash_flow': 0.3, 'client_risk': 0.3, 'business_insights': 0.3})
+
+        started = time.monotonic()
+        report = ai.generate_report(user_id)
+        elapsed = time.monotonic() - started
+
+        assert elapsed < 0.6  # em série seriam 0,9s
+        assert {analysis: result['resumo'] for analysis, result in report.items()} == \
+            {analysis: analysis for analysis in ANALYSES}
+        assert all(timeout == app.config['AI_REQUEST_TIMEOUT'] for _analysis, timeout in ai.client.chat.completions.calls)
+
+        # Segunda geração sai toda do cache, sem chamadas à API
+        again = ai.generate_report(user_id)
+        assert len(ai.client.chat.completions.calls) == 3
+        assert all(result['em_cache'] for result in again.values())
+
+        ai.generate_report(user_id, refresh=True)
+        assert len(ai.client.chat.completions.calls) == 6
+
+def test_failed_and_slow_analyses_do_not_block_the_report(make_user, make_client):
+    with app.app_context():
+        user_id = make_user().id
+        make_client(user_id, 'Cliente Relatório')
+        ai = make_ai({'cash_flow': 'falha', 'client_risk': 2, 'business_insights': 0})
+
+        app.config['AI_REQUEST_TIMEOUT'] = 0.3
+        try:
+            started = time.monotonic()
+            report = ai.generate_report(user_id)
+            elapsed = time.monotonic() - started
+        finally:
+            app.config['AI_REQUEST_TIMEOUT'] = 45
+
+        assert elapsed < 1
+        # Falhou só o texto da IA: os números do modelo local continuam
+        assert report['cash_flow']['aviso'].startswith('Erro ao gerar predição')
+        assert len(report['cash_flow']['predicao_mensal']) == 3
+        assert 'Tempo esgotado' in report['client_risk']['error']
+        assert report['business_insights']['resumo'] == 'business_insights'
+
+        # Só a análise que deu certo foi guardada; as outras são tentadas de novo
+        ai.client.chat.completions.delays = {}
+        report = ai.generate_report(user_id)
+        assert report['business_insights']['em_cache'] is True
+        assert report['cash_flow']['em_cache'] is False and report['client_risk']['em_cache'] is False
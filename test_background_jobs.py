@@ -0,0 +1,130 @@
+"""
+Teste das tarefas em segundo plano (fila, reserva, progresso, limpeza e endpoints)
+"""
+import runpy
+import threading
+from datetime import datetime, timedelta
+
+from app import app, db
+from models import BackgroundJob
+import background_jobs
+from background_jobs import (register_job, enqueue_job, claim_job, process_jobs, cleanup_jobs,
+                             LEASE_SECONDS)
+
+@register_job('test_echo')
+def _echo_job(user_id, params, progress):
+    progress(50)
+    if params.get('fail'):
+        raise RuntimeError('falhou de propósito')
+    return {'user_id': user_id, 'valor': params.get('valor'), 'texto': 'ação'}
+
+def clear_queue():
+    BackgroundJob.query.delete()
+    db.session.commit()
+
+def test_jobs_run_in_worker_and_repeat_requests_share_a_job(make_user):
+    with app.app_context():
+        clear_queue()
+        user_id = make_user().id
+
+        job = enqueue_job(user_id, 'test_echo', {'valor': 1})
+        assert job.status == 'pending' and job.progress == 0
+        assert enqueue_job(user_id, 'test_echo', {'valor': 1}).id == job.id
+        other = enqueue_job(user_id, 'test_echo', {'valor': 2, 'fail': True})
+        assert other.id != job.id
+
+        assert process_jobs() == 2
+        job = db.session.get(BackgroundJob, job.id)
+        assert job.status == 'done' and job.progress == 100 and job.attempts == 1
+        assert '"valor": 1' in job.result and job.finished_at is not None and job.locked_by is None
+
+        other = db.session.get(BackgroundJob, other.id)
+        assert other.status == 'failed' and other.error == 'falhou de propósito' and other.progress == 50
+
+        # Terminada, a mesma tarefa pode ser pedida de novo
+        assert enqueue_job(user_id, 'test_echo', {'valor': 1}).id != job.id
+
+        try:
+            enqueue_job(user_id, 'inexistente')
+            assert False, 'tipo desconhecido deveria falhar'
+        except ValueError:
+            pass
+
+def test_inline_mode_and_abandoned_jobs(make_user):
+    with app.app_context():
+        clear_queue()
+        user_id = make_user().id
+
+        app.config['BACKGROUND_JOBS_ENABLED'] = False
+        try:
+            job = enqueue_job(user_id, 'test_echo', {'valor': 3})
+        finally:
+            app.config['BACKGROUND_JOBS_ENABLED'] = True
+        assert job.status == 'done' and process_jobs() == 0
+
+        job = enqueue_job(user_id, 'test_echo', {'valor': 4})
+        claimed = claim_job()
+        assert claimed.id == job.id and claimed.status == 'running'
+        assert claim_job() is None  # reservada para o primeiro worker
+
+        # Worker caiu: a reserva vence e outro worker retoma a tarefa
+        later = datetime.utcnow() + timedelta(seconds=LEASE_SECONDS + 1)
+        assert process_jobs(now=later) == 1
+        job = db.session.get(BackgroundJob, job.id)
+        assert job.status == 'done' and job.attempts == 2
+
+def test_cleanup_removes_only_old_finished_jobs(make_user):
+    with app.app_context():
+        clear_queue()
+        user_id = make_user().id
+        old_id = enqueue_job(user_id, 'test_echo', {'valor': 5}).id
+        process_jobs()
+        pending_id = enqueue_job(user_id, 'test_echo', {'valor': 6}).id
+
+        assert cleanup_jobs() == 0
+        assert cleanup_jobs(now=datetime.utcnow() + timedelta(hours=25)) == 1
+        db.session.commit()
+        assert db.session.get(BackgroundJob, old_id) is None
+        assert db.session.get(BackgroundJob, pending_id) is not None
+
+def test_ai_endpoint_returns_job_and_status_is_per_user(make_user, logged_client):
+    with app.app_context():
+        clear_queue()
+        user_id = make_user(premium=True).id
+        stranger_id = make_user().id
+
+    client = logged_client(user_id)
+    response = client.get('/ai_insights/cash_flow_prediction?months=6')
+    assert response.status_code == 202
+    data = response.get_json()
+    assert data['status'] == 'pending' and data['status_url'] == f"/jobs/{data['id']}"
+
+    with app.app_context():
+        job = db.session.get(BackgroundJob, data['id'])
+        assert job.kind == 'ai_cash_flow' and '"months_ahead": 6' in job.params
+        process_jobs()
+
+    status = client.get(data['status_url']).get_json()
+    # Sem IA configurada no teste: previsão do modelo estatístico local
+    assert status['status'] == 'done' and len(status['result']['predicao_mensal']) == 6
+
+    assert logged_client(stranger_id).get(data['status_url']).status_code == 404
+
+def test_script_mode_worker_sees_registered_jobs(monkeypatch):
+    """python background_jobs.py: o worker roda no módulo importado, com as tarefas da IA registradas"""
+    started = {}
+
+    def fake_start(workers=1):
+        started['handlers'] = dict(background_jobs.JOB_HANDLERS)
+
+    monkeypatch.setattr(background_jobs.job_worker, 'start', fake_start)
+    # Nenhuma thread de verdade, mesmo se o script iniciar outro worker
+    monkeypatch.setattr(threading.Thread, 'start', lambda self: None)
+    monkeypatch.setattr(threading.Thread, 'join', lambda self, timeout=None: None)
+    namespace = runpy.run_path(background_jobs.__file__, run_name='__main__')
+
+    assert 'handlers' in started
+    for kind in ('ai_cash_flow', 'ai_client_risk', 'ai_business_insights', 'ai_report'):
+        assert kind in started['handlers']
+    # O registro do script em si continua vazio: por isso o worker não pode rodar nele
+    assert namespace['JOB_HANDLERS'] == {}
@@ -0,0 +1,133 @@
+"""
+Teste da importação em lote (CSV) de clientes e contas
+"""
+import io
+import random
+
+from app import app, db
+from models import Client, Supplier, Receivable, Payable, SearchTerm, ReminderSchedule, AccountSeries
+from bulk_import import valid_documents, normalize_phones, import_csv
+from party_search import search_parties
+from utils import validate_cpf, validate_cnpj, format_phone
+
+def csv_file(text):
+    return io.BytesIO(text.encode('utf-8'))
+
+def test_vectorised_validation_matches_utils():
+    rng = random.Random(7)
+    documents = ['', '11111111111', '00000000000000', '123']
+    documents += [''.join(rng.choice('0123456789') for _ in range(11)) for _ in range(3000)]
+    documents += [''.join(rng.choice('0123456789') for _ in range(14)) for _ in range(3000)]
+    documents += ['52998224725', '11222333000181']
+
+    expected = [not d or (validate_cpf(d) if len(d) == 11 else validate_cnpj(d) if len(d) == 14 else False)
+                for d in documents]
+    assert valid_documents(documents) == expected
+    assert expected[-2:] == [True, True]
+
+    phones = ['', '11987654321', '1133334444', '5511987654321', '0187654321', '11887654321', '123']
+    assert normalize_phones(phones) == ['', '5511987654321', '551133334444', '5511987654321', None, None, None]
+    assert normalize_phones(['11987654321'])[0] == format_phone('11987654321')
+
+def test_import_clients_dedupes_and_reports_errors(make_user):
+    with app.app_context():
+        user = make_user(premium=True)
+        db.session.add(Client(user_id=user.id, name='Já Existe', document='529.982.247-25'))
+        db.session.commit()
+
+        result = import_csv(user, 'clients', csv_file(
+            'Nome;CPF/CNPJ;WhatsApp;Email\n'
+            'Maria Souza;11.222.333/0001-81;(11) 98765-4321;maria@x.com\n'
+            'Outro Nome;529.982.247-25;;\n'           # documento já cadastrado
+            'Maria Souza;11222333000181;;\n'          # repetida no arquivo
+            'Documento Ruim;123.456.789-00;;\n'
+            'Telefone Ruim;;12345;\n'
+            ';;;\n'
+            'Sem Nome? Não;;;\n'
+            "'=Fórmula;;;\n"
+        ), chunk_rows=3)
+
+        assert (result.imported, result.duplicates, result.error_count) == (3, 2, 2)
+        assert [error['line'] for error in result.errors] == [5, 6]
+        assert 'CPF/CNPJ inválido' in result.errors[0]['message']
+
+        maria = Client.query.filter_by(user_id=user.id, name='Maria Souza').one()
+        assert maria.whatsapp == '5511987654321' and maria.document == '11222333000181'
+        assert [c.name for c in search_parties(user.id, 'clients', 'souza')] == ['Maria Souza']
+        assert SearchTerm.query.filter_by(kind='clients', party_id=maria.id).count() > 0
+        assert Client.query.filter_by(user_id=user.id, name='=Fórmula').count() == 1
+
+def test_import_accounts_with_plan_limit(make_user):
+    with app.app_context():
+        user = make_user()
+        client = Client(user_id=user.id, name='José Lima', document='52998224725')
+        db.session.add_all([client, Supplier(user_id=user.id, name='Energia SA')])
+        db.session.commit()
+
+        rows = ''.join(f'José Lima;Parcela {i};1.234,56;10/0{1 + i % 9}/2030;Pendente\n' for i in range(25))
+        result = import_csv(user, 'receivables', csv_file(
+            'Cliente,Descrição,Valor,Vencimento,Status\n'.replace(',', ';') +
+            'Desconhecido;Teste;10;01/01/2030;\n' +
+            rows
+        ))
+        # Plano gratuito: 20 contas a receber
+        assert result.imported == 20
+        assert result.errors[0] == {'line': 2, 'message': 'Cliente não encontrado: Desconhecido'}
+        assert sum('Limite' in e['message'] for e in result.errors) == 5
+
+        receivable = Receivable.query.filter_by(user_id=user.id, description='Parcela 0').one()
+        assert float(receivable.amount) == 1234.56 and receivable.series_id
+        assert ReminderSchedule.query.filter_by(receivable_id=receivable.id).count() > 0
+
+        # Mesmo arquivo de novo: tudo duplicado, nada novo
+        again = import_csv(user, 'receivables', csv_file('Cliente;Descrição;Valor;Vencimento\n' + rows[:200]))
+        assert again.imported == 0 and again.duplicates > 0
+
+        payables = import_csv(user, 'payables', csv_file(
+            'description,amount,due_date,supplier,category\n'
+            'Luz,80.50,2030-01-10,Energia SA,Contas\n'
+            'Água,abc,2030-01-10,,\n'
+            'Internet,99.90,2030-01-10,Operadora X,\n'
+        ))
+        assert payables.imported == 1 and payables.error_count == 2
+        assert Payable.query.filter_by(user_id=user.id, description='Luz').one().supplier_id is not None
+
+def test_import_without_returning_links_generated_ids(make_user):
+    with app.app_context():
+        user = make_user(premium=True)
+        db.session.add(Client(user_id=user.id, name='Cliente Antigo'))
+        db.session.commit()
+
+        # Como no MySQL: INSERT sem RETURNING, ids lidos depois
+        dialect = db.engine.dialect
+        dialect.insert_executemany_returning_sort_by_parameter_order = False
+        try:
+            clients = import_csv(user, 'clients', csv_file('Nome;WhatsApp\nBruna Alves;11987654321\nCaio Reis;\n'))
+            receivables = import_csv(user, 'receivables', csv_file(
+                'Cliente;Descrição;Valor;Vencimento\nBruna Alves;Aula 1;50;10/01/2030\nCaio Reis;Aula 2;60;11/01/2030\n'
+            ))
+        finally:
+            del dialect.insert_executemany_returning_sort_by_parameter_order
+
+        assert clients.imported == 2 and receivables.imported == 2
+        assert [c.name for c in search_parties(user.id, 'clients', 'caio')] == ['Caio Reis']
+        for receivable in Receivable.query.filter_by(user_id=user.id):
+            series = db.session.get(AccountSeries, receivable.series_id)
+            assert series.description == receivable.description and series.client_id == receivable.client_id
+            assert ReminderSchedule.query.filter_by(receivable_id=receivable.id).count() > 0
+
+def test_import_endpoint(make_user, logged_client):
+    with app.app_context():
+        user_id = make_user(premium=True).id
+
+    with logged_client(user_id) as client:
+        response = client.post('/import/clients?format=json',
+                               data={'file': (csv_file('Nome;WhatsApp\nAna;11987654321\n'), 'c.csv')})
+        assert response.get_json()['imported'] == 1
+
+        response = client.post('/import/clients', data={'file': (csv_file('Nome;WhatsApp\nAna;11987654321\n'), 'c.csv')})
+        assert response.status_code == 200 and 'Já cadastrados' in response.get_data(as_text=True)
+
+        response = client.post('/import/receivables?format=json', data={'file': (csv_file('Valor\n10\n'), 'r.csv')})
+        assert response.status_code == 400
+        assert client.post('/import/receivables', data={}).status_code == 302
@@ -0,0 +1,91 @@
+"""
+Teste da previsão estatística de fluxo de caixa (backtest em séries sintéticas e previsão pelo banco)
+"""
+import time
+from datetime import date
+
+import numpy as np
+
+from app import app, db
+from models import Receivable, Payable
+from cash_flow_forecast import forecast_series, forecast_cash_flow
+from ai_insights import FinancialAI
+from recurrence import add_months
+
+HOLDOUT = 6
+TODAY = date(2025, 7, 10)
+
+def holdout_mape(series):
+    """Erro percentual médio prevendo os últimos HOLDOUT meses só com o histórico anterior"""
+    train, actual = series[:-HOLDOUT], series[-HOLDOUT:]
+    forecast, model, _error = forecast_series(train, HOLDOUT)
+    return float(np.mean(np.abs(forecast - actual) / actual)), model
+
+def seasonal_series(months, rng):
+    t = np.arange(months)
+    return 10000 + 3000 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 200, months)
+
+def test_backtest_accuracy_on_synthetic_series():
+    rng = np.random.default_rng(42)
+
+    seasonal = seasonal_series(36, rng)
+    mape, model = holdout_mape(seasonal)
+    assert model == 'sazonal' and mape < 0.05
+    # Bem melhor que repetir a média do histórico
+    baseline = float(np.mean(np.abs(seasonal[:-HOLDOUT].mean() - seasonal[-HOLDOUT:]) / seasonal[-HOLDOUT:]))
+    assert mape < baseline / 3
+
+    trend = 5000 + 250 * np.arange(24) + rng.normal(0, 100, 24)
+    mape, model = holdout_mape(trend)
+    assert model == 'tendencia' and mape < 0.03
+
+    level = 8000 + rng.normal(0, 300, 24)
+    mape, model = holdout_mape(level)
+    assert model in ('suavizacao', 'tendencia') and mape < 0.06
+
+    # Histórico curto: média; previsão nunca negativa
+    forecast, model, error = forecast_series([100, 200], 3)
+    assert model == 'media' and error is None and list(forecast) == [150, 150, 150]
+    forecast, _model, _error = forecast_series([900, 700, 500, 300, 100], 3)
+    assert (forecast >= 0).all() and forecast[-1] == 0
+
+def test_forecast_takes_milliseconds():
+    series = seasonal_series(24, np.random.default_rng(7))
+    started = time.perf_counter()
+    for _ in range(20):
+        forecast_series(series, 12)
+    assert (time.perf_counter() - started) / 20 < 0.02
+
+def test_forecast_from_database_with_scheduled_floor(make_user, make_client):
+    with app.app_context():
+        user = make_user()
+        client = make_client(user.id, 'Cliente Previsão')
+
+        # 24 meses pagos: receitas sazonais e gastos fixos
+        revenue = seasonal_series(24, np.random.default_rng(1))
+        for offset in range(24):
+            due_date = add_months(TODAY.replace(day=15), offset - 24)
+            db.session.add(Receivable(user_id=user.id, client_id=client.id, description=f'R{offset}',
+                                      amount=round(float(revenue[offset]), 2), due_date=due_date, status='paid'))
+            db.session.add(Payable(user_id=user.id, description=f'P{offset}', amount=4000,
+                                   due_date=due_date, status='paid'))
+        # Venda grande já agendada para o mês que vem
+        db.session.add(Receivable(user_id=user.id, client_id=client.id, description='Contrato', amount=50000,
+                                  due_date=date(2025, 8, 20), status='pending'))
+        db.session.commit()
+
+        result = forecast_cash_flow(user.id, 3, today=TODAY)
+        months = result['predicao_mensal']
+        assert [m['mes'] for m in months] == ['2025-07', '2025-08', '2025-09']
+        assert result['metodo']['receitas'].startswith('sazonal') and result['metodo']['meses_historico'] == 24
+
+        # Julho: o mesmo mês do ano anterior; agosto: o agendado é o piso
+        assert abs(months[0]['receita_prevista'] - round(float(revenue[12]), 2)) < 0.01
+        assert months[1]['receita_prevista'] == 50000 and result['melhor_mes_cobranca'] == '2025-08'
+        assert all(abs(m['gastos_previstos'] - 4000) < 1 for m in months)
+        assert all(m['saldo_previsto'] == round(m['receita_prevista'] - m['gastos_previstos'], 2) for m in months)
+        assert result['probabilidade_inadimplencia'] == 0 and result['resumo']
+
+        # Sem IA configurada, a predição sai do modelo local
+        prediction = FinancialAI().get_cash_flow_prediction(user.id, 3)
+        assert 'error' not in prediction and len(prediction['predicao_mensal']) == 3
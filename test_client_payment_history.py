@@ -0,0 +1,78 @@
+"""
+Teste do histórico de pagamentos por cliente da análise de risco (consulta única)
+"""
+from datetime import date, timedelta
+from sqlalchemy import event
+
+from app import app, db
+from models import Client, Receivable
+from ai_insights import client_payment_history
+
+TODAY = date(2025, 6, 15)
+
+def make_data(make_user):
+    user_id = make_user().id
+    busy = Client(user_id=user_id, name='Cliente Antigo')
+    empty = Client(user_id=user_id, name='Cliente Sem Contas')
+    db.session.add_all([busy, empty])
+    db.session.flush()
+
+    # 15 contas, duas no mesmo vencimento: as 3 mais recentes sem pagar
+    for month in range(14):
+        status = 'paid' if month < 11 else 'overdue'
+        db.session.add(Receivable(user_id=user_id, client_id=busy.id, description=f'M{month}', amount=100 + month,
+                                  due_date=date(2024, 5, 10) + timedelta(days=30 * month), status=status))
+    db.session.add(Receivable(user_id=user_id, client_id=busy.id, description='Mesmo dia', amount=7,
+                              due_date=date(2024, 5, 10) + timedelta(days=30 * 13), status='pending'))
+
+    # Outro usuário não entra na conta
+    other_id = make_user().id
+    other = Client(user_id=other_id, name='Outro')
+    db.session.add(other)
+    db.session.flush()
+    db.session.add(Receivable(user_id=other_id, client_id=other.id, description='X', amount=999,
+                              due_date=TODAY, status='paid'))
+    db.session.commit()
+    return user_id
+
+def count_queries(func):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        result = func()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return result, len(statements)
+
+def test_recent_history_and_totals_in_one_query(make_user):
+    with app.app_context():
+        user_id = make_data(make_user)
+
+        clients, queries = count_queries(lambda: client_payment_history(user_id, today=TODAY, use_window=True))
+        assert queries == 1
+
+        busy, empty = clients
+        assert [c['nome'] for c in clients] == ['Cliente Antigo', 'Cliente Sem Contas']
+        assert empty['historico_pagamentos'] == [] and empty['total_negociado'] == 0 and empty['score_pagamento'] == 0
+
+        history = busy['historico_pagamentos']
+        assert len(history) == 10
+        # As mais recentes primeiro (antes saíam as 10 mais antigas), empate pelo id
+        assert [h['valor'] for h in history] == [7.0, 113.0, 112.0, 111.0, 110.0, 109.0, 108.0, 107.0, 106.0, 105.0]
+        assert history[0]['dias_atraso'] == (TODAY - date.fromisoformat(history[0]['vencimento'])).days
+        assert history[-1]['status'] == 'paid' and history[-1]['dias_atraso'] == 0
+
+        # Totais sobre todas as 15 contas, não só as 10 enviadas
+        assert busy['total_negociado'] == sum(100 + m for m in range(14)) + 7
+        assert busy['total_pago'] == sum(100 + m for m in range(11))
+        assert busy['contas_em_atraso'] == 3
+        assert round(busy['score_pagamento'], 4) == round(busy['total_pago'] / busy['total_negociado'] * 100, 4)
+
+def test_fallback_without_window_functions_matches(make_user):
+    with app.app_context():
+        user_id = make_data(make_user)
+        window = client_payment_history(user_id, history_size=4, today=TODAY, use_window=True)
+        fallback = client_payment_history(user_id, history_size=4, today=TODAY, use_window=False)
+        assert fallback == window
+        assert len(window[0]['historico_pagamentos']) == 4
@@ -0,0 +1,114 @@
+"""
+Teste das métricas do dashboard: totais do GROUP BY (status, vencida) contra a contagem conta a conta
+"""
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlalchemy import func
+
+from app import app, db
+from models import Client, Receivable, Payable, InstallmentSale
+from dashboard_metrics import get_dashboard_metrics
+
+TODAY = date(2031, 4, 15)
+
+def per_row_totals(model, user_id):
+    """Os contadores do dashboard calculados como antes, percorrendo as contas uma a uma"""
+    totals = {'total': 0, 'pending': 0, 'overdue': 0, 'paid': 0,
+              'pending_amount': Decimal('0'), 'overdue_amount': Decimal('0'), 'month_amount': Decimal('0')}
+    for account in model.query.filter_by(user_id=user_id).all():
+        amount = Decimal(str(account.amount))
+        totals['total'] += 1
+        if account.status == 'paid':
+            totals['paid'] += 1
+            if (account.due_date.year, account.due_date.month) == (TODAY.year, TODAY.month):
+                totals['month_amount'] += amount
+        elif account.status == 'overdue' or (account.status == 'pending' and account.due_date < TODAY):
+            totals['overdue'] += 1
+            totals['overdue_amount'] += amount
+        elif account.status == 'pending':
+            totals['pending'] += 1
+            totals['pending_amount'] += amount
+    return totals
+
+def baseline_pending_total(model, user_id):
+    """Total do dashboard antigo: SUM(amount) das contas 'pending', vencidas ou não"""
+    total = db.session.query(func.sum(model.amount)).filter_by(user_id=user_id, status='pending').scalar()
+    return Decimal(str(total or 0)).quantize(Decimal('0.01'))
+
+def test_grouped_totals_match_per_row_counts(make_user, make_client):
+    with app.app_context():
+        user_id = make_user().id
+        client_id = make_client(user_id).id
+        other_id = make_user().id
+        rng = random.Random(7)
+
+        # Meses anteriores, o corrente (antes, no dia e depois de hoje) e os seguintes
+        due_dates = [TODAY + timedelta(days=offset) for offset in (-95, -40, -15, -14, -1, 0, 1, 15, 16, 45, 120)]
+        for index in range(120):
+            due_date = rng.choice(due_dates)
+            status = rng.choice(['pending', 'pending', 'overdue', 'paid', 'cancelled'])
+            amount = Decimal(rng.randint(100, 99999)) / 100
+            db.session.add(Receivable(user_id=user_id, client_id=client_id, description=f'R{index}',
+                                      amount=amount, due_date=due_date, status=status))
+            db.session.add(Payable(user_id=user_id, description=f'P{index}', amount=amount,
+                                   due_date=rng.choice(due_dates), status=rng.choice(['pending', 'paid'])))
+        for status in ('pending', 'pending', 'confirmed', 'approved'):
+            db.session.add(InstallmentSale(user_id=user_id, client_id=client_id, description='Venda',
+                                           total_amount=300, installments=3, status=status))
+        # Contas de outro usuário não entram na conta
+        db.session.add(Payable(user_id=other_id, description='Outro', amount=10, due_date=TODAY - timedelta(days=1)))
+        db.session.commit()
+
+        metrics = get_dashboard_metrics(user_id, TODAY)
+
+        receivables = per_row_totals(Receivable, user_id)
+        assert (metrics.total_receivables, metrics.pending_receivables, metrics.overdue_receivables,
+                metrics.paid_receivables) == (receivables['total'], receivables['pending'],
+                                              receivables['overdue'], receivables['paid'])
+        assert metrics.receivables_pending_amount == receivables['pending_amount']
+        assert metrics.receivables_overdue_amount == receivables['overdue_amount']
+        assert metrics.revenue_this_month == receivables['month_amount']
+        assert metrics.receivables_pending_total.quantize(Decimal('0.01')) == \
+            baseline_pending_total(Receivable, user_id)
+
+        payables = per_row_totals(Payable, user_id)
+        assert (metrics.total_payables, metrics.pending_payables, metrics.overdue_payables,
+                metrics.paid_payables) == (payables['total'], payables['pending'],
+                                           payables['overdue'], payables['paid'])
+        assert metrics.payables_pending_amount == payables['pending_amount']
+        assert metrics.payables_overdue_amount == payables['overdue_amount']
+        assert metrics.expenses_this_month == payables['month_amount']
+        assert metrics.payables_pending_total.quantize(Decimal('0.01')) == baseline_pending_total(Payable, user_id)
+
+        assert metrics.total_clients == Client.query.filter_by(user_id=user_id).count() == 1
+        assert (metrics.total_installment_sales, metrics.pending_sales, metrics.confirmed_sales) == (4, 2, 1)
+
+def test_due_today_is_not_overdue(make_user, make_client):
+    with app.app_context():
+        user_id = make_user().id
+        client_id = make_client(user_id).id
+        for offset, amount in ((-1, 10), (0, 20), (1, 40)):
+            db.session.add(Receivable(user_id=user_id, client_id=client_id, description='Hoje', amount=amount,
+                                      due_date=TODAY + timedelta(days=offset)))
+        db.session.commit()
+
+        metrics = get_dashboard_metrics(user_id, TODAY)
+        assert (metrics.overdue_receivables, metrics.receivables_overdue_amount) == (1, Decimal('10'))
+        assert (metrics.pending_receivables, metrics.receivables_pending_amount) == (2, Decimal('60'))
+        assert metrics.revenue_this_month == 0
+        # O total em aberto do dashboard não cai quando a conta vence
+        assert metrics.receivables_pending_total == Decimal('70') == baseline_pending_total(Receivable, user_id)
+
+def test_dashboard_page_shows_pending_total_with_past_due(make_user, make_client, logged_client):
+    with app.app_context():
+        user_id = make_user().id
+        client_id = make_client(user_id).id
+        for offset, amount in ((-3, 100), (5, 23.45)):
+            db.session.add(Receivable(user_id=user_id, client_id=client_id, description='Aberta', amount=amount,
+                                      due_date=date.today() + timedelta(days=offset)))
+        db.session.commit()
+
+    page = logged_client(user_id).get('/').get_data(as_text=True)
+    assert 'R$ 123.45' in page
@@ -0,0 +1,110 @@
+"""
+Teste do cliente da Evolution API: keep-alive, novas tentativas e histogramas
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app import app
+from evolution_client import EvolutionClient, latency_snapshot, reset_latency_histograms
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """Stub HTTP/1.1; as primeiras 'failures' respostas são 503"""
+    protocol_version = 'HTTP/1.1'
+    connections = set()
+    requests_seen = 0
+    failures = 0
+    lock = threading.Lock()
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        with self.lock:
+            self.connections.add(self.client_address)
+            type(self).requests_seen += 1
+            fail = type(self).failures > 0
+            if fail:
+                type(self).failures -= 1
+        self._reply(503 if fail else 201, {'apikey': self.headers.get('apikey')})
+
+    def do_GET(self):
+        with self.lock:
+            self.connections.add(self.client_address)
+            type(self).requests_seen += 1
+        self._reply(200, [])
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub(failures=0):
+    KeepAliveHandler.connections = set()
+    KeepAliveHandler.requests_seen = 0
+    KeepAliveHandler.failures = failures
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+def test_connections_are_reused():
+    server, url = start_stub()
+    try:
+        client = EvolutionClient(url, ' key ')
+        for _ in range(20):
+            response = client.send_text('inst', '5511999999999', 'oi')
+            assert response.status_code == 201
+        # URL e chave normalizadas
+        assert response.json() == {'apikey': 'key'}
+        assert KeepAliveHandler.requests_seen == 20
+        assert len(KeepAliveHandler.connections) == 1
+        client.close()
+    finally:
+        server.shutdown()
+
+def test_retries_5xx_with_backoff():
+    server, url = start_stub(failures=2)
+    try:
+        client = EvolutionClient(url, 'key', max_retries=2, backoff=0.01)
+        assert client.send_text('inst', '5511999999999', 'oi').status_code == 201
+        assert KeepAliveHandler.requests_seen == 3
+
+        # Sem tentativas restantes a resposta 5xx é devolvida ao chamador
+        KeepAliveHandler.failures = 5
+        assert EvolutionClient(url, 'key', max_retries=1, backoff=0.01).send_text('i', '1', 'x').status_code == 503
+    finally:
+        server.shutdown()
+
+def test_connection_error_is_retried_then_raised():
+    import requests
+    client = EvolutionClient('http://127.0.0.1:9', 'key', max_retries=2, backoff=0.01)
+    reset_latency_histograms()
+    try:
+        client.fetch_instances()
+        assert False, 'deveria falhar'
+    except requests.exceptions.ConnectionError:
+        pass
+    stats = latency_snapshot()['instance/fetchInstances']
+    assert stats['count'] == 3
+    assert stats['errors'] == 3
+
+def test_latency_histogram_per_endpoint():
+    server, url = start_stub()
+    try:
+        reset_latency_histograms()
+        client = EvolutionClient(url, 'key')
+        for _ in range(4):
+            client.send_text('inst', '5511999999999', 'oi')
+        client.fetch_instances()
+
+        stats = latency_snapshot()
+        assert stats['message/sendText']['count'] == 4
+        assert stats['instance/fetchInstances']['count'] == 1
+        assert sum(stats['message/sendText']['buckets'].values()) == 4
+        assert stats['message/sendText']['p95_ms'] is not None
+    finally:
+        server.shutdown()
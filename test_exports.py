@@ -0,0 +1,76 @@
+"""
+Teste da exportação CSV/XLSX por streaming
+"""
+import io
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import date, timedelta
+
+from app import app, db
+from models import Receivable, Payable, WhatsAppMessage
+
+NS = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+def make_data(make_user, make_client):
+    user = make_user(premium=True)
+    client = make_client(user.id, '=Cliente <Export> & Cia', document='123.456.789-00')
+
+    today = date.today()
+    for i in range(1200):
+        db.session.add(Receivable(user_id=user.id, client_id=client.id, description=f'R{i}',
+                                  amount=10 + i / 100, due_date=today + timedelta(days=i % 3)))
+    db.session.add(Receivable(user_id=user.id, client_id=client.id, description='Antiga', amount=5,
+                              due_date=today - timedelta(days=400), status='paid'))
+    db.session.add(Payable(user_id=user.id, description='Luz', amount=80, due_date=today, category='Contas'))
+    db.session.add(WhatsAppMessage(user_id=user.id, client_id=client.id, message_type='reminder',
+                                   content='Olá\x01 cliente', status='sent'))
+    db.session.commit()
+    return user.id
+
+def sheet_rows(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as package:
+        assert '[Content_Types].xml' in package.namelist()
+        root = ET.fromstring(package.read('xl/worksheets/sheet1.xml'))
+    return root.findall('.//x:sheetData/x:row', NS)
+
+def test_csv_is_streamed_with_list_filters(make_user, make_client, logged_client):
+    with app.app_context():
+        user_id = make_data(make_user, make_client)
+
+    client = logged_client(user_id)
+    response = client.get('/receivables/export?format=csv&status=pending')
+    assert response.status_code == 200 and response.is_streamed
+    assert 'attachment' in response.headers['Content-Disposition']
+
+    lines = response.get_data().decode('utf-8-sig').splitlines()
+    assert lines[0].startswith('ID;Cliente;CPF/CNPJ;Descrição;Valor;Vencimento')
+    assert len(lines) == 1 + 1200
+    # Texto que parece fórmula vai com apóstrofo; valores com vírgula decimal
+    assert ";'=Cliente <Export> & Cia;" in lines[1] and ';10,00;' in lines[1]
+
+    # Mês/ano como na tela mensal
+    old = date.today() - timedelta(days=400)
+    lines = client.get(f'/receivables/export?month={old.month}&year={old.year}').get_data().decode('utf-8-sig').splitlines()
+    assert len(lines) == 2 and 'Antiga' in lines[1]
+
+    response = client.get('/receivables/export?format=pdf')
+    assert response.status_code == 302
+
+def test_xlsx_is_valid_workbook(make_user, make_client, logged_client):
+    with app.app_context():
+        user_id = make_data(make_user, make_client)
+
+    client = logged_client(user_id)
+    rows = sheet_rows(client.get('/receivables/export?format=xlsx').get_data())
+    assert len(rows) == 1 + 1201
+    first = rows[1].findall('x:c', NS)
+    assert first[1].find('.//x:t', NS).text == '=Cliente <Export> & Cia'
+    assert first[4].get('s') == '3' and float(first[4].find('x:v', NS).text) == 5.0
+    assert first[5].get('s') == '1'
+
+    assert len(sheet_rows(client.get('/payables/export?format=xlsx').get_data())) == 2
+    assert len(sheet_rows(client.get('/clients/export?format=xlsx').get_data())) == 2
+
+    messages = sheet_rows(client.get('/whatsapp/messages/export?format=xlsx').get_data())
+    assert len(messages) == 2
+    assert messages[1].findall('x:c', NS)[-1].find('.//x:t', NS).text == 'Olá cliente'
@@ -0,0 +1,50 @@
+"""
+Teste da geração de parcelas em lote: centavos, meses de calendário e INSERT único
+"""
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import event
+from app import app, db
+from models import Receivable, Payable, ReminderSchedule
+from installments import InstallmentPlan, insert_installments, installment_schedule, split_amount
+
+def test_schedule_is_cent_exact_and_monthly():
+    assert split_amount(100, 3) == [Decimal('33.34'), Decimal('33.33'), Decimal('33.33')]
+    assert sum(split_amount(Decimal('1999.99'), 7)) == Decimal('1999.99')
+    assert sum(split_amount(0.1 + 0.2, 3)) == Decimal('0.30')
+
+    schedule = installment_schedule(1000, 4, date(2026, 1, 31))
+    assert [due for _n, due, _a in schedule] == [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31), date(2026, 4, 30)]
+
+def test_single_insert_per_table(make_user, make_client):
+    with app.app_context():
+        user = make_user()
+        client = make_client(user.id, 'Cliente Parcelado')
+        inserts = []
+
+        def count_inserts(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('INSERT INTO receivables') or statement.startswith('INSERT INTO payables'):
+                inserts.append(statement.split()[2])
+
+        event.listen(db.engine, 'before_cursor_execute', count_inserts)
+        try:
+            series = insert_installments([
+                InstallmentPlan('receivable', user.id, 'Venda', Decimal('500.00'), 60, date.today(), client_id=client.id),
+                InstallmentPlan('receivable', user.id, 'Outra venda', Decimal('90.00'), 12, date.today(), client_id=client.id),
+                InstallmentPlan('payable', user.id, 'Compra', Decimal('300.00'), 3, date.today(), category='Estoque'),
+            ])
+            db.session.commit()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count_inserts)
+
+        assert inserts == ['receivables', 'payables']
+        rows = Receivable.query.filter_by(series_id=series[0].id).order_by(Receivable.installment_number).all()
+        assert len(rows) == 60 and sum(r.amount for r in rows) == Decimal('500.00')
+        assert rows[-1].description == 'Venda - Parcela 60/60'
+        assert Payable.query.filter_by(series_id=series[2].id).count() == 3
+
+        # Contadores de uso e agenda de lembretes acompanham o lote
+        db.session.refresh(user)
+        assert (user.receivables_count, user.payables_count) == (72, 3)
+        assert ReminderSchedule.query.filter_by(user_id=user.id).count() > 0
@@ -0,0 +1,66 @@
+"""
+Teste das listagens JSON paginadas por cursor (keyset)
+"""
+from datetime import date, timedelta
+
+from app import app, db
+from models import Client, Receivable, Payable
+
+def make_data(make_user):
+    user = make_user()
+    clients = [Client(user_id=user.id, name=f'Cliente {i}') for i in range(5)]
+    db.session.add_all(clients)
+    db.session.flush()
+
+    # Vencimentos repetidos para exercitar o desempate por id
+    today = date.today()
+    for i in range(9):
+        db.session.add(Receivable(user_id=user.id, client_id=clients[i % 5].id, description=f'R{i}', amount=10 + i,
+                                  due_date=today + timedelta(days=i // 3), status='paid' if i % 4 == 0 else 'pending'))
+    db.session.add(Payable(user_id=user.id, description='Luz', amount=80, due_date=today, category='Contas'))
+    db.session.add(Payable(user_id=user.id, description='Estoque', amount=500, due_date=today, category='Estoque'))
+    db.session.commit()
+    return user, clients
+
+def fetch_all(client, url):
+    items, cursor = [], None
+    while True:
+        response = client.get(url + (f'&cursor={cursor}' if cursor else ''))
+        assert response.status_code == 200, response.get_json()
+        data = response.get_json()
+        items.extend(data['items'])
+        cursor = data['next_cursor']
+        if not cursor:
+            return items
+
+def test_pages_cover_everything_once(make_user, logged_client):
+    with app.app_context():
+        user, clients = make_data(make_user)
+        user_id = user.id
+        expected = [r.id for r in Receivable.query.filter_by(user_id=user.id).order_by(Receivable.due_date, Receivable.id)]
+
+    with logged_client(user_id) as client:
+        items = fetch_all(client, '/receivables/api/list?limit=2')
+        assert [item['id'] for item in items] == expected
+
+        # Clientes: mais recentes primeiro
+        listed = fetch_all(client, '/clients/api/list?limit=2&fields=name')
+        assert len(listed) == 5 and set(listed[0]) == {'id', 'name'}
+        assert [c['id'] for c in listed] == sorted((c['id'] for c in listed), reverse=True)
+
+def test_filters_and_sparse_fields(make_user, logged_client):
+    with app.app_context():
+        user, clients = make_data(make_user)
+        user_id, client_id = user.id, clients[1].id
+
+    with logged_client(user_id) as client:
+        data = client.get(f'/receivables/api/list?status=pending&client_id={client_id}&fields=amount,status').get_json()
+        assert data['items'] and all(set(item) == {'id', 'amount', 'status'} for item in data['items'])
+        assert all(item['status'] == 'pending' for item in data['items'])
+
+        data = client.get('/payables/api/list?category=Estoque').get_json()
+        assert [item['description'] for item in data['items']] == ['Estoque']
+
+        assert client.get('/receivables/api/list?cursor=xyz').status_code == 400
+        assert client.get('/receivables/api/list?fields=password').status_code == 400
+        assert client.get('/receivables/api/list?date_from=31/12/2026').status_code == 400
@@ -0,0 +1,45 @@
+"""
+Teste dos filtros mensais: intervalo do mês (virada de ano) e parâmetros inválidos nas telas
+"""
+from datetime import date
+
+from app import app, db
+from models import Receivable, Payable
+from utils import month_range, valid_month
+
+def test_month_range_boundaries():
+    assert month_range(2025, 1) == (date(2025, 1, 1), date(2025, 2, 1))
+    assert month_range(2024, 2) == (date(2024, 2, 1), date(2024, 3, 1))
+    assert month_range(2025, 12) == (date(2025, 12, 1), date(2026, 1, 1))
+
+    assert valid_month(2025, 1) and valid_month(2025, 12)
+    assert not valid_month(2025, 0) and not valid_month(2025, 13)
+    assert not valid_month(0, 5) and not valid_month(9999, 12)
+
+def test_month_filters_on_screens_and_lists(make_user, make_client, logged_client):
+    with app.app_context():
+        user = make_user()
+        client = make_client(user.id, 'Cliente Virada')
+        # Último dia de dezembro e primeiro de janeiro: cada um só no seu mês
+        for description, due_date in (('Conta 31-12', date(2025, 12, 31)), ('Conta 01-01', date(2026, 1, 1))):
+            db.session.add(Receivable(user_id=user.id, client_id=client.id, description=description,
+                                      amount=10, due_date=due_date))
+            db.session.add(Payable(user_id=user.id, description=description, amount=10, due_date=due_date))
+        db.session.commit()
+        user_id = user.id
+
+    client = logged_client(user_id)
+
+    for kind in ('receivables', 'payables'):
+        page = client.get(f'/{kind}/?month=12&year=2025').get_data(as_text=True)
+        assert 'Conta 31-12' in page and 'Conta 01-01' not in page
+
+        data = client.get(f'/{kind}/api/list?month=12&year=2025&fields=description').get_json()
+        assert [item['description'] for item in data['items']] == ['Conta 31-12']
+        data = client.get(f'/{kind}/api/list?month=1&year=2026&fields=description').get_json()
+        assert [item['description'] for item in data['items']] == ['Conta 01-01']
+
+        # Mês inválido: a tela mostra o mês atual; a API responde 400
+        for query in ('month=13', 'month=0', 'month=12&year=9999', 'year=0'):
+            assert client.get(f'/{kind}/?{query}').status_code == 200
+        assert client.get(f'/{kind}/api/list?month=13&year=2025').status_code == 400
@@ -0,0 +1,111 @@
+"""
+Teste do resumo mensal das contas (monthly_summary)
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from app import app, db
+from models import Receivable, Payable, MonthlySummary
+from monthly_summary import rebuild_monthly_summary, remove_from_summary, paid_by_month
+from installments import InstallmentPlan, insert_installments
+from dashboard_metrics import get_dashboard_metrics
+from tasks import update_overdue_status
+from usage_counters import adjust_usage
+
+def snapshot(user_id):
+    return {
+        (row.kind, row.month, row.status): (row.count, Decimal(str(row.amount)))
+        for row in MonthlySummary.query.filter_by(user_id=user_id)
+        if row.count
+    }
+
+def assert_matches_rebuild(user_id):
+    incremental = snapshot(user_id)
+    rebuild_monthly_summary([user_id])
+    db.session.commit()
+    assert incremental == snapshot(user_id)
+    return incremental
+
+def test_orm_changes_keep_summary_in_sync(make_user, make_client):
+    with app.app_context():
+        user_id = make_user().id
+        client_id = make_client(user_id, 'Cliente Resumo').id
+        today = date.today()
+        month = today.replace(day=1)
+
+        receivable = Receivable(user_id=user_id, client_id=client_id, description='A', amount=100, due_date=today)
+        db.session.add_all([
+            receivable,
+            Receivable(user_id=user_id, client_id=client_id, description='B', amount=50, due_date=today),
+            Payable(user_id=user_id, description='Luz', amount=80, due_date=today, status='paid'),
+        ])
+        db.session.commit()
+        assert snapshot(user_id)[('receivable', month, 'pending')] == (2, Decimal('150.00'))
+
+        # Pagamento, novo valor e novo vencimento em outro mês
+        receivable.status = 'paid'
+        db.session.commit()
+        receivable.amount = 120
+        receivable.due_date = today - timedelta(days=40)
+        db.session.commit()
+        summary = assert_matches_rebuild(user_id)
+        assert summary[('receivable', month, 'pending')] == (1, Decimal('50.00'))
+        assert summary[('receivable', receivable.due_date.replace(day=1), 'paid')] == (1, Decimal('120.00'))
+
+        db.session.delete(receivable)
+        db.session.commit()
+        assert ('receivable', receivable.due_date.replace(day=1), 'paid') not in assert_matches_rebuild(user_id)
+
+def test_bulk_paths_keep_summary_in_sync(make_user, make_client):
+    with app.app_context():
+        user_id = make_user().id
+        client_id = make_client(user_id, 'Cliente Resumo').id
+        first_due = date.today() - timedelta(days=65)
+
+        insert_installments([InstallmentPlan(kind='receivable', user_id=user_id, description='Carnê',
+                                             total_amount=600, installments=6, first_due_date=first_due,
+                                             client_id=client_id)])
+        db.session.commit()
+        assert sum(count for count, _amount in assert_matches_rebuild(user_id).values()) == 6
+
+        update_overdue_status()
+        summary = assert_matches_rebuild(user_id)
+        assert sum(count for (kind, _month, status), (count, _a) in summary.items() if status == 'overdue') >= 2
+
+        criteria = [Receivable.user_id == user_id, Receivable.due_date > date.today()]
+        remove_from_summary(Receivable, criteria)
+        deleted = Receivable.query.filter(*criteria).delete(synchronize_session=False)
+        adjust_usage(user_id, 'receivables', -deleted)
+        db.session.commit()
+        assert_matches_rebuild(user_id)
+
+def test_readers_use_summary(make_user, make_client):
+    with app.app_context():
+        user_id = make_user().id
+        client_id = make_client(user_id, 'Cliente Resumo').id
+        today = date(2030, 6, 15)
+        db.session.add_all([
+            Receivable(user_id=user_id, client_id=client_id, description='Mês passado', amount=10,
+                       due_date=date(2030, 5, 20)),
+            Receivable(user_id=user_id, client_id=client_id, description='Vencida no mês', amount=20,
+                       due_date=date(2030, 6, 10)),
+            Receivable(user_id=user_id, client_id=client_id, description='A vencer', amount=30,
+                       due_date=date(2030, 6, 20)),
+            Receivable(user_id=user_id, client_id=client_id, description='Recebida', amount=40,
+                       due_date=date(2030, 6, 1), status='paid'),
+            Receivable(user_id=user_id, client_id=client_id, description='Futura', amount=50,
+                       due_date=date(2030, 8, 1)),
+            Payable(user_id=user_id, description='Aluguel', amount=70, due_date=date(2030, 5, 5), status='paid'),
+        ])
+        db.session.commit()
+
+        metrics = get_dashboard_metrics(user_id, today)
+        assert metrics.total_receivables == 5
+        assert (metrics.overdue_receivables, metrics.receivables_overdue_amount) == (2, Decimal('30'))
+        assert (metrics.pending_receivables, metrics.receivables_pending_amount) == (2, Decimal('80'))
+        assert metrics.revenue_this_month == Decimal('40') and metrics.expenses_this_month == 0
+
+        assert paid_by_month(user_id, 3, today) == {
+            '2030-05': {'receitas': 0, 'gastos': 70.0},
+            '2030-06': {'receitas': 40.0, 'gastos': 0},
+        }
@@ -0,0 +1,94 @@
+"""
+Teste da virada diária para 'overdue': marca d'água por dia e liberação do dia em caso de falha
+"""
+from datetime import date
+
+from app import app, db
+from models import Receivable, Payable, JobWatermark
+import tasks
+from tasks import OVERDUE_SWEEP_JOB, claim_daily_run, run_daily_overdue_sweep
+
+# Datas no passado: a marca d'água gravada não bloqueia as execuções de hoje
+DAY = date(2020, 3, 10)
+
+def reset_watermark():
+    JobWatermark.query.filter_by(name=OVERDUE_SWEEP_JOB).update({JobWatermark.last_run_on: None})
+    db.session.commit()
+
+def watermark():
+    return db.session.execute(
+        db.select(JobWatermark.last_run_on).filter_by(name=OVERDUE_SWEEP_JOB)
+    ).scalar_one_or_none()
+
+def add_accounts(user_id, client_id):
+    """Duas contas vencidas em DAY (uma a receber, uma a pagar) e duas ainda no prazo"""
+    for due_date in (date(2020, 3, 9), date(2020, 3, 10)):
+        db.session.add(Receivable(user_id=user_id, client_id=client_id, description='Varredura', amount=10,
+                                  due_date=due_date))
+        db.session.add(Payable(user_id=user_id, description='Varredura', amount=10, due_date=due_date))
+    db.session.commit()
+
+def statuses(model, user_id):
+    return {row.due_date: row.status for row in model.query.filter_by(user_id=user_id)}
+
+def test_claim_is_once_per_day():
+    with app.app_context():
+        reset_watermark()
+        assert claim_daily_run(OVERDUE_SWEEP_JOB, DAY)
+        assert not claim_daily_run(OVERDUE_SWEEP_JOB, DAY)
+        assert watermark() == DAY
+        # Um dia anterior ao já reservado também é recusado; o seguinte é liberado
+        assert not claim_daily_run(OVERDUE_SWEEP_JOB, date(2020, 3, 9))
+        assert claim_daily_run(OVERDUE_SWEEP_JOB, date(2020, 3, 11))
+        assert JobWatermark.query.filter_by(name=OVERDUE_SWEEP_JOB).count() == 1
+        reset_watermark()
+
+def test_sweep_runs_once_per_day(make_user, make_client):
+    with app.app_context():
+        reset_watermark()
+        user_id = make_user().id
+        add_accounts(user_id, make_client(user_id).id)
+
+        result = run_daily_overdue_sweep(DAY)
+        assert result['success'] and not result['skipped']
+        assert result['receivables_updated'] >= 1 and result['payables_updated'] >= 1
+        for model in (Receivable, Payable):
+            assert statuses(model, user_id) == {date(2020, 3, 9): 'overdue', date(2020, 3, 10): 'pending'}
+
+        # Mesmo dia: não toca nas tabelas
+        db.session.add(Payable(user_id=user_id, description='Tardia', amount=5, due_date=date(2020, 3, 1)))
+        db.session.commit()
+        assert run_daily_overdue_sweep(DAY) == {'success': True, 'skipped': True,
+                                                'receivables_updated': 0, 'payables_updated': 0}
+        assert Payable.query.filter_by(user_id=user_id, description='Tardia').one().status == 'pending'
+
+        # Dia seguinte: processa o que ficou para trás
+        result = run_daily_overdue_sweep(date(2020, 3, 11))
+        assert result['success'] and not result['skipped']
+        for model in (Receivable, Payable):
+            assert model.query.filter_by(user_id=user_id, status='pending').count() == 0
+        reset_watermark()
+
+def test_failed_sweep_releases_the_day(make_user, make_client, monkeypatch):
+    with app.app_context():
+        reset_watermark()
+        user_id = make_user().id
+        add_accounts(user_id, make_client(user_id).id)
+
+        def broken_summary(*args, **kwargs):
+            raise RuntimeError('resumo indisponível')
+
+        monkeypatch.setattr(tasks, 'move_in_summary', broken_summary)
+        result = run_daily_overdue_sweep(DAY)
+        assert not result['success'] and result['skipped'] is False
+        assert 'resumo indisponível' in result['error']
+        # O dia volta a ficar livre e nada foi alterado
+        assert watermark() is None
+        assert set(statuses(Receivable, user_id).values()) == {'pending'}
+
+        monkeypatch.undo()
+        result = run_daily_overdue_sweep(DAY)
+        assert result['success'] and not result['skipped']
+        assert statuses(Receivable, user_id)[date(2020, 3, 9)] == 'overdue'
+        assert watermark() == DAY
+        reset_watermark()
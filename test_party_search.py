@@ -0,0 +1,78 @@
+"""
+Teste da busca de clientes/fornecedores (typeahead por termos normalizados)
+"""
+
+from app import app, db
+from models import Client, Supplier, SearchTerm
+from party_search import search_parties, find_by_name, rebuild_search_index, setup_search_backend
+
+def make_parties(make_user):
+    user = make_user()
+    db.session.add_all([
+        Client(user_id=user.id, name='João da Silva', document='123.456.789-00', whatsapp='5511987654321'),
+        Client(user_id=user.id, name='Márcia Conceição', whatsapp=None),
+        Client(user_id=user.id, name='Silvana Souza', document='98.765.432/0001-10'),
+        Supplier(user_id=user.id, name='Distribuidora São Jorge', phone='1133334444'),
+    ])
+    db.session.commit()
+    return user
+
+def names(user_id, search_type, q, **kwargs):
+    return [party.name for party in search_parties(user_id, search_type, q, **kwargs)]
+
+def test_prefix_search_by_name_document_and_phone(make_user):
+    with app.app_context():
+        user = make_parties(make_user)
+
+        assert names(user.id, 'clients', 'joao') == ['João da Silva']
+        assert names(user.id, 'clients', 'SIL') == ['João da Silva', 'Silvana Souza']
+        assert names(user.id, 'clients', 'silva jo') == ['João da Silva']
+        assert names(user.id, 'clients', 'conceicao') == ['Márcia Conceição']
+        assert names(user.id, 'clients', '123.456.789') == ['João da Silva']
+        assert names(user.id, 'clients', '(11) 98765-4321') == ['João da Silva']
+        assert names(user.id, 'clients', '98765') == ['João da Silva', 'Silvana Souza']
+        assert names(user.id, 'clients', 'marcia', with_phone=True) == []
+        assert names(user.id, 'suppliers', 'sao jorge') == ['Distribuidora São Jorge']
+        assert find_by_name(user.id, 'clients', 'joão DA silva').document == '123.456.789-00'
+
+        # Edição e exclusão atualizam os termos na mesma transação
+        client = Client.query.filter_by(user_id=user.id, name='Silvana Souza').first()
+        client.name = 'Ana Souza'
+        db.session.commit()
+        assert names(user.id, 'clients', 'silv') == ['João da Silva']
+        assert names(user.id, 'clients', 'ana') == ['Ana Souza']
+
+        client_id = client.id
+        db.session.delete(client)
+        db.session.commit()
+        assert SearchTerm.query.filter_by(kind='clients', party_id=client_id).count() == 0
+
+def test_rebuild_and_fulltext_backend(make_user):
+    with app.app_context():
+        user = make_parties(make_user)
+        SearchTerm.query.filter_by(user_id=user.id).delete()
+        db.session.commit()
+        assert names(user.id, 'clients', 'joao') == []
+
+        assert rebuild_search_index([user.id]) == 4
+        db.session.commit()
+        assert names(user.id, 'clients', 'joao') == ['João da Silva']
+
+        app.config['SEARCH_BACKEND'] = 'fulltext'
+        try:
+            setup_search_backend()
+            assert names(user.id, 'clients', 'silva jo') == ['João da Silva']
+            assert names(user.id, 'suppliers', 'distrib') == ['Distribuidora São Jorge']
+        finally:
+            app.config['SEARCH_BACKEND'] = 'prefix'
+            setup_search_backend()
+
+def test_search_endpoint(make_user, logged_client):
+    with app.app_context():
+        user_id = make_parties(make_user).id
+
+    with logged_client(user_id) as client:
+        data = client.get('/api/search?type=clients&q=jo').get_json()
+        assert [item['name'] for item in data['results']] == ['João da Silva']
+        assert set(data['results'][0]) == {'id', 'name', 'document', 'phone'}
+        assert client.get('/api/search?type=users&q=jo').status_code == 400
@@ -0,0 +1,42 @@
+"""
+Teste da expiração de planos: rotina em lote e leituras sem efeito colateral
+"""
+from datetime import timedelta
+
+from app import app, db
+from models import Client, UserPlan, PlanTransition
+from plan_lifecycle import expire_plans
+from api.plans import check_plan_limit, get_plan_info
+
+def test_read_paths_do_not_write(make_user, logged_client):
+    with app.app_context():
+        user = make_user(premium_expires_in=timedelta(hours=-1))
+        db.session.add_all([Client(user_id=user.id, name=f'C{i}') for i in range(5)])
+        db.session.commit()
+
+        # Vencido: já vale como Gratuito, mas nada é gravado
+        assert get_plan_info(user)['plan_name'] == 'Free'
+        assert check_plan_limit(user, 'clients') is False
+        assert not db.session.dirty and not db.session.new
+        assert UserPlan.query.filter_by(user_id=user.id).first().plan_name == 'Premium'
+
+        data = logged_client(user.id).get('/plans/check_limits').get_json()
+        assert data['plan_name'] == 'Free' and data['plan_expired'] is True
+        assert UserPlan.query.filter_by(user_id=user.id).first().plan_name == 'Premium'
+
+def test_expire_plans_in_batch(make_user):
+    with app.app_context():
+        expired = [make_user(premium_expires_in=timedelta(minutes=-m)) for m in (1, 2)]
+        active = make_user(premium_expires_in=timedelta(days=10))
+
+        assert expire_plans() >= 2
+        assert expire_plans() == 0
+
+        for user in expired:
+            plan = UserPlan.query.filter_by(user_id=user.id).first()
+            assert (plan.plan_name, plan.max_clients, plan.expires_at) == ('Free', 5, None)
+            transitions = PlanTransition.query.filter_by(user_id=user.id).all()
+            assert [(t.from_plan, t.to_plan, t.reason) for t in transitions] == [('Premium', 'Free', 'expired')]
+
+        assert UserPlan.query.filter_by(user_id=active.id).first().plan_name == 'Premium'
+        assert PlanTransition.query.filter_by(user_id=active.id).count() == 0
@@ -0,0 +1,56 @@
+"""
+Teste das contas recorrentes: regra, janela móvel e ocorrências previstas
+"""
+from datetime import date, timedelta
+
+from app import app, db
+from models import Receivable, Payable, AccountSeries
+from recurrence import add_months, create_recurring_series, materialize_due, stop_series, virtual_occurrences
+
+def test_add_months_keeps_calendar_day():
+    assert add_months(date(2026, 1, 31), 1) == date(2026, 2, 28)
+    assert add_months(date(2026, 1, 31), 2) == date(2026, 3, 31)
+    assert add_months(date(2026, 11, 15), 3) == date(2027, 2, 15)
+
+def test_only_horizon_is_materialized(make_user, make_client):
+    today = date(2026, 1, 10)
+    with app.app_context():
+        user = make_user()
+        client = make_client(user.id, 'Cliente Recorrente')
+        series = create_recurring_series(user.id, 'receivable', 'Mensalidade', 100, date(2026, 1, 15),
+                                         occurrences=24, client_id=client.id, today=today)
+        db.session.commit()
+
+        # Janela de 90 dias (até 10/04): jan, fev e mar
+        rows = Receivable.query.filter_by(series_id=series.id).order_by(Receivable.due_date).all()
+        assert [r.due_date for r in rows] == [date(2026, m, 15) for m in (1, 2, 3)]
+        assert rows[-1].description == 'Mensalidade - Mês 3'
+        assert series.next_due_date == date(2026, 4, 15)
+
+        # Meses fora da janela aparecem como previstos
+        projected = virtual_occurrences(user.id, 'receivable', date(2026, 12, 1), date(2026, 12, 31))
+        assert [(p['due_date'], p['description']) for p in projected] == [(date(2026, 12, 15), 'Mensalidade - Mês 12')]
+        assert virtual_occurrences(user.id, 'receivable', date(2028, 1, 1), date(2028, 1, 31)) == []
+
+        # A rotina avança a janela sem duplicar ocorrências
+        assert materialize_due(today + timedelta(days=31)) >= 1
+        assert materialize_due(today + timedelta(days=31)) == 0
+        dates = [r.due_date for r in Receivable.query.filter_by(series_id=series.id)]
+        assert len(dates) == len(set(dates)) == 4
+
+def test_open_ended_and_stop(make_user):
+    today = date(2026, 3, 1)
+    with app.app_context():
+        user = make_user()
+        series = create_recurring_series(user.id, 'payable', 'Aluguel', 1500, date(2026, 3, 5),
+                                         category='Aluguel', today=today)
+        db.session.commit()
+        assert Payable.query.filter_by(series_id=series.id).count() == 3
+        assert len(virtual_occurrences(user.id, 'payable', date(2036, 1, 1), date(2036, 1, 31))) == 1
+
+        stop_series(series)
+        db.session.commit()
+        assert db.session.get(AccountSeries, series.id).next_due_date is None
+        assert virtual_occurrences(user.id, 'payable', date(2026, 6, 1), date(2026, 6, 30)) == []
+        materialize_due(date(2026, 12, 1))
+        assert Payable.query.filter_by(series_id=series.id).count() == 3
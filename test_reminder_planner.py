@@ -0,0 +1,131 @@
+"""
+Teste da agenda de lembretes: configuração por usuário e envio único
+"""
+from datetime import date, datetime, time, timedelta
+
+from app import app, db
+from models import (Client, AutoReminderConfig, Receivable, ReminderSchedule, ReminderLedger, SystemSettings,
+                    UserWhatsAppInstance)
+from reminder_planner import ReminderPlan, parse_days, plan_receivables, replan_user
+from scheduler import reminder_scheduler
+from settings_cache import invalidate_settings
+
+def reminder_user(make_user, days_before='2', days_after='5', preferred_time='14:30', active=True):
+    """Usuário com lembretes configurados, um cliente e instância do WhatsApp conectada"""
+    user = make_user()
+    db.session.add(AutoReminderConfig(user_id=user.id, days_before_due=days_before, days_after_due=days_after,
+                                      preferred_time=preferred_time, is_active=active))
+    client = Client(user_id=user.id, name='Cliente', whatsapp='11999990001')
+    db.session.add(client)
+
+    # Instância conectada: sem ela o envio é ignorado (e tentado de novo depois)
+    settings = SystemSettings.query.first() or SystemSettings()
+    settings.evolution_api_url = 'http://evolution.invalid'
+    settings.evolution_api_key = 'key'
+    settings.evolution_enabled = True
+    db.session.add(settings)
+    db.session.add(UserWhatsAppInstance(user_id=user.id, instance_name=f"inst{user.id}", status='connected'))
+    db.session.commit()
+    invalidate_settings()
+    return user, client
+
+def test_parse_and_plan():
+    assert parse_days('7, 1,x,3,0,3') == [1, 3, 7]
+    plan = ReminderPlan(due_days=[2], overdue_days=[5], preferred_time=time(14, 30))
+    today = date(2026, 1, 10)
+    fires = list(plan.fire_times(date(2026, 1, 20), today))
+    assert fires == [('due', 2, datetime(2026, 1, 18, 14, 30)), ('overdue', 5, datetime(2026, 1, 25, 14, 30))]
+    # Lembretes de dias que já passaram não são agendados
+    assert list(plan.fire_times(date(2026, 1, 6), today)) == [('overdue', 5, datetime(2026, 1, 11, 14, 30))]
+
+def test_schedule_follows_user_config(make_user):
+    with app.app_context():
+        user, client = reminder_user(make_user)
+        receivable = Receivable(user_id=user.id, client_id=client.id, description='Conta', amount=10,
+                                due_date=date.today() + timedelta(days=10))
+        db.session.add(receivable)
+        plan_receivables([receivable])
+        db.session.commit()
+
+        rows = {(r.reminder_kind, r.offset_days): r.fire_at
+                for r in ReminderSchedule.query.filter_by(receivable_id=receivable.id)}
+        assert rows == {
+            ('due', 2): datetime.combine(receivable.due_date - timedelta(days=2), time(14, 30)),
+            ('overdue', 5): datetime.combine(receivable.due_date + timedelta(days=5), time(14, 30)),
+        }
+
+        # Editar o vencimento recalcula a agenda
+        receivable.due_date += timedelta(days=1)
+        plan_receivables([receivable])
+        db.session.commit()
+        assert ReminderSchedule.query.filter_by(receivable_id=receivable.id).count() == 2
+        assert min(r.fire_at for r in ReminderSchedule.query.filter_by(receivable_id=receivable.id)).date() == \
+            receivable.due_date - timedelta(days=2)
+
+        # Desativar os lembretes esvazia a agenda do usuário
+        config = AutoReminderConfig.query.filter_by(user_id=user.id).first()
+        config.is_active = False
+        replan_user(user.id)
+        db.session.commit()
+        assert ReminderSchedule.query.filter_by(user_id=user.id).count() == 0
+
+def test_fires_once_at_preferred_time(make_user):
+    with app.app_context():
+        user, client = reminder_user(make_user, days_before='1', days_after='1', preferred_time='14:30')
+        receivable = Receivable(user_id=user.id, client_id=client.id, description='Amanhã', amount=10,
+                                due_date=date.today() + timedelta(days=1))
+        db.session.add(receivable)
+        plan_receivables([receivable])
+        db.session.commit()
+        receivable_id = receivable.id
+
+    sent = []
+    def fake_send(api_url, api_key, instance_name, phone, message):
+        sent.append(phone)
+        return True
+
+    # Antes do horário preferido nada é lido da agenda
+    before, after = (datetime.combine(date.today(), time(h, m)) for h, m in ((14, 0), (14, 35)))
+    reminder_scheduler.run_reminders(fake_send, now=before)
+    with app.app_context():
+        assert ReminderLedger.query.filter_by(receivable_id=receivable_id).count() == 0
+        assert ReminderSchedule.query.filter_by(receivable_id=receivable_id).count() == 2
+
+    reminder_scheduler.run_reminders(fake_send, now=after)
+    reminder_scheduler.run_reminders(fake_send, now=after)
+    with app.app_context():
+        ledger = ReminderLedger.query.filter_by(receivable_id=receivable_id).all()
+        assert [(l.reminder_kind, l.offset_days) for l in ledger] == [('due', 1)]
+        # Lembrete de atraso continua agendado
+        remaining = ReminderSchedule.query.filter_by(receivable_id=receivable_id).all()
+        assert [(r.reminder_kind, r.offset_days) for r in remaining] == [('overdue', 1)]
+
+def test_failed_send_is_retried_the_same_day(make_user):
+    with app.app_context():
+        user, client = reminder_user(make_user, days_before='1', days_after='', preferred_time='08:00')
+        receivable = Receivable(user_id=user.id, client_id=client.id, description='Retentativa', amount=10,
+                                due_date=date.today() + timedelta(days=1))
+        db.session.add(receivable)
+        plan_receivables([receivable])
+        db.session.commit()
+        receivable_id = receivable.id
+
+    attempts = []
+    def flaky_send(api_url, api_key, instance_name, phone, message):
+        attempts.append(phone)
+        return len(attempts) > 1
+
+    now = datetime.combine(date.today(), time(8, 5))
+    reminder_scheduler.run_reminders(flaky_send, now=now)
+    with app.app_context():
+        # Falhou: nada no ledger e o lembrete continua na agenda
+        assert ReminderLedger.query.filter_by(receivable_id=receivable_id).count() == 0
+        assert ReminderSchedule.query.filter_by(receivable_id=receivable_id).count() == 1
+
+    reminder_scheduler.run_reminders(flaky_send, now=now + timedelta(minutes=5))
+    reminder_scheduler.run_reminders(flaky_send, now=now + timedelta(minutes=10))
+    assert len(attempts) == 2
+    with app.app_context():
+        ledger = ReminderLedger.query.filter_by(receivable_id=receivable_id).one()
+        assert ledger.status == 'sent' and ledger.sent_at is not None
+        assert ReminderSchedule.query.filter_by(receivable_id=receivable_id).count() == 0
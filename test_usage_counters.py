@@ -0,0 +1,57 @@
+"""
+Teste dos contadores de uso dos planos: eventos do ORM, lotes e reparo
+"""
+from datetime import date
+
+from app import app, db
+from models import User, Client, Receivable, Payable
+from usage_counters import adjust_usage, get_usage, repair_usage_counters
+from api.plans import check_plan_limit
+
+def test_counters_follow_orm_inserts_and_deletes(make_user):
+    with app.app_context():
+        user = make_user()
+        client = Client(user_id=user.id, name='Cliente')
+        db.session.add(client)
+        db.session.flush()
+        db.session.add_all([
+            Receivable(user_id=user.id, client_id=client.id, description=f'R{i}', amount=10, due_date=date.today())
+            for i in range(3)
+        ])
+        db.session.add(Payable(user_id=user.id, description='P', amount=5, due_date=date.today()))
+        db.session.commit()
+        assert get_usage(user) == {'clients': 1, 'receivables': 3, 'payables': 1}
+
+        db.session.delete(Receivable.query.filter_by(user_id=user.id).first())
+        db.session.commit()
+        assert get_usage(user)['receivables'] == 2
+
+        # Exclusão em lote exige ajuste explícito
+        deleted = Receivable.query.filter_by(user_id=user.id).delete()
+        adjust_usage(user.id, 'receivables', -deleted)
+        db.session.commit()
+        assert get_usage(user)['receivables'] == 0
+
+def test_limit_check_reads_counter(make_user):
+    with app.app_context():
+        user = make_user()
+        for i in range(5):
+            db.session.add(Client(user_id=user.id, name=f'C{i}'))
+        db.session.commit()
+        # Plano gratuito: 5 clientes
+        assert check_plan_limit(user, 'clients') is False
+        assert check_plan_limit(user, 'payables') is True
+
+def test_repair_fixes_drift(make_user):
+    with app.app_context():
+        user = make_user()
+        db.session.add(Client(user_id=user.id, name='Cliente'))
+        db.session.commit()
+
+        User.query.filter_by(id=user.id).update({User.clients_count: 40, User.payables_count: 7})
+        db.session.commit()
+
+        assert repair_usage_counters(user_ids=[user.id]) == 1
+        db.session.refresh(user)
+        assert get_usage(user) == {'clients': 1, 'receivables': 0, 'payables': 0}
+        assert repair_usage_counters() == 0
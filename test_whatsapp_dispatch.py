@@ -0,0 +1,84 @@
+"""
+Teste do pipeline de envio de lembretes contra um servidor HTTP local (stub da Evolution API)
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app import app
+from utils import post_whatsapp_text
+from whatsapp_dispatch import WhatsAppDispatcher, DispatchJob
+
+class StubEvolutionHandler(BaseHTTPRequestHandler):
+    """Responde como /message/sendText; números terminados em 0 retornam 400"""
+    received = []
+    lock = threading.Lock()
+    delay = 0.05
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with self.lock:
+            self.received.append((time.monotonic(), self.path, body['number']))
+        time.sleep(self.delay)
+
+        status = 400 if body['number'].endswith('0') else 201
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub():
+    StubEvolutionHandler.received = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubEvolutionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def test_dispatch_summary_and_concurrency():
+    server, url = start_stub()
+    try:
+        target = (url, 'key', 'inst1')
+        with WhatsAppDispatcher(post_whatsapp_text, workers=8, queue_size=4, rate_per_instance=1000) as dispatcher:
+            for i in range(40):
+                dispatcher.submit(DispatchJob(target, f"1199999{i:04d}", 'teste', i))
+            dispatcher.skip()
+
+        summary = dispatcher.summary
+        assert summary.sent == 36
+        assert summary.failed == 4
+        assert summary.skipped == 1
+        assert len(StubEvolutionHandler.received) == 40
+        # 40 chamadas de 50ms em série levariam 2s; com 8 workers bem menos
+        assert summary.duration < 1.5
+        assert summary.throughput > 0
+    finally:
+        server.shutdown()
+
+def test_rate_limit_per_instance():
+    server, url = start_stub()
+    try:
+        rate = 10
+        with WhatsAppDispatcher(post_whatsapp_text, workers=8, queue_size=10, rate_per_instance=rate, burst=1) as dispatcher:
+            for i in range(10):
+                dispatcher.submit(DispatchJob((url, 'key', 'inst1'), f"1199999{i:03d}1", 'a', i))
+                dispatcher.submit(DispatchJob((url, 'key', 'inst2'), f"1199998{i:03d}1", 'b', i))
+
+        assert dispatcher.summary.sent == 20
+        for instance in ('inst1', 'inst2'):
+            times = sorted(t for t, path, _ in StubEvolutionHandler.received if path.endswith(instance))
+            # 10 envios a 10/s com rajada 1 ocupam pelo menos ~0.9s por instância
+            assert times[-1] - times[0] >= (len(times) - 1) / rate * 0.9
+        # As duas instâncias são limitadas separadamente, então rodam em paralelo
+        assert dispatcher.summary.duration < 2 * 10 / rate
+    finally:
+        server.shutdown()
+
+def test_connection_error_counts_as_failure():
+    with WhatsAppDispatcher(post_whatsapp_text, workers=2, queue_size=2) as dispatcher:
+        dispatcher.submit(DispatchJob(('http://127.0.0.1:9', 'key', 'inst'), '11999999991', 'x'))
+
+    assert dispatcher.summary.failed == 1
+    assert dispatcher.summary.results[0].error
@@ -0,0 +1,145 @@
+"""
+Teste da fila de envio (outbox) de mensagens WhatsApp com stub da Evolution API
+"""
+from datetime import datetime, timedelta
+
+from app import app, db
+from models import User, Client, SystemSettings, UserWhatsAppInstance, WhatsAppMessage
+import whatsapp_outbox
+from whatsapp_outbox import queue_whatsapp_message, claim_batch, process_outbox
+from settings_cache import invalidate_settings
+from test_whatsapp_dispatch import StubEvolutionHandler, start_stub
+
+def setup_user(make_user, api_url):
+    """Usuário com instância conectada e um cliente com WhatsApp"""
+    user = make_user()
+    settings = SystemSettings.query.first() or SystemSettings()
+    settings.evolution_api_url = api_url
+    settings.evolution_api_key = 'key'
+    settings.evolution_enabled = True
+    db.session.add(settings)
+
+    db.session.add(UserWhatsAppInstance(user_id=user.id, instance_name=f"inst{user.id}", status='connected'))
+    client = Client(user_id=user.id, name='Cliente', whatsapp='11999990001')
+    db.session.add(client)
+    db.session.commit()
+    invalidate_settings()
+    return user, client
+
+def clear_queue():
+    WhatsAppMessage.query.delete()
+    db.session.commit()
+
+def test_queue_and_send(make_user):
+    server, url = start_stub()
+    try:
+        with app.app_context():
+            app.config['WHATSAPP_OUTBOX_ENABLED'] = True
+            clear_queue()
+            user, client = setup_user(make_user, url)
+
+            for i in range(5):
+                msg = queue_whatsapp_message(user.id, f"mensagem {i}", 'manual', client_id=client.id)
+                assert msg.status == 'pending'
+            # Nenhum envio acontece na requisição
+            assert StubEvolutionHandler.received == []
+
+            summary = process_outbox()
+            assert summary.sent == 5
+            sent = WhatsAppMessage.query.filter_by(status='sent').all()
+            assert len(sent) == 5
+            assert all(m.sent_at and m.attempts == 1 and m.locked_by is None for m in sent)
+
+            # Fila vazia: nada a fazer
+            assert process_outbox().sent == 0
+    finally:
+        server.shutdown()
+
+def test_claim_is_exclusive_and_expired_lease_is_reclaimed(make_user):
+    with app.app_context():
+        app.config['WHATSAPP_OUTBOX_ENABLED'] = True
+        clear_queue()
+        user, client = setup_user(make_user, 'http://127.0.0.1:9')
+        for i in range(4):
+            queue_whatsapp_message(user.id, f"m{i}", 'manual', client_id=client.id)
+
+        first = claim_batch(3)
+        second = claim_batch(3)
+        assert len(first) == 3
+        assert len(second) == 1
+        assert not {m.id for m in first} & {m.id for m in second}
+        assert claim_batch(3) == []
+
+        # Worker que morreu: a reserva expira e o lote volta para a fila
+        later = datetime.utcnow() + timedelta(hours=1)
+        assert len(claim_batch(10, now=later)) == 4
+
+def test_failed_send_is_retried_then_marked_failed(make_user):
+    with app.app_context():
+        app.config['WHATSAPP_OUTBOX_ENABLED'] = True
+        app.config['WHATSAPP_OUTBOX_MAX_ATTEMPTS'] = 2
+        clear_queue()
+        user, client = setup_user(make_user, 'http://127.0.0.1:9')
+        msg = queue_whatsapp_message(user.id, 'x', 'manual', client_id=client.id)
+
+        now = datetime.utcnow()
+        assert process_outbox(now=now).failed == 1
+        db.session.refresh(msg)
+        assert msg.status == 'pending'
+        assert msg.attempts == 1
+        assert msg.last_error
+        assert msg.next_attempt_at > now
+
+        # Antes do prazo de nova tentativa a mensagem não é reservada
+        assert claim_batch(10, now=now) == []
+
+        assert process_outbox(now=msg.next_attempt_at).failed == 1
+        db.session.refresh(msg)
+        assert msg.status == 'failed'
+        assert msg.attempts == 2
+
+def test_admin_message_without_client(make_user):
+    server, url = start_stub()
+    try:
+        with app.app_context():
+            app.config['WHATSAPP_OUTBOX_ENABLED'] = True
+            clear_queue()
+            user, _ = setup_user(make_user, url)
+            admin = User.query.filter_by(is_admin=True).first()
+            admin_instance = UserWhatsAppInstance.query.filter_by(user_id=admin.id, status='connected').first()
+
+            # Mensagem do cadastro: pertence ao novo usuário, sai pela instância do admin
+            msg = queue_whatsapp_message(user.id, 'código', 'phone_confirmation', phone='11988887771', sender='admin')
+            assert process_outbox().sent == 1
+            db.session.refresh(msg)
+            assert msg.status == 'sent'
+            assert StubEvolutionHandler.received[-1][1].endswith('/' + admin_instance.instance_name)
+    finally:
+        server.shutdown()
+
+def test_direct_send_without_recipient_is_recorded_as_failed(make_user, make_client, monkeypatch):
+    sent = []
+    monkeypatch.setattr(whatsapp_outbox, 'send_whatsapp_message', lambda *args: sent.append(args) or True)
+    with app.app_context():
+        previous = app.config.get('WHATSAPP_OUTBOX_ENABLED')
+        app.config['WHATSAPP_OUTBOX_ENABLED'] = False
+        try:
+            user = make_user()
+            no_phone = make_client(user.id, 'Sem WhatsApp')
+            removed = make_client(user.id, 'Removido', whatsapp='11999990002')
+            removed_id = removed.id
+            db.session.delete(removed)
+            db.session.commit()
+
+            # Sem cliente, cliente removido ou sem número: nada é enviado e a falha fica registrada
+            for client_id in (None, removed_id, no_phone.id):
+                msg = queue_whatsapp_message(user.id, 'oi', 'manual', client_id=client_id)
+                assert msg.id and msg.status == 'failed' and msg.sent_at is None
+                assert msg.last_error == 'Destinatário sem WhatsApp'
+            assert sent == []
+
+            with_phone = make_client(user.id, 'Com WhatsApp', whatsapp='11999990003')
+            msg = queue_whatsapp_message(user.id, 'oi', 'manual', client_id=with_phone.id)
+            assert msg.status == 'sent' and sent == [(user.id, '11999990003', 'oi')]
+        finally:
+            app.config['WHATSAPP_OUTBOX_ENABLED'] = previous
@@ -0,0 +1,86 @@
+"""
+Contadores de uso dos limites do plano
+users.clients_count, receivables_count e payables_count acompanham o
+número de linhas de cada tabela, para que as verificações de limite leiam
+um inteiro em vez de carregar as coleções inteiras.
+
+Inserções e exclusões pelo ORM atualizam os contadores via eventos do
+SQLAlchemy, na mesma transação. Operações em lote (query.delete(),
+__table__.insert()) não disparam esses eventos: quem as usa chama
+adjust_usage(). repair_usage_counters() recalcula tudo a partir das
+tabelas e corrige qualquer desvio.
+"""
+
+from datetime import date
+from sqlalchemy import event, func, or_, select
+from app import db
+from models import User, Client, Receivable, Payable
+import logging
+
+logger = logging.getLogger(__name__)
+
+USAGE_REPAIR_JOB = 'usage_counters_repair'
+
+# Tipo de limite -> (modelo contado, coluna em users)
+USAGE_COUNTERS = {
+    'clients': (Client, User.clients_count),
+    'receivables': (Receivable, User.receivables_count),
+    'payables': (Payable, User.payables_count),
+}
+
+def _increment_statement(column, user_id, delta):
+    return User.__table__.update().where(User.id == user_id).values({column.key: column + delta})
+
+def _register(model, column):
+    @event.listens_for(model, 'after_insert')
+    def _after_insert(mapper, connection, target):
+        connection.execute(_increment_statement(column, target.user_id, 1))
+
+    @event.listens_for(model, 'after_delete')
+    def _after_delete(mapper, connection, target):
+        connection.execute(_increment_statement(column, target.user_id, -1))
+
+for _model, _column in USAGE_COUNTERS.values():
+    _register(_model, _column)
+
+def adjust_usage(user_id, limit_type, delta):
+    """Ajusta um contador após inserções/exclusões em lote (sem commit)"""
+    if delta:
+        _model, column = USAGE_COUNTERS[limit_type]
+        db.session.execute(_increment_statement(column, user_id, delta))
+
+def get_usage(user):
+    """Uso atual do usuário, lido dos contadores"""
+    return {limit_type: getattr(user, column.key) or 0 for limit_type, (_model, column) in USAGE_COUNTERS.items()}
+
+def repair_usage_counters(user_ids=None):
+    """
+    Recalcula os contadores a partir das tabelas em um único UPDATE.
+
+    Retorna quantos usuários estavam com algum contador divergente.
+    """
+    actual = {
+        column.key: select(func.count(model.id)).where(model.user_id == User.id).scalar_subquery()
+        for model, column in USAGE_COUNTERS.values()
+    }
+
+    statement = User.__table__.update().values(actual).where(
+        or_(*(column != actual[column.key] for _model, column in USAGE_COUNTERS.values()))
+    )
+    if user_ids is not None:
+        statement = statement.where(User.id.in_(list(user_ids)))
+
+    repaired = db.session.execute(statement).rowcount
+    db.session.commit()
+
+    if repaired:
+        logger.warning(f"Contadores de uso corrigidos para {repaired} usuários")
+    return repaired
+
+def run_daily_usage_repair(today=None):
+    """Reconciliação diária dos contadores (marca d'água)"""
+    from tasks import claim_daily_run
+
+    if not claim_daily_run(USAGE_REPAIR_JOB, today or date.today()):
+        return None
+    return repair_usage_counters()
@@ -1,8 +1,8 @@
-from flask import session, redirect, url_for, flash
+from flask import session, redirect, url_for, flash, g, has_request_context, request
 from functools import wraps
+from app import db
 from models import User, UserPlan
 import re
-import requests
 import os
 import logging
 from datetime import datetime
@@ -31,29 +31,104 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def get_current_user():
-    if 'user_id' in session:
-        return User.query.get(session['user_id'])
-    return None
-
-def get_user_plan_name(user_id):
-    """Buscar plano atual do usuário no banco de dados"""
-    user_plan = UserPlan.query.filter_by(user_id=user_id).first()
+class RequestIdentity:
+    """Usuário logado e seu plano, carregados juntos uma vez por requisição"""
+    
+    def __init__(self, user, plan):
+        self.user = user
+        self.plan = plan
     
-    if not user_plan:
-        return 'Free'
+    @property
+    def plan_expired(self):
+        from plan_lifecycle import is_expired
+        return is_expired(self.plan)
     
-    # Verificar se o plano Premium expirou
-    if user_plan.plan_name == 'Premium' and user_plan.expires_at:
-        if user_plan.expires_at < datetime.utcnow():
+    @property
+    def plan_name(self):
+        if not self.plan:
+            return 'Free'
+        
+        # Verificar se o plano Premium expirou
+        if self.plan.plan_name == 'Premium' and self.plan_expired:
             return 'Free'  # Plano expirou, retornar para Free
+        
+        return self.plan.plan_name
     
-    return user_plan.plan_name
+    @property
+    def has_premium(self):
+        return self.plan_name == 'Premium'
+
+def _load_identity(user_id):
+    row = db.session.query(User, UserPlan).outerjoin(
+        UserPlan, UserPlan.user_id == User.id
+    ).filter(User.id == user_id).first()
+    
+    if not row:
+        return None
+    return RequestIdentity(*row)
+
+def current_identity():
+    """
+    Identidade da requisição atual (ou None se não houver login).
+    
+    Fica em flask.g, associada ao user_id da sessão: decorators, handlers,
+    context processors e helpers reaproveitam a mesma consulta.
+    """
+    user_id = session.get('user_id')
+    if user_id is None:
+        return None
+    
+    cached = g.get('_identity')
+    if cached is None or cached[0] != user_id:
+        cached = (user_id, _load_identity(user_id))
+        g._identity = cached
+    return cached[1]
+
+def get_current_user():
+    identity = current_identity()
+    return identity.user if identity else None
+
+def get_user_plan(user_id):
+    """UserPlan do usuário; usa o da requisição quando é o usuário logado"""
+    identity = current_identity() if has_request_context() else None
+    if identity and identity.user.id == user_id and identity.plan is not None:
+        return identity.plan
+    return UserPlan.query.filter_by(user_id=user_id).first()
+
+def get_user_plan_name(user_id):
+    """Buscar plano atual do usuário no banco de dados"""
+    return RequestIdentity(None, get_user_plan(user_id)).plan_name
 
 def has_premium_access(user_id):
     """Verificar se usuário tem acesso Premium válido"""
     return get_user_plan_name(user_id) == 'Premium'
 
+def valid_month(year, month):
+    """Mês/ano que month_range aceita (o mês seguinte também precisa existir)"""
+    from datetime import MAXYEAR, MINYEAR
+    
+    return 1 <= month <= 12 and MINYEAR <= year < MAXYEAR
+
+def month_range(year, month):
+    """Intervalo [início, início do mês seguinte) para filtros indexáveis por data"""
+    from datetime import date
+    
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+def month_filter_args():
+    """(mês, ano) de ?month/year das telas mensais; se inválidos, o mês atual"""
+    from datetime import date
+    
+    today = date.today()
+    month = request.args.get('month', today.month, type=int)
+    year = request.args.get('year', today.year, type=int)
+    if not valid_month(year, month):
+        flash('Mês inválido, mostrando o mês atual.', 'error')
+        return today.month, today.year
+    return month, year
+
 def validate_cpf(cpf):
     """Validate Brazilian CPF"""
     cpf = re.sub(r'[^\d]', '', cpf)
@@ -127,10 +202,10 @@ def format_phone(phone):
 
 def get_system_domain():
     """Get configured system domain from admin settings"""
-    from models import SystemSettings
+    from settings_cache import get_settings
     
     try:
-        system_settings = SystemSettings.query.first()
+        system_settings = get_settings()
         if system_settings and system_settings.system_domain:
             domain = system_settings.system_domain.strip()
             if not domain.startswith(('http://', 'https://')):
@@ -160,206 +235,125 @@ def generate_system_url(endpoint, **kwargs):
     
     return f"{system_domain}{relative_url}"
 
+def get_evolution_target(user_id):
+    """
+    Resolve URL, chave e instância conectada da Evolution API para um usuário.
+    
+    Retorna a tupla (api_url, api_key, instance_name), ou None quando não é
+    possível enviar (API desativada ou nenhuma instância conectada).
+    """
+    from models import UserWhatsAppInstance
+    from settings_cache import get_settings
+    
+    system_settings = get_settings()
+    if not system_settings or not system_settings.evolution_enabled:
+        logging.warning("Evolution API not configured or disabled")
+        return None
+    
+    # Get user's first connected WhatsApp instance
+    instance = UserWhatsAppInstance.query.filter_by(
+        user_id=user_id, 
+        status='connected'
+    ).first()
+    
+    if not instance:
+        logging.warning(f"No connected WhatsApp instance found for user {user_id}")
+        return None
+    
+    # Clean API settings
+    clean_api_key = system_settings.evolution_api_key.strip() if system_settings.evolution_api_key else ''
+    clean_api_url = system_settings.evolution_api_url.rstrip('/') if system_settings.evolution_api_url else ''
+    
+    return clean_api_url, clean_api_key, instance.instance_name
+
+def post_whatsapp_text(api_url, api_key, instance_name, phone, message):
+    """
+    Envia uma mensagem de texto pela Evolution API (sem acesso ao banco).
+    
+    Pode ser chamada das threads dos workers: só faz a requisição HTTP.
+    """
+    # Format phone number
+    formatted_phone = format_phone(phone)
+    if not formatted_phone:
+        logging.warning(f"Invalid phone number: {phone}")
+        return False
+    
+    # Send message via Evolution API (conexão reaproveitada do pool)
+    from evolution_client import get_evolution_client
+    response = get_evolution_client(api_url, api_key).send_text(instance_name, formatted_phone, message)
+    
+    logging.info(f"WhatsApp message response: {response.status_code} - {response.text}")
+    
+    if response.status_code == 400:
+        # Número não existe no WhatsApp
+        logging.warning(f"WhatsApp number not found: {formatted_phone}")
+        return False
+    
+    return response.status_code in [200, 201]
+
 def send_whatsapp_message(user_id, phone, message):
     """Send WhatsApp message via Evolution API"""
-    from models import SystemSettings, UserWhatsAppInstance
-    import logging
-    
     try:
-        # Get system settings
-        system_settings = SystemSettings.query.first()
-        if not system_settings or not system_settings.evolution_enabled:
-            logging.warning("Evolution API not configured or disabled")
-            return False
-        
-        # Get user's first connected WhatsApp instance
-        instance = UserWhatsAppInstance.query.filter_by(
-            user_id=user_id, 
-            status='connected'
-        ).first()
-        
-        if not instance:
-            logging.warning(f"No connected WhatsApp instance found for user {user_id}")
+        target = get_evolution_target(user_id)
+        if not target:
             return False
         
-        # Clean API settings
-        clean_api_key = system_settings.evolution_api_key.strip() if system_settings.evolution_api_key else ''
-        clean_api_url = system_settings.evolution_api_url.rstrip('/') if system_settings.evolution_api_url else ''
-        
-        # Format phone number
-        formatted_phone = format_phone(phone)
-        if not formatted_phone:
-            logging.warning(f"Invalid phone number: {phone}")
-            return False
-        
-        # Send message via Evolution API
-        response = requests.post(
-            f"{clean_api_url}/message/sendText/{instance.instance_name}",
-            headers={
-                'apikey': clean_api_key,
-                'Content-Type': 'application/json'
-            },
-            json={
-                'number': formatted_phone,
-                'text': message
-            },
-            timeout=10
-        )
-        
-        logging.info(f"WhatsApp message response: {response.status_code} - {response.text}")
-        
-        if response.status_code == 400:
-            # Número não existe no WhatsApp
-            logging.warning(f"WhatsApp number not found: {formatted_phone}")
-            return False
-        
-        return response.status_code in [200, 201]
+        api_url, api_key, instance_name = target
+        return post_whatsapp_text(api_url, api_key, instance_name, phone, message)
     except Exception as e:
         logging.error(f"Error sending WhatsApp message: {str(e)}")
         return False
 
+def get_admin_evolution_target():
+    """
+    Resolve a instância conectada do administrador (mensagens do sistema).
+    
+    Mesmo retorno de get_evolution_target().
+    """
+    from models import User
+    
+    # Get first admin's connected WhatsApp instance
+    admin_user = User.query.filter_by(is_admin=True).first()
+    if not admin_user:
+        logging.warning("No admin user found")
+        return None
+    
+    return get_evolution_target(admin_user.id)
+
 def send_admin_whatsapp_message(phone, message):
     """Send WhatsApp message from admin instance"""
-    from models import SystemSettings, UserWhatsAppInstance, User
-    import logging
-    import requests
-    
     try:
-        # Get system settings
-        system_settings = SystemSettings.query.first()
-        if not system_settings or not system_settings.evolution_enabled:
-            logging.warning("Evolution API not configured or disabled")
-            return False
-        
-        # Get first admin's connected WhatsApp instance
-        admin_user = User.query.filter_by(is_admin=True).first()
-        if not admin_user:
-            logging.warning("No admin user found")
-            return False
-            
-        admin_instance = UserWhatsAppInstance.query.filter_by(
-            user_id=admin_user.id, 
-            status='connected'
-        ).first()
-        
-        if not admin_instance:
-            logging.warning(f"No connected WhatsApp instance found for admin")
-            return False
-        
-        # Clean API settings
-        clean_api_key = system_settings.evolution_api_key.strip() if system_settings.evolution_api_key else ''
-        clean_api_url = system_settings.evolution_api_url.rstrip('/') if system_settings.evolution_api_url else ''
-        
-        # Format phone number
-        formatted_phone = format_phone(phone)
-        if not formatted_phone:
-            logging.warning(f"Invalid phone number: {phone}")
+        target = get_admin_evolution_target()
+        if not target:
             return False
         
-        # Send message via Evolution API
-        response = requests.post(
-            f"{clean_api_url}/message/sendText/{admin_instance.instance_name}",
-            headers={
-                'apikey': clean_api_key,
-                'Content-Type': 'application/json'
-            },
-            json={
-                'number': formatted_phone,
-                'text': message
-            },
-            timeout=10
-        )
-        
-        logging.info(f"Admin WhatsApp message response: {response.status_code} - {response.text}")
-        
-        if response.status_code == 400:
-            # Número não existe no WhatsApp
-            logging.warning(f"WhatsApp number not found: {formatted_phone}")
-            return False
-        
-        return response.status_code in [200, 201]
+        api_url, api_key, instance_name = target
+        return post_whatsapp_text(api_url, api_key, instance_name, phone, message)
     except Exception as e:
         logging.error(f"Error sending admin WhatsApp message: {str(e)}")
         return False
 
 def calculate_dashboard_stats(user_id):
     """Calculate dashboard statistics for a user"""
-    from models import Client, Receivable, Payable, InstallmentSale
-    from datetime import datetime
-    from sqlalchemy import func
-    
-    stats = {
-        'total_clients': 0,
-        'total_receivables': 0,
-        'total_payables': 0,
-        'overdue_receivables': 0,
-        'pending_receivables': 0,
-        'paid_receivables': 0,
-        'overdue_payables': 0,
-        'pending_payables': 0,
-        'paid_payables': 0,
-        'total_installment_sales': 0,
-        'revenue_this_month': 0,
-        'expenses_this_month': 0
-    }
+    from dashboard_metrics import DashboardMetrics, get_dashboard_metrics
     
     try:
-        # Total clients
-        stats['total_clients'] = Client.query.filter_by(user_id=user_id).count()
-        
-        # Receivables stats
-        receivables = Receivable.query.filter_by(user_id=user_id).all()
-        stats['total_receivables'] = len(receivables)
-        
-        today = datetime.now().date()
-        for r in receivables:
-            if r.status == 'paid':
-                stats['paid_receivables'] += 1
-            elif r.status == 'pending':
-                if r.due_date and r.due_date < today:
-                    stats['overdue_receivables'] += 1
-                else:
-                    stats['pending_receivables'] += 1
-        
-        # Payables stats
-        payables = Payable.query.filter_by(user_id=user_id).all()
-        stats['total_payables'] = len(payables)
-        
-        for p in payables:
-            if p.status == 'paid':
-                stats['paid_payables'] += 1
-            elif p.status == 'pending':
-                if p.due_date and p.due_date < today:
-                    stats['overdue_payables'] += 1
-                else:
-                    stats['pending_payables'] += 1
-        
-        # Installment sales
-        stats['total_installment_sales'] = InstallmentSale.query.filter_by(user_id=user_id).count()
-        
-        # Monthly revenue/expenses (simplified)
-        current_month = datetime.now().month
-        current_year = datetime.now().year
-        
-        monthly_receivables = Receivable.query.filter(
-            Receivable.user_id == user_id,
-            Receivable.status == 'paid',
-            func.extract('month', Receivable.payment_date) == current_month,
-            func.extract('year', Receivable.payment_date) == current_year
-        ).all()
-        
-        stats['revenue_this_month'] = sum(r.amount for r in monthly_receivables)
-        
-        monthly_payables = Payable.query.filter(
-            Payable.user_id == user_id,
-            Payable.status == 'paid',
-            func.extract('month', Payable.payment_date) == current_month,
-            func.extract('year', Payable.payment_date) == current_year
-        ).all()
-        
-        stats['expenses_this_month'] = sum(p.amount for p in monthly_payables)
-        
+        metrics = get_dashboard_metrics(user_id)
     except Exception as e:
         logging.error(f"Error calculating dashboard stats: {str(e)}")
+        metrics = DashboardMetrics()
     
-    return stats
+    return {
+        'total_clients': metrics.total_clients,
+        'total_receivables': metrics.total_receivables,
+        'total_payables': metrics.total_payables,
+        'overdue_receivables': metrics.overdue_receivables,
+        'pending_receivables': metrics.pending_receivables,
+        'paid_receivables': metrics.paid_receivables,
+        'overdue_payables': metrics.overdue_payables,
+        'pending_payables': metrics.pending_payables,
+        'paid_payables': metrics.paid_payables,
+        'total_installment_sales': metrics.total_installment_sales,
+        'revenue_this_month': metrics.revenue_this_month,
+        'expenses_this_month': metrics.expenses_this_month
+    }
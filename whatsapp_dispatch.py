@@ -0,0 +1,164 @@
+"""
+Pipeline de envio concorrente de mensagens WhatsApp
+Fila limitada (backpressure) + pool de threads + limite de envio por instância
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class DispatchJob:
+    """Mensagem a ser enviada; 'target' é a tupla (api_url, api_key, instance_name)"""
+    target: tuple
+    phone: str
+    message: str
+    context: Any = None  # Dados do chamador (ex.: receivable_id), devolvidos no resultado
+
+    @property
+    def instance_key(self):
+        return (self.target[0], self.target[2])
+
+@dataclass
+class DispatchResult:
+    job: DispatchJob
+    success: bool
+    error: Optional[str] = None
+
+@dataclass
+class DispatchSummary:
+    """Resumo de uma execução do pipeline"""
+    sent: int = 0
+    failed: int = 0
+    skipped: int = 0
+    duration: float = 0.0
+    results: list = field(default_factory=list, repr=False)
+
+    @property
+    def throughput(self):
+        """Mensagens processadas por segundo"""
+        processed = self.sent + self.failed
+        return processed / self.duration if self.duration > 0 else 0.0
+
+    def __str__(self):
+        return (f"{self.sent} enviadas, {self.failed} falharam, {self.skipped} ignoradas "
+                f"em {self.duration:.1f}s ({self.throughput:.1f} msg/s)")
+
+class RateLimiter:
+    """Token bucket: no máximo 'rate' envios por segundo, com rajada de 'burst'"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Bloqueia até haver um token disponível"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class WhatsAppDispatcher:
+    """
+    Envia mensagens em paralelo respeitando o limite de cada instância.
+
+    O produtor chama submit(); quando a fila está cheia ele bloqueia
+    (backpressure), evitando carregar milhares de mensagens em memória.
+    """
+
+    def __init__(self, send_func: Callable[..., bool], workers=8, queue_size=100,
+                 rate_per_instance=5.0, burst=None):
+        self.send_func = send_func
+        self.workers = max(1, workers)
+        self.rate_per_instance = rate_per_instance
+        self.burst = burst
+        self.jobs = queue.Queue(maxsize=max(1, queue_size))
+        self.limiters = {}
+        self.limiters_lock = threading.Lock()
+        self.results_lock = threading.Lock()
+        self.summary = DispatchSummary()
+        self.threads = []
+        self.started_at = None
+
+    def _limiter_for(self, job):
+        with self.limiters_lock:
+            limiter = self.limiters.get(job.instance_key)
+            if limiter is None:
+                limiter = RateLimiter(self.rate_per_instance, self.burst)
+                self.limiters[job.instance_key] = limiter
+            return limiter
+
+    def _worker(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                return
+
+            error = None
+            try:
+                self._limiter_for(job).acquire()
+                api_url, api_key, instance_name = job.target
+                success = bool(self.send_func(api_url, api_key, instance_name, job.phone, job.message))
+            except Exception as e:
+                success = False
+                error = str(e)
+                logger.error(f"Erro ao enviar mensagem WhatsApp: {error}")
+
+            with self.results_lock:
+                if success:
+                    self.summary.sent += 1
+                else:
+                    self.summary.failed += 1
+                self.summary.results.append(DispatchResult(job, success, error))
+
+            self.jobs.task_done()
+
+    def start(self):
+        self.started_at = time.monotonic()
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, job):
+        """Enfileira um envio; bloqueia enquanto a fila estiver cheia"""
+        self.jobs.put(job)
+
+    def skip(self):
+        """Registra uma mensagem que não pôde ser enfileirada (sem WhatsApp, sem instância...)"""
+        with self.results_lock:
+            self.summary.skipped += 1
+
+    def finish(self):
+        """Aguarda os envios pendentes e devolve o resumo"""
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        self.summary.duration = time.monotonic() - self.started_at if self.started_at else 0.0
+        return self.summary
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish()
+        return False
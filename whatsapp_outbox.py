@@ -0,0 +1,256 @@
+"""
+Fila de envio de mensagens WhatsApp (outbox) sobre a tabela whatsapp_messages
+
+As telas apenas gravam a mensagem com status 'pending' e retornam; o worker
+reserva lotes (SELECT ... FOR UPDATE SKIP LOCKED no MySQL/PostgreSQL, coluna
+de reserva locked_until no SQLite), envia pelo pipeline concorrente e atualiza
+status, tentativas e sent_at.
+
+Uso como processo dedicado: python whatsapp_outbox.py
+"""
+
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_
+from app import db
+from models import WhatsAppMessage, Client
+from utils import (get_evolution_target, get_admin_evolution_target,
+                   post_whatsapp_text, send_whatsapp_message, send_admin_whatsapp_message)
+from whatsapp_dispatch import WhatsAppDispatcher, DispatchJob
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tempo que um lote fica reservado para o worker antes de poder ser retomado
+LEASE_SECONDS = 300
+# Espera antes da 1ª nova tentativa; dobra a cada falha
+RETRY_BASE_SECONDS = 60
+
+def outbox_enabled():
+    return current_app.config.get('WHATSAPP_OUTBOX_ENABLED', False)
+
+def queue_whatsapp_message(user_id, message, message_type, client_id=None, phone=None, sender='user'):
+    """
+    Registra uma mensagem para envio e retorna o WhatsAppMessage.
+
+    No modo outbox a mensagem fica 'pending' para o worker; caso contrário é
+    enviada na hora (comportamento antigo) e gravada como 'sent'/'failed'.
+    """
+    whatsapp_msg = WhatsAppMessage(
+        user_id=user_id,
+        client_id=client_id,
+        phone=phone,
+        sender=sender,
+        message_type=message_type,
+        content=message,
+        status='pending',
+        attempts=0
+    )
+
+    if not outbox_enabled():
+        destination = phone
+        if not destination and client_id:
+            client = db.session.get(Client, client_id)
+            destination = client.whatsapp if client else None
+
+        whatsapp_msg.attempts = 1
+        if not destination:
+            # Mesmo tratamento do worker: sem número a mensagem falha sem envio
+            whatsapp_msg.status = 'failed'
+            whatsapp_msg.last_error = 'Destinatário sem WhatsApp'
+        else:
+            if sender == 'admin':
+                success = send_admin_whatsapp_message(destination, message)
+            else:
+                success = send_whatsapp_message(user_id, destination, message)
+            whatsapp_msg.status = 'sent' if success else 'failed'
+            whatsapp_msg.sent_at = datetime.utcnow() if success else None
+            if not success:
+                whatsapp_msg.last_error = 'Falha no envio pela Evolution API'
+
+    db.session.add(whatsapp_msg)
+    db.session.commit()
+    return whatsapp_msg
+
+def _claimable(now):
+    """Pendentes já liberadas para envio, ou reservas abandonadas por um worker"""
+    return or_(
+        and_(
+            WhatsAppMessage.status == 'pending',
+            or_(WhatsAppMessage.next_attempt_at.is_(None), WhatsAppMessage.next_attempt_at <= now)
+        ),
+        and_(
+            WhatsAppMessage.status == 'sending',
+            WhatsAppMessage.locked_until < now
+        )
+    )
+
+def claim_batch(batch_size=50, now=None):
+    """
+    Reserva até batch_size mensagens para este worker.
+
+    A reserva é um UPDATE condicional (status/locked_until), então dois
+    workers nunca pegam a mesma mensagem, mesmo no SQLite; no MySQL e no
+    PostgreSQL o SELECT usa SKIP LOCKED para não esperar lotes alheios.
+    """
+    now = now or datetime.utcnow()
+    token = uuid.uuid4().hex
+
+    query = db.session.query(WhatsAppMessage.id).filter(
+        _claimable(now)
+    ).order_by(WhatsAppMessage.id).limit(batch_size)
+
+    if db.engine.dialect.name in ('mysql', 'mariadb', 'postgresql'):
+        query = query.with_for_update(skip_locked=True)
+
+    ids = [row.id for row in query.all()]
+    if not ids:
+        db.session.commit()
+        return []
+
+    WhatsAppMessage.query.filter(
+        WhatsAppMessage.id.in_(ids),
+        _claimable(now)
+    ).update({
+        WhatsAppMessage.status: 'sending',
+        WhatsAppMessage.locked_by: token,
+        WhatsAppMessage.locked_until: now + timedelta(seconds=LEASE_SECONDS)
+    }, synchronize_session=False)
+    db.session.commit()
+
+    return WhatsAppMessage.query.filter(
+        WhatsAppMessage.locked_by == token,
+        WhatsAppMessage.status == 'sending'
+    ).order_by(WhatsAppMessage.id).all()
+
+def process_outbox(batch_size=None, send_func=None, now=None):
+    """
+    Envia um lote da fila e grava o resultado de cada mensagem.
+
+    Retorna o DispatchSummary do lote (vazio se não havia nada a enviar).
+    """
+    config = current_app.config
+    batch_size = batch_size or config.get('WHATSAPP_OUTBOX_BATCH_SIZE', 50)
+    max_attempts = config.get('WHATSAPP_OUTBOX_MAX_ATTEMPTS', 5)
+
+    messages = claim_batch(batch_size, now)
+    dispatcher = WhatsAppDispatcher(
+        send_func or post_whatsapp_text,
+        workers=config.get('REMINDER_DISPATCH_WORKERS', 8),
+        queue_size=max(1, len(messages)),
+        rate_per_instance=config.get('EVOLUTION_RATE_PER_SECOND', 5)
+    )
+    if not messages:
+        return dispatcher.summary
+
+    client_ids = {m.client_id for m in messages if m.client_id and not m.phone}
+    phones = dict(
+        db.session.query(Client.id, Client.whatsapp).filter(Client.id.in_(client_ids)).all()
+    ) if client_ids else {}
+
+    targets = {}
+    errors = {}
+    with dispatcher:
+        for message in messages:
+            phone = message.phone or phones.get(message.client_id)
+            if not phone:
+                errors[message.id] = (True, 'Destinatário sem WhatsApp')
+                dispatcher.skip()
+                continue
+
+            key = (message.sender, message.user_id)
+            if key not in targets:
+                targets[key] = get_admin_evolution_target() if message.sender == 'admin' else get_evolution_target(message.user_id)
+            if not targets[key]:
+                errors[message.id] = (False, 'Nenhuma instância do WhatsApp conectada')
+                dispatcher.skip()
+                continue
+
+            dispatcher.submit(DispatchJob(targets[key], phone, message.content, message.id))
+
+    results = {result.job.context: result for result in dispatcher.summary.results}
+    finished_at = now or datetime.utcnow()
+
+    for message in messages:
+        message.attempts = (message.attempts or 0) + 1
+        message.locked_by = None
+        message.locked_until = None
+
+        result = results.get(message.id)
+        if result and result.success:
+            message.status = 'sent'
+            message.sent_at = finished_at
+            message.last_error = None
+            continue
+
+        permanent, error = errors.get(message.id, (False, None))
+        message.last_error = error or (result.error if result else None) or 'Falha no envio pela Evolution API'
+
+        if permanent or message.attempts >= max_attempts:
+            message.status = 'failed'
+        else:
+            message.status = 'pending'
+            message.next_attempt_at = finished_at + timedelta(
+                seconds=RETRY_BASE_SECONDS * 2 ** (message.attempts - 1)
+            )
+
+    db.session.commit()
+    logger.info(f"Fila WhatsApp: {dispatcher.summary}")
+    return dispatcher.summary
+
+class OutboxWorker:
+    """Thread que esvazia a fila continuamente"""
+
+    def __init__(self):
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+            logger.info("Worker da fila WhatsApp iniciado")
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        logger.info("Worker da fila WhatsApp parado")
+
+    def run(self):
+        from app import app
+
+        while self.running:
+            try:
+                with app.app_context():
+                    summary = process_outbox()
+                    poll_seconds = app.config.get('WHATSAPP_OUTBOX_POLL_SECONDS', 5)
+
+                # Lote vazio: aguarda; lote processado: segue para o próximo
+                if not (summary.sent or summary.failed or summary.skipped):
+                    time.sleep(poll_seconds)
+            except Exception as e:
+                logger.error(f"Erro no worker da fila WhatsApp: {str(e)}")
+                time.sleep(30)
+
+# Instância global do worker
+outbox_worker = OutboxWorker()
+
+def start_outbox_worker():
+    """Inicia o worker da fila (apenas no modo outbox)"""
+    from app import app
+
+    if app.config.get('WHATSAPP_OUTBOX_ENABLED'):
+        outbox_worker.start()
+
+def stop_outbox_worker():
+    outbox_worker.stop()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    outbox_worker.running = True
+    outbox_worker.run()